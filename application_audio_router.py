@@ -3,11 +3,21 @@ import asyncio
 import os
 import json
 import flet as ft
-import pygetwindow as gw
 import ctypes
 import threading
 import time
-import win32gui
+from concurrent.futures import ThreadPoolExecutor
+from device_policy import ROLE_SOURCE
+from process_discovery import ProcessDiscovery, ProcessNameCache
+from routing_table import RoutingSnapshot, build_routing_snapshot
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+# Общий кеш имен процессов (PID → имя) для разовых запросов
+_process_name_cache = ProcessNameCache()
 
 
 # Функция для получения имени процесса по hwnd
@@ -16,8 +26,7 @@ def get_process_name(hwnd):
         # Получаем PID процесса через hwnd
         pid = ctypes.c_ulong()
         ctypes.windll.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
-        process = psutil.Process(pid.value)
-        return process.name()
+        return _process_name_cache.get(pid.value)
     except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
         return "Unknown"
 
@@ -30,6 +39,7 @@ class ApplicationAudioRouter:
         self.devices = target_devices_list  # Список устройств, переданный из главного приложения
         self.app = app_instance  # Экземпляр AudioForwarderApp
         self.applications = {}  # Инициализация словаря приложений
+        self._extra_titles = frozenset()  # Заголовки из настроек для потока сканирования (copy-on-write)
         
         # ИСПРАВЛЕНИЕ: Добавляем контроль жизненного цикла
         self._stop_event = threading.Event()
@@ -38,6 +48,27 @@ class ApplicationAudioRouter:
         self._last_update_time = 0
         self._update_interval = 3.0  # Уменьшаем частоту обновлений до 3 секунд
         
+        # ИСПРАВЛЕНИЕ: Асинхронный конвейер мониторинга
+        self._loop = None  # Цикл событий, в котором работает мониторинг
+        self._async_stop = None  # asyncio.Event, создается внутри цикла событий
+        self._events = None  # asyncio.Queue с событиями для интерфейса
+        self._event_listeners = []  # Синхронные подписчики на события
+        self._scan_executor = None  # Отдельный поток для блокирующего перечисления окон
+        
+        # ОПТИМИЗАЦИЯ: Инкрементальное обнаружение приложений с кешем имен процессов
+        self._discovery = ProcessDiscovery(
+            name_cache=_process_name_cache,
+            extra_titles=lambda: self._extra_titles
+        )
+        self._discovery_lock = threading.Lock()
+        
+        # ОПТИМИЗАЦИЯ: Снимок маршрутизации для аудио-callback (copy-on-write)
+        self._routing_snapshot = build_routing_snapshot(self.devices, {}, {})
+        self._routing_lock = threading.Lock()  # Только для построителей снимка, не для читателей
+        self._foreground_thread = None
+        self._foreground_stop = threading.Event()
+        self._foreground_poll_interval = 0.25
+        
         # ИСПРАВЛЕНИЕ: Правильное управление источником звука
         self.source_device_name = None
         self.source_device_id = None
@@ -54,6 +85,7 @@ class ApplicationAudioRouter:
         self.error_reset_interval = 300  # 5 минут
         
         self.load_settings()  # Загружаем настройки при инициализации
+        self._rebuild_routing_snapshot()
 
     def load_settings(self):
         """Загрузка настроек из файла."""
@@ -63,25 +95,113 @@ class ApplicationAudioRouter:
                     self.device_settings = json.load(f)
             except (json.JSONDecodeError, FileNotFoundError):
                 self.device_settings = {}
+        self._publish_extra_titles()
+
+    def _publish_extra_titles(self):
+        """Публикует неизменяемый снимок заголовков из настроек одним присваиванием.
+
+        Словарь настроек меняет только поток интерфейса, а ProcessDiscovery
+        читает заголовки в потоке сканирования - итерировать сам словарь там нельзя.
+        """
+        self._extra_titles = frozenset(self.device_settings)
 
     def save_settings(self):
         """Сохранение настроек в файл."""
+        self._publish_extra_titles()
         try:
             with open('audio_router_settings.json', 'w', encoding='utf-8') as f:
                 json.dump(self.device_settings, f, ensure_ascii=False, indent=2)
         except Exception as e:
-            print(f"Ошибка сохранения настроек: {e}")
+            log.warning(f"Ошибка сохранения настроек: {e}")
 
     def select_devices_for_app(self, app_name, selected_devices):
         """Сохраняет выбор устройств вывода звука для приложения."""
         self.device_settings[app_name] = selected_devices
         self.save_settings()
+        self._rebuild_routing_snapshot()
+
+    @property
+    def routing_snapshot(self) -> RoutingSnapshot:
+        """Текущий неизменяемый снимок маршрутизации (безопасно читать из аудио-потока)."""
+        return self._routing_snapshot
+
+    _KEEP_ACTIVE = object()
+
+    def _rebuild_routing_snapshot(self, active_handle=_KEEP_ACTIVE):
+        """Перестраивает снимок маршрутизации и публикует его одним присваиванием."""
+        with self._routing_lock:
+            current = self._routing_snapshot
+            if active_handle is self._KEEP_ACTIVE:
+                active_handle = current.active_handle
+            self._routing_snapshot = build_routing_snapshot(
+                self.devices,
+                dict(self.device_settings),
+                dict(self.applications),
+                active_handle=active_handle,
+                version=current.version + 1
+            )
+
+    def _set_foreground(self, handle):
+        """Публикует снимок с новым активным окном без пересчета масок."""
+        with self._routing_lock:
+            current = self._routing_snapshot
+            if current.active_handle != handle:
+                self._routing_snapshot = current.with_active(handle)
+
+    def start_foreground_tracking(self):
+        """Запускает фоновое отслеживание активного окна для снимка маршрутизации."""
+        if self._foreground_thread and self._foreground_thread.is_alive():
+            return
+        self._foreground_stop.clear()
+        self._foreground_thread = threading.Thread(target=self._foreground_loop, daemon=True)
+        self._foreground_thread.start()
+        log.info("👁️ Отслеживание активного окна запущено")
+
+    def stop_foreground_tracking(self):
+        """Останавливает отслеживание активного окна."""
+        self._foreground_stop.set()
+        if self._foreground_thread and self._foreground_thread.is_alive():
+            self._foreground_thread.join(timeout=2.0)
+        self._foreground_thread = None
+
+    def _foreground_loop(self):
+        """Опрашивает активное окно вне аудио-потока и обновляет снимок при изменении."""
+        last_handle = None
+        while not self._foreground_stop.wait(self._foreground_poll_interval):
+            try:
+                handle = self._discovery.get_foreground_handle()
+                if handle == last_handle:
+                    continue
+                last_handle = handle
+
+                # Новое окно, которого нет в снимке - обновляем список приложений
+                if handle is not None and handle not in self._routing_snapshot.handle_titles:
+                    if self._refresh_applications():
+                        self._rebuild_routing_snapshot(active_handle=handle)
+                        continue
+                self._set_foreground(handle)
+            except Exception as e:
+                self._handle_error('monitoring', e, "Отслеживание активного окна", show_user=False)
+                self._foreground_stop.wait(1.0)
+
+    def _refresh_applications(self):
+        """Инкрементально обновляет список приложений. Возвращает изменения."""
+        with self._discovery_lock:
+            changes = self._discovery.refresh()
+            if changes:
+                self.applications = self._discovery.applications
+        return changes
 
     def stop_monitoring(self):
         """Остановка мониторинга и очистка ресурсов."""
-        print("🔴 Остановка мониторинга ApplicationAudioRouter...")
+        log.info("🔴 Остановка мониторинга ApplicationAudioRouter...")
         self._stop_event.set()
         self._dialog_open = False
+        self._signal_async_stop()
+        
+        if self._scan_executor is not None:
+            self._scan_executor.shutdown(wait=False)
+            self._scan_executor = None
         
         # Останавливаем все потоки устройств
         for device_name, streams in list(self.device_streams.items()):
@@ -92,110 +212,153 @@ class ApplicationAudioRouter:
                         target_stream.stop()
                     if hasattr(target_stream, 'close'):
                         target_stream.close()
-                    print(f"✅ Поток для {device_name} остановлен")
+                    log.info(f"✅ Поток для {device_name} остановлен")
             except Exception as e:
-                print(f"⚠️ Ошибка остановки потока {device_name}: {e}")
+                log.warning(f"⚠️ Ошибка остановки потока {device_name}: {e}")
         
         self.device_streams.clear()
         self.applications.clear()
-        print("✅ ApplicationAudioRouter остановлен")
+        with self._discovery_lock:
+            self._discovery.reset()
+        self._rebuild_routing_snapshot()
+        log.info("✅ ApplicationAudioRouter остановлен")
+
+    def _signal_async_stop(self):
+        """Будит ожидающие корутины мониторинга (безопасно из любого потока)."""
+        loop, async_stop = self._loop, self._async_stop
+        if loop is None or async_stop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(async_stop.set)
+        except RuntimeError:
+            pass  # Цикл событий уже остановлен
+
+    async def _wait_stop(self, timeout):
+        """Неблокирующая пауза, прерываемая остановкой мониторинга.
+
+        Returns:
+            bool: True если мониторинг остановлен
+        """
+        if self._stop_event.is_set():
+            return True
+        if self._async_stop is None:
+            await asyncio.sleep(timeout)
+            return self._stop_event.is_set()
+        try:
+            await asyncio.wait_for(self._async_stop.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._stop_event.is_set()
+
+    def add_event_listener(self, callback):
+        """Подписывает синхронную функцию на события мониторинга: callback(kind, payload)."""
+        if callback not in self._event_listeners:
+            self._event_listeners.append(callback)
+
+    def remove_event_listener(self, callback):
+        """Отписывает функцию от событий мониторинга."""
+        if callback in self._event_listeners:
+            self._event_listeners.remove(callback)
+
+    def _publish_event(self, kind, payload=None):
+        """Публикует событие в очередь интерфейса и синхронным подписчикам."""
+        queue = self._events
+        if queue is not None:
+            try:
+                queue.put_nowait((kind, payload))
+            except asyncio.QueueFull:
+                # Интерфейс не успевает - старое событие теряет смысл
+                try:
+                    queue.get_nowait()
+                    queue.put_nowait((kind, payload))
+                except (asyncio.QueueEmpty, asyncio.QueueFull):
+                    pass
+        
+        for listener in list(self._event_listeners):
+            try:
+                listener(kind, payload)
+            except Exception as e:
+                log.warning(f"⚠️ Ошибка подписчика событий мониторинга: {e}")
+
+    async def scan_applications(self):
+        """Выполняет одно сканирование в отдельном потоке и публикует изменения."""
+        if self._scan_executor is None:
+            self._scan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="app-scan")
+        
+        loop = asyncio.get_running_loop()
+        changes = await loop.run_in_executor(self._scan_executor, self._refresh_applications)
+        
+        if changes:
+            self._rebuild_routing_snapshot()
+            log.info(f"📱 Обновлен список приложений: {len(self.applications)} элементов "
+                     f"(+{len(changes.added)} -{len(changes.removed)} ~{len(changes.changed)})")
+            self._publish_event('applications_changed', changes)
+        return changes
 
     async def update_applications(self):
-        """Обновляет список запущенных приложений с контролем ресурсов."""
-        print("🔄 Запуск мониторинга приложений...")
+        """Обновляет список запущенных приложений, не блокируя цикл событий."""
+        log.info("🔄 Запуск мониторинга приложений...")
         cycle_count = 0
         
-        while not self._stop_event.wait(0.1):  # Неблокирующая проверка
-            try:
-                # Проверка состояния системы
-                is_valid, error_msg = self._validate_state()
-                if not is_valid:
-                    print(f"⚠️ Мониторинг остановлен: {error_msg}")
-                    break
-                
-                cycle_count += 1
-                current_time = time.time()
-                
-                # Обновляем только если прошло достаточно времени
-                if current_time - self._last_update_time < self._update_interval:
-                    await asyncio.sleep(0.5)
-                    continue
-                
-                self._last_update_time = current_time
-                
-                # Получаем приложения только если диалог открыт
-                if not self._dialog_open:
-                    await asyncio.sleep(1.0)
-                    continue
-                
-                current_apps = {}
-                
-                # ОПТИМИЗАЦИЯ: Фильтруем только нужные окна
+        try:
+            while not self._stop_event.is_set():
                 try:
-                    visible_windows = gw.getWindowsWithTitle('')
-                    audio_relevant_processes = {
-                        'chrome.exe', 'firefox.exe', 'msedge.exe', 'opera.exe',
-                        'spotify.exe', 'vlc.exe', 'wmplayer.exe', 'winamp.exe',
-                        'foobar2000.exe', 'aimp.exe', 'potplayer.exe', 'mpc-hc.exe',
-                        'steam.exe', 'discord.exe', 'telegram.exe', 'zoom.exe',
-                        'teams.exe', 'skype.exe', 'obs64.exe', 'streamlabs.exe'
-                    }
+                    # Проверка состояния системы
+                    is_valid, error_msg = self._validate_state()
+                    if not is_valid:
+                        log.error(f"⚠️ Мониторинг остановлен: {error_msg}")
+                        self._publish_event('monitoring_stopped', error_msg)
+                        break
                     
-                    for win in visible_windows:
-                        if (win.visible and win.title.strip() != '' and 
-                            len(win.title) > 3 and win.title != 'Program Manager'):
-                            
-                            try:
-                                hwnd = win._hWnd
-                                app_name = get_process_name(hwnd)
-                                
-                                # Фильтруем только аудио-релевантные приложения или добавленные пользователем
-                                if (app_name.lower() in audio_relevant_processes or
-                                    win.title in self.device_settings or
-                                    any(keyword in win.title.lower() for keyword in 
-                                        ['музыка', 'music', 'audio', 'звук', 'video', 'видео', 'player'])):
-                                    
-                                    current_apps[hwnd] = {
-                                        "title": win.title,
-                                        "app_name": app_name
-                                    }
-                            except Exception as e:
-                                # Мелкие ошибки обработки окон не критичны
-                                continue
-                                
+                    # Получаем приложения только если диалог открыт
+                    if not self._dialog_open:
+                        await self._wait_stop(1.0)
+                        continue
+                    
+                    cycle_count += 1
+                    self._last_update_time = time.time()
+                    
+                    # ОПТИМИЗАЦИЯ: Блокирующее перечисление окон выполняется в executor
+                    try:
+                        await self.scan_applications()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        # Критическая ошибка получения списка окон
+                        self._handle_error('monitoring', e, "Ошибка получения списка окон", show_user=False)
+                        await self._wait_stop(2.0)
+                        continue
+                    
+                    # Логируем статистику каждые 20 циклов
+                    if cycle_count % 20 == 0:
+                        log.info(f"📊 Мониторинг: цикл {cycle_count}, приложений {len(self.applications)}, "
+                                 f"обновление {self._discovery.stats['last_refresh_ms']:.1f}мс, "
+                                 f"кеш процессов {len(self._discovery.name_cache)}")
+                    
+                    await self._wait_stop(self._update_interval)  # Пауза между итерациями
+                    
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
-                    # Критическая ошибка получения списка окон
-                    self._handle_error('monitoring', e, "Ошибка получения списка окон", show_user=False)
-                    await asyncio.sleep(2.0)
-                    continue
-
-                # Обновляем только если есть изменения
-                if current_apps != self.applications:
-                    self.applications = current_apps
-                    print(f"📱 Обновлен список приложений: {len(current_apps)} элементов")
-                
-                # Логируем статистику каждые 20 циклов
-                if cycle_count % 20 == 0:
-                    print(f"📊 Мониторинг: цикл {cycle_count}, приложений {len(current_apps)}")
-                
-                await asyncio.sleep(1.0)  # Пауза между итерациями
-                
-            except Exception as e:
-                # Обработка критических ошибок в цикле мониторинга
-                error_id = self._handle_error('monitoring', e, f"Цикл мониторинга #{cycle_count}", show_user=False)
-                
-                # Если слишком много ошибок, останавливаем мониторинг
-                if self.error_counts['monitoring'] > self.max_errors_per_category:
-                    print(f"🚨 Мониторинг остановлен из-за критических ошибок")
-                    break
-                
-                await asyncio.sleep(3.0)  # Увеличенная пауза при ошибке
-        
-        print("✅ Мониторинг приложений остановлен")
+                    # Обработка критических ошибок в цикле мониторинга
+                    self._handle_error('monitoring', e, f"Цикл мониторинга #{cycle_count}", show_user=False)
+                    
+                    # Если слишком много ошибок, останавливаем мониторинг
+                    if self.error_counts['monitoring'] > self.max_errors_per_category:
+                        log.error(f"🚨 Мониторинг остановлен из-за критических ошибок")
+                        self._publish_event('monitoring_stopped', "critical errors")
+                        break
+                    
+                    await self._wait_stop(3.0)  # Увеличенная пауза при ошибке
+        except asyncio.CancelledError:
+            log.info("⏹️ Мониторинг приложений отменен")
+            raise
+        finally:
+            log.info("✅ Мониторинг приложений остановлен")
 
     async def show_interface(self, page: ft.Page):
         """Отображает интерфейс для управления аудиомаршрутизацией."""
-        print("🖥️ Открытие интерфейса расширенных настроек...")
+        log.debug("🖥️ Открытие интерфейса расширенных настроек...")
         
         try:
             # Проверка состояния перед открытием интерфейса
@@ -205,6 +368,8 @@ class ApplicationAudioRouter:
                 return
             
             self._dialog_open = True
+            if self._events is None:
+                self._events = asyncio.Queue(maxsize=32)
             
             # Создаем контейнер для содержимого диалога
             app_list = ft.Column(
@@ -258,31 +423,35 @@ class ApplicationAudioRouter:
             dialog.open = True
             page.update()
 
-            # ИСПРАВЛЕНИЕ: Контролируемый цикл обновления вместо бесконечного
-            last_apps_count = len(self.applications)
+            # ИСПРАВЛЕНИЕ: Интерфейс обновляется по событиям мониторинга, а не по таймеру
             update_counter = 0
             
             while dialog.open and not self._stop_event.is_set():
                 try:
-                    await asyncio.sleep(2.0)  # Увеличенный интервал обновления
+                    try:
+                        kind, payload = await asyncio.wait_for(self._events.get(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        continue  # Проверяем, не закрыт ли диалог
                     
-                    # Обновляем только если есть изменения
-                    current_apps_count = len(self.applications)
-                    if current_apps_count != last_apps_count or update_counter % 10 == 0:
+                    if kind == 'monitoring_stopped':
+                        break
+                    
+                    if kind == 'applications_changed':
+                        app_list._last_apps_count = None  # Принудительная перерисовка
                         await self.populate_app_list(app_list)
                         if page and hasattr(page, 'update'):
                             page.update()
-                        last_apps_count = current_apps_count
-                        print(f"🔄 UI обновлен: {current_apps_count} приложений")
-                    
-                    update_counter += 1
+                        update_counter += 1
+                        log.info(f"🔄 UI обновлен: {len(self.applications)} приложений")
                     
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
                     # Обработка ошибок интерфейса
                     self._handle_error('interface', e, f"Обновление UI #{update_counter}", show_user=False)
-                    await asyncio.sleep(3.0)
+                    await self._wait_stop(3.0)
             
-            print("✅ Интерфейс расширенных настроек закрыт")
+            log.info("✅ Интерфейс расширенных настроек закрыт")
             
         except Exception as e:
             # Критическая ошибка интерфейса
@@ -293,11 +462,26 @@ class ApplicationAudioRouter:
     def force_refresh_apps(self, app_list, page):
         """Принудительное обновление списка приложений."""
         try:
-            print("🔄 Принудительное обновление списка приложений...")
-            asyncio.create_task(self.populate_app_list(app_list))
-            page.update()
+            log.info("🔄 Принудительное обновление списка приложений...")
+            # Обработчик кнопки вызывается вне цикла событий - планируем сканирование в нем
+            if page and hasattr(page, 'run_task'):
+                page.run_task(self._force_refresh, app_list, page)
+            elif self._loop is not None and self._loop.is_running():
+                asyncio.run_coroutine_threadsafe(self._force_refresh(app_list, page), self._loop)
+        except Exception as e:
+            log.warning(f"⚠️ Ошибка принудительного обновления: {e}")
+
+    async def _force_refresh(self, app_list, page):
+        """Внеочередное сканирование; интерфейс перерисуется по событию."""
+        try:
+            changes = await self.scan_applications()
+            if not changes:
+                # Изменений нет, но пользователь ждет отклика
+                app_list._last_apps_count = None
+                await self.populate_app_list(app_list)
+                page.update()
         except Exception as e:
-            print(f"⚠️ Ошибка принудительного обновления: {e}")
+            self._handle_error('monitoring', e, "Принудительное обновление списка", show_user=False)
 
     async def populate_app_list(self, app_list):
         """Заполняет список приложений с оптимизацией производительности."""
@@ -353,6 +537,7 @@ class ApplicationAudioRouter:
                         # По умолчанию выбираем все устройства, если настройки не были сохранены
                         if info['title'] not in self.device_settings or not isinstance(self.device_settings[info['title']], list):
                             self.device_settings[info['title']] = self.devices.copy()
+                            self._publish_extra_titles()
 
                         selected_devices = self.device_settings.get(info['title'], [])
                         
@@ -431,7 +616,7 @@ class ApplicationAudioRouter:
 
     def close_dialog(self, page, dialog):
         """Закрывает диалог с правильной очисткой ресурсов."""
-        print("❌ Закрытие диалога расширенных настроек...")
+        log.info("🚪 Закрытие диалога расширенных настроек...")
         try:
             self._dialog_open = False
             dialog.open = False
@@ -445,9 +630,9 @@ class ApplicationAudioRouter:
             
             if page and hasattr(page, 'update'):
                 page.update()
-            print("✅ Диалог закрыт успешно")
+            log.info("✅ Диалог закрыт успешно")
         except Exception as e:
-            print(f"⚠️ Ошибка закрытия диалога: {e}")
+            log.warning(f"⚠️ Ошибка закрытия диалога: {e}")
 
     def update_device_selection(self, app_name, device, is_selected):
         """Обновляет выбор устройства для приложения с улучшенной логикой."""
@@ -459,16 +644,17 @@ class ApplicationAudioRouter:
 
             if is_selected and device not in selected_devices:
                 selected_devices.append(device)
-                print(f"✅ Устройство '{device}' добавлено для '{app_name}'")
+                log.info(f"✅ Устройство '{device}' добавлено для '{app_name}'")
                 
             elif not is_selected and device in selected_devices:
                 selected_devices.remove(device)
-                print(f"❌ Устройство '{device}' удалено для '{app_name}'")
+                log.info(f"➖ Устройство '{device}' удалено для '{app_name}'")
 
             self.device_settings[app_name] = selected_devices
             self.save_settings()  # Сохраняем изменения
+            self._rebuild_routing_snapshot()
             
-            print(f"💾 Настройки для '{app_name}': {selected_devices}")
+            log.info(f"💾 Настройки для '{app_name}': {selected_devices}")
             
             # ИСПРАВЛЕНИЕ: Уведомляем основную систему об изменениях
             if hasattr(self.app, 'on_routing_settings_changed'):
@@ -480,36 +666,27 @@ class ApplicationAudioRouter:
     def get_active_devices_for_current_app(self):
         """Возвращает список активных устройств для текущего активного приложения."""
         try:
-            # Получаем активное окно
-            active_hwnd = win32gui.GetForegroundWindow()
-            
-            for hwnd, info in self.applications.items():
-                if hwnd == active_hwnd:
-                    app_title = info['title']
-                    return self.device_settings.get(app_title, self.devices.copy())
-            
-            # Если активное приложение не найдено, возвращаем все устройства
-            return self.devices.copy()
+            # Активное окно уже учтено в снимке маршрутизации
+            return list(self._routing_snapshot.enabled_targets())
             
         except Exception as e:
             self._handle_error('monitoring', e, "Определение активного приложения", show_user=False)
             return self.devices.copy()
 
     def should_route_to_device(self, device_name, target_app_title=None):
-        """Проверяет должен ли звук маршрутизироваться на указанное устройство."""
+        """Проверяет должен ли звук маршрутизироваться на указанное устройство.
+        
+        Безопасно для аудио-callback: читает только готовый снимок, без системных вызовов.
+        """
         try:
-            # Если нет настроек маршрутизации, разрешаем все устройства
-            if not self.device_settings:
-                return True
+            snapshot = self._routing_snapshot
             
             # Если указано конкретное приложение
             if target_app_title:
-                app_devices = self.device_settings.get(target_app_title, self.devices.copy())
-                return device_name in app_devices if isinstance(app_devices, list) else True
+                return snapshot.allows_for_app(target_app_title, device_name)
             
-            # Определяем активное приложение
-            active_devices = self.get_active_devices_for_current_app()
-            return device_name in active_devices if isinstance(active_devices, list) else True
+            # Маска активного приложения посчитана заранее
+            return snapshot.allows(device_name)
             
         except Exception as e:
             self._handle_error('monitoring', e, f"Проверка маршрутизации для {device_name}", show_user=False)
@@ -565,7 +742,7 @@ class ApplicationAudioRouter:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(export_data, f, ensure_ascii=False, indent=2)
             
-            print(f"💾 Настройки экспортированы в: {filepath}")
+            log.info(f"💾 Настройки экспортированы в: {filepath}")
             return filepath
             
         except Exception as e:
@@ -581,7 +758,8 @@ class ApplicationAudioRouter:
             if 'routing_settings' in import_data:
                 self.device_settings.update(import_data['routing_settings'])
                 self.save_settings()
-                print(f"📥 Настройки импортированы из: {filepath}")
+                self._rebuild_routing_snapshot()
+                log.info(f"📥 Настройки импортированы из: {filepath}")
                 return True
             else:
                 self._handle_error('settings', Exception("Неверный формат файла"), f"Импорт из {filepath}", show_user=True)
@@ -596,7 +774,8 @@ class ApplicationAudioRouter:
         try:
             self.device_settings.clear()
             self.save_settings()
-            print("🔄 Все настройки маршрутизации сброшены")
+            self._rebuild_routing_snapshot()
+            log.info("🔄 Все настройки маршрутизации сброшены")
             
             if hasattr(self.app, 'show_message'):
                 self.app.show_message("✅ Настройки маршрутизации сброшены")
@@ -606,40 +785,53 @@ class ApplicationAudioRouter:
 
     async def start(self, page):
         """Запуск приложения и мониторинга с улучшенным контролем."""
-        print("🚀 Запуск ApplicationAudioRouter...")
+        log.info("🚀 Запуск ApplicationAudioRouter...")
+        monitoring_task = None
         try:
-            # Сбрасываем состояние остановки
+            # Сбрасываем состояние остановки; примитивы asyncio создаются внутри цикла событий
             self._stop_event.clear()
+            self._loop = asyncio.get_running_loop()
+            self._async_stop = asyncio.Event()
+            self._events = asyncio.Queue(maxsize=32)
             
             # Запускаем задачи параллельно с контролем ошибок
             monitoring_task = asyncio.create_task(self.update_applications())
-            interface_task = asyncio.create_task(self.show_interface(page))
+            self._monitoring_task = monitoring_task
             
             # Ждем завершения интерфейса (когда пользователь закроет диалог)
-            await interface_task
+            await self.show_interface(page)
             
-            # Останавливаем мониторинг
-            self._stop_event.set()
-            
-            # Ждем завершения мониторинга с таймаутом
-            try:
-                await asyncio.wait_for(monitoring_task, timeout=5.0)
-            except asyncio.TimeoutError:
-                print("⚠️ Мониторинг не завершился в течение таймаута, принудительная остановка")
-                monitoring_task.cancel()
-            
-            print("✅ ApplicationAudioRouter завершен")
+            log.info("✅ ApplicationAudioRouter завершен")
             
+        except asyncio.CancelledError:
+            log.info("⏹️ ApplicationAudioRouter отменен")
+            raise
         except Exception as e:
-            print(f"❌ Ошибка запуска маршрутизатора: {e}")
+            log.error(f"❌ Ошибка запуска маршрутизатора: {e}")
             self._stop_event.set()
         finally:
-            # Гарантированная очистка
-            self.stop_monitoring()
+            # Останавливаем мониторинг: отмена прерывает ожидание executor'а немедленно
+            if monitoring_task is not None and not monitoring_task.done():
+                monitoring_task.cancel()
+                try:
+                    await monitoring_task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    log.warning(f"⚠️ Ошибка завершения мониторинга: {e}")
+            self._monitoring_task = None
+            
+            # Закрытие диалога завершает только задачу мониторинга: список приложений, потоки
+            # и снимок маршрутизации нужны отслеживанию активного окна (полная очистка -
+            # stop_monitoring() при выходе из программы)
+            self._stop_event.set()
+            self._dialog_open = False
+            self._events = None
+            self._async_stop = None
 
     def update_devices(self, new_devices):
         """Обновляет список устройств с синхронизацией настроек."""
-        print(f"🔄 Обновление списка устройств: {len(new_devices)} устройств")
+        log.info(f"🔄 Обновление списка устройств: {len(new_devices)} устройств")
         
         # Удаляем настройки для несуществующих устройств
         for app_name, devices in list(self.device_settings.items()):
@@ -648,21 +840,22 @@ class ApplicationAudioRouter:
                 valid_devices = [d for d in devices if d in new_devices]
                 if valid_devices != devices:
                     self.device_settings[app_name] = valid_devices
-                    print(f"📱 Обновлены устройства для {app_name}: {valid_devices}")
+                    log.info(f"📱 Обновлены устройства для {app_name}: {valid_devices}")
         
         self.devices = new_devices
         self.save_settings()
-        print(f"✅ Список устройств обновлен: {self.devices}")
+        self._rebuild_routing_snapshot()
+        log.info(f"✅ Список устройств обновлен: {self.devices}")
 
     def update_source_device(self, source_device_name):
         """Обновляет источник звука для маршрутизации."""
         self.source_device_name = source_device_name
         if source_device_name and hasattr(self.app, 'get_device_id'):
-            self.source_device_id = self.app.get_device_id(source_device_name)
-            print(f"🎤 Источник звука обновлен: {source_device_name} (ID: {self.source_device_id})")
+            self.source_device_id = self.app.get_device_id(source_device_name, ROLE_SOURCE)
+            log.info(f"🎤 Источник звука обновлен: {source_device_name} (ID: {self.source_device_id})")
         else:
             self.source_device_id = None
-            print(f"❌ Источник звука сброшен")
+            log.info("🎤 Источник звука сброшен")
 
     def get_device_settings_for_app(self, app_title):
         """Получает настройки устройств для конкретного приложения."""
@@ -680,7 +873,7 @@ class ApplicationAudioRouter:
         # Сброс счетчиков ошибок если прошло достаточно времени
         if current_time - self.last_error_time > self.error_reset_interval:
             self.error_counts = {key: 0 for key in self.error_counts.keys()}
-            print("📊 Счетчики ошибок сброшены")
+            log.info("📊 Счетчики ошибок сброшены")
         
         # Увеличиваем счетчик ошибок для данного типа
         if error_type in self.error_counts:
@@ -695,13 +888,13 @@ class ApplicationAudioRouter:
         if context:
             error_msg += f" | Контекст: {context}"
         
-        print(f"❌ {error_msg} (ID: {error_id})")
+        log.error(f"❌ {error_msg} (ID: {error_id})")
         
         # Проверяем критичность ошибки
         is_critical = self.error_counts.get(error_type, 0) > self.max_errors_per_category
         
         if is_critical:
-            print(f"🚨 КРИТИЧЕСКАЯ ОШИБКА: {error_type} превысил лимит ({self.max_errors_per_category})")
+            log.error(f"🚨 КРИТИЧЕСКАЯ ОШИБКА: {error_type} превысил лимит ({self.max_errors_per_category})")
             
             # Показываем критическую ошибку пользователю
             if hasattr(self.app, 'show_message'):
@@ -727,14 +920,14 @@ class ApplicationAudioRouter:
 
     def _emergency_stop(self):
         """Экстренная остановка при критических ошибках."""
-        print("🚨 Экстренная остановка ApplicationAudioRouter...")
+        log.error("🚨 Экстренная остановка ApplicationAudioRouter...")
         try:
             self._stop_event.set()
             self._dialog_open = False
             self.stop_monitoring()
-            print("✅ Экстренная остановка выполнена")
+            log.info("✅ Экстренная остановка выполнена")
         except Exception as e:
-            print(f"❌ Ошибка экстренной остановки: {e}")
+            log.error(f"❌ Ошибка экстренной остановки: {e}")
 
     def _is_error_critical(self, error: Exception) -> bool:
         """Определяет критичность ошибки."""
@@ -7,14 +7,14 @@ Audio Device Monitor для Windows
 """
 import threading
 import time
-import logging
 import hashlib
 from typing import Callable, Optional, Dict, Set
 import sounddevice as sd
+from device_policy import invalidate_device_cache
+from rt_log import get_logger
 
-# Настройка логирования
-logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+# Журнал без блокировок (вывод в фоновом потоке rt_log)
+logger = get_logger(__name__)
 
 
 class AudioDeviceInfo:
@@ -130,6 +130,10 @@ class AudioDeviceMonitor:
                         logger.info(f"🔌 Устройство удалено: {device}")
                         self._handle_device_change('device_removed', device)
                 
+                # Индексы PortAudio после переинициализации другие - группы сканирования устарели
+                if added_devices or removed_devices:
+                    invalidate_device_cache()
+
                 # Обновляем список устройств
                 self.previous_devices = current_devices
                 
@@ -256,25 +260,25 @@ class AudioDeviceMonitor:
 if __name__ == "__main__":
     def device_change_handler(event_type: str, device_info: AudioDeviceInfo):
         """Пример обработчика изменений устройств."""
-        print(f"🔔 Событие: {event_type}")
-        print(f"📱 Устройство: {device_info}")
-        print("-" * 50)
+        logger.info(f"🔔 Событие: {event_type}")
+        logger.info(f"📱 Устройство: {device_info}")
+        logger.info("-" * 50)
     
     # Использование как контекстного менеджера
     with AudioDeviceMonitor(device_change_handler) as monitor:
-        print("Мониторинг аудио-устройств запущен.")
-        print("Подключите или отключите аудио-устройство для проверки.")
-        print("Нажмите Ctrl+C для остановки...")
+        logger.info("Мониторинг аудио-устройств запущен.")
+        logger.info("Подключите или отключите аудио-устройство для проверки.")
+        logger.info("Нажмите Ctrl+C для остановки...")
         
         # Показываем начальный список устройств
         initial_devices = monitor.get_current_audio_devices()
-        print(f"\nНачальный список устройств ({len(initial_devices)}):")
+        logger.info(f"\nНачальный список устройств ({len(initial_devices)}):")
         for device in initial_devices:
-            print(f"  • {device}")
-        print()
+            logger.info(f"  • {device}")
+        logger.info("")
         
         try:
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
-            print("\nОстановка мониторинга...")
\ No newline at end of file
+            logger.info("\nОстановка мониторинга...")
\ No newline at end of file
@@ -0,0 +1,1410 @@
+"""
+Audio Engine для AudioForwarderApp
+Цепочка обработки звука: источники → матрица микширования → раскладка каналов →
+линия задержки → громкость → формат устройства → вывод.
+
+Движок не зависит от интерфейса и работает как внутри GUI-процесса, так и в
+отдельном процессе (engine_process.py). Настройки целей хранятся в словарях
+EngineState; внутри GUI это те же словари, которые меняет интерфейс, поэтому
+изменения задержки и громкости подхватываются со следующего блока (задержка
+меняется плавно, кроссфейдом в линии задержки).
+"""
+import collections
+import copy
+import math
+import os
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import sounddevice as sd
+
+from audio_mixer import PRIMARY_SOURCE, MixingMatrix, SourceRing
+from file_source import (GENERATOR_CHANNELS, FileSourceStream, WavFile, file_source_path,
+                         is_file_source, is_generator_source, is_virtual_source)
+from delay_line import DEFAULT_DELAY_CROSSFADE_MS, MAX_DELAY_MS, DelayLine
+from channel_mapping import (DEFAULT_CHANNEL_MAP, compile_channel_map, fit_to_device,
+                             output_channels, required_input_channels)
+from sample_format import (DEFAULT_SAMPLE_FORMAT, SampleFormatConverter, is_raw_format,
+                           negotiate_sample_format)
+from idle_mode import DEFAULT_IDLE_POLICY, IDLE_OFF, IDLE_SUSPEND, OutputSuspender, SilenceGate
+from level_meters import LevelMeters
+from spectrum_analyzer import SPECTRUM_SOURCE, SpectrumTap
+from stream_supervisor import DeviceHealth, StreamSupervisor
+from device_policy import ROLE_SOURCE, ROLE_TARGET, resolve_device
+from latency import DEFAULT_AUTO_ALIGN, TargetLatency, stream_latency
+from network_audio import (NetworkSinkStream, NetworkSourceStream, is_network_source, is_network_target,
+                           packet_format, parse_network_source)
+from callback_watchdog import DEFAULT_STALL_DEADLINE_MS, STALL_LOG_SIZE, CallbackWatchdog, StallRecord
+from jitter_buffer import AdaptiveJitterBuffer, default_jitter_limits
+from target_writer import DEFAULT_DROP_POLICY, TargetWriter
+from wav_recorder import DEFAULT_ROTATE_MB, DEFAULT_ROTATE_MINUTES, WavRecorder
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+def find_device_id(device_name: str, role: str = ROLE_TARGET, sample_rate: Optional[int] = None) -> Optional[int]:
+    """
+    Возвращает индекс устройства по имени.
+
+    Из вариантов устройства под разными аудио-интерфейсами выбирается тот же,
+    что и при сканировании (политика device_policy).
+
+    Args:
+        device_name: Имя устройства
+        role: ROLE_SOURCE (нужны входы) или ROLE_TARGET (нужны выходы)
+        sample_rate: Частота для проверки варианта (None - без проверки)
+    """
+    try:
+        return resolve_device(device_name, role, sample_rate)
+    except Exception as e:
+        log.warning(f"Ошибка получения ID устройства: {e}")
+    return None
+
+
+def find_source(source_name: str, sample_rate: Optional[int] = None) -> Tuple[bool, Optional[int], int]:
+    """
+    Ищет источник: устройство, WAV-файл ("file:<путь>"), генератор ("gen:...")
+    или сеть ("udp:<порт>"; каналы пакетов неизвестны до приема - 0).
+
+    Returns:
+        tuple: (найден, индекс устройства или None, максимум входных каналов или 0)
+    """
+    if is_generator_source(source_name):
+        return True, None, GENERATOR_CHANNELS
+    if is_network_source(source_name):
+        try:
+            parse_network_source(source_name)
+        except ValueError as e:
+            log.warning(f"⚠️ Сетевой источник: {e}")
+            return False, None, 0
+        return True, None, 0
+    if is_file_source(source_name):
+        try:
+            wav = WavFile(file_source_path(source_name))
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️ Файл-источник недоступен: {e}")
+            return False, None, 0
+        channels, file_rate = wav.channels, wav.sample_rate
+        wav.close()
+        if sample_rate and file_rate != sample_rate:
+            # Без передискретизации файл звучал бы с другой высотой и скоростью
+            log.warning(f"⚠️ {file_rate_mismatch(file_rate, sample_rate)}")
+            return False, None, 0
+        return True, None, channels
+    device_id = find_device_id(source_name, ROLE_SOURCE, sample_rate)
+    if device_id is None:
+        return False, None, 0
+    return True, device_id, _device_channels(device_id, 'max_input_channels')
+
+
+def file_rate_mismatch(file_rate: int, sample_rate: int) -> str:
+    """Сообщение о файле-источнике с частотой, отличной от частоты движка."""
+    return (f"Частота файла {file_rate} Гц отличается от частоты трансляции {sample_rate} Гц - "
+            f"выберите {file_rate} Гц или преобразуйте файл")
+
+
+def _file_rate(source_name: str) -> Optional[int]:
+    """Частота WAV-файла источника (None - не файл или файл недоступен)."""
+    if not is_file_source(source_name):
+        return None
+    try:
+        wav = WavFile(file_source_path(source_name))
+    except (OSError, ValueError):
+        return None
+    wav.close()
+    return wav.sample_rate
+
+
+def _device_channels(device_id: int, key: str) -> int:
+    """Максимальное число входных/выходных каналов устройства (0 если неизвестно)."""
+    try:
+        return int(sd.query_devices(device_id).get(key, 0))  # type: ignore
+    except Exception:
+        return 0
+
+
+SOURCE_CROSSFADE_MS = 20  # Длительность кроссфейда при горячей замене источника
+
+
+class _IncomingSource:
+    """Новый источник на время горячей замены: кольцо блоков и кривые кроссфейда."""
+
+    def __init__(self, slot: int, name: str, device_id: int, channels: int,
+                 blocksize: int, engine_channels: int, fade_frames: int):
+        self.slot = slot
+        self.name = name
+        self.device_id = device_id
+        self.channels = channels
+        self.stream = None
+        self.ring = SourceRing(8, blocksize, engine_channels)
+        self.block = np.zeros((blocksize, engine_channels), dtype=np.float32)
+        # Равномощный кроссфейд (источники не коррелированы)
+        phase = (np.arange(fade_frames, dtype=np.float32) + 0.5) / fade_frames * (math.pi / 2)
+        self.fade_in = np.sin(phase)[:, None]
+        self.fade_out = np.cos(phase)[:, None]
+        self.position = 0
+        self.started = threading.Event()
+        self.done = threading.Event()
+
+
+def new_stream_stats() -> dict:
+    """Создает словарь статистики потоков."""
+    return {
+        'active_streams': 0,
+        'total_frames': 0,
+        'errors_count': 0,
+        'start_time': None,
+        'total_callbacks': 0,
+        'data_processed_mb': 0.0,
+        'last_callback_time': 0,
+        'idle': False,  # Источник молчит - обработка целей приостановлена
+        'stalls': 0,  # Зависания потоков, найденные сторожем
+        'last_stall_time': 0,
+        'callback_intervals': collections.deque(maxlen=100)  # Для измерения стабильности
+    }
+
+
+def reset_stream_stats(stats: dict):
+    """Сбрасывает счетчики статистики при запуске потока (словарь сохраняется)."""
+    stats['start_time'] = time.time()
+    stats['total_frames'] = 0
+    stats['errors_count'] = 0
+    stats['total_callbacks'] = 0
+    stats['data_processed_mb'] = 0.0
+    stats['last_callback_time'] = 0
+    stats['idle'] = False
+    stats['stalls'] = 0
+    stats['last_stall_time'] = 0
+    stats['callback_intervals'].clear()
+
+
+class EngineState:
+    """
+    Настройки целей, которые движок читает в каждом блоке.
+
+    Внутри GUI словари передаются по ссылке; для отдельного процесса
+    состояние сериализуется через to_dict()/from_dict().
+    """
+
+    FIELDS = ('delays', 'volumes', 'routing_matrix', 'channel_maps', 'sample_formats', 'dither_enabled',
+              'drop_policies', 'jitter_limits')
+
+    def __init__(self, **dicts):
+        for field in self.FIELDS:
+            value = dicts.get(field)
+            setattr(self, field, value if value is not None else {})
+
+    def to_dict(self) -> dict:
+        """Копия состояния для передачи в другой процесс."""
+        return {field: copy.deepcopy(dict(getattr(self, field))) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EngineState":
+        return cls(**{field: dict(data.get(field, {})) for field in cls.FIELDS})
+
+
+class AudioEngine:
+    """
+    Общая шина захвата: один входной поток основного источника и вывод на
+    динамический набор целей.
+
+    Основной источник задает такт: в его callback выполняется вся обработка.
+    Цели подключаются и отключаются на лету (attach_target/detach_target):
+    набор целей публикуется одним присваиванием кортежа, поэтому изменения
+    вступают в силу на границе блоков без повторного захвата и перезапуска.
+    """
+
+    def __init__(self, source_name: str, target_names: Sequence[str], state: EngineState,
+                 sample_rate: int, blocksize: int,
+                 stats: Optional[dict] = None,
+                 notify: Optional[Callable[[str], None]] = None,
+                 loop_detector: Optional[Callable[[np.ndarray, str], bool]] = None,
+                 routing_provider: Optional[Callable[[], object]] = None,
+                 device_streams: Optional[dict] = None,
+                 buffers: Optional[dict] = None,
+                 delay_debug_mode: bool = False,
+                 fanout: bool = False,
+                 adaptive_jitter: bool = False,
+                 delay_crossfade_ms: float = DEFAULT_DELAY_CROSSFADE_MS,
+                 file_loop: bool = True,
+                 file_realtime: bool = True,
+                 output_factory: Optional[Callable[[str, int], object]] = None,
+                 shared_levels=None,
+                 shared_spectrum=None,
+                 idle_policy: str = DEFAULT_IDLE_POLICY,
+                 stall_deadline_ms: float = DEFAULT_STALL_DEADLINE_MS,
+                 auto_align: bool = DEFAULT_AUTO_ALIGN):
+        """
+        Args:
+            source_name: Основной источник
+            target_names: Целевые устройства
+            state: Настройки целей
+            sample_rate: Частота дискретизации
+            blocksize: Размер блока в фреймах
+            stats: Словарь статистики (по умолчанию - собственный)
+            notify: Функция для сообщений пользователю
+            loop_detector: Проверка аудио-петли: (indata, имя источника) → bool
+            routing_provider: Возвращает снимок маршрутизации (или None)
+            device_streams: Общий словарь устройство → (входной поток, выходной поток)
+            buffers: Общий словарь линий задержки целей
+            delay_debug_mode: Дополнительное деление задержки на 1000
+            fanout: Отдельный поток записи для каждой цели
+            adaptive_jitter: Адаптивный запас блоков для каждой цели (включает потоки записи)
+            delay_crossfade_ms: Длительность кроссфейда при изменении задержки (0 - мгновенно)
+            file_loop: Файловые источники повторяются по кругу
+            file_realtime: Файловые источники идут в темпе реального времени (иначе - максимально быстро)
+            output_factory: Создает выход цели вместо устройства: (имя, каналы) → объект с write()
+                (офлайн-рендер; вывод в float32 без преобразования формата)
+            shared_levels: SharedLevels для уровней (режим отдельного процесса)
+            shared_spectrum: SharedSpectrumRing для спектра (режим отдельного процесса)
+            idle_policy: Поведение при тишине на источнике ('off', 'zeros' или 'suspend')
+            stall_deadline_ms: Через сколько мс молчания поток считается зависшим (0 - сторож выключен)
+            auto_align: Выравнивать цели по самой медленной (задержка выхода и адаптивный запас)
+        """
+        self.source_name = source_name
+        self.target_names = list(dict.fromkeys(target_names))
+        self.state = state
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.stats = stats if stats is not None else new_stream_stats()
+        self.notify = notify or (lambda message: log.info("📝 %s", message))
+        self.loop_detector = loop_detector
+        self.routing_provider = routing_provider or (lambda: None)
+        self.device_streams = device_streams if device_streams is not None else {}
+        self.buffers = buffers if buffers is not None else {}
+        self.delay_debug_mode = delay_debug_mode
+        self.fanout = fanout
+        self.adaptive_jitter = adaptive_jitter
+        self.delay_crossfade_ms = delay_crossfade_ms
+        self.file_loop = file_loop
+        self.file_realtime = file_realtime
+        self.output_factory = output_factory
+        self._reserve_max = 0  # Наибольший запас среди целей (для выравнивания задержек)
+        self.auto_align = auto_align
+        self.output_latency_frames: Dict[str, int] = {}  # Заявленная задержка выхода цели (публикуется целиком)
+        self._latency_max = 0  # Задержка самого медленного устройства (автовыравнивание)
+
+        self.source_device_id: Optional[int] = None
+        self.source_max_inputs = 0
+        self.input_channels = 2
+        self.input_stream = None
+        self.source_streams: Dict[str, object] = {}  # Дополнительные источники: имя → поток
+        self.source_beats: Dict[str, int] = {}  # Блоков от каждого дополнительного источника (для сторожа)
+        self.writing_target: Optional[str] = None  # Цель, в которую callback пишет прямо сейчас
+        self.writing_stream = None  # И ее поток (после reopen_target у цели уже другой)
+        self.target_streams: Tuple[Tuple[object, str], ...] = ()  # Публикуется целиком (copy-on-write)
+        self._targets_lock = threading.Lock()  # Только для подключения/отключения из UI
+        self._block_counter = 0  # Номер блока - для ожидания границы блоков
+        
+        # Горячая замена источника: такт задает поток с номером _clock_slot
+        self._clock_slot = 0
+        self._next_slot = 1
+        self._pending_source: Optional[_IncomingSource] = None
+        self._source_lock = threading.Lock()
+        self.mixer: Optional[MixingMatrix] = None
+        self.compiled_channel_maps: Dict[str, tuple] = {}  # устройство → (ChannelMap, буфер)
+        self.format_converters: Dict[str, SampleFormatConverter] = {}
+        self.writers: Dict[str, TargetWriter] = {}  # Потоки записи целей (режим fan-out)
+        self.source_taps: List[Callable[[np.ndarray], None]] = []  # Копии блоков источника наружу
+        self.target_taps: Dict[str, Callable[[np.ndarray], None]] = {}  # Копии выхода целей (публикуются целиком)
+        self.recorder: Optional[WavRecorder] = None
+        self.meters = LevelMeters(blocksize, sample_rate, shared=shared_levels)
+        self._source_record_tap = None
+        self.spectrum = SpectrumTap(sample_rate, blocksize, shared=shared_spectrum)
+        self.spectrum_target: Optional[str] = None  # SPECTRUM_SOURCE, имя цели или None
+        
+        # Простой при тишине: блоки тишины в формате каждой цели готовятся при открытии
+        self.idle_policy = IDLE_OFF
+        self.silence_gate = SilenceGate(sample_rate)
+        self.silence_blocks: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # цель → (float32, формат устройства)
+        self.suspender: Optional[OutputSuspender] = None
+        self._idle_policy_request: Optional[str] = None  # Смена политики, которую применит callback
+        self._apply_idle_policy(idle_policy)
+        self.supervisor: Optional[StreamSupervisor] = None  # Перезапуск сбойных целей (только живой захват)
+        # Убранные надзором потоки, запись в которые еще не вернулась: (поток, цель, поток записи)
+        self._retired_streams: List[Tuple[object, str, Optional[TargetWriter]]] = []
+        self.stall_deadline_ms = stall_deadline_ms
+        self.watchdog: Optional[CallbackWatchdog] = None
+        self.stalls: Deque[StallRecord] = collections.deque(maxlen=STALL_LOG_SIZE)
+        self.bytes_per_frame = 0
+        self._delay_debug_printed = set()
+
+    # ---------------------------------------------------------------- открытие
+
+    def open(self) -> bool:
+        """
+        Открывает выходные потоки и дополнительные источники.
+
+        Returns:
+            bool: False если основной источник не найден
+        """
+        found, self.source_device_id, self.source_max_inputs = find_source(self.source_name, self.sample_rate)
+        if not found:
+            file_rate = _file_rate(self.source_name)
+            if file_rate is not None and file_rate != self.sample_rate:
+                self.notify(file_rate_mismatch(file_rate, self.sample_rate))
+            else:
+                self.notify(f"Источник '{self.source_name}' не найден")
+            return False
+
+        # Каналы движка: сколько нужно раскладкам, но не больше, чем умеет источник
+        self.input_channels = self._engine_channels()
+
+        reset_stream_stats(self.stats)
+        log.info(f"📊 Статистика сброшена, запуск для {len(self.target_names)} устройств")
+
+        opened = []
+        for target_name in self.target_names:
+            target_stream = self._open_output(target_name)
+            if target_stream:
+                self.device_streams[target_name] = (None, target_stream)
+                opened.append((target_stream, target_name))
+        self.target_streams = tuple(opened)
+
+        if self.fanout or self.adaptive_jitter:
+            for target_stream, name in self.target_streams:
+                self._start_writer(target_stream, name)
+            log.info(f"🧵 Режим fan-out: {len(self.writers)} потоков записи"
+                     f"{', адаптивный запас' if self.adaptive_jitter else ''}")
+
+        # Матрица N источников × M целей: одно умножение матриц на блок
+        sources = self._active_sources()
+        self.mixer = MixingMatrix(sources, [name for _, name in self.target_streams],
+                                  self.blocksize, channels=self.input_channels)
+        self.mixer.set_routing(self.state.routing_matrix, default_source=self.source_name)
+        self.meters.set_sources(sources, self.input_channels)
+        for _, name in self.target_streams:
+            self.meters.assign_target(name, self.compiled_channel_maps[name][0].out_channels)
+        if len(sources) > 1:
+            log.info(f"🎚️ Матрица микширования: {len(sources)} источников × {len(self.target_streams)} целей")
+            self._open_secondary_sources()
+
+        self.bytes_per_frame = self._bytes_per_frame()
+        return True
+
+    def _bytes_per_frame(self) -> int:
+        """Байт на фрейм с учетом реальных каналов и форматов: входы float32 + выходы в формате устройств."""
+        return 4 * len(self.sources) * self.input_channels + sum(
+            self.format_converters[name].bytes_per_frame()
+            for _, name in self.target_streams if name in self.format_converters)
+
+    def _engine_channels(self) -> int:
+        """Количество каналов захвата: максимум, нужный раскладкам целей, в пределах возможностей источника."""
+        needed = 2
+        for target in self.target_names:
+            try:
+                needed = max(needed, required_input_channels(
+                    self.state.channel_maps.get(target, DEFAULT_CHANNEL_MAP)))
+            except ValueError as e:
+                log.warning(f"⚠️ {target}: {e}")
+        max_inputs = self.source_max_inputs
+        if max_inputs > 0 and needed > max_inputs:
+            log.warning(f"⚠️ Источник поддерживает только {max_inputs} каналов (нужно {needed})")
+            needed = max_inputs
+        return needed
+
+    def _active_sources(self) -> List[str]:
+        """Основной источник первым, затем задействованные в матрице."""
+        sources = [self.source_name]
+        for target in self.target_names:
+            for source, gain_db in self.state.routing_matrix.get(target, {}).items():
+                if gain_db is not None and source not in sources and source != PRIMARY_SOURCE:
+                    sources.append(source)
+        return sources
+
+    def _open_output(self, device_name: str):
+        """Открывает выходной поток для цели."""
+        if self.output_factory is not None:
+            return self._open_virtual_output(device_name)
+        network = is_network_target(device_name)
+        target_device_id = None if network else find_device_id(device_name, ROLE_TARGET, self.sample_rate)
+        if target_device_id is None and not network:
+            self.notify(f"Устройство '{device_name}' не найдено")
+            return None
+
+        try:
+            # Раскладка каналов: устройство получает ровно столько каналов, сколько ему нужно
+            spec = self.state.channel_maps.get(device_name, DEFAULT_CHANNEL_MAP)
+            fitted_spec = spec
+            if not network:  # Сетевая цель принимает любое число каналов
+                max_outputs = _device_channels(target_device_id, 'max_output_channels')
+                fitted_spec = fit_to_device(spec, max_outputs)
+                if fitted_spec != spec:
+                    log.info(f"🔀 {device_name}: раскладка '{spec}' заменена на '{fitted_spec}' (каналов: {max_outputs})")
+            channel_map = compile_channel_map(fitted_spec, self.input_channels)
+            self.compiled_channel_maps[device_name] = (channel_map, channel_map.allocate(self.blocksize))
+
+            # Формат сэмплов: из настроек, но только тот, что устройство реально принимает
+            preferred_format = self.state.sample_formats.get(device_name, DEFAULT_SAMPLE_FORMAT)
+            if network:
+                sample_format = packet_format(preferred_format)
+            else:
+                sample_format = negotiate_sample_format(target_device_id, self.sample_rate,
+                                                        channel_map.out_channels, preferred_format)
+            converter = SampleFormatConverter(sample_format, self.blocksize, channel_map.out_channels,
+                                              dither=self.state.dither_enabled.get(device_name, True))
+            self.format_converters[device_name] = converter
+            log.info(f"🎛️ {device_name}: {channel_map.out_channels} кан., формат {sample_format}"
+                     f"{' (запрошен ' + preferred_format + ')' if preferred_format not in ('auto', sample_format) else ''}")
+
+            if network:
+                target_stream = NetworkSinkStream(device_name, self.sample_rate, channel_map.out_channels,
+                                                  self.blocksize, dtype=sample_format)
+            else:
+                # int24 передается упакованными байтами через Raw-поток
+                stream_class = sd.RawOutputStream if is_raw_format(sample_format) else sd.OutputStream
+                target_stream = stream_class(
+                    device=target_device_id,
+                    samplerate=self.sample_rate,
+                    channels=channel_map.out_channels,
+                    blocksize=self.blocksize,
+                    dtype=sample_format,
+                    latency='low'  # Минимальная задержка
+                )
+            target_stream.start()
+            self.buffers[device_name] = self._new_delay_line(channel_map.out_channels)
+            self.silence_blocks[device_name] = (np.zeros((self.blocksize, channel_map.out_channels), dtype=np.float32),
+                                                converter.silence())
+            # Задержка выхода измеряется при каждом открытии: замена устройства пересчитывает выравнивание
+            latency_frames = int(stream_latency(target_stream) * self.sample_rate)
+            self.output_latency_frames = dict(self.output_latency_frames, **{device_name: latency_frames})
+            return target_stream
+        except Exception as e:
+            self.notify(f"Ошибка запуска потока для {device_name}: {e}")
+            return None
+
+    def _open_virtual_output(self, device_name: str):
+        """Выход цели без устройства (офлайн-рендер): та же цепочка, вывод в float32."""
+        try:
+            spec = self.state.channel_maps.get(device_name, DEFAULT_CHANNEL_MAP)
+            channel_map = compile_channel_map(spec, self.input_channels)
+            self.compiled_channel_maps[device_name] = (channel_map, channel_map.allocate(self.blocksize))
+            target_stream = self.output_factory(device_name, channel_map.out_channels)
+            target_stream.start()
+            self.buffers[device_name] = self._new_delay_line(channel_map.out_channels)
+            silence = np.zeros((self.blocksize, channel_map.out_channels), dtype=np.float32)
+            self.silence_blocks[device_name] = (silence, silence)
+            return target_stream
+        except Exception as e:
+            self.notify(f"Ошибка открытия выхода {device_name}: {e}")
+            return None
+
+    def _new_delay_line(self, channels: int) -> DelayLine:
+        """Линия задержки цели: предел интерфейса плюс секунда на выравнивание адаптивного запаса."""
+        max_delay_frames = self.sample_rate * MAX_DELAY_MS // 1000 + self.sample_rate
+        return DelayLine(max_delay_frames, self.blocksize, channels)
+
+    def _start_writer(self, target_stream, name: str):
+        """Запускает поток записи цели."""
+        channel_map, _ = self.compiled_channel_maps[name]
+        jitter = None
+        if self.adaptive_jitter:
+            min_ms, max_ms = self.state.jitter_limits.get(name, default_jitter_limits(name))
+            jitter = AdaptiveJitterBuffer(self.blocksize / self.sample_rate * 1000, min_ms, max_ms)
+        writer = TargetWriter(name, target_stream, self.format_converters.get(name),
+                              self.blocksize, channel_map.out_channels,
+                              policy=self.state.drop_policies.get(name, DEFAULT_DROP_POLICY),
+                              jitter=jitter)
+        writer.start()
+        self.writers[name] = writer
+
+    # ------------------------------------------------- подключение целей на лету
+
+    def attach_target(self, name: str) -> bool:
+        """
+        Подключает цель к работающему захвату (вызывается не из callback).
+
+        Returns:
+            bool: True если цель подключена
+        """
+        with self._targets_lock:
+            if any(existing == name for _, existing in self.target_streams):
+                return True
+            try:
+                needed = required_input_channels(self.state.channel_maps.get(name, DEFAULT_CHANNEL_MAP))
+                if needed > self.input_channels:
+                    log.warning(f"⚠️ {name}: раскладке нужно {needed} каналов, захватывается {self.input_channels}")
+            except ValueError as e:
+                log.warning(f"⚠️ {name}: {e}")
+
+            target_stream = self._open_output(name)
+            if target_stream is None:
+                return False
+            if self.fanout or self.adaptive_jitter:
+                self._start_writer(target_stream, name)
+
+            # Сначала матрица (с новой строкой) и индикатор, затем набор целей
+            self.meters.assign_target(name, self.compiled_channel_maps[name][0].out_channels)
+            self.target_names.append(name)
+            self.mixer.set_targets(self.target_names, self.state.routing_matrix, default_source=self.source_name)
+            self.target_streams = self.target_streams + ((target_stream, name),)
+            self.device_streams[name] = (None, target_stream)
+            self.bytes_per_frame = self._bytes_per_frame()
+            if self.recorder is not None:
+                self._add_target_tap(name)
+        log.info(f"➕ {name} подключено к общему захвату")
+        return True
+
+    def detach_target(self, name: str, timeout: float = 1.0) -> bool:
+        """
+        Отключает цель от работающего захвата (вызывается не из callback).
+
+        Поток устройства закрывается только после того, как callback
+        гарантированно перешел к новому набору целей.
+
+        Returns:
+            bool: True если цель была подключена
+        """
+        with self._targets_lock:
+            entry = next((item for item in self.target_streams if item[1] == name), None)
+            if entry is None and name not in self.target_names:
+                return False
+            if self.supervisor is not None:
+                self.supervisor.forget(name)
+            self.target_streams = tuple(item for item in self.target_streams if item[1] != name)
+            self.target_taps = {key: tap for key, tap in self.target_taps.items() if key != name}
+            if name in self.target_names:
+                self.target_names.remove(name)
+            self.mixer.set_targets(self.target_names, self.state.routing_matrix, default_source=self.source_name)
+            self._wait_blocks(2, timeout)
+
+            writer = self.writers.pop(name, None)
+            if writer is not None:
+                writer.stop()
+            if self.recorder is not None:
+                self.recorder.remove_tap(f"target_{name}")
+            if entry is not None:  # Цель на перезапуске уже закрыта надзором
+                self._close_stream(entry[0])
+            self.device_streams.pop(name, None)
+            self.buffers.pop(name, None)
+            self.silence_blocks.pop(name, None)
+            self.output_latency_frames = {key: value for key, value in self.output_latency_frames.items()
+                                          if key != name}
+            self.meters.release_target(name)
+            self.compiled_channel_maps.pop(name, None)
+            self.format_converters.pop(name, None)
+            self.bytes_per_frame = self._bytes_per_frame()
+        log.info(f"➖ {name} отключено от общего захвата")
+        return True
+
+    # ------------------------------------------------ перезапуск сбойных целей
+
+    def target_stream(self, name: str):
+        """Выходной поток цели (None если цель закрыта или на перезапуске)."""
+        return next((stream for stream, existing in self.target_streams if existing == name), None)
+
+    def isolate_target(self, name: str, timeout: float = 1.0) -> bool:
+        """
+        Убирает сбойную цель из обработки и закрывает ее устройство (поток надзора).
+
+        Цель остается в target_names, матрице и индикаторах: остальные цели
+        продолжают играть, а reopen_target() возвращает ее на место.
+
+        Закрывать поток, пока другой поток стоит в его write(), нельзя. Если
+        запись идет (callback или поток записи fan-out), поток прерывается
+        abort() - это освобождает запись, - а close() откладывается, пока
+        запись не вернется (close_retired_streams).
+
+        Returns:
+            bool: True если цель была в обработке
+        """
+        with self._targets_lock:
+            entry = next((item for item in self.target_streams if item[1] == name), None)
+            if entry is None:
+                return False
+            stream = entry[0]
+            self.target_streams = tuple(item for item in self.target_streams if item[1] != name)
+            writer = self.writers.pop(name, None)
+            aborted = self._stream_writing(stream, writer)
+            if aborted:
+                self._abort_only(stream)
+            self._wait_blocks(1, timeout)
+            if writer is not None:
+                writer.stop(timeout)
+            if self._stream_writing(stream, writer):
+                log.warning("⏳ %s: запись еще не вернулась - устройство будет закрыто позже", name)
+                self._retired_streams.append((stream, name, writer))
+            elif aborted:
+                self._close_only(stream)
+            else:
+                self._close_stream(stream)
+            self.device_streams.pop(name, None)
+            self.meters.clear_target(name)
+            self.bytes_per_frame = self._bytes_per_frame()
+        return True
+
+    def _stream_writing(self, stream, writer: Optional[TargetWriter]) -> bool:
+        """Какой-то поток сейчас стоит в write() этого потока (callback или поток записи цели)."""
+        return self.writing_stream is stream or (writer is not None and bool(writer.write_started))
+
+    def close_retired_streams(self):
+        """Закрывает убранные потоки, запись в которые вернулась (поток надзора)."""
+        if not self._retired_streams:
+            return
+        pending = []
+        for stream, name, writer in self._retired_streams:
+            if self._stream_writing(stream, writer):
+                pending.append((stream, name, writer))
+            else:
+                self._close_only(stream)
+                log.info("✅ %s: прерванное устройство закрыто", name)
+        self._retired_streams = pending
+
+    def reopen_target(self, name: str) -> bool:
+        """
+        Заново открывает устройство цели, убранной isolate_target() (поток надзора).
+
+        Returns:
+            bool: True если устройство снова в обработке
+        """
+        with self._targets_lock:
+            if name not in self.target_names:
+                return False
+            if self.target_stream(name) is not None:
+                return True
+            target_stream = self._open_output(name)
+            if target_stream is None:
+                return False
+            if self.fanout or self.adaptive_jitter:
+                self._start_writer(target_stream, name)
+            # Порядок целей сохраняется: перезапуск не меняет очередность вывода
+            order = {target: index for index, target in enumerate(self.target_names)}
+            self.target_streams = tuple(sorted(self.target_streams + ((target_stream, name),),
+                                               key=lambda item: order.get(item[1], len(order))))
+            self.device_streams[name] = (None, target_stream)
+            self.bytes_per_frame = self._bytes_per_frame()
+        return True
+
+    def device_health(self) -> Dict[str, DeviceHealth]:
+        """Состояние устройств целей (пусто, если надзор не запущен)."""
+        return self.supervisor.health() if self.supervisor is not None else {}
+
+    def _wait_blocks(self, count: int, timeout: float):
+        """Ждет, пока callback начнет count новых блоков (если захват идет)."""
+        if self.input_stream is None or not getattr(self.input_stream, 'active', False):
+            return
+        start = self._block_counter
+        deadline = time.monotonic() + timeout
+        while self._block_counter - start < count and time.monotonic() < deadline:
+            time.sleep(0.002)
+
+    def _open_secondary_sources(self):
+        """Открывает входные потоки дополнительных источников, питающие кольца матрицы."""
+        for source_name in self.mixer.sources[1:]:
+            if self._open_secondary(source_name):
+                log.info(f"📥 Дополнительный источник запущен: {source_name}")
+
+    def _open_secondary(self, source_name: str) -> bool:
+        """Открывает и запускает входной поток одного дополнительного источника."""
+        mixer = self.mixer
+        found, source_id, max_inputs = find_source(source_name, self.sample_rate)
+        if not found:
+            log.warning(f"⚠️ Дополнительный источник '{source_name}' не найден - будет тишина")
+            return False
+
+        def source_callback(indata, frames, time, status, name=source_name):
+            if status:
+                self.stats['errors_count'] += 1
+            self.source_beats[name] += 1
+            mixer.push_secondary(name, indata)
+
+        try:
+            channels = min(mixer.channels, max_inputs) if max_inputs > 0 else mixer.channels
+            stream = self._create_input(source_name, source_id, channels, source_callback)
+            self.source_beats.setdefault(source_name, 0)
+            stream.start()
+            self.source_streams[source_name] = stream
+            return True
+        except Exception as e:
+            log.warning(f"⚠️ Не удалось открыть источник '{source_name}': {e}")
+            return False
+
+    def create_input_stream(self):
+        """
+        Создает входной поток основного источника (не запущенный).
+
+        Поток закрывается в close(): после горячей замены источника
+        input_stream указывает уже на другой поток.
+        """
+        self.input_stream = self._create_input(self.source_name, self.source_device_id, self.input_channels,
+                                               self._make_source_callback(self._clock_slot))
+        if self.supervisor is None:
+            self.supervisor = StreamSupervisor(self)
+            self.supervisor.start()
+        if self.watchdog is None:
+            self.watchdog = CallbackWatchdog(self)
+            self.watchdog.start()
+        return self.input_stream
+
+    # ---------------------------------------------------- сторож зависших потоков
+
+    def restart_input(self) -> bool:
+        """
+        Заново открывает зависший входной поток основного источника (поток сторожа).
+
+        Устройство ищется заново (после сна у него может быть другой номер);
+        такт остается у того же слота, поэтому выходы не перезапускаются.
+
+        Returns:
+            bool: True если новый поток запущен
+        """
+        with self._source_lock:
+            if self._pending_source is not None:
+                return False
+            found, device_id, max_inputs = find_source(self.source_name, self.sample_rate)
+            if not found:
+                self.notify(f"Источник '{self.source_name}' не найден")
+                return False
+            old_stream = self.input_stream
+            if old_stream is not None:
+                self._abort_stream(old_stream)
+            try:
+                stream = self._create_input(self.source_name, device_id, self.input_channels,
+                                            self._make_source_callback(self._clock_slot))
+                stream.start()
+            except Exception as e:
+                log.warning(f"⚠️ Не удалось открыть источник '{self.source_name}': {e}")
+                return False
+            self.input_stream = stream
+            self.source_device_id = device_id
+            self.source_max_inputs = max_inputs
+        self.notify(f"⏳ Источник '{self.source_name}' завис и был открыт заново")
+        return True
+
+    def restart_secondary(self, name: str) -> bool:
+        """Заново открывает зависший дополнительный источник (поток сторожа)."""
+        old_stream = self.source_streams.pop(name, None)
+        if old_stream is not None:
+            self._abort_stream(old_stream)
+        return self._open_secondary(name)
+
+    def record_stall(self, record: StallRecord):
+        """Учитывает зависание в журнале и статистике (поток сторожа)."""
+        self.stalls.append(record)
+        self.stats['stalls'] = self.stats.get('stalls', 0) + 1
+        self.stats['last_stall_time'] = record.time
+
+    def set_stall_deadline(self, deadline_ms: float):
+        """Меняет срок, после которого поток считается зависшим (0 - сторож выключен)."""
+        self.stall_deadline_ms = max(0.0, float(deadline_ms))
+
+    def _create_input(self, source_name: str, device_id: Optional[int], channels: int, callback):
+        """Входной поток устройства, файла или генератора (с одинаковым интерфейсом)."""
+        if is_virtual_source(source_name):
+            # Частоту файла уже проверил find_source
+            return FileSourceStream(source_name, self.blocksize, callback,
+                                    samplerate=self.sample_rate, loop=self.file_loop,
+                                    realtime=self.file_realtime)
+        if is_network_source(source_name):
+            return NetworkSourceStream(source_name, self.blocksize, callback, self.sample_rate, channels)
+        return sd.InputStream(device=device_id, channels=channels, callback=callback,
+                              samplerate=self.sample_rate, blocksize=self.blocksize)
+
+    def network_stats(self) -> Dict[str, float]:
+        """Сводка сетевых источников: счетчики суммируются, запас - наименьший."""
+        streams = [stream for stream in (self.input_stream, *self.source_streams.values())
+                   if isinstance(stream, NetworkSourceStream)]
+        summary = {'net_packets': 0, 'net_concealed_frames': 0, 'net_late': 0, 'net_underruns': 0,
+                   'net_fill_ms': 0.0}
+        fills = []
+        for stream in streams:
+            stats = stream.stats()
+            if not stats:
+                continue  # Пакетов еще не было
+            summary['net_packets'] += stats['packets']
+            summary['net_concealed_frames'] += stats['concealed_frames']
+            summary['net_late'] += stats['late']
+            summary['net_underruns'] += stats['underruns']
+            fills.append(stats['fill_ms'])
+        if fills:
+            summary['net_fill_ms'] = min(fills)
+        return summary
+
+    def run(self, stop_event, on_started: Optional[Callable[[], None]] = None):
+        """Запускает захват и работает до установки stop_event."""
+        self.create_input_stream().start()
+        if on_started:
+            on_started()
+        while not stop_event.is_set():
+            sd.sleep(100)
+
+    def _make_source_callback(self, slot: int):
+        """Callback входного потока: обработка, если поток задает такт, иначе - в кольцо замены."""
+        def source_callback(indata, frames, time_info, status):
+            if self._clock_slot == slot:
+                self.callback(indata, frames, time_info, status)
+                return
+            pending = self._pending_source
+            if pending is not None and pending.slot == slot:
+                pending.ring.push(indata)
+                pending.started.set()
+        return source_callback
+
+    # ---------------------------------------------------- горячая замена источника
+
+    def swap_source(self, new_source: str, crossfade_ms: float = SOURCE_CROSSFADE_MS,
+                    timeout: float = 2.0) -> bool:
+        """
+        Переключает основной источник на лету (вызывается не из callback).
+
+        Новый входной поток открывается заранее и пишет в кольцо; callback
+        текущего источника делает кроссфейд на границе блока, после чего такт
+        передается новому потоку. Выходные потоки не перезапускаются.
+
+        Returns:
+            bool: False если замена на лету невозможна (нужен перезапуск)
+        """
+        if new_source == self.source_name:
+            return True
+        if self.input_stream is None or not getattr(self.input_stream, 'active', False):
+            return False
+        if self.mixer is not None and new_source in self.mixer.sources[1:]:
+            log.warning(f"⚠️ '{new_source}' уже подключен как дополнительный источник - нужен перезапуск")
+            return False
+        found, device_id, max_inputs = find_source(new_source, self.sample_rate)
+        if not found:
+            self.notify(f"Источник '{new_source}' не найден")
+            return False
+
+        with self._source_lock:
+            channels = min(self.input_channels, max_inputs) if max_inputs > 0 else self.input_channels
+            fade_frames = max(1, int(self.sample_rate * crossfade_ms / 1000))
+            pending = _IncomingSource(self._next_slot, new_source, device_id, channels,
+                                      self.blocksize, self.input_channels, fade_frames)
+            self._next_slot += 1
+            previous_slot = self._clock_slot
+            try:
+                pending.stream = self._create_input(new_source, device_id, channels,
+                                                    self._make_source_callback(pending.slot))
+                self._pending_source = pending
+                pending.stream.start()
+            except Exception as e:
+                self._pending_source = None
+                self.notify(f"Ошибка открытия источника '{new_source}': {e}")
+                return False
+
+            # Кроссфейд начинается, когда новый поток выдал первые блоки
+            if not pending.done.wait(timeout):
+                self._pending_source = None
+                # Callback, уже взявший pending, мог передать такт новому потоку в момент таймаута:
+                # после его завершения (меньше блока) передача больше невозможна - решаем по факту
+                time.sleep(2 * self.blocksize / self.sample_rate)
+                if not pending.done.is_set() and self._clock_slot != pending.slot:
+                    self._clock_slot = previous_slot
+                    self._close_stream(pending.stream)
+                    log.warning(f"⚠️ Источник '{new_source}' не начал выдавать звук за {timeout:.1f}с")
+                    return False
+
+            old_stream = self.input_stream
+            old_name = self.source_name
+            self.input_stream = pending.stream
+            self.source_name = new_source
+            self.source_device_id = device_id
+            self.source_max_inputs = max_inputs
+            self._pending_source = None
+            if self.mixer is not None:
+                self.mixer.replace_primary(new_source, self.state.routing_matrix)
+                self.meters.set_sources(self.mixer.sources, self.input_channels)
+            self._close_stream(old_stream)
+        log.info(f"🔀 Источник переключен на лету: {old_name} → {new_source} (кроссфейд {crossfade_ms:.0f} мс)")
+        return True
+
+    def _crossfade_step(self, pending: _IncomingSource, frames: int):
+        """Смешивает блок нового источника с текущим (вызывается из callback)."""
+        current = self.mixer.stack[0, :frames]
+        incoming = pending.block[:frames]
+        pending.ring.pop_into(incoming)
+        if pending.channels < incoming.shape[1]:
+            # Моно-источник: дублируем канал
+            incoming[:, pending.channels:] = incoming[:, :1]
+
+        position = pending.position
+        fade_len = len(pending.fade_in)
+        count = max(0, min(frames, fade_len - position))
+        if count:
+            np.multiply(current[:count], pending.fade_out[position:position + count], out=current[:count])
+            current[:count] += incoming[:count] * pending.fade_in[position:position + count]
+        current[count:] = incoming[count:]  # После кроссфейда - только новый источник
+
+        pending.position = position + frames
+        if pending.position >= fade_len:
+            # Со следующего блока такт задает новый источник
+            self._clock_slot = pending.slot
+            pending.done.set()
+
+    @staticmethod
+    def _close_stream(stream):
+        try:
+            stream.stop()
+            stream.close()
+        except Exception as e:
+            log.warning(f"Ошибка остановки потока: {e}")
+
+    @staticmethod
+    def _abort_only(stream):
+        """Прерывает поток без закрытия: блокирующая запись в другом потоке возвращается."""
+        try:
+            getattr(stream, 'abort', stream.stop)()
+        except Exception as e:
+            log.warning(f"Ошибка остановки потока: {e}")
+
+    @staticmethod
+    def _close_only(stream):
+        try:
+            stream.close()
+        except Exception as e:
+            log.warning(f"Ошибка закрытия потока: {e}")
+
+    @staticmethod
+    def _abort_stream(stream):
+        """Закрывает зависший поток: abort() не ждет, пока драйвер доиграет буферы."""
+        try:
+            getattr(stream, 'abort', stream.stop)()
+            stream.close()
+        except Exception as e:
+            log.warning(f"Ошибка остановки потока: {e}")
+
+    # ---------------------------------------------------------------- запись
+
+    def start_recording(self, directory: str, rotate_mb: float = DEFAULT_ROTATE_MB,
+                        rotate_minutes: float = DEFAULT_ROTATE_MINUTES) -> bool:
+        """
+        Начинает фоновую запись источника и выхода каждой цели в WAV.
+
+        Returns:
+            bool: False если запись уже идет
+        """
+        if self.recorder is not None:
+            return False
+        recorder = WavRecorder(directory, self.sample_rate, rotate_mb, rotate_minutes)
+        recorder.start()
+        self.recorder = recorder
+        with self._targets_lock:
+            tap = recorder.add_tap(f"source_{self.source_name}", self.input_channels, self.blocksize)
+            self._source_record_tap = tap.push
+            self.source_taps = self.source_taps + [tap.push]
+            for _, name in self.target_streams:
+                self._add_target_tap(name)
+        log.info(f"⏺️ Запись в WAV: {os.path.abspath(directory)}")
+        return True
+
+    def _add_target_tap(self, name: str):
+        channel_map, _ = self.compiled_channel_maps[name]
+        tap = self.recorder.add_tap(f"target_{name}", channel_map.out_channels, self.blocksize)
+        self.target_taps = dict(self.target_taps, **{name: tap.push})
+
+    def stop_recording(self) -> List[str]:
+        """
+        Останавливает запись и закрывает файлы.
+
+        Returns:
+            list: Пути записанных файлов
+        """
+        recorder = self.recorder
+        if recorder is None:
+            return []
+        with self._targets_lock:
+            # Сначала callback перестает копировать блоки, затем закрываются файлы
+            self.source_taps = [tap for tap in self.source_taps if tap is not self._source_record_tap]
+            self.target_taps = {}
+            self._source_record_tap = None
+            self._wait_blocks(1, 0.5)
+            self.recorder = None
+        files = recorder.stop()
+        overflows = recorder.overflows
+        log.info(f"⏹️ Запись остановлена: {len(files)} файлов"
+                 f"{f', потеряно блоков: {overflows}' if overflows else ''}")
+        return files
+
+    def close(self):
+        """Останавливает все потоки движка."""
+        # Сторож и надзор первыми: иначе они начнут перезапускать закрываемые потоки
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+        if self.supervisor is not None:
+            self.supervisor.stop()
+            self.supervisor = None
+        self.stop_recording()
+        # Сначала потоки записи, чтобы никто не писал в закрываемые устройства
+        for writer in self.writers.values():
+            writer.stop()
+        self.writers.clear()
+
+        streams = [stream for stream, _ in self.target_streams] + list(self.source_streams.values())
+        if self.input_stream is not None:
+            streams.insert(0, self.input_stream)
+        for stream in streams:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception as e:
+                log.warning(f"Ошибка остановки потока: {e}")
+        # Захват остановлен, потоки записи тоже - прерванные устройства больше никто не пишет
+        for stream, _, _ in self._retired_streams:
+            self._close_only(stream)
+        self._retired_streams = []
+        for _, name in self.target_streams:
+            self.device_streams.pop(name, None)
+        self.target_streams = ()
+        self.source_streams.clear()
+        self.source_beats.clear()
+        self.input_stream = None
+
+    # ------------------------------------------------------ изменения на лету
+
+    def set_gain(self, source: str, target: str, gain_db: Optional[float]):
+        """Меняет ячейку матрицы источников."""
+        if self.mixer is not None:
+            self.mixer.set_gain(source, target, gain_db)
+
+    def set_channel_map(self, target: str, spec: str) -> bool:
+        """
+        Подменяет раскладку каналов, если число каналов не меняется.
+
+        Returns:
+            bool: True если изменение применено на лету
+        """
+        compiled = self.compiled_channel_maps.get(target)
+        if compiled is None:
+            return False
+        current_map, current_buffer = compiled
+        if output_channels(spec) != current_map.out_channels:
+            return False
+        if required_input_channels(spec) > current_map.in_channels:
+            return False
+        # Одно присваивание кортежа - callback увидит либо старую, либо новую раскладку
+        self.compiled_channel_maps[target] = (compile_channel_map(spec, current_map.in_channels), current_buffer)
+        return True
+
+    def set_dither(self, target: str, enabled: bool):
+        converter = self.format_converters.get(target)
+        if converter is not None:
+            converter.dither = bool(enabled)
+
+    def set_drop_policy(self, target: str, policy: str):
+        writer = self.writers.get(target)
+        if writer is not None:
+            writer.policy = policy
+
+    def set_delay_crossfade(self, crossfade_ms: float):
+        """Меняет длительность кроссфейда при изменении задержки (со следующей смены)."""
+        self.delay_crossfade_ms = max(0.0, float(crossfade_ms))
+
+    def set_spectrum(self, selection: Optional[str]):
+        """Выбирает сигнал для спектра: SPECTRUM_SOURCE, имя цели или None (выключен)."""
+        self.spectrum_target = selection
+
+    def set_idle_policy(self, policy: str):
+        """
+        Меняет поведение при тишине на источнике (на лету).
+
+        'off' - обработка всегда, 'zeros' - блоки тишины без обработки,
+        'suspend' - в выходные потоки ничего не пишется до появления сигнала
+        (потоки работают, поэтому запись возобновляется в том же блоке).
+        Политику применяет callback на границе блока: детектор тишины и
+        OutputSuspender меняет только он.
+        """
+        self._idle_policy_request = policy
+
+    def _apply_idle_policy(self, policy: str):
+        """Применяет политику простоя (из callback или до запуска потоков)."""
+        if policy == self.idle_policy:
+            return
+        self.idle_policy = policy
+        if policy == IDLE_SUSPEND and self.suspender is None:
+            self.suspender = OutputSuspender(lambda: list(self.writers.values()))
+        elif policy != IDLE_SUSPEND and self.suspender is not None:
+            self.suspender.request(False)
+            self.suspender = None
+        if policy == IDLE_OFF:
+            self.silence_gate.reset()
+            self.stats['idle'] = False
+
+    def set_jitter_limits(self, target: str, min_ms: float, max_ms: float):
+        """Меняет пределы адаптивного запаса цели."""
+        writer = self.writers.get(target)
+        if writer is not None and writer.jitter is not None:
+            writer.jitter.set_limits(min_ms, max_ms)
+
+    def set_auto_align(self, enabled: bool):
+        """Включает выравнивание целей по самой медленной (со следующего блока, через кроссфейд)."""
+        self.auto_align = bool(enabled)
+
+    def _device_latency_frames(self, name: str) -> int:
+        """Задержка устройства цели: заявленная задержка выхода плюс адаптивный запас."""
+        frames = self.output_latency_frames.get(name, 0)
+        writer = self.writers.get(name)
+        if writer is not None and self.adaptive_jitter:
+            frames += writer.reserve_blocks * self.blocksize
+        return frames
+
+    def latency_report(self) -> Dict[str, TargetLatency]:
+        """Сквозная задержка каждой подключенной цели (вызывается не из callback)."""
+        to_ms = 1000 / self.sample_rate
+        input_ms = stream_latency(self.input_stream) * 1000
+        latency_max = max((self._device_latency_frames(name) for _, name in self.target_streams), default=0)
+        report = {}
+        for _, name in self.target_streams:
+            user_ms = float(self.state.delays.get(name, 0))
+            writer = self.writers.get(name)
+            align_frames = 0
+            if self.auto_align:
+                align_frames = latency_max - self._device_latency_frames(name)
+            elif writer is not None and self.adaptive_jitter:
+                align_frames = (self._reserve_max - writer.reserve_blocks) * self.blocksize
+            # Блок обработки плюс блоки, ждущие в кольце потока записи
+            buffer_frames = self.blocksize + (len(writer.ring) * self.blocksize if writer is not None else 0)
+            output_ms = self.output_latency_frames.get(name, 0) * to_ms
+            align_ms, buffer_ms = align_frames * to_ms, buffer_frames * to_ms
+            report[name] = TargetLatency(round(input_ms, 1), round(user_ms, 1), round(align_ms, 1), round(buffer_ms, 1),
+                                         round(output_ms, 1),
+                                         round(input_ms + user_ms + align_ms + buffer_ms + output_ms, 1))
+        return report
+
+    def writer_stats(self) -> Dict[str, Dict[str, int]]:
+        """Статистика потоков записи целей (режим fan-out)."""
+        return {name: writer.stats() for name, writer in self.writers.items()}
+
+    @property
+    def sources(self) -> Tuple[str, ...]:
+        return self.mixer.sources if self.mixer is not None else (self.source_name,)
+
+    # ---------------------------------------------------------------- callback
+
+    def callback(self, indata, frames, time_info, status):
+        """Улучшенная callback функция со статистикой и защитой от петель."""
+        stats = self.stats
+        current_callback_time = time.time()
+        self._block_counter += 1
+
+        if status:
+            log.warning("🔊 Статус ошибки: %s", status)
+            stats['errors_count'] += 1
+
+        # Копии источника - до проверки петли: по ним (в процессе движка) GUI и решает, что петля ушла
+        for tap in self.source_taps:
+            tap(indata)
+
+        # КРИТИЧЕСКИ ВАЖНО: Обнаружение аудио-петель для Bluetooth устройств
+        if self.loop_detector is not None:
+            try:
+                # Проверяем на аудио-петли (особенно для Tronsmart Element T6)
+                if self.loop_detector(indata, self.source_name):
+                    log.error("🚨 ОБНАРУЖЕНА АУДИО-ПЕТЛЯ: %s", self.source_name)
+                    # Немедленно прекращаем обработку для предотвращения петли
+                    return
+            except Exception as e:
+                log.warning("⚠️ Ошибка обнаружения петли: %s", e)
+                # Продолжаем работу даже если обнаружение петли не сработало
+
+        # ИСПРАВЛЕНО: правильная статистика
+        stats['total_frames'] += frames
+        stats['total_callbacks'] += 1
+
+        # Измеряем объем обработанных данных (frames × реальные каналы входов и выходов × байты)
+        stats['data_processed_mb'] += frames * self.bytes_per_frame / (1024 * 1024)
+
+        # Измеряем стабильность интервалов между callback'ами
+        if stats['last_callback_time'] > 0:
+            stats['callback_intervals'].append(current_callback_time - stats['last_callback_time'])
+        stats['last_callback_time'] = current_callback_time
+
+        mixer = self.mixer
+
+        # Складываем блоки всех источников в общий массив (N, frames, каналы)
+        block_frames = mixer.load_primary(indata)
+
+        # Горячая замена источника: кроссфейд на границе блока
+        pending = self._pending_source
+        if pending is not None and pending.started.is_set() and not pending.done.is_set():
+            self._crossfade_step(pending, block_frames)
+
+        # Спектр источника: только копия в кольцо, БПФ - в рабочем потоке
+        if self.spectrum_target == SPECTRUM_SOURCE:
+            self.spectrum.push(mixer.stack[0, :block_frames])
+
+        # Простой при тишине: обработка целей пропускается, выход в том же блоке, где вернулся сигнал
+        policy = self._idle_policy_request
+        if policy is not None:
+            self._idle_policy_request = None
+            self._apply_idle_policy(policy)
+        if self.idle_policy != IDLE_OFF and pending is None and self._idle_step(mixer.stack[:, :block_frames]):
+            self._feed_idle(block_frames)
+            return
+
+        # Антиалиасинг фильтр для высоких частот дискретизации (сразу по всем источникам)
+        if self.sample_rate > 48000:
+            mixer.smooth(block_frames)
+
+        # Выходы всех целей одним умножением матриц (раскладка целей читается один раз за блок)
+        layout = mixer.layout
+        mixed = mixer.mix(block_frames, layout)
+
+        # Снимок маршрутизации читается один раз за блок (без системных вызовов)
+        routing = self.routing_provider()
+
+        # Наибольший запас среди целей: остальные цели задерживаются на разницу
+        if self.auto_align:
+            self._latency_max = max((self._device_latency_frames(name) for _, name in self.target_streams), default=0)
+        elif self.adaptive_jitter:
+            self._reserve_max = max((writer.reserve_blocks for writer in self.writers.values()), default=0)
+
+        supervisor = self.supervisor
+        for target_stream, target_device_name in self.target_streams:
+            try:
+                # ИСПРАВЛЕНИЕ: Проверка маршрутизации перед обработкой звука
+                if routing is not None and not routing.allows(target_device_name):
+                    # Если маршрутизация запрещена, пропускаем этот поток
+                    self.meters.clear_target(target_device_name)
+                    continue
+                self._process_target(target_stream, target_device_name, mixed, layout)
+            except Exception as e:
+                log.warning("⚠️  Ошибка обработки %s: %s", target_device_name, e)
+                stats['errors_count'] += 1
+                # Только счетчик: перезапуском устройства займется поток надзора
+                if supervisor is not None:
+                    supervisor.report_error(target_device_name, e)
+                continue
+
+        # Уровни всех источников и целей одной редукцией
+        self.meters.measure(mixer.stack, block_frames)
+
+    def _idle_step(self, stack: np.ndarray) -> bool:
+        """Обновляет детектор тишины; True если блок обрабатывается как простой."""
+        gate = self.silence_gate
+        was_idle = gate.idle
+        if gate.update(stack):
+            return True
+        if was_idle:
+            self.stats['idle'] = False
+            if self.suspender is not None:
+                self.suspender.request(False)
+            log.info("▶️ Сигнал на источнике - обработка возобновлена")
+            return False
+        # Хвосты линий задержки (с кроссфейдом) должны прозвучать до входа в простой
+        fade_frames = int(self.sample_rate * self.delay_crossfade_ms / 1000)
+        if not gate.ready(max((line.delay or 0 for line in self.buffers.values()), default=0) + fade_frames):
+            return False
+        gate.enter()
+        self.stats['idle'] = True
+        self.meters.publish_silence()
+        if self.suspender is not None:
+            self.suspender.request(True)
+        log.info("💤 Тишина на источнике - простой (%s)", "без записи в устройства" if self.suspender else "блоки тишины")
+        return True
+
+    def _feed_idle(self, frames: int):
+        """Блоки тишины вместо обработки (в режиме 'suspend' - ничего)."""
+        if self.suspender is not None:
+            return
+        for target_stream, name in self.target_streams:
+            silence = self.silence_blocks.get(name)
+            if silence is None:
+                continue
+            try:
+                tap = self.target_taps.get(name)
+                if tap is not None:
+                    tap(silence[0][:frames])
+                writer = self.writers.get(name)
+                if writer is not None:
+                    writer.submit(silence[0][:frames])
+                else:
+                    self.writing_target = name
+                    self.writing_stream = target_stream
+                    try:
+                        target_stream.write(silence[1][:frames])
+                    finally:
+                        self.writing_target = None
+                        self.writing_stream = None
+            except Exception as e:
+                log.warning("⚠️  Ошибка обработки %s: %s", name, e)
+                self.stats['errors_count'] += 1
+                if self.supervisor is not None:
+                    self.supervisor.report_error(name, e)
+
+    def _process_target(self, target_stream, target_device_name: str, mixed: np.ndarray, layout):
+        """Задержка, громкость, раскладка и вывод для одной цели."""
+        sample_rate = self.sample_rate
+        blocksize = self.blocksize
+
+        # Получаем задержку в миллисекундах
+        delay_ms = self.state.delays.get(target_device_name, 0)
+
+        # Преобразуем в секунды (обычно мс → сек)
+        delay_s = delay_ms / 1000.0
+
+        # ДОПОЛНИТЕЛЬНАЯ ЗАЩИТА: если задержки все еще слишком большие
+        if self.delay_debug_mode:
+            delay_s = delay_s / 1000.0  # Еще раз делим на 1000
+            log.debug("🐛 DEBUG: дополнительное деление для %s: %sмс → %sс", target_device_name, delay_ms, delay_s)
+
+        volume_db = self.state.volumes.get(target_device_name, 0)
+        volume_factor = 10 ** (volume_db / 20.0)
+
+        delay_line = self.buffers[target_device_name]
+        delay_frames = int(sample_rate * delay_s)
+
+        # Диагностика (только при первом callback для каждого устройства)
+        if target_device_name not in self._delay_debug_printed:
+            log.info("📊 %s: установлено %sмс → %d фреймов", target_device_name, delay_ms, delay_frames)
+            self._delay_debug_printed.add(target_device_name)
+
+        # Выравнивание: цели с меньшей задержкой устройства (или запасом) задерживаются на разницу
+        writer = self.writers.get(target_device_name)
+        if self.auto_align:
+            delay_frames += self._latency_max - self._device_latency_frames(target_device_name)
+        elif writer is not None and self.adaptive_jitter:
+            delay_frames += (self._reserve_max - writer.reserve_blocks) * blocksize
+
+        target_index = layout.target_index.get(target_device_name)
+        if target_index is None:
+            return
+
+        # Раскладка каналов одним умножением на маленькую матрицу
+        channel_map, map_buffer = self.compiled_channel_maps[target_device_name]
+        mapped = channel_map.apply(mixed[target_index], map_buffer)
+
+        # Задержка: один блок на входе - один блок на выходе, смена задержки кроссфейдом
+        fade_frames = int(sample_rate * self.delay_crossfade_ms / 1000)
+        delayed = delay_line.process(mapped, delay_frames, fade_frames)
+
+        # Применяем громкость с мягким ограничением (на месте, в буфере линии задержки)
+        modified_audio = np.multiply(delayed, volume_factor, out=delayed)
+
+        # Мягкое ограничение для предотвращения клиппинга
+        if volume_factor > 1.0:
+            np.multiply(modified_audio, 0.9, out=modified_audio)
+            np.tanh(modified_audio, out=modified_audio)
+            np.multiply(modified_audio, 1.1, out=modified_audio)
+        self.meters.store_target(target_device_name, modified_audio)
+        if self.spectrum_target == target_device_name:
+            self.spectrum.push(modified_audio)
+
+        tap = self.target_taps.get(target_device_name)
+        if tap is not None:
+            tap(modified_audio)
+
+        suspender = self.suspender
+        if suspender is not None and suspender.suspended:
+            return  # Простой: запись в устройства приостановлена
+
+        if writer is not None:
+            # Fan-out: запись на устройство выполняет поток цели
+            writer.submit(modified_audio)
+            return
+
+        # Преобразование в формат устройства в заранее выделенный буфер
+        converter = self.format_converters.get(target_device_name)
+        out_data = converter.convert(modified_audio) if converter is not None else modified_audio
+        # Отметка для сторожа: если запись не вернется, зависла цель, а не источник
+        self.writing_target = target_device_name
+        self.writing_stream = target_stream
+        try:
+            target_stream.write(out_data)
+        finally:
+            self.writing_target = None
+            self.writing_stream = None
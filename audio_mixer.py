@@ -0,0 +1,321 @@
+"""
+Audio Mixer для AudioForwarderApp
+Матрица микширования N источников × M целей с усилением в каждой ячейке.
+
+Блоки всех источников складываются в заранее выделенный массив (N, frames, ch),
+после чего выходы всех целей получаются одним умножением матриц за блок.
+
+Ячейка основного источника хранится в настройках под ключом PRIMARY_SOURCE,
+а не под именем устройства: после смены источника строка цели продолжает
+слышать новый основной источник.
+"""
+import threading
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+
+PRIMARY_SOURCE = "__primary__"  # Ключ ячейки "текущий основной источник" в матрице настроек
+
+
+def adopt_primary(routing_matrix: Dict[str, Dict[str, float]], source: Optional[str]) -> int:
+    """
+    Переносит ячейки, сохраненные под именем основного источника, на ключ PRIMARY_SOURCE.
+
+    Нужен для настроек, записанных до появления ключа, и перед сменой
+    источника (ячейка старого источника переходит к новому).
+
+    Returns:
+        int: Количество перенесенных ячеек
+    """
+    moved = 0
+    if not source:
+        return moved
+    for cells in routing_matrix.values():
+        if source in cells and PRIMARY_SOURCE not in cells:
+            cells[PRIMARY_SOURCE] = cells.pop(source)
+            moved += 1
+    return moved
+
+
+def db_to_gain(gain_db: Optional[float]) -> float:
+    """Переводит дБ в линейный коэффициент (None означает "выключено")."""
+    if gain_db is None:
+        return 0.0
+    return float(10 ** (float(gain_db) / 20.0))
+
+
+class SourceRing:
+    """
+    Небольшое кольцо блоков для дополнительного источника.
+
+    Callback дополнительного источника пишет в кольцо, callback основного
+    источника (задающий такт) забирает по одному блоку. Память выделяется
+    один раз, при переполнении перезаписывается самый старый блок.
+    """
+
+    def __init__(self, capacity: int, blocksize: int, channels: int):
+        self._blocks = np.zeros((capacity, blocksize, channels), dtype=np.float32)
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self.capacity = capacity
+        self._write = 0
+        self._read = 0
+        self.overruns = 0
+        self.underruns = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    def push(self, block: np.ndarray):
+        """Кладет блок в кольцо (вызывается из callback источника)."""
+        if self._write - self._read >= self.capacity:
+            self._read += 1  # Отбрасываем самый старый блок
+            self.overruns += 1
+        slot = self._write % self.capacity
+        frames = min(len(block), self._blocks.shape[1])
+        channels = min(block.shape[1], self._blocks.shape[2])
+        self._blocks[slot, :frames, :channels] = block[:frames, :channels]
+        if channels < self._blocks.shape[2]:
+            self._blocks[slot, :frames, channels:] = 0.0
+        self._frames[slot] = frames
+        self._write += 1
+
+    def pop_into(self, dst: np.ndarray) -> bool:
+        """
+        Копирует следующий блок в dst; при отсутствии данных заполняет тишиной.
+
+        Returns:
+            bool: True если блок был в кольце
+        """
+        if self._write == self._read:
+            dst[...] = 0.0
+            self.underruns += 1
+            return False
+        slot = self._read % self.capacity
+        frames = min(int(self._frames[slot]), len(dst))
+        dst[:frames] = self._blocks[slot, :frames]
+        if frames < len(dst):
+            dst[frames:] = 0.0
+        self._read += 1
+        return True
+
+    def clear(self):
+        self._read = self._write
+
+
+class MixerLayout(NamedTuple):
+    """Согласованный набор целей и усилений; callback читает его один раз за блок."""
+    targets: Tuple[str, ...]
+    target_index: Mapping[str, int]
+    gains: np.ndarray  # (M, N)
+    out: np.ndarray    # (M, blocksize, channels)
+
+
+class MixingMatrix:
+    """
+    Матрица маршрутизации N источников на M целей.
+
+    Цели и усиления публикуются одним присваиванием ссылки на MixerLayout
+    (copy-on-write): изменения из UI, подключение и отключение целей не
+    требуют блокировок в аудио-callback, и он всегда видит согласованную матрицу.
+    """
+
+    def __init__(self, sources: Sequence[str], targets: Sequence[str], blocksize: int,
+                 channels: int = 2, ring_blocks: int = 4):
+        """
+        Args:
+            sources: Источники; первый задает такт обработки
+            targets: Целевые устройства
+            blocksize: Размер блока в фреймах
+            channels: Количество каналов движка
+            ring_blocks: Глубина кольца для дополнительных источников
+        """
+        self.sources = tuple(dict.fromkeys(sources))
+        self.blocksize = blocksize
+        self.channels = channels
+        self.source_index: Dict[str, int] = {name: i for i, name in enumerate(self.sources)}
+
+        n = len(self.sources)
+        self._stack = np.zeros((n, blocksize, channels), dtype=np.float32)
+        self._rings = {i: SourceRing(ring_blocks, blocksize, channels) for i in range(1, n)}
+        self._lock = threading.Lock()  # Только для изменений из UI; callback не блокируется
+        self._layout = self._make_layout(tuple(dict.fromkeys(targets)), None)
+
+    def _make_layout(self, targets: Tuple[str, ...], gains: Optional[np.ndarray]) -> MixerLayout:
+        m = len(targets)
+        if gains is None:
+            gains = np.zeros((m, len(self.sources)), dtype=np.float32)
+        return MixerLayout(
+            targets=targets,
+            target_index=MappingProxyType({name: i for i, name in enumerate(targets)}),
+            gains=gains,
+            out=np.zeros((m, self.blocksize, self.channels), dtype=np.float32)
+        )
+
+    @property
+    def layout(self) -> MixerLayout:
+        """Текущая раскладка целей (читается callback'ом один раз за блок)."""
+        return self._layout
+
+    @property
+    def targets(self) -> Tuple[str, ...]:
+        return self._layout.targets
+
+    @property
+    def target_index(self) -> Mapping[str, int]:
+        return self._layout.target_index
+
+    @property
+    def gains(self) -> np.ndarray:
+        """Текущая матрица усилений (M, N), только для чтения."""
+        return self._layout.gains
+
+    @property
+    def stack(self) -> np.ndarray:
+        """Входные блоки всех источников (N, blocksize, channels)."""
+        return self._stack
+
+    def _routing_gains(self, targets: Sequence[str], routing_matrix: Dict[str, Dict[str, float]],
+                       default_source: Optional[str]) -> np.ndarray:
+        if default_source is None and self.sources:
+            default_source = self.sources[0]
+
+        gains = np.zeros((len(targets), len(self.sources)), dtype=np.float32)
+        for t_idx, target in enumerate(targets):
+            cells = routing_matrix.get(target)
+            if cells is None:
+                s_idx = self.source_index.get(default_source)
+                if s_idx is not None:
+                    gains[t_idx, s_idx] = 1.0
+                continue
+            for source, gain_db in cells.items():
+                s_idx = self._source_slot(source)
+                if s_idx is not None:
+                    gains[t_idx, s_idx] = db_to_gain(gain_db)
+            if PRIMARY_SOURCE in cells and self.sources:
+                gains[t_idx, 0] = db_to_gain(cells[PRIMARY_SOURCE])  # Стабильный ключ важнее имени
+        return gains
+
+    def _source_slot(self, source: str) -> Optional[int]:
+        """Индекс источника в матрице (PRIMARY_SOURCE - основной)."""
+        if source == PRIMARY_SOURCE:
+            return 0 if self.sources else None
+        return self.source_index.get(source)
+
+    def set_routing(self, routing_matrix: Dict[str, Dict[str, float]], default_source: Optional[str] = None):
+        """
+        Загружает матрицу из настроек.
+
+        Args:
+            routing_matrix: Настройки вида {цель: {источник: усиление_дБ}}
+            default_source: Источник для целей без настроек (по умолчанию - первый)
+        """
+        with self._lock:
+            layout = self._layout
+            gains = self._routing_gains(layout.targets, routing_matrix, default_source)
+            self._layout = layout._replace(gains=gains)
+
+    def set_targets(self, targets: Sequence[str], routing_matrix: Dict[str, Dict[str, float]],
+                    default_source: Optional[str] = None):
+        """Меняет набор целей (подключение/отключение на лету)."""
+        targets = tuple(dict.fromkeys(targets))
+        with self._lock:
+            gains = self._routing_gains(targets, routing_matrix, default_source)
+            self._layout = self._make_layout(targets, gains)
+
+    def set_gain(self, source: str, target: str, gain_db: Optional[float]):
+        """Меняет одну ячейку матрицы (None выключает маршрут)."""
+        with self._lock:
+            layout = self._layout
+            s_idx = self._source_slot(source)
+            t_idx = layout.target_index.get(target)
+            if s_idx is None or t_idx is None:
+                return
+            gains = layout.gains.copy()
+            gains[t_idx, s_idx] = db_to_gain(gain_db)
+            self._layout = layout._replace(gains=gains)
+
+    def replace_primary(self, source: str, routing_matrix: Dict[str, Dict[str, float]]):
+        """
+        Переименовывает основной источник (после горячей замены) и пересчитывает усиления.
+
+        Ячейка старого источника, сохраненная под его именем, переносится на
+        PRIMARY_SOURCE - строка цели продолжает слышать основной источник.
+        """
+        adopt_primary(routing_matrix, self.sources[0] if self.sources else None)
+        with self._lock:
+            self.sources = (source,) + self.sources[1:]
+            self.source_index = {name: i for i, name in enumerate(self.sources)}
+            layout = self._layout
+            gains = self._routing_gains(layout.targets, routing_matrix, source)
+            self._layout = layout._replace(gains=gains)
+
+    def routed_sources(self, target: str) -> Iterable[str]:
+        """Источники, которые слышны на цели."""
+        layout = self._layout
+        t_idx = layout.target_index.get(target)
+        if t_idx is None:
+            return ()
+        row = layout.gains[t_idx]
+        return tuple(name for name, i in self.source_index.items() if row[i] != 0.0)
+
+    def push_secondary(self, source: str, indata: np.ndarray):
+        """Принимает блок дополнительного источника (из его callback)."""
+        ring = self._rings.get(self.source_index.get(source, -1))
+        if ring is not None:
+            ring.push(indata)
+
+    def load_primary(self, indata: np.ndarray) -> int:
+        """
+        Загружает блок основного источника и подтягивает блоки остальных.
+
+        Returns:
+            int: Количество фреймов в блоке
+        """
+        frames = min(len(indata), self.blocksize)
+        channels = min(indata.shape[1], self.channels)
+        stack = self._stack
+        stack[0, :frames, :channels] = indata[:frames, :channels]
+        if channels < self.channels:
+            # Моно-источник: дублируем канал
+            stack[0, :frames, channels:] = stack[0, :frames, :1]
+        for index, ring in self._rings.items():
+            ring.pop_into(stack[index, :frames])
+        return frames
+
+    def smooth(self, frames: int):
+        """Сглаживающий фильтр первого порядка сразу по всем источникам."""
+        block = self._stack[:, :frames]
+        if frames > 1:
+            np.add(block[:, 1:] * 0.9, block[:, :-1] * 0.1, out=block[:, 1:])
+
+    def mix(self, frames: int, layout: Optional[MixerLayout] = None) -> np.ndarray:
+        """
+        Смешивает источники для всех целей одним умножением матриц.
+
+        Args:
+            frames: Количество фреймов в блоке
+            layout: Раскладка, прочитанная callback'ом (по умолчанию - текущая)
+
+        Returns:
+            np.ndarray: Представление (M, frames, channels) в заранее выделенном буфере
+        """
+        if layout is None:
+            layout = self._layout  # Одно чтение ссылки - согласованная матрица на весь блок
+        gains = layout.gains
+        n = len(self.sources)
+        m = len(layout.targets)
+        out = layout.out[:, :frames]
+        if n == 0 or m == 0:
+            return out
+        stacked = self._stack[:, :frames].reshape(n, frames * self.channels)
+        if frames == self.blocksize:
+            np.matmul(gains, stacked, out=layout.out.reshape(m, frames * self.channels))
+        else:
+            out[...] = np.matmul(gains, stacked).reshape(m, frames, self.channels)
+        return out
+
+    def ring_stats(self) -> Dict[str, Dict[str, int]]:
+        """Статистика переполнений/опустошений колец дополнительных источников."""
+        return {self.sources[i]: {'overruns': r.overruns, 'underruns': r.underruns, 'fill': len(r)}
+                for i, r in self._rings.items()}
@@ -0,0 +1,192 @@
+"""
+Callback Watchdog для AudioForwarderApp
+Сторож потоков: зависший callback источника или запись в устройство.
+
+Если драйвер завис или устройство уснуло, callback источника перестает
+вызываться, а поток трансляции продолжает ждать - интерфейс показывает
+"транслирую". Сторож несколько раз в секунду сверяет счетчики блоков
+каждого входного потока с ожидаемым периодом (blocksize / sample_rate) и
+время начала текущей записи в каждое устройство. Если поток молчит дольше
+срока, зависание классифицируется и поток открывается заново:
+
+* 'hung'    - поток считается активным, но callback не вызывается;
+* 'stopped' - драйвер сам остановил поток;
+* 'blocked' - запись в выходное устройство не возвращается (для цели
+  перезапуск выполняет StreamSupervisor, остальные цели продолжают играть).
+
+Каждое зависание попадает в журнал stalls движка и в счетчики статистики
+(а оттуда - в телеметрию процесса движка).
+"""
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+from file_source import is_virtual_source
+from network_audio import is_network_source
+from stream_supervisor import backoff_delay
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+STALL_HUNG = 'hung'
+STALL_STOPPED = 'stopped'
+STALL_BLOCKED = 'blocked'
+
+# Вид зависания → описание для сообщений
+STALL_LABELS = {
+    STALL_HUNG: "callback не вызывается",
+    STALL_STOPPED: "поток остановлен драйвером",
+    STALL_BLOCKED: "запись в устройство не возвращается",
+}
+
+DEFAULT_STALL_DEADLINE_MS = 500
+# Варианты для интерфейса: срок в мс → описание (0 - сторож выключен)
+STALL_DEADLINE_OPTIONS = {
+    0: "Выкл",
+    250: "250 мс",
+    500: "500 мс",
+    1000: "1 с",
+    2000: "2 с",
+    5000: "5 с",
+}
+WATCHDOG_INTERVAL = 0.05  # Период проверки
+MIN_STALL_PERIODS = 4     # Срок не короче стольких периодов блока
+STALL_LOG_SIZE = 64       # Последние зависания в журнале движка
+
+
+class StallRecord(NamedTuple):
+    time: float       # time.time() обнаружения
+    stream: str       # Имя источника или цели
+    kind: str         # STALL_HUNG / STALL_STOPPED / STALL_BLOCKED
+    silent_ms: float  # Сколько поток молчал к моменту обнаружения
+    recovered: bool   # Поток открыт заново (для цели - передан надзору)
+
+
+class _Beat:
+    """Последнее изменение счетчика блоков одного входного потока."""
+
+    __slots__ = ('count', 'changed', 'attempts', 'next_retry')
+
+    def __init__(self, count: int, now: float):
+        self.count = count
+        self.changed = now
+        self.attempts = 0
+        self.next_retry = 0.0
+
+
+class CallbackWatchdog:
+    """
+    Поток сторожа одного AudioEngine.
+
+    Движок предоставляет счетчики блоков (_block_counter, source_beats),
+    цель, в которую callback пишет прямо сейчас (writing_target),
+    время начала записи потоков целей (writer.write_started),
+    restart_input(), restart_secondary(имя) и supervisor.fail(имя, причина).
+    Срок берется из engine.stall_deadline_ms при каждой проверке (0 - выключен).
+    """
+
+    def __init__(self, engine, interval: float = WATCHDOG_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self._beats: Dict[str, _Beat] = {}
+        self._reported: Dict[str, float] = {}  # цель → начало записи, о зависании которой уже сообщено
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="CallbackWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def deadline(self) -> float:
+        """Срок молчания в секундах (0 - сторож выключен)."""
+        engine = self.engine
+        if engine.stall_deadline_ms <= 0:
+            return 0.0
+        period = engine.blocksize / engine.sample_rate
+        return max(engine.stall_deadline_ms / 1000, MIN_STALL_PERIODS * period)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            deadline = self.deadline()
+            now = time.monotonic()
+            if not deadline:
+                self._beats.clear()  # После включения отсчет начинается заново
+                continue
+            try:
+                self._check_outputs(deadline, now)
+                self._check_input(None, self.engine._block_counter, self.engine.input_stream, deadline, now)
+                for name, count in list(self.engine.source_beats.items()):
+                    self._check_input(name, count, self.engine.source_streams.get(name), deadline, now)
+            except Exception as e:
+                log.warning("⚠️ Сторож потоков: %s", e)
+
+    def _check_input(self, name: Optional[str], count: int, stream, deadline: float, now: float):
+        """Входной поток: основной (name=None) или дополнительный источник."""
+        source = name or self.engine.source_name
+        if is_virtual_source(source) or is_network_source(source):
+            # Файл без петли заканчивается сам; сетевой источник идет по своим часам и при обрыве дает тишину
+            return
+        key = name or ""
+        beat = self._beats.get(key)
+        if beat is None or count != beat.count:
+            if beat is not None and beat.attempts:
+                log.info("✅ %s: callback снова вызывается", name or self.engine.source_name)
+            self._beats[key] = _Beat(count, now)
+            return
+        silent = now - beat.changed
+        if silent < deadline or now < beat.next_retry:
+            return
+
+        engine = self.engine
+        if name is None:
+            if engine._pending_source is not None:
+                return  # Идет горячая замена источника - поток меняет она
+            blocked = engine.writing_target
+            if blocked is not None:
+                # Callback стоит внутри записи в устройство: виновата цель, а не источник.
+                # Сообщается один раз - дальше запись прерывает надзор (abort, закрытие - после возврата)
+                if not beat.attempts:
+                    self._record(blocked, STALL_BLOCKED, silent, self._fail_target(blocked, silent))
+                    beat.attempts = 1
+                return
+
+        kind = STALL_STOPPED if stream is not None and not getattr(stream, 'active', True) else STALL_HUNG
+        recovered = engine.restart_input() if name is None else engine.restart_secondary(name)
+        self._record(name or engine.source_name, kind, silent, recovered)
+        if recovered:
+            beat.changed = now
+        # Пауза растет, пока поток не заработает (счетчик сбрасывается с первым блоком)
+        beat.next_retry = now + backoff_delay(beat.attempts)
+        beat.attempts += 1
+
+    def _check_outputs(self, deadline: float, now: float):
+        """Потоки записи целей (режим fan-out): запись, которая не возвращается."""
+        for name, writer in list(self.engine.writers.items()):
+            started = writer.write_started
+            if not started or now - started < deadline or self._reported.get(name) == started:
+                continue
+            self._reported[name] = started
+            self._record(name, STALL_BLOCKED, now - started, self._fail_target(name, now - started))
+
+    def _fail_target(self, name: str, silent: float) -> bool:
+        supervisor = self.engine.supervisor
+        if supervisor is None:
+            return False
+        supervisor.fail(name, f"{STALL_LABELS[STALL_BLOCKED]} {silent * 1000:.0f} мс")
+        return True
+
+    def _record(self, stream: str, kind: str, silent: float, recovered: bool):
+        record = StallRecord(time.time(), stream, kind, round(silent * 1000, 1), recovered)
+        self.engine.record_stall(record)
+        if not recovered:
+            outcome = "перезапуск не удался"
+        else:
+            outcome = "устройство перезапускает надзор" if kind == STALL_BLOCKED else "поток перезапущен"
+        log.warning("⏳ %s: %s %.0f мс (%s) - %s", stream, STALL_LABELS[kind], record.silent_ms, kind, outcome)
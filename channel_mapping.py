@@ -0,0 +1,154 @@
+"""
+Channel Mapping для AudioForwarderApp
+Раскладка каналов для каждой цели: моно, L/R, перестановка, апмикс 5.1
+и выбор каналов многоканального источника.
+
+Каждая раскладка компилируется в маленькую матрицу (входные × выходные каналы)
+и применяется к блоку одним умножением матриц в заранее выделенный буфер.
+"""
+from typing import Dict, NamedTuple, Tuple
+import numpy as np
+
+
+# Раскладки для интерфейса: ключ → описание
+CHANNEL_MAP_PRESETS: Dict[str, str] = {
+    'stereo': "Стерео (L, R)",
+    'mono': "Моно (L+R)",
+    'left': "Только L (моно)",
+    'right': "Только R (моно)",
+    'swap': "Стерео, L ↔ R",
+    '5.1': "Апмикс стерео → 5.1",
+}
+
+DEFAULT_CHANNEL_MAP = 'stereo'
+
+# Коэффициенты апмикса 5.1 (FL, FR, C, LFE, SL, SR)
+_CENTER_GAIN = 0.5 * 0.7071
+_LFE_GAIN = 0.5
+_SURROUND_GAIN = 0.7071
+
+
+class ChannelMap(NamedTuple):
+    """Скомпилированная раскладка каналов."""
+    spec: str
+    matrix: np.ndarray  # (входные каналы, выходные каналы)
+
+    @property
+    def in_channels(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def out_channels(self) -> int:
+        return self.matrix.shape[1]
+
+    def apply(self, block: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Применяет раскладку к блоку.
+
+        Args:
+            block: Блок (frames, входные каналы)
+            out: Буфер (>= frames, выходные каналы)
+
+        Returns:
+            np.ndarray: Представление out[:frames]
+        """
+        frames = len(block)
+        result = out[:frames]
+        np.matmul(block, self.matrix, out=result)
+        return result
+
+    def allocate(self, blocksize: int) -> np.ndarray:
+        """Выделяет выходной буфер под раскладку."""
+        return np.zeros((blocksize, self.out_channels), dtype=np.float32)
+
+
+def _parse_pick(spec: str) -> Tuple[int, ...]:
+    """Разбирает 'pick:3,4' в индексы каналов (с нуля)."""
+    try:
+        channels = tuple(int(part) - 1 for part in spec.split(':', 1)[1].split(',') if part.strip())
+    except ValueError:
+        raise ValueError(f"Неверная раскладка каналов: {spec}")
+    if not channels or min(channels) < 0:
+        raise ValueError(f"Неверная раскладка каналов: {spec}")
+    return channels
+
+
+def required_input_channels(spec: str) -> int:
+    """Сколько каналов источника нужно раскладке."""
+    if spec.startswith('pick:'):
+        return max(_parse_pick(spec)) + 1
+    if spec in ('stereo', 'swap', '5.1', 'mono', 'right'):
+        return 2
+    return 1
+
+
+def output_channels(spec: str) -> int:
+    """Сколько каналов раскладка отдает на устройство."""
+    if spec.startswith('pick:'):
+        return len(_parse_pick(spec))
+    return {'mono': 1, 'left': 1, 'right': 1, '5.1': 6}.get(spec, 2)
+
+
+def compile_channel_map(spec: str, in_channels: int) -> ChannelMap:
+    """
+    Компилирует раскладку в матрицу.
+
+    Args:
+        spec: Ключ из CHANNEL_MAP_PRESETS или 'pick:N,M,...' (номера каналов с 1)
+        in_channels: Количество каналов в буфере движка
+
+    Returns:
+        ChannelMap: Раскладка с матрицей (in_channels, out_channels)
+    """
+    spec = (spec or DEFAULT_CHANNEL_MAP).strip()
+    out_ch = output_channels(spec)
+    matrix = np.zeros((in_channels, out_ch), dtype=np.float32)
+
+    # Моно-источник ведет себя как стерео с одинаковыми каналами
+    left = 0
+    right = 1 if in_channels > 1 else 0
+
+    if spec.startswith('pick:'):
+        for out_index, in_index in enumerate(_parse_pick(spec)):
+            if in_index < in_channels:
+                matrix[in_index, out_index] = 1.0
+    elif spec == 'stereo':
+        matrix[left, 0] = 1.0
+        matrix[right, 1] = 1.0
+    elif spec == 'swap':
+        matrix[right, 0] = 1.0
+        matrix[left, 1] = 1.0
+    elif spec == 'mono':
+        matrix[left, 0] += 0.5
+        matrix[right, 0] += 0.5
+    elif spec == 'left':
+        matrix[left, 0] = 1.0
+    elif spec == 'right':
+        matrix[right, 0] = 1.0
+    elif spec == '5.1':
+        matrix[left, 0] = 1.0                 # FL
+        matrix[right, 1] = 1.0                # FR
+        matrix[left, 2] += _CENTER_GAIN       # C
+        matrix[right, 2] += _CENTER_GAIN
+        matrix[left, 3] += _LFE_GAIN          # LFE
+        matrix[right, 3] += _LFE_GAIN
+        matrix[left, 4] = _SURROUND_GAIN      # SL
+        matrix[right, 5] = _SURROUND_GAIN     # SR
+    else:
+        raise ValueError(f"Неизвестная раскладка каналов: {spec}")
+
+    return ChannelMap(spec, matrix)
+
+
+def fit_to_device(spec: str, max_output_channels: int) -> str:
+    """
+    Подбирает раскладку под возможности устройства.
+
+    Если устройство не принимает столько каналов, стерео и 5.1 сводятся к
+    стерео или моно, чтобы поток вообще открылся.
+    """
+    if max_output_channels <= 0 or output_channels(spec) <= max_output_channels:
+        return spec
+    if max_output_channels == 1:
+        return 'mono'
+    return 'stereo'
@@ -0,0 +1,149 @@
+"""
+Delay Line для AudioForwarderApp
+Линия задержки цели с плавной сменой задержки.
+
+Блоки пишутся в кольцевой буфер сэмплов фиксированного размера, выход
+читается со смещением на текущую задержку. При изменении задержки выход
+в течение заданного времени плавно переходит (кроссфейд) со старой позиции
+чтения на новую: ни пауз при увеличении задержки, ни сброса буфера и
+пачек отброшенного звука при уменьшении.
+"""
+from typing import Dict, Optional
+import numpy as np
+
+
+MAX_DELAY_MS = 10000  # Верхний предел задержки в интерфейсе
+DEFAULT_DELAY_CROSSFADE_MS = 50
+
+# Варианты для интерфейса: мс → описание
+DELAY_CROSSFADE_OPTIONS = {
+    0: "Мгновенно",
+    20: "20 мс",
+    50: "50 мс",
+    100: "100 мс",
+    250: "250 мс",
+}
+
+
+class DelayLine:
+    """
+    Кольцевой буфер сэмплов с чтением по задержке.
+
+    Память выделяется один раз; в callback только копирование срезов и
+    арифметика numpy с параметром out.
+    """
+
+    def __init__(self, max_delay_frames: int, blocksize: int, channels: int):
+        """
+        Args:
+            max_delay_frames: Максимальная задержка в фреймах
+            blocksize: Максимальный размер блока в фреймах
+            channels: Количество каналов
+        """
+        self.capacity = int(max_delay_frames) + 2 * blocksize
+        self.blocksize = blocksize
+        self.channels = channels
+        self._buffer = np.zeros((self.capacity, channels), dtype=np.float32)
+        self._out = np.zeros((blocksize, channels), dtype=np.float32)
+        self._next = np.zeros((blocksize, channels), dtype=np.float32)
+        self._ramps: Dict[int, np.ndarray] = {}
+        self._write = 0  # Абсолютный номер следующего записываемого фрейма
+
+        self.delay: Optional[int] = None    # Текущая задержка (фреймы)
+        self._fade_to: Optional[int] = None  # Задержка, к которой идет кроссфейд
+        self._fade_pos = 0
+        self._fade_ramp: Optional[np.ndarray] = None
+        self.crossfades = 0
+
+    @property
+    def max_delay(self) -> int:
+        return self.capacity - 2 * self.blocksize
+
+    @property
+    def fading(self) -> bool:
+        return self._fade_to is not None
+
+    def __len__(self):
+        """Текущая задержка в блоках (для диагностики)."""
+        return (self.delay or 0) // self.blocksize
+
+    def clear(self):
+        """Заполняет линию тишиной (задержка сохраняется)."""
+        self._buffer[...] = 0.0
+        self._fade_to = None
+
+    def _ramp(self, fade_frames: int) -> np.ndarray:
+        ramp = self._ramps.get(fade_frames)
+        if ramp is None:
+            # Линейный кроссфейд: старая и новая позиции читают один и тот же сигнал
+            ramp = ((np.arange(fade_frames, dtype=np.float32) + 0.5) / fade_frames)[:, None]
+            self._ramps[fade_frames] = ramp
+        return ramp
+
+    def _read_into(self, dst: np.ndarray, start: int, frames: int):
+        index = start % self.capacity
+        first = min(frames, self.capacity - index)
+        dst[:first] = self._buffer[index:index + first]
+        if first < frames:
+            dst[first:frames] = self._buffer[:frames - first]
+
+    def process(self, block: np.ndarray, delay_frames: int, fade_frames: int = 0) -> np.ndarray:
+        """
+        Записывает блок и возвращает задержанный выход того же размера.
+
+        Args:
+            block: Входной блок (frames, channels)
+            delay_frames: Требуемая задержка в фреймах
+            fade_frames: Длительность кроссфейда при смене задержки
+
+        Returns:
+            np.ndarray: Представление заранее выделенного буфера (frames, channels)
+        """
+        frames = len(block)
+        delay_frames = max(0, min(int(delay_frames), self.max_delay))
+
+        # Запись блока в кольцо
+        index = self._write % self.capacity
+        first = min(frames, self.capacity - index)
+        self._buffer[index:index + first] = block[:first]
+        if first < frames:
+            self._buffer[:frames - first] = block[first:]
+        self._write += frames
+
+        if self.delay is None:
+            self.delay = delay_frames
+        elif not self.fading and delay_frames != self.delay:
+            if fade_frames <= 0:
+                self.delay = delay_frames
+            else:
+                # Новая смена во время кроссфейда ждет его окончания
+                self._fade_to = delay_frames
+                self._fade_pos = 0
+                self._fade_ramp = self._ramp(fade_frames)
+                self.crossfades += 1
+
+        out = self._out[:frames]
+        base = self._write - frames
+        self._read_into(out, base - self.delay, frames)
+        if not self.fading:
+            return out
+
+        incoming = self._next[:frames]
+        self._read_into(incoming, base - self._fade_to, frames)
+        ramp = self._fade_ramp
+        position = self._fade_pos
+        count = max(0, min(frames, len(ramp) - position))
+        if count:
+            # out = out + (incoming - out) * ramp
+            segment = ramp[position:position + count]
+            np.subtract(incoming[:count], out[:count], out=incoming[:count])
+            np.multiply(incoming[:count], segment, out=incoming[:count])
+            np.add(out[:count], incoming[:count], out=out[:count])
+        if count < frames:
+            # Кроссфейд закончился внутри блока - остаток читается с новой позиции
+            self._read_into(out[count:], base + count - self._fade_to, frames - count)
+        self._fade_pos = position + frames
+        if self._fade_pos >= len(ramp):
+            self.delay = self._fade_to
+            self._fade_to = None
+        return out
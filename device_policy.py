@@ -0,0 +1,303 @@
+"""
+Device Policy для AudioForwarderApp
+Правила выбора устройств: роли, фильтры по именам и приоритет аудио-интерфейсов.
+
+Одно и то же физическое устройство PortAudio показывает под каждым
+аудио-интерфейсом (MME, DirectSound, WASAPI, ...). MME дает самую большую
+задержку, поэтому вместо фильтра "только MME" устройства группируются по
+полному имени, и из группы выбирается рабочий вариант с интерфейсом выше в
+списке host_apis, а при равенстве - с меньшей заявленной задержкой. MME
+обрезает имена до 31 символа: обрезанное имя присоединяется к группе, чье
+полное имя начинается с него, только если такая группа одна (два устройства
+с общим началом имени не сливаются).
+
+Политика - словарь (хранится в настройках как есть):
+
+    host_apis            интерфейсы в порядке предпочтения (остальные - после них)
+    exclude_host_apis    интерфейсы, которые не используются совсем
+    exclude              регулярные выражения: исключить устройство в любой роли
+    source_include       источники: только подходящие (пусто - любые входы)
+    source_exclude       источники: исключить
+    target_include       цели: только подходящие (пусто - любые выходы)
+    target_exclude       цели: исключить
+    output_only_targets  цели - только устройства без входов (защита от петель)
+
+Регулярные выражения компилируются один раз на сканирование (compile_policy).
+Скомпилированная политика и группы последнего сканирования запоминаются:
+resolve_device при открытии потоков берет их оттуда, а не перечисляет
+устройства заново. Кеш сбрасывают set_device_policy и invalidate_device_cache
+(после переинициализации PortAudio индексы устройств меняются).
+"""
+import re
+import sys
+from typing import Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+import sounddevice as sd
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+ROLE_SOURCE = 'source'
+ROLE_TARGET = 'target'
+
+MME_HOST_API = "MME"
+MME_NAME_LIMIT = 31  # MME обрезает имена устройств до 31 символа
+
+if sys.platform == 'win32':
+    _DEFAULT_HOST_APIS = ["ASIO", "Windows WASAPI", "Windows DirectSound", "MME"]
+    _DEFAULT_EXCLUDED_APIS = ["Windows WDM-KS"]  # Другие имена устройств и нестабильные драйверы
+    _DEFAULT_SOURCES = [r"Line \d+ \(Virtual Audio Cable\)"]
+elif sys.platform == 'darwin':
+    _DEFAULT_HOST_APIS = ["Core Audio"]
+    _DEFAULT_EXCLUDED_APIS = []
+    _DEFAULT_SOURCES = []
+else:
+    _DEFAULT_HOST_APIS = ["JACK Audio Connection Kit", "ALSA"]
+    _DEFAULT_EXCLUDED_APIS = []
+    _DEFAULT_SOURCES = []
+
+DEFAULT_DEVICE_POLICY = {
+    'host_apis': _DEFAULT_HOST_APIS,
+    'exclude_host_apis': _DEFAULT_EXCLUDED_APIS,
+    # Системные виртуальные устройства Windows
+    'exclude': [r"Mapper", r"Переназначение звуковых устр", r"Primary Sound Driver",
+                r"Основной звуковой драйвер"],
+    'source_include': _DEFAULT_SOURCES,
+    'source_exclude': [],
+    'target_include': [],
+    'target_exclude': list(_DEFAULT_SOURCES),  # Линии Virtual Audio Cable - только источники
+    'output_only_targets': sys.platform == 'win32',
+}
+
+
+class CompiledPolicy(NamedTuple):
+    api_rank: Dict[str, int]
+    excluded_apis: frozenset
+    exclude: Optional[Pattern]
+    source_include: Optional[Pattern]
+    source_exclude: Optional[Pattern]
+    target_include: Optional[Pattern]
+    target_exclude: Optional[Pattern]
+    output_only_targets: bool
+
+
+class DeviceChoice(NamedTuple):
+    name: str          # Имя выбранного варианта (показывается в интерфейсе)
+    index: int         # Индекс устройства PortAudio
+    host_api: str
+    channels: int      # Каналов в роли (входов для источника, выходов для цели)
+    latency_ms: float  # Заявленная минимальная задержка
+
+
+class DeviceScan(NamedTuple):
+    sources: List[DeviceChoice]
+    targets: List[DeviceChoice]
+
+
+_policy = dict(DEFAULT_DEVICE_POLICY)
+_scan_cache: Optional[Tuple[CompiledPolicy, Dict[str, Dict[str, List[Tuple[tuple, DeviceChoice]]]]]] = None
+
+
+def set_device_policy(policy: Optional[dict]):
+    """Устанавливает политику процесса (недостающие ключи - по умолчанию; с ошибкой - вся по умолчанию)."""
+    global _policy
+    invalidate_device_cache()
+    merged = dict(DEFAULT_DEVICE_POLICY, **(policy or {}))
+    try:
+        compile_policy(merged)
+    except (re.error, KeyError, TypeError) as e:
+        log.warning(f"⚠️ Ошибка в политике устройств ({e}) - используются правила по умолчанию")
+        merged = dict(DEFAULT_DEVICE_POLICY)
+    _policy = merged
+
+
+def device_policy() -> dict:
+    return _policy
+
+
+def invalidate_device_cache():
+    """Забывает группы последнего сканирования (список устройств PortAudio изменился)."""
+    global _scan_cache
+    _scan_cache = None
+
+
+def device_key(name: str) -> str:
+    """Ключ группы: полное имя устройства без учета регистра."""
+    return str(name).strip().casefold()
+
+
+def _truncated_group(key: str, groups: Dict[str, list]) -> Optional[str]:
+    """
+    Группа для имени, обрезанного MME: единственная группа, чье имя начинается с него.
+
+    Returns:
+        Optional[str]: Ключ группы или None (имя не обрезано, совпадений нет или их несколько)
+    """
+    if len(key) < MME_NAME_LIMIT - 1:
+        return None  # Короче предела (с учетом пробела, срезанного strip) - имя не обрезано
+    matches = [group for group in groups if group != key and group.startswith(key)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _group(groups: Dict[str, List[Tuple[tuple, DeviceChoice]]], key: str) -> Optional[List[Tuple[tuple, DeviceChoice]]]:
+    """Варианты устройства по ключу (для обрезанного имени - по единственной подходящей группе)."""
+    candidates = groups.get(key)
+    if candidates is None:
+        candidates = groups.get(_truncated_group(key, groups))
+    return candidates
+
+
+def _union(patterns: Sequence[str]) -> Optional[Pattern]:
+    """Одно выражение из списка (None для пустого списка)."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE)
+
+
+def compile_policy(policy: Optional[dict] = None) -> CompiledPolicy:
+    """
+    Компилирует регулярные выражения политики.
+
+    Raises:
+        re.error: Если выражение в политике некорректно
+    """
+    policy = dict(DEFAULT_DEVICE_POLICY, **(policy or _policy))
+    return CompiledPolicy(
+        api_rank={name: rank for rank, name in enumerate(policy['host_apis'])},
+        excluded_apis=frozenset(policy['exclude_host_apis']),
+        exclude=_union(policy['exclude']),
+        source_include=_union(policy['source_include']),
+        source_exclude=_union(policy['source_exclude']),
+        target_include=_union(policy['target_include']),
+        target_exclude=_union(policy['target_exclude']),
+        output_only_targets=bool(policy['output_only_targets']),
+    )
+
+
+def _allowed(name: str, include: Optional[Pattern], exclude: Optional[Pattern]) -> bool:
+    return (include is None or include.search(name) is not None) and \
+        (exclude is None or exclude.search(name) is None)
+
+
+def _host_api_names() -> Dict[int, str]:
+    try:
+        return {index: str(api.get('name', 'Unknown')) for index, api in enumerate(sd.query_hostapis())}  # type: ignore
+    except Exception:
+        return {}
+
+
+def _candidates(compiled: CompiledPolicy, role: str) -> Dict[str, List[Tuple[tuple, DeviceChoice]]]:
+    """Подходящие устройства роли, сгруппированные по ключу и отсортированные по предпочтению."""
+    host_apis = _host_api_names()
+    channel_key = 'max_input_channels' if role == ROLE_SOURCE else 'max_output_channels'
+    latency_key = 'default_low_input_latency' if role == ROLE_SOURCE else 'default_low_output_latency'
+    include, exclude = ((compiled.source_include, compiled.source_exclude) if role == ROLE_SOURCE
+                        else (compiled.target_include, compiled.target_exclude))
+    groups: Dict[str, List[Tuple[tuple, DeviceChoice]]] = {}
+    truncated: List[Tuple[tuple, DeviceChoice]] = []
+    for device in sd.query_devices():
+        name = str(device.get('name', ''))  # type: ignore
+        host_api = host_apis.get(device.get('hostapi', -1), 'Unknown')  # type: ignore
+        if device.get(channel_key, 0) <= 0 or host_api in compiled.excluded_apis:  # type: ignore
+            continue
+        if role == ROLE_TARGET and compiled.output_only_targets and device.get('max_input_channels', 0) > 0:  # type: ignore
+            continue
+        if compiled.exclude is not None and compiled.exclude.search(name):
+            continue
+        if not _allowed(name, include, exclude):
+            continue
+        latency_ms = float(device.get(latency_key, 0) or 0) * 1000  # type: ignore
+        rank = (compiled.api_rank.get(host_api, len(compiled.api_rank)), latency_ms)
+        choice = DeviceChoice(name, int(device.get('index', -1)), host_api,  # type: ignore
+                              int(device.get(channel_key, 0)), latency_ms)  # type: ignore
+        if host_api == MME_HOST_API:
+            truncated.append((rank, choice))  # Группа MME-варианта - после полных имен
+        else:
+            groups.setdefault(device_key(name), []).append((rank, choice))
+    full_names = dict(groups)
+    for rank, choice in truncated:
+        key = device_key(choice.name)
+        if key not in full_names:
+            key = _truncated_group(key, full_names) or key
+        groups.setdefault(key, []).append((rank, choice))
+    for candidates in groups.values():
+        candidates.sort(key=lambda item: item[0])
+    return groups
+
+
+def _works(choice: DeviceChoice, role: str, sample_rate: Optional[int]) -> bool:
+    """Устройство принимает частоту дискретизации (без открытия потока)."""
+    if not sample_rate:
+        return True
+    check = sd.check_input_settings if role == ROLE_SOURCE else sd.check_output_settings
+    try:
+        check(device=choice.index, samplerate=sample_rate, channels=min(2, choice.channels))
+        return True
+    except Exception:
+        return False
+
+
+def _pick(candidates: List[Tuple[tuple, DeviceChoice]], role: str, sample_rate: Optional[int]) -> Optional[DeviceChoice]:
+    """Лучший рабочий вариант группы (если ни один не прошел проверку - лучший по рангу)."""
+    for _, choice in candidates:
+        if _works(choice, role, sample_rate):
+            return choice
+    return candidates[0][1] if candidates else None
+
+
+def discover_devices(sample_rate: Optional[int] = None, policy: Optional[dict] = None) -> DeviceScan:
+    """
+    Сканирует устройства по политике: по одному варианту на физическое устройство.
+
+    Args:
+        sample_rate: Частота для проверки работоспособности (None - без проверки)
+        policy: Политика (по умолчанию - установленная set_device_policy)
+    """
+    global _scan_cache
+    compiled = compile_policy(policy)
+    groups = {role: _candidates(compiled, role) for role in (ROLE_SOURCE, ROLE_TARGET)}
+    if policy is None:
+        _scan_cache = (compiled, groups)
+    scan = []
+    for role in (ROLE_SOURCE, ROLE_TARGET):
+        chosen = []
+        for candidates in groups[role].values():
+            choice = _pick(candidates, role, sample_rate)
+            if choice is not None:
+                chosen.append(choice)
+        scan.append(chosen)
+    return DeviceScan(*scan)
+
+
+def resolve_device(name: str, role: str, sample_rate: Optional[int] = None,
+                   policy: Optional[dict] = None) -> Optional[int]:
+    """
+    Индекс устройства для имени в роли: тот же выбор интерфейса, что и при сканировании.
+
+    Имя из старых настроек (обрезанное MME) находит ту же группу. Группы
+    берутся из последнего сканирования по политике процесса; если имени там
+    нет (устройство подключили позже), устройства перечисляются заново. Если
+    устройство не проходит фильтры политики, ищется точное совпадение имени
+    с подходящими каналами.
+    """
+    global _scan_cache
+    key = device_key(name)
+    cache = _scan_cache if policy is None else None
+    candidates = _group(cache[1].get(role, {}), key) if cache is not None else None
+    if not candidates:
+        compiled = compile_policy(policy)
+        groups = _candidates(compiled, role)
+        if policy is None:
+            _scan_cache = (compiled, dict(cache[1] if cache is not None else {}, **{role: groups}))
+        candidates = _group(groups, key)
+    if candidates:
+        return _pick(candidates, role, sample_rate).index
+    channel_key = 'max_input_channels' if role == ROLE_SOURCE else 'max_output_channels'
+    try:
+        for device in sd.query_devices():
+            if str(device.get('name', '')) == name and device.get(channel_key, 0) > 0:  # type: ignore
+                return device.get('index', None)  # type: ignore
+    except Exception as e:
+        log.warning(f"Ошибка получения ID устройства: {e}")
+    return None
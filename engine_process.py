@@ -0,0 +1,407 @@
+"""
+Engine Process для AudioForwarderApp
+Запуск аудио-движка в отдельном процессе.
+
+Захват, обработка и вывод выполняются в дочернем процессе со своим GIL и
+сборщиком мусора, поэтому задержки интерфейса Flet, таймер статуса и сканер
+приложений не вызывают срывов звука. Между процессами передаются:
+
+* блоки основного источника - кольцо в разделяемой памяти (для защиты от петель);
+* телеметрия - блок в разделяемой памяти (статистика для статус-бара);
+* уровни источников и целей - массив в разделяемой памяти (индикаторы);
+* сэмплы для спектра - кольцо в разделяемой памяти (БПФ считает GUI);
+* команды и события - небольшой канал Pipe.
+
+Команды GUI → движок (кортежи):
+    ('delay', цель, мс), ('volume', цель, дБ), ('gain', источник, цель, дБ|None),
+    ('channel_map', цель, раскладка), ('dither', цель, bool), ('drop_policy', цель, политика),
+    ('jitter_limits', цель, (мин_мс, макс_мс)), ('delay_crossfade', мс), ('idle_policy', политика),
+    ('stall_deadline', мс), ('auto_align', bool),
+    ('attach', цель, настройки цели), ('detach', цель), ('swap_source', источник),
+    ('record', папка | None, размер_МБ, минуты), ('spectrum', источник спектра | None),
+    ('routing', кортеж разрешенных целей | None), ('loop_guard', bool), ('stop',)
+
+События движок → GUI:
+    ('started', {...}), ('message', текст), ('channel_map', цель, применено),
+    ('attached', цель, успех), ('detached', цель), ('source_swapped', источник, успех),
+    ('recording', идет запись, список файлов), ('meter_rows', источники, {цель: номер}),
+    ('health', {цель: кортеж DeviceHealth}), ('latency', {цель: кортеж TargetLatency}), ('stopped', None)
+"""
+import collections
+import gc
+import multiprocessing
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from audio_engine import AudioEngine, EngineState
+from callback_watchdog import DEFAULT_STALL_DEADLINE_MS
+from device_policy import device_policy, set_device_policy
+from latency import DEFAULT_AUTO_ALIGN, LATENCY_UI_INTERVAL
+from delay_line import DEFAULT_DELAY_CROSSFADE_MS
+from idle_mode import DEFAULT_IDLE_POLICY
+from level_meters import MAX_METER_CHANNELS, METER_ROWS, LevelMeterReader
+from shm_ring import SharedFrameRing, SharedLevels, SharedSpectrumRing, SharedTelemetry
+from spectrum_analyzer import SPECTRUM_RING_SAMPLES
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+TELEMETRY_INTERVAL = 0.1  # Публикация телеметрии 10 раз в секунду
+SOURCE_RING_BLOCKS = 32
+SOURCE_RING_CHANNELS = 2
+
+# Настройки цели из GUI → поле EngineState
+DEVICE_SETTING_FIELDS = {
+    'delay': 'delays',
+    'volume': 'volumes',
+    'channel_map': 'channel_maps',
+    'sample_format': 'sample_formats',
+    'dither': 'dither_enabled',
+    'drop_policy': 'drop_policies',
+    'jitter_limits': 'jitter_limits',
+}
+
+
+class TargetMask:
+    """Маска разрешенных целей, присланная из GUI (аналог RoutingSnapshot.allows)."""
+
+    __slots__ = ('enabled',)
+
+    def __init__(self, enabled: Optional[Sequence[str]] = None):
+        self.enabled = frozenset(enabled) if enabled is not None else None
+
+    def allows(self, device_name: str) -> bool:
+        return self.enabled is None or device_name in self.enabled
+
+
+def _raise_priority():
+    """Повышает приоритет процесса движка (если позволяет система)."""
+    try:
+        import psutil
+        process = psutil.Process()
+        if hasattr(psutil, 'HIGH_PRIORITY_CLASS'):
+            process.nice(psutil.HIGH_PRIORITY_CLASS)
+        else:
+            process.nice(-5)
+    except Exception:
+        pass
+
+
+def _engine_stats_values(engine: AudioEngine, source_ring: SharedFrameRing) -> Dict[str, float]:
+    stats = engine.stats
+    return dict({
+        'heartbeat': time.time(),
+        'start_time': stats['start_time'] or 0.0,
+        'total_frames': stats['total_frames'],
+        'total_callbacks': stats['total_callbacks'],
+        'errors_count': stats['errors_count'],
+        'data_processed_mb': stats['data_processed_mb'],
+        'last_callback_time': stats['last_callback_time'],
+        'active_streams': sum(1 for stream, _ in engine.target_streams if getattr(stream, 'active', False)),
+        'source_overruns': source_ring.overruns,
+        'writer_drops': sum(w.dropped_full + w.dropped_stale for w in engine.writers.values()),
+        'recording_overflows': engine.recorder.overflows if engine.recorder is not None else 0,
+        'idle': stats.get('idle', False),
+        'stalls': stats.get('stalls', 0),
+        'last_stall_time': stats.get('last_stall_time', 0),
+    }, **engine.network_stats())
+
+
+def _send_meter_rows(engine: AudioEngine, conn):
+    """Сообщает GUI, в каких строках массива уровней какие источники и цели."""
+    conn.send(('meter_rows', engine.meters.source_names, dict(engine.meters.target_rows)))
+
+
+def _apply_command(engine: AudioEngine, control: dict, command: Tuple, conn) -> bool:
+    """
+    Применяет команду GUI в процессе движка.
+
+    Returns:
+        bool: False для команды остановки
+    """
+    kind = command[0]
+    state = engine.state
+    if kind == 'stop':
+        return False
+    if kind == 'delay':
+        state.delays[command[1]] = command[2]
+    elif kind == 'volume':
+        state.volumes[command[1]] = command[2]
+    elif kind == 'gain':
+        _, source, target, gain_db = command
+        cells = state.routing_matrix.setdefault(target, {})
+        if gain_db is None:
+            cells.pop(source, None)
+        else:
+            cells[source] = gain_db
+        engine.set_gain(source, target, gain_db)
+    elif kind == 'channel_map':
+        state.channel_maps[command[1]] = command[2]
+        conn.send(('channel_map', command[1], engine.set_channel_map(command[1], command[2])))
+    elif kind == 'dither':
+        state.dither_enabled[command[1]] = bool(command[2])
+        engine.set_dither(command[1], command[2])
+    elif kind == 'drop_policy':
+        state.drop_policies[command[1]] = command[2]
+        engine.set_drop_policy(command[1], command[2])
+    elif kind == 'jitter_limits':
+        state.jitter_limits[command[1]] = tuple(command[2])
+        engine.set_jitter_limits(command[1], *command[2])
+    elif kind == 'delay_crossfade':
+        engine.set_delay_crossfade(command[1])
+    elif kind == 'idle_policy':
+        engine.set_idle_policy(command[1])
+    elif kind == 'stall_deadline':
+        engine.set_stall_deadline(command[1])
+    elif kind == 'auto_align':
+        engine.set_auto_align(command[1])
+    elif kind == 'attach':
+        _, target, settings = command
+        for key, value in settings.items():
+            field = DEVICE_SETTING_FIELDS.get(key)
+            if field is not None:
+                getattr(state, field)[target] = value
+        conn.send(('attached', target, engine.attach_target(target)))
+        _send_meter_rows(engine, conn)
+    elif kind == 'detach':
+        engine.detach_target(command[1])
+        conn.send(('detached', command[1]))
+        _send_meter_rows(engine, conn)
+    elif kind == 'swap_source':
+        conn.send(('source_swapped', command[1], engine.swap_source(command[1])))
+        _send_meter_rows(engine, conn)
+    elif kind == 'record':
+        _, directory, rotate_mb, rotate_minutes = command
+        if directory is None:
+            conn.send(('recording', False, engine.stop_recording()))
+        else:
+            conn.send(('recording', engine.start_recording(directory, rotate_mb, rotate_minutes), []))
+    elif kind == 'spectrum':
+        engine.set_spectrum(command[1])
+    elif kind == 'routing':
+        # Новая маска публикуется одним присваиванием ссылки
+        control['routing'] = TargetMask(command[1])
+    elif kind == 'loop_guard':
+        control['loop_guard'] = bool(command[1])
+    return True
+
+
+def run_engine_process(config: dict, conn, ring_descriptor: dict, telemetry_descriptor: dict,
+                       levels_descriptor: dict, spectrum_descriptor: dict):
+    """
+    Точка входа процесса движка.
+
+    Args:
+        config: Источник, цели, частота, размер блока и EngineState.to_dict()
+        conn: Конец Pipe для команд и событий
+        ring_descriptor: Описание кольца блоков источника
+        telemetry_descriptor: Описание блока телеметрии
+        levels_descriptor: Описание массива уровней
+        spectrum_descriptor: Описание кольца спектра
+    """
+    source_ring = SharedFrameRing.attach(ring_descriptor)
+    telemetry = SharedTelemetry.attach(telemetry_descriptor)
+    levels = SharedLevels.attach(levels_descriptor)
+    spectrum_ring = SharedSpectrumRing.attach(spectrum_descriptor)
+    _raise_priority()
+    # Тот же выбор вариантов устройств, что и в GUI
+    set_device_policy(config.get('device_policy'))
+
+    control = {'routing': TargetMask(config.get('enabled_targets')), 'loop_guard': False}
+    # Сообщения приходят и из потока надзора: в канал пишет только основной цикл
+    messages = collections.deque()
+    engine = AudioEngine(
+        config['source'], config['targets'], EngineState.from_dict(config['state']),
+        config['sample_rate'], config['blocksize'],
+        notify=messages.append,
+        loop_detector=lambda indata, name: control['loop_guard'],
+        routing_provider=lambda: control['routing'],
+        delay_debug_mode=config.get('delay_debug_mode', False),
+        fanout=config.get('fanout', False),
+        adaptive_jitter=config.get('adaptive_jitter', False),
+        delay_crossfade_ms=config.get('delay_crossfade_ms', DEFAULT_DELAY_CROSSFADE_MS),
+        file_loop=config.get('file_loop', True),
+        file_realtime=config.get('file_realtime', True),
+        shared_levels=levels,
+        shared_spectrum=spectrum_ring,
+        idle_policy=config.get('idle_policy', DEFAULT_IDLE_POLICY),
+        stall_deadline_ms=config.get('stall_deadline_ms', DEFAULT_STALL_DEADLINE_MS),
+        auto_align=config.get('auto_align', DEFAULT_AUTO_ALIGN)
+    )
+    engine.set_spectrum(config.get('spectrum'))
+    engine.source_taps.append(source_ring.push)
+
+    try:
+        if not engine.open():
+            return
+        engine.create_input_stream().start()
+        # Все объекты настройки созданы - исключаем их из сборки мусора
+        gc.collect()
+        gc.freeze()
+        conn.send(('started', {'targets': [name for _, name in engine.target_streams],
+                               'sources': list(engine.sources),
+                               'channels': engine.input_channels}))
+        _send_meter_rows(engine, conn)
+        log.info(f"🧩 Движок запущен в отдельном процессе: {config['source']} → {len(engine.target_streams)} устройств")
+        next_publish = 0.0
+        next_latency = 0.0
+        health = {}
+        running = True
+        while running:
+            if conn.poll(TELEMETRY_INTERVAL / 2):
+                try:
+                    running = _apply_command(engine, control, conn.recv(), conn)
+                except EOFError:
+                    break  # GUI-процесс завершился
+            while messages:
+                conn.send(('message', messages.popleft()))
+            now = time.time()
+            if now >= next_publish:
+                telemetry.publish(_engine_stats_values(engine, source_ring),
+                                  engine.stats['callback_intervals'])
+                current = {name: tuple(state) for name, state in engine.device_health().items()}
+                if current != health:
+                    health = current
+                    conn.send(('health', health))
+                next_publish = now + TELEMETRY_INTERVAL
+            if now >= next_latency:
+                conn.send(('latency', {name: tuple(latency) for name, latency in engine.latency_report().items()}))
+                next_latency = now + LATENCY_UI_INTERVAL
+    except Exception as e:
+        try:
+            conn.send(('message', f"Ошибка в аудиопотоке: {e}"))
+        except (BrokenPipeError, OSError):
+            pass
+    finally:
+        engine.close()
+        telemetry.publish(_engine_stats_values(engine, source_ring), ())
+        try:
+            while messages:
+                conn.send(('message', messages.popleft()))
+            conn.send(('stopped', None))
+        except (BrokenPipeError, OSError):
+            pass
+        source_ring.close()
+        telemetry.close()
+        engine.meters = engine.spectrum = None  # Представления массивов - до закрытия сегментов
+        levels.close()
+        spectrum_ring.close()
+
+
+class EngineProcessClient:
+    """
+    Сторона GUI: запуск процесса движка, команды, события и телеметрия.
+
+    Разделяемая память создается и удаляется здесь; процесс движка только
+    подключается к ней.
+    """
+
+    def __init__(self, ring_blocks: int = SOURCE_RING_BLOCKS):
+        self.ring_blocks = ring_blocks
+        self.process: Optional[multiprocessing.Process] = None
+        self.source_ring: Optional[SharedFrameRing] = None
+        self.telemetry: Optional[SharedTelemetry] = None
+        self.levels: Optional[SharedLevels] = None
+        self.meter_reader: Optional[LevelMeterReader] = None
+        self.spectrum_ring: Optional[SharedSpectrumRing] = None
+        self._conn = None
+        self._send_lock = threading.Lock()
+
+    def start(self, source_name: str, targets: Sequence[str], state: EngineState,
+              sample_rate: int, blocksize: int, enabled_targets: Optional[Sequence[str]] = None,
+              delay_debug_mode: bool = False, fanout: bool = False, adaptive_jitter: bool = False,
+              delay_crossfade_ms: float = DEFAULT_DELAY_CROSSFADE_MS,
+              file_loop: bool = True, file_realtime: bool = True, spectrum: Optional[str] = None,
+              idle_policy: str = DEFAULT_IDLE_POLICY, stall_deadline_ms: float = DEFAULT_STALL_DEADLINE_MS,
+              auto_align: bool = DEFAULT_AUTO_ALIGN):
+        """Создает разделяемую память и запускает процесс движка."""
+        context = multiprocessing.get_context('spawn')
+        self.source_ring = SharedFrameRing.create(self.ring_blocks, blocksize, SOURCE_RING_CHANNELS)
+        self.telemetry = SharedTelemetry.create()
+        self.levels = SharedLevels.create(METER_ROWS, MAX_METER_CHANNELS)
+        self.meter_reader = LevelMeterReader(self.levels.levels, self.levels.channels, self.levels.sequence)
+        self.spectrum_ring = SharedSpectrumRing.create(SPECTRUM_RING_SAMPLES)
+        self._conn, child_conn = context.Pipe()
+        config = {
+            'source': source_name,
+            'targets': list(targets),
+            'sample_rate': sample_rate,
+            'blocksize': blocksize,
+            'state': state.to_dict(),
+            'enabled_targets': list(enabled_targets) if enabled_targets is not None else None,
+            'delay_debug_mode': delay_debug_mode,
+            'fanout': fanout,
+            'adaptive_jitter': adaptive_jitter,
+            'delay_crossfade_ms': delay_crossfade_ms,
+            'file_loop': file_loop,
+            'file_realtime': file_realtime,
+            'spectrum': spectrum,
+            'idle_policy': idle_policy,
+            'stall_deadline_ms': stall_deadline_ms,
+            'device_policy': device_policy(),
+            'auto_align': auto_align,
+        }
+        self.process = context.Process(
+            target=run_engine_process,
+            args=(config, child_conn, self.source_ring.descriptor(), self.telemetry.descriptor(),
+                  self.levels.descriptor(), self.spectrum_ring.descriptor()),
+            name="AudioEngine",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def send(self, *command) -> bool:
+        """Отправляет команду движку (из любого потока GUI)."""
+        if self._conn is None:
+            return False
+        try:
+            with self._send_lock:
+                self._conn.send(command)
+            return True
+        except (BrokenPipeError, OSError):
+            return False
+
+    def poll_events(self) -> List[Tuple]:
+        """Забирает накопившиеся события движка без ожидания."""
+        events = []
+        try:
+            while self._conn is not None and self._conn.poll():
+                events.append(self._conn.recv())
+        except (EOFError, OSError):
+            pass
+        return events
+
+    def read_telemetry(self) -> Optional[Dict]:
+        return self.telemetry.read() if self.telemetry is not None else None
+
+    def stop(self, timeout: float = 3.0):
+        """Останавливает процесс движка и освобождает разделяемую память."""
+        if self.process is not None:
+            self.send('stop')
+            self.process.join(timeout)
+            if self.process.is_alive():
+                log.warning("⚠️ Процесс движка не завершился вовремя - принудительная остановка")
+                self.process.terminate()
+                self.process.join(1.0)
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except OSError:
+                pass
+        self.meter_reader = None
+        for shared in (self.source_ring, self.telemetry, self.levels, self.spectrum_ring):
+            if shared is not None:
+                shared.close()
+        self.process = None
+        self.source_ring = None
+        self.telemetry = None
+        self.levels = None
+        self.spectrum_ring = None
+        self._conn = None
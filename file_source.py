@@ -0,0 +1,368 @@
+"""
+File Source для AudioForwarderApp
+Источник звука из WAV-файла: воспроизводимый прогон всей цепочки обработки.
+
+Файл отображается в память (np.memmap), блоки отдаются движку как
+представления NumPy без копирования (для float32; целочисленные форматы
+преобразуются в заранее выделенный буфер). Поток файла повторяет интерфейс
+sd.InputStream (start/stop/close/active и callback), поэтому движок
+использует его так же, как входной поток устройства.
+
+Имя источника: "file:<путь к WAV>". Для тестов и офлайн-рендера есть
+генераторы сигнала: "gen:sine:<Гц>", "gen:sweep:<от Гц>:<до Гц>",
+"gen:noise", "gen:silence" (детерминированные, без файлов и устройств).
+"""
+import os
+import struct
+import threading
+import time
+from typing import Callable, Optional
+import numpy as np
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+FILE_SOURCE_PREFIX = "file:"
+GENERATOR_PREFIX = "gen:"
+GENERATOR_CHANNELS = 2
+GENERATOR_LEVEL = 0.5  # -6 dBFS: запас для усиления и матрицы
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def is_file_source(name: Optional[str]) -> bool:
+    return bool(name) and name.startswith(FILE_SOURCE_PREFIX)
+
+
+def file_source_name(path: str) -> str:
+    return FILE_SOURCE_PREFIX + path
+
+
+def file_source_path(name: str) -> str:
+    return name[len(FILE_SOURCE_PREFIX):] if is_file_source(name) else name
+
+
+def is_generator_source(name: Optional[str]) -> bool:
+    return bool(name) and name.startswith(GENERATOR_PREFIX)
+
+
+def is_virtual_source(name: Optional[str]) -> bool:
+    """Источник без устройства: файл или генератор."""
+    return is_file_source(name) or is_generator_source(name)
+
+
+class WavFile:
+    """WAV-файл, отображенный в память (PCM 16/24/32 бит или float32)."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к WAV-файлу
+
+        Raises:
+            ValueError: Файл не WAV или формат не поддерживается
+        """
+        self.path = path
+        fmt, data_offset, data_bytes = self._parse_chunks(path)
+        format_tag, self.channels, self.sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+        if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            format_tag = struct.unpack('<H', fmt[24:26])[0]  # Первые байты GUID подформата
+        self.bits = bits
+        self.is_float = format_tag == _WAVE_FORMAT_IEEE_FLOAT
+        if format_tag not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_IEEE_FLOAT) or \
+                (self.is_float and bits != 32) or (not self.is_float and bits not in (16, 24, 32)):
+            raise ValueError(f"Неподдерживаемый формат WAV: тег {format_tag}, {bits} бит")
+
+        self.frames = data_bytes // block_align
+        if bits == 24:
+            # 24 бит - по 3 байта на сэмпл, преобразуются поблочно
+            self.data = np.memmap(path, dtype=np.uint8, mode='r', offset=data_offset,
+                                  shape=(self.frames, self.channels, 3))
+        else:
+            dtype = np.float32 if self.is_float else (np.int16 if bits == 16 else np.int32)
+            self.data = np.memmap(path, dtype=dtype, mode='r', offset=data_offset,
+                                  shape=(self.frames, self.channels))
+
+    @staticmethod
+    def _parse_chunks(path: str):
+        with open(path, 'rb') as f:
+            riff = f.read(12)
+            if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+                raise ValueError(f"Не WAV-файл: {path}")
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"В файле нет данных: {path}")
+                chunk_id, size = header[:4], struct.unpack('<I', header[4:])[0]
+                if chunk_id == b'fmt ':
+                    fmt = f.read(size)
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        raise ValueError(f"Блок data перед fmt: {path}")
+                    offset = f.tell()
+                    # Размер data может быть не дописан (запись прервана) - берем по файлу
+                    available = os.path.getsize(path) - offset
+                    return fmt, offset, min(size, available) if size else available
+                else:
+                    f.seek(size, os.SEEK_CUR)
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)  # Блоки выровнены на 2 байта
+
+    @property
+    def zero_copy(self) -> bool:
+        """Блоки отдаются без копирования (float32)."""
+        return self.is_float
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+    def convert_into(self, start: int, count: int, dst: np.ndarray):
+        """Преобразует count фреймов с позиции start во float32 в dst."""
+        view = self.data[start:start + count]
+        if self.is_float:
+            dst[:count] = view
+        elif self.bits == 16:
+            np.multiply(view, 1.0 / 32768, out=dst[:count], casting='unsafe')
+        elif self.bits == 32:
+            np.multiply(view, 1.0 / 2147483648, out=dst[:count], casting='unsafe')
+        else:
+            # 24 бит: собираем int32 из трех байт со сдвигом в старшие разряды
+            packed = (view[..., 0].astype(np.int32) << 8) | (view[..., 1].astype(np.int32) << 16) | \
+                     (view[..., 2].astype(np.int32) << 24)
+            np.multiply(packed, 1.0 / 2147483648, out=dst[:count], casting='unsafe')
+
+    def close(self):
+        data, self.data = self.data, None
+        mmap_obj = getattr(data, '_mmap', None)
+        if mmap_obj is not None:
+            try:
+                mmap_obj.close()
+            except BufferError:
+                pass  # Остались представления блоков - файл закроет сборщик мусора
+
+
+class FileBlockReader:
+    """Последовательное чтение файла блоками фиксированного размера."""
+
+    def __init__(self, wav: WavFile, blocksize: int, loop: bool = True):
+        self.wav = wav
+        self.blocksize = blocksize
+        self.loop = loop
+        self.position = 0
+        self.loops = 0
+        self._buffer = np.zeros((blocksize, wav.channels), dtype=np.float32)
+        self.sample_rate = wav.sample_rate
+        self.channels = wav.channels
+        self.label = os.path.basename(wav.path)
+
+    def close(self):
+        self.wav.close()
+
+    def next_block(self) -> Optional[np.ndarray]:
+        """
+        Следующий блок (frames=blocksize, channels файла).
+
+        Returns:
+            np.ndarray: Представление файла (float32 внутри файла) или заранее
+                выделенный буфер; действителен до следующего вызова. None в конце файла.
+        """
+        wav = self.wav
+        if wav.frames == 0 or (self.position >= wav.frames and not self.loop):
+            return None
+        if self.position >= wav.frames:
+            self.position = 0
+            self.loops += 1
+        start = self.position
+        end = start + self.blocksize
+        if end <= wav.frames:
+            self.position = end
+            if wav.zero_copy:
+                return wav.data[start:end]
+            wav.convert_into(start, self.blocksize, self._buffer)
+            return self._buffer
+
+        # Конец файла внутри блока: хвост + начало файла (петля) или тишина
+        tail = wav.frames - start
+        wav.convert_into(start, tail, self._buffer)
+        filled = tail
+        if self.loop:
+            while filled < self.blocksize:
+                count = min(self.blocksize - filled, wav.frames)
+                wav.convert_into(0, count, self._buffer[filled:])
+                filled += count
+            self.position = count
+            self.loops += 1
+        else:
+            self._buffer[filled:] = 0.0
+            self.position = wav.frames
+        return self._buffer
+
+
+class SignalGenerator:
+    """Детерминированный тестовый сигнал с интерфейсом FileBlockReader."""
+
+    def __init__(self, spec: str, sample_rate: int, blocksize: int,
+                 duration: Optional[float] = None, seed: int = 0):
+        """
+        Args:
+            spec: "sine:<Гц>", "sweep:<от>:<до>", "noise" или "silence" (можно с префиксом "gen:")
+            sample_rate: Частота дискретизации
+            blocksize: Размер блока в фреймах
+            duration: Длительность в секундах (None - бесконечно; для sweep - период)
+            seed: Зерно шума (одинаковый сигнал при каждом запуске)
+
+        Raises:
+            ValueError: Неизвестный генератор
+        """
+        parts = (spec[len(GENERATOR_PREFIX):] if is_generator_source(spec) else spec).split(':')
+        self.kind = parts[0]
+        try:
+            self.params = [float(value) for value in parts[1:]]
+        except ValueError:
+            raise ValueError(f"Неверные параметры генератора: {spec}")
+        if self.kind not in ('sine', 'sweep', 'noise', 'silence'):
+            raise ValueError(f"Неизвестный генератор: {spec}")
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.channels = GENERATOR_CHANNELS
+        self.label = spec
+        self.total_frames = int(duration * sample_rate) if duration else None
+        self.position = 0
+        self._rng = np.random.default_rng(seed)
+        self._buffer = np.zeros((blocksize, self.channels), dtype=np.float32)
+        self._index = np.arange(blocksize, dtype=np.float64)
+        self._phase = np.zeros(blocksize, dtype=np.float64)
+        self._sweep_seconds = duration or 10.0
+
+    def close(self):
+        pass
+
+    def next_block(self) -> Optional[np.ndarray]:
+        """Следующий блок (frames=blocksize); None после окончания длительности."""
+        if self.total_frames is not None and self.position >= self.total_frames:
+            return None
+        buffer = self._buffer
+        t = (self._index + self.position) / self.sample_rate
+        if self.kind == 'sine':
+            frequency = self.params[0] if self.params else 1000.0
+            np.multiply(t, 2 * np.pi * frequency, out=self._phase)
+            np.sin(self._phase, out=self._phase)
+            buffer[:] = (self._phase * GENERATOR_LEVEL)[:, None]
+        elif self.kind == 'sweep':
+            # Логарифмический свип, повторяется каждые duration секунд
+            f0, f1 = (self.params + [20.0, 20000.0][len(self.params):])[:2]
+            period = self._sweep_seconds
+            rate = np.log(f1 / f0) / period
+            local = np.mod(t, period)
+            np.sin(2 * np.pi * f0 * np.expm1(rate * local) / rate, out=self._phase)
+            buffer[:] = (self._phase * GENERATOR_LEVEL)[:, None]
+        elif self.kind == 'noise':
+            buffer[:] = self._rng.uniform(-GENERATOR_LEVEL, GENERATOR_LEVEL,
+                                          (self.blocksize, self.channels))
+        else:
+            buffer[:] = 0.0
+        self.position += self.blocksize
+        if self.total_frames is not None and self.position > self.total_frames:
+            buffer[self.blocksize - (self.position - self.total_frames):] = 0.0
+        return buffer
+
+
+def open_block_reader(source_name: str, blocksize: int, sample_rate: int, loop: bool = True,
+                      duration: Optional[float] = None):
+    """
+    Открывает блочное чтение файла или генератора по имени источника.
+
+    Raises:
+        OSError, ValueError: Файл недоступен или генератор неизвестен
+    """
+    if is_generator_source(source_name):
+        return SignalGenerator(source_name, sample_rate, blocksize, duration=duration)
+    return FileBlockReader(WavFile(file_source_path(source_name)), blocksize, loop)
+
+
+class FileSourceStream:
+    """
+    Входной поток из файла с интерфейсом sd.InputStream.
+
+    Отдельный поток вызывает callback(indata, frames, time_info, status) для
+    каждого блока: в реальном времени (по часам) или так быстро, как успевает
+    обработка.
+    """
+
+    def __init__(self, source_name: str, blocksize: int, callback: Callable,
+                 samplerate: Optional[int] = None, loop: bool = True, realtime: bool = True,
+                 on_finished: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            source_name: "file:<путь>" (или просто путь) либо "gen:..."
+            blocksize: Размер блока в фреймах
+            callback: Callback в формате sd.InputStream
+            samplerate: Частота движка (для темпа реального времени; по умолчанию - частота файла)
+            loop: Повторять файл по кругу
+            realtime: Темп реального времени (иначе - максимально быстро)
+            on_finished: Вызывается, когда файл закончился (без петли)
+        """
+        self.reader = open_block_reader(source_name, blocksize, samplerate or 48000, loop)
+        self.blocksize = blocksize
+        self.callback = callback
+        self.samplerate = samplerate or self.reader.sample_rate
+        self.channels = self.reader.channels
+        self.realtime = realtime
+        self.on_finished = on_finished
+        self.blocks_delivered = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.closed = False
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.active:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="FileSource", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(2.0)
+        self._thread = None
+
+    def close(self):
+        self.stop()
+        if not self.closed:
+            self.reader.close()
+            self.closed = True
+
+    def _run(self):
+        block_time = self.blocksize / self.samplerate
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            block = self.reader.next_block()
+            if block is None:
+                log.info(f"📄 Файл воспроизведен: {self.reader.label}")
+                if self.on_finished is not None:
+                    self.on_finished()
+                return
+            try:
+                self.callback(block, len(block), None, None)
+            except Exception as e:
+                log.warning("⚠️ Ошибка обработки блока файла: %s", e)
+            self.blocks_delivered += 1
+            if self.realtime:
+                next_time += block_time
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+                elif delay < -0.5:
+                    next_time = time.perf_counter()  # Сильно отстали - не догоняем рывком
@@ -0,0 +1,120 @@
+"""
+Idle Mode для AudioForwarderApp
+Режим простоя при тишине на источнике.
+
+Пока источник молчит (например, Virtual Audio Cable ночью), callback не
+выполняет обработку целей: раскладку, линию задержки, громкость и
+преобразование формата. Вместо этого устройства получают заранее
+подготовленные блоки тишины, а в режиме 'suspend' в выходные потоки вообще
+ничего не пишется. Вход в простой идет с гистерезисом: уровень должен быть ниже
+IDLE_ENTER_DB дольше IDLE_HOLD_SECONDS плюс наибольшая задержка целей, чтобы
+хвосты линий задержки успели прозвучать. Выход из простоя происходит в том же
+блоке, в котором уровень поднялся выше IDLE_EXIT_DB.
+"""
+from typing import Callable, Iterable
+import numpy as np
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+IDLE_OFF = 'off'
+IDLE_ZEROS = 'zeros'
+IDLE_SUSPEND = 'suspend'
+DEFAULT_IDLE_POLICY = IDLE_OFF
+
+# Варианты для интерфейса: политика → описание
+IDLE_POLICY_OPTIONS = {
+    IDLE_OFF: "Всегда обрабатывать",
+    IDLE_ZEROS: "Тишина без обработки",
+    IDLE_SUSPEND: "Без записи в устройства",
+}
+
+IDLE_ENTER_DB = -80.0   # Ниже этого уровня источник считается молчащим
+IDLE_EXIT_DB = -70.0    # Выше этого уровня простой заканчивается
+IDLE_HOLD_SECONDS = 5.0
+
+
+class SilenceGate:
+    """
+    Детектор тишины с гистерезисом по пиковому уровню блока.
+
+    Вызывается только из callback; состояние меняет только он.
+    """
+
+    def __init__(self, sample_rate: int, enter_db: float = IDLE_ENTER_DB,
+                 exit_db: float = IDLE_EXIT_DB, hold_seconds: float = IDLE_HOLD_SECONDS):
+        """
+        Args:
+            sample_rate: Частота дискретизации
+            enter_db: Порог входа в простой (дБ FS)
+            exit_db: Порог выхода из простоя (дБ FS, выше порога входа)
+            hold_seconds: Сколько тишины нужно для входа в простой
+        """
+        self.enter_level = 10 ** (enter_db / 20)
+        self.exit_level = 10 ** (max(exit_db, enter_db) / 20)
+        self.hold_frames = int(hold_seconds * sample_rate)
+        self.silent_frames = 0
+        self.idle = False
+        self.entries = 0  # Сколько раз движок уходил в простой
+
+    def update(self, block: np.ndarray) -> bool:
+        """
+        Учитывает блок источников.
+
+        Returns:
+            bool: True если движок остается в простое
+        """
+        peak = max(float(block.max()), -float(block.min())) if block.size else 0.0
+        if self.idle:
+            if peak > self.exit_level:
+                self.idle = False
+                self.silent_frames = 0
+        elif peak < self.enter_level:
+            self.silent_frames += block.shape[-2]
+        else:
+            self.silent_frames = 0
+        return self.idle
+
+    def ready(self, flush_frames: int) -> bool:
+        """Тишина длится достаточно, чтобы линии задержки опустели."""
+        return not self.idle and self.silent_frames >= self.hold_frames + flush_frames
+
+    def enter(self):
+        self.idle = True
+        self.entries += 1
+
+    def reset(self):
+        self.idle = False
+        self.silent_frames = 0
+
+
+class OutputSuspender:
+    """
+    Пауза записи в выходные потоки в режиме 'suspend'.
+
+    Потоки устройств не останавливаются: пока источник молчит, в них ничего
+    не пишется, и PortAudio выводит тишину сам (буфер устройства пуст).
+    Остановка и повторный запуск устройства заняли бы десятки миллисекунд и
+    съели бы начало звука, а запись в работающий поток возобновляется в том
+    же блоке, в котором вернулся сигнал. Состояние меняет только callback.
+    """
+
+    def __init__(self, writers: Callable[[], Iterable[object]]):
+        """
+        Args:
+            writers: Возвращает потоки записи целей (режим fan-out)
+        """
+        self.writers = writers
+        self.suspended = False
+
+    def request(self, suspended: bool):
+        """Приостанавливает или возобновляет запись (вызывается из callback, не блокирует)."""
+        if suspended == self.suspended:
+            return
+        if not suspended:
+            # Первое опустошение после паузы ожидаемо: запас потоков записи не растет
+            for writer in self.writers():
+                writer.rearm()
+        self.suspended = suspended
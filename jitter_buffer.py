@@ -0,0 +1,114 @@
+"""
+Jitter Buffer для AudioForwarderApp
+Адаптивный запас блоков перед каждым устройством.
+
+Целевое заполнение растет при опустошении буфера устройства (underrun) и
+медленно уменьшается, пока устройство работает стабильно. Bluetooth-колонкам
+обычно нужен запас в сотни миллисекунд, проводным ЦАП - ноль.
+"""
+import math
+import time
+from typing import Callable, Dict, Tuple
+
+
+DEFAULT_JITTER_LIMITS_MS = (0, 250)
+WIRELESS_JITTER_LIMITS_MS = (20, 500)
+MAX_JITTER_LIMIT_MS = 2000  # Наибольший предел, который можно задать в интерфейсе (по нему размечено кольцо)
+
+# Признаки беспроводных устройств в имени
+_WIRELESS_MARKERS = ('bluetooth', 'hands-free', 'a2dp', 'wireless')
+
+
+def default_jitter_limits(device_name: str) -> Tuple[int, int]:
+    """Пределы запаса (мин, макс) в мс по умолчанию для устройства."""
+    name = device_name.lower()
+    if any(marker in name for marker in _WIRELESS_MARKERS):
+        return WIRELESS_JITTER_LIMITS_MS
+    return DEFAULT_JITTER_LIMITS_MS
+
+
+class AdaptiveJitterBuffer:
+    """
+    Адаптивное целевое заполнение в блоках.
+
+    Сам буфер - кольцо потока записи цели (TargetWriter); здесь только
+    решение, сколько блоков держать в запасе.
+    """
+
+    def __init__(self, block_ms: float, min_ms: float = 0, max_ms: float = 250,
+                 grow_blocks: int = 1, shrink_after: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            block_ms: Длительность блока в мс
+            min_ms: Нижний предел запаса
+            max_ms: Верхний предел запаса
+            grow_blocks: На сколько блоков растет запас при опустошении
+            shrink_after: Секунд без опустошений до уменьшения на один блок
+            clock: Источник времени
+        """
+        self.block_ms = block_ms
+        self.grow_blocks = grow_blocks
+        self.shrink_after = shrink_after
+        self._clock = clock
+        self.min_blocks = 0
+        self.max_blocks = 0
+        self.set_limits(min_ms, max_ms)
+        self.target = self.min_blocks
+        self.underruns = 0
+        self.grows = 0
+        self.shrinks = 0
+        self._last_event = clock()
+
+    def set_limits(self, min_ms: float, max_ms: float):
+        """Меняет пределы запаса (не выше MAX_JITTER_LIMIT_MS); текущая цель приводится в новые пределы."""
+        min_ms, max_ms = min(min_ms, MAX_JITTER_LIMIT_MS), min(max_ms, MAX_JITTER_LIMIT_MS)
+        self.min_blocks = max(0, math.ceil(min_ms / self.block_ms))
+        self.max_blocks = max(self.min_blocks, math.ceil(max_ms / self.block_ms))
+        if hasattr(self, 'target'):
+            self.target = min(self.max_blocks, max(self.min_blocks, self.target))
+
+    @property
+    def target_ms(self) -> float:
+        return self.target * self.block_ms
+
+    def on_underrun(self) -> bool:
+        """
+        Регистрирует опустошение буфера устройства.
+
+        Returns:
+            bool: True если целевое заполнение выросло
+        """
+        self.underruns += 1
+        self._last_event = self._clock()
+        if self.target >= self.max_blocks:
+            return False
+        self.target = min(self.max_blocks, self.target + self.grow_blocks)
+        self.grows += 1
+        return True
+
+    def on_stable(self) -> bool:
+        """
+        Проверяет, пора ли уменьшить запас (вызывается после каждой записи).
+
+        Returns:
+            bool: True если целевое заполнение уменьшилось на один блок
+        """
+        if self.target <= self.min_blocks:
+            return False
+        now = self._clock()
+        if now - self._last_event < self.shrink_after:
+            return False
+        self.target -= 1
+        self.shrinks += 1
+        self._last_event = now
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'target_blocks': self.target,
+            'target_ms': self.target_ms,
+            'underruns': self.underruns,
+            'grows': self.grows,
+            'shrinks': self.shrinks,
+        }
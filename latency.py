@@ -0,0 +1,56 @@
+"""
+Latency для AudioForwarderApp
+Учет сквозной задержки каждой цели и автоматическое выравнивание.
+
+Сквозная задержка цели складывается из:
+
+* задержки входа (stream.latency входного потока источника);
+* задержки, заданной пользователем (delays);
+* добавки автовыравнивания;
+* буфера: один блок обработки плюс блоки в кольце потока записи цели;
+* задержки выхода (stream.latency выходного потока, заявленная драйвером).
+
+В режиме автовыравнивания каждая цель задерживается ровно настолько, чтобы
+ее задержка устройства (выход плюс адаптивный запас) сравнялась с самой
+медленной целью. Задержка выхода измеряется при каждом открытии потока,
+поэтому после замены или перезапуска устройства выравнивание пересчитывается
+само. Задержку кодека Bluetooth драйвер обычно не сообщает - ее по-прежнему
+компенсирует задержка пользователя.
+"""
+from typing import NamedTuple
+
+
+DEFAULT_AUTO_ALIGN = False
+LATENCY_UI_INTERVAL = 1.0  # Период обновления разбивки задержек в интерфейсе
+
+
+class TargetLatency(NamedTuple):
+    input_ms: float
+    user_ms: float
+    align_ms: float
+    buffer_ms: float
+    output_ms: float
+    total_ms: float
+
+
+def stream_latency(stream) -> float:
+    """Заявленная задержка потока в секундах (0 если неизвестна)."""
+    latency = getattr(stream, 'latency', 0.0) if stream is not None else 0.0
+    if isinstance(latency, (tuple, list)):
+        latency = latency[-1]  # Дуплексный поток: (вход, выход)
+    try:
+        return max(0.0, float(latency))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def format_latency(latency: TargetLatency) -> str:
+    """Разбивка задержки цели для карточки устройства."""
+    parts = [f"вход {latency.input_ms:.0f}"]
+    if latency.user_ms:
+        parts.append(f"задержка {latency.user_ms:.0f}")
+    if latency.align_ms:
+        parts.append(f"выравн. {latency.align_ms:.0f}")
+    parts.append(f"буфер {latency.buffer_ms:.0f}")
+    parts.append(f"выход {latency.output_ms:.0f}")
+    return f"⏱️ {latency.total_ms:.0f} мс = " + " + ".join(parts)
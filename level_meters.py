@@ -0,0 +1,257 @@
+"""
+Level Meters для AudioForwarderApp
+Пиковые и RMS-уровни источников и целей.
+
+Callback складывает готовые блоки целей в общий массив (цели × фреймы ×
+каналы) и в конце блока считает уровни одной векторной редукцией по нему
+и по массиву источников микшера - без выделения памяти и блокировок.
+Уровни накапливаются за окно ~50 мс и публикуются в заранее выделенный
+массив (в режиме отдельного процесса - в разделяемой памяти); интерфейс
+читает его 10-20 раз в секунду и сам держит пики (peak-hold).
+"""
+import math
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+
+MAX_METER_SOURCES = 8
+MAX_METER_TARGETS = 32
+MAX_METER_CHANNELS = 8
+METER_ROWS = MAX_METER_SOURCES + MAX_METER_TARGETS
+METER_WINDOW_MS = 50
+
+PEAK_HOLD_SECONDS = 1.5
+PEAK_FALL_DB_PER_SECOND = 20.0
+CLIP_HOLD_SECONDS = 3.0
+CLIP_LEVEL = 0.999
+SILENCE_DB = -90.0
+METER_FLOOR_DB = -60.0  # Нижняя граница шкалы индикатора
+METER_UI_INTERVAL = 1 / 15  # Частота обновления индикаторов в интерфейсе
+
+
+def to_db(value: float) -> float:
+    return 20 * math.log10(value) if value > 1e-9 else -math.inf
+
+
+def target_row(index: int) -> int:
+    """Строка массива уровней для цели с номером index."""
+    return MAX_METER_SOURCES + index
+
+
+class LevelMeters:
+    """
+    Сторона движка: сбор уровней в callback.
+
+    Номера строк целей назначаются при подключении и освобождаются при
+    отключении; словарь строк публикуется целиком (copy-on-write).
+    """
+
+    def __init__(self, blocksize: int, sample_rate: int, shared=None):
+        """
+        Args:
+            blocksize: Размер блока в фреймах
+            sample_rate: Частота дискретизации (для окна усреднения)
+            shared: SharedLevels (массивы в разделяемой памяти) или None
+        """
+        if shared is not None:
+            self.levels, self.channels, self.sequence = shared.levels, shared.channels, shared.sequence
+        else:
+            self.levels = np.zeros((METER_ROWS, 2, MAX_METER_CHANNELS), dtype=np.float32)
+            self.channels = np.zeros(METER_ROWS, dtype=np.int32)
+            self.sequence = np.zeros(1, dtype=np.int64)
+        self.target_stack = np.zeros((MAX_METER_TARGETS, blocksize, MAX_METER_CHANNELS), dtype=np.float32)
+        self._target_scratch = np.zeros_like(self.target_stack)
+        self._source_scratch = np.zeros((MAX_METER_SOURCES, blocksize, MAX_METER_CHANNELS), dtype=np.float32)
+        self._block_peak = np.zeros((METER_ROWS, MAX_METER_CHANNELS), dtype=np.float32)
+        self._block_square = np.zeros((METER_ROWS, MAX_METER_CHANNELS), dtype=np.float32)
+        self._peak = np.zeros((METER_ROWS, MAX_METER_CHANNELS), dtype=np.float32)
+        self._square = np.zeros((METER_ROWS, MAX_METER_CHANNELS), dtype=np.float64)
+        self._frames = 0
+        self.window_frames = max(1, sample_rate * METER_WINDOW_MS // 1000)
+
+        self.source_names: Tuple[str, ...] = ()
+        self.target_rows: Dict[str, int] = {}  # цель → номер цели (строка = target_row(номер))
+        self._target_count = 0  # Сколько первых строк целей участвуют в редукции
+
+    # ------------------------------------------------ назначение строк (не callback)
+
+    def set_sources(self, names: Sequence[str], channels: int):
+        self.source_names = tuple(names[:MAX_METER_SOURCES])
+        self.channels[:MAX_METER_SOURCES] = 0
+        self.channels[:len(self.source_names)] = min(channels, MAX_METER_CHANNELS)
+
+    def assign_target(self, name: str, channels: int) -> Optional[int]:
+        """Назначает цели свободную строку (None если строк не осталось)."""
+        if name in self.target_rows:
+            return self.target_rows[name]
+        used = set(self.target_rows.values())
+        index = next((i for i in range(MAX_METER_TARGETS) if i not in used), None)
+        if index is None:
+            return None
+        self.target_stack[index] = 0.0
+        self.channels[target_row(index)] = min(channels, MAX_METER_CHANNELS)
+        self.target_rows = dict(self.target_rows, **{name: index})
+        self._target_count = max(self._target_count, index + 1)
+        return index
+
+    def release_target(self, name: str):
+        index = self.target_rows.get(name)
+        if index is None:
+            return
+        self.target_rows = {key: value for key, value in self.target_rows.items() if key != name}
+        self._target_count = max(self.target_rows.values(), default=-1) + 1
+        self.channels[target_row(index)] = 0
+        self.target_stack[index] = 0.0
+        self.levels[target_row(index)] = 0.0
+
+    # ------------------------------------------------------------------ callback
+
+    def store_target(self, name: str, block: np.ndarray):
+        """Кладет готовый блок цели в общий массив."""
+        index = self.target_rows.get(name)
+        if index is not None:
+            channels = min(block.shape[1], MAX_METER_CHANNELS)
+            self.target_stack[index, :len(block), :channels] = block[:, :channels]
+
+    def clear_target(self, name: str):
+        """Цель пропущена в этом блоке (маршрутизация) - ее уровень нулевой."""
+        index = self.target_rows.get(name)
+        if index is not None:
+            self.target_stack[index] = 0.0
+
+    def measure(self, source_stack: np.ndarray, frames: int):
+        """Редукция по источникам и целям; публикация раз в окно."""
+        sources = min(len(source_stack), MAX_METER_SOURCES)
+        channels = min(source_stack.shape[2], MAX_METER_CHANNELS)
+        self._reduce(source_stack[:sources, :frames, :channels],
+                     self._source_scratch[:sources, :frames, :channels], 0, sources, channels)
+        targets = self._target_count
+        if targets:
+            self._reduce(self.target_stack[:targets, :frames], self._target_scratch[:targets, :frames],
+                         MAX_METER_SOURCES, targets, MAX_METER_CHANNELS)
+
+        self._frames += frames
+        if self._frames >= self.window_frames:
+            self.sequence[0] += 1  # Нечетное значение - идет запись
+            self.levels[:, 0] = self._peak
+            np.divide(self._square, self._frames, out=self._square)
+            np.sqrt(self._square, out=self._square)
+            self.levels[:, 1] = self._square
+            self.sequence[0] += 1
+            self._peak.fill(0.0)
+            self._square.fill(0.0)
+            self._frames = 0
+
+    def publish_silence(self):
+        """Публикует нулевые уровни (вход в простой: измерения приостанавливаются)."""
+        self.sequence[0] += 1
+        self.levels.fill(0.0)
+        self.sequence[0] += 1
+        self.target_stack.fill(0.0)
+        self._peak.fill(0.0)
+        self._square.fill(0.0)
+        self._frames = 0
+
+    def _reduce(self, block: np.ndarray, scratch: np.ndarray, row: int, rows: int, channels: int):
+        peak = self._block_peak[row:row + rows, :channels]
+        square = self._block_square[row:row + rows, :channels]
+        np.abs(block, out=scratch)
+        np.max(scratch, axis=1, out=peak)
+        np.square(block, out=scratch)
+        np.sum(scratch, axis=1, out=square)
+        np.maximum(self._peak[row:row + rows, :channels], peak, out=self._peak[row:row + rows, :channels])
+        np.add(self._square[row:row + rows, :channels], square, out=self._square[row:row + rows, :channels])
+
+
+class MeterReading(NamedTuple):
+    peak_db: List[float]    # Пики по каналам
+    rms_db: List[float]     # RMS по каналам
+    hold_db: float          # Удерживаемый пик (максимум каналов)
+    clipped: bool           # Была перегрузка за последние CLIP_HOLD_SECONDS
+    silent_channels: List[int]  # Каналы без сигнала при звучащих остальных (номера с 1)
+
+    @property
+    def max_peak_db(self) -> float:
+        return max(self.peak_db, default=-math.inf)
+
+    @property
+    def max_rms_db(self) -> float:
+        return max(self.rms_db, default=-math.inf)
+
+
+class LevelMeterReader:
+    """Сторона интерфейса: согласованное чтение уровней и удержание пиков."""
+
+    def __init__(self, levels: np.ndarray, channels: np.ndarray, sequence: np.ndarray):
+        self.levels = levels
+        self.channels = channels
+        self.sequence = sequence
+        self._snapshot = np.zeros_like(levels)
+        self._hold: Dict[int, Tuple[float, float]] = {}  # строка → (пик дБ, время)
+        self._clip: Dict[int, float] = {}                # строка → время перегрузки
+
+    @classmethod
+    def for_meters(cls, meters) -> "LevelMeterReader":
+        return cls(meters.levels, meters.channels, meters.sequence)
+
+    def refresh(self, retries: int = 5) -> bool:
+        """Копирует опубликованные уровни (seqlock); False если не удалось."""
+        for _ in range(retries):
+            version = int(self.sequence[0])
+            if version % 2:
+                continue
+            np.copyto(self._snapshot, self.levels)
+            if int(self.sequence[0]) == version:
+                return True
+        return False
+
+    def read(self, row: int, now: Optional[float] = None) -> MeterReading:
+        """Уровни строки из последнего refresh() с удержанием пика."""
+        now = time.monotonic() if now is None else now
+        channels = int(self.channels[row])
+        peaks = self._snapshot[row, 0, :channels]
+        rms = self._snapshot[row, 1, :channels]
+        peak_db = [to_db(float(value)) for value in peaks]
+        rms_db = [to_db(float(value)) for value in rms]
+        current = max(peak_db, default=-math.inf)
+
+        hold, since = self._hold.get(row, (-math.inf, now))
+        age = now - since
+        if age > PEAK_HOLD_SECONDS:
+            hold -= PEAK_FALL_DB_PER_SECOND * (age - PEAK_HOLD_SECONDS)
+        if current >= hold:
+            self._hold[row] = (current, now)
+            hold = current
+
+        if channels and float(peaks.max()) >= CLIP_LEVEL:
+            self._clip[row] = now
+        clipped = now - self._clip.get(row, -math.inf) < CLIP_HOLD_SECONDS
+
+        loudest = max(rms_db, default=-math.inf)
+        silent = [i + 1 for i, value in enumerate(rms_db) if value < SILENCE_DB] if loudest > METER_FLOOR_DB else []
+        return MeterReading(peak_db, rms_db, hold, clipped, silent)
+
+    def reset(self):
+        self._hold.clear()
+        self._clip.clear()
+        self._snapshot.fill(0.0)
+
+
+def format_reading(reading: MeterReading) -> str:
+    """Подпись индикатора: пик, удерживаемый пик, RMS и предупреждения."""
+    def db(value: float) -> str:
+        return "−∞" if value == -math.inf else f"{value:.1f}"
+    text = f"пик {db(reading.max_peak_db)} ({db(reading.hold_db)}) | RMS {db(reading.max_rms_db)} дБ"
+    if reading.clipped:
+        text += " | 🔴 перегрузка"
+    if reading.silent_channels:
+        text += f" | ⚠️ нет сигнала: кан. {', '.join(map(str, reading.silent_channels))}"
+    return text
+
+
+def meter_fraction(level_db: float) -> float:
+    """Положение индикатора 0..1 для уровня в дБ (шкала METER_FLOOR_DB..0)."""
+    if level_db == -math.inf:
+        return 0.0
+    return max(0.0, min(1.0, 1 - level_db / METER_FLOOR_DB))
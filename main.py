@@ -6,9 +6,37 @@ import os
 import json
 import time
 import numpy as np
-# from application_audio_router import ApplicationAudioRouter  # Отключено
+from application_audio_router import ApplicationAudioRouter
 import asyncio
 from audio_device_monitor import AudioDeviceMonitor
+from audio_engine import AudioEngine, EngineState, find_device_id
+from audio_mixer import PRIMARY_SOURCE, adopt_primary
+from delay_line import DEFAULT_DELAY_CROSSFADE_MS, DELAY_CROSSFADE_OPTIONS
+from idle_mode import DEFAULT_IDLE_POLICY, IDLE_POLICY_OPTIONS
+from callback_watchdog import DEFAULT_STALL_DEADLINE_MS, STALL_DEADLINE_OPTIONS
+from device_policy import ROLE_SOURCE, ROLE_TARGET, discover_devices, set_device_policy
+from latency import DEFAULT_AUTO_ALIGN, LATENCY_UI_INTERVAL, TargetLatency, format_latency
+from network_audio import (DEFAULT_NETWORK_PORT, is_network_source, is_network_target, network_source_name,
+                           network_target_name, parse_network_address, parse_network_source)
+from file_source import file_source_name, file_source_path, is_file_source
+from channel_mapping import CHANNEL_MAP_PRESETS, DEFAULT_CHANNEL_MAP, output_channels
+from engine_process import EngineProcessClient
+from sample_format import DEFAULT_SAMPLE_FORMAT, SAMPLE_FORMAT_OPTIONS
+from stream_supervisor import HEALTH_LABELS, HEALTH_OK, HEALTH_RESTARTING, DeviceHealth
+from jitter_buffer import MAX_JITTER_LIMIT_MS, default_jitter_limits
+from spectrum_analyzer import (SPECTRUM_BANDS, SPECTRUM_FLOOR_DB, SPECTRUM_SOURCE, SpectrumAnalyzer,
+                               format_frequency, spectrum_decimation)
+from level_meters import METER_UI_INTERVAL, LevelMeterReader, format_reading, meter_fraction, target_row
+from target_writer import DEFAULT_DROP_POLICY, DROP_POLICY_OPTIONS
+from wav_recorder import DEFAULT_RECORDING_DIR, DEFAULT_ROTATE_MB, DEFAULT_ROTATE_MINUTES
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+# Высота графика спектра в пикселях
+SPECTRUM_VIEW_HEIGHT = 80
 
 
 class SettingsManager:
@@ -36,7 +64,7 @@ class SettingsManager:
             with open(self.filepath, 'w', encoding='utf-8') as f:
                 json.dump(settings, f, ensure_ascii=False, indent=2)
         except Exception as e:
-            print(f"Ошибка сохранения настроек: {e}")
+            log.warning(f"Ошибка сохранения настроек: {e}")
 
 
 class AudioForwarderApp:
@@ -54,7 +82,7 @@ class AudioForwarderApp:
         self.device_containers = {}
         self.update_devices()
 
-        # self.audio_router = ApplicationAudioRouter(self.target_devices_list, self)  # Отключено
+        self.audio_router = ApplicationAudioRouter(self.target_devices_list, self)
         self.source_device_name = None
 
         self.apply_theme()
@@ -67,26 +95,68 @@ class AudioForwarderApp:
     def load_settings(self):
         loaded_settings = self.settings_manager.load()
         self.device_settings = loaded_settings.get("device_settings", {})
+        # Матрица источников: {цель: {источник или PRIMARY_SOURCE: усиление_дБ}}
+        self.routing_matrix = loaded_settings.get("routing_matrix", {})
+        self._matrix_primary = None  # Источник, для которого ячейки уже переведены на PRIMARY_SOURCE
         
         # Загружаем аудио настройки
         self.sample_rate = loaded_settings.get("sample_rate", 48000)
         self.blocksize = loaded_settings.get("blocksize", 256)
+        self.engine_mode = loaded_settings.get("engine_mode", "thread")
+        self.fanout_enabled = loaded_settings.get("fanout", False)
+        self.adaptive_jitter = loaded_settings.get("adaptive_jitter", False)
+        self.auto_align = loaded_settings.get("auto_align", DEFAULT_AUTO_ALIGN)
+        self.delay_crossfade_ms = loaded_settings.get("delay_crossfade_ms", DEFAULT_DELAY_CROSSFADE_MS)
+        self.idle_policy = loaded_settings.get("idle_policy", DEFAULT_IDLE_POLICY)
+        self.stall_deadline_ms = loaded_settings.get("stall_deadline_ms", DEFAULT_STALL_DEADLINE_MS)
+        # Правила выбора устройств (только в файле настроек): роли, фильтры, приоритет интерфейсов
+        set_device_policy(loaded_settings.get("device_policy"))
+        self._force_device_update = True
+        self.recording_dir = loaded_settings.get("recording_dir", DEFAULT_RECORDING_DIR)
+        self.recording_rotate_mb = loaded_settings.get("recording_rotate_mb", DEFAULT_ROTATE_MB)
+        self.recording_rotate_minutes = loaded_settings.get("recording_rotate_minutes", DEFAULT_ROTATE_MINUTES)
+        self.file_loop = loaded_settings.get("file_loop", True)
+        self.file_realtime = loaded_settings.get("file_realtime", True)
         
         # Обновляем UI элементы если они уже созданы
         if hasattr(self, 'sample_rate_dropdown'):
             self.sample_rate_dropdown.value = str(self.sample_rate)
         if hasattr(self, 'blocksize_dropdown'):
             self.blocksize_dropdown.value = str(self.blocksize)
+        if hasattr(self, 'engine_process_checkbox'):
+            self.engine_process_checkbox.value = self.engine_mode == 'process'
+        if hasattr(self, 'fanout_checkbox'):
+            self.fanout_checkbox.value = self.fanout_enabled
+        if hasattr(self, 'adaptive_jitter_checkbox'):
+            self.adaptive_jitter_checkbox.value = self.adaptive_jitter
+        if hasattr(self, 'auto_align_checkbox'):
+            self.auto_align_checkbox.value = self.auto_align
+        if hasattr(self, 'delay_crossfade_dropdown'):
+            self.delay_crossfade_dropdown.value = str(self.delay_crossfade_ms)
+        if hasattr(self, 'idle_policy_dropdown'):
+            self.idle_policy_dropdown.value = self.idle_policy
+        if hasattr(self, 'stall_deadline_dropdown'):
+            self.stall_deadline_dropdown.value = str(self.stall_deadline_ms)
+
+    def get_device_settings_entry(self, device):
+        """Текущие настройки устройства в формате device_settings."""
+        return {
+            'delay': self.delays.get(device, 0),
+            'volume': self.volumes.get(device, 0),
+            'channel_map': self.channel_maps.get(device, DEFAULT_CHANNEL_MAP),
+            'sample_format': self.sample_formats.get(device, DEFAULT_SAMPLE_FORMAT),
+            'dither': self.dither_enabled.get(device, True),
+            'drop_policy': self.drop_policies.get(device, DEFAULT_DROP_POLICY),
+            'jitter_limits': list(self.jitter_limits.get(device, default_jitter_limits(device)))
+        }
 
     def save_settings(self):
         """Сохраняет текущие настройки устройств."""
         for device in self.target_devices_list:
-            self.device_settings[device] = {
-                'delay': self.delays.get(device, 0),
-                'volume': self.volumes.get(device, 0)
-            }
+            self.device_settings[device] = self.get_device_settings_entry(device)
 
         self.settings_manager.settings["device_settings"] = self.device_settings
+        self.settings_manager.settings["routing_matrix"] = self.routing_matrix
         self.settings_manager.save(self.settings_manager.settings)
 
     def start_status_timer(self):
@@ -108,7 +178,7 @@ class AudioForwarderApp:
             'last_callback_time': 0,
             'callback_intervals': collections.deque(maxlen=100)
         }
-        print("📊 Статистика потоков сброшена")
+        log.info("📊 Статистика потоков сброшена")
 
     def update_status(self):
         """Обновляет статус-бар с правильной статистикой."""
@@ -121,7 +191,7 @@ class AudioForwarderApp:
             self._debug_counter += 1
             
             if self._debug_counter % 10 == 0:  # Каждые 5 секунд
-                print(f"🔄 Обновление статуса #{self._debug_counter}, потоков: {len(self.device_streams)}")
+                log.info(f"🔄 Обновление статуса #{self._debug_counter}, потоков: {len(self.device_streams)}")
                 # Принудительно обновляем устройства каждые 5 секунд для проверки
                 self._force_device_update = True
                 self.update_devices()
@@ -153,9 +223,13 @@ class AudioForwarderApp:
                     else:
                         debug_info.append(f"{device_name}: inactive")
                         
+            # В режиме отдельного процесса потоки открыты там - берем число из телеметрии
+            if self.engine_process is not None:
+                active_streams = self.stream_stats.get('active_streams', 0)
+                
             # DEBUG: выводим детальную информацию о потоках
             if self._debug_counter % 10 == 0 and debug_info:
-                print(f"📊 Детали потоков: {'; '.join(debug_info)}")
+                log.info(f"📊 Детали потоков: {'; '.join(debug_info)}")
             
             self.streams_indicator.value = f"Потоки: {active_streams}"
             
@@ -182,12 +256,12 @@ class AudioForwarderApp:
                 
                 # DEBUG: статистика callback'ов
                 if self._debug_counter % 10 == 0:
-                    print(f"📈 Статистика: {self.stream_stats['total_callbacks']} callback'ов за {elapsed:.1f}с")
+                    log.debug(f"📈 Статистика: {self.stream_stats['total_callbacks']} callback'ов за {elapsed:.1f}с")
             else:
                 self.performance_indicator.value = f"Статистика собирается..."
                 # DEBUG: почему нет статистики
                 if self._debug_counter % 10 == 0:
-                    print(f"⚠️ Нет статистики: start_time={self.stream_stats['start_time']}, callbacks={self.stream_stats['total_callbacks']}")
+                    log.warning(f"⚠️ Нет статистики: start_time={self.stream_stats['start_time']}, callbacks={self.stream_stats['total_callbacks']}")
             
             # Обновляем информацию об ошибках с процентом
             errors = self.stream_stats['errors_count']
@@ -195,13 +269,34 @@ class AudioForwarderApp:
             error_rate = (errors / total_calls) * 100
             
             self.error_indicator.value = f"Ошибки: {errors} ({error_rate:.1f}%)"
+            stalls = int(self.stream_stats.get('stalls', 0))
+            if stalls:
+                self.error_indicator.value += f" | Зависаний: {stalls}"
+            if self.stream_stats.get('net_packets'):
+                concealed_ms = self.stream_stats.get('net_concealed_frames', 0) * 1000 / self.sample_rate
+                self.error_indicator.value += (f" | Сеть: запас {self.stream_stats.get('net_fill_ms', 0):.0f} мс, "
+                                               f"потери {concealed_ms:.0f} мс")
             
             # ИСПРАВЛЕНО: более точный статус трансляции
             is_transmitting = (self.transmission_thread and self.transmission_thread.is_alive() and 
                              active_streams > 0)
             
-            if is_transmitting:
+            # Callback источника давно не вызывался: поток завис, сторож его перезапускает
+            last_callback = self.stream_stats.get('last_callback_time', 0)
+            silent_for = current_time - last_callback if last_callback else 0
+            
+            if silent_for > max(1.0, self.stall_deadline_ms / 1000) and self.transmission_thread and \
+                    self.transmission_thread.is_alive():
+                self.status_text.value = (f"⏳ Нет звука от источника {silent_for:.0f} с - "
+                                          f"{'восстановление' if self.stall_deadline_ms else 'сторож выключен'}")
+            elif self.stream_stats.get('idle') and self.transmission_thread and self.transmission_thread.is_alive():
+                # Источник молчит: в режиме 'suspend' в устройства ничего не пишется
+                self.status_text.value = "💤 Тишина на источнике - простой"
+            elif is_transmitting:
                 self.status_text.value = f"▶️ Транслирую на {active_streams} устройств"
+                if self.recording_enabled:
+                    overflows = self.recording_overflows()
+                    self.status_text.value += f" | ⏺️ Запись{f' (потеряно блоков: {overflows})' if overflows else ''}"
             elif self.transmission_thread and self.transmission_thread.is_alive():
                 self.status_text.value = "⚠️ Поток запущен, но нет целей"
             else:
@@ -215,10 +310,10 @@ class AudioForwarderApp:
                 
                 # DEBUG: подтверждение обновления UI
                 if self._debug_counter % 10 == 0:
-                    print(f"🖥️ UI обновлен успешно")
+                    log.debug(f"🖥️ UI обновлен успешно")
             
         except Exception as e:
-            print(f"⚠️ Ошибка обновления статуса: {e}")
+            log.warning(f"⚠️ Ошибка обновления статуса: {e}")
         
         # Планируем следующее обновление
         if not self.stop_event.is_set():  # Проверяем что приложение не закрывается
@@ -248,6 +343,59 @@ class AudioForwarderApp:
         self.volumes = {}
         self.device_settings = {}
         
+        # Несколько источников: матрица маршрутизации и потоки дополнительных источников
+        self.routing_matrix = {}
+        self._matrix_primary = None
+        
+        # Раскладка каналов для каждой цели
+        self.channel_maps = {}
+        
+        # Формат сэмплов для каждой цели (float32 остается форматом движка)
+        self.sample_formats = {}
+        self.dither_enabled = {}
+        
+        # Аудио-движки: 'thread' - в процессе GUI, 'process' - в отдельном процессе
+        self.engine_mode = 'thread'
+        self.engines = []  # Активные движки в процессе GUI (для изменений на лету)
+        self.engine_process = None  # EngineProcessClient в режиме 'process'
+        
+        # Fan-out: отдельный поток записи для каждой цели со своей политикой перегрузки
+        self.fanout_enabled = False
+        self.drop_policies = {}
+        
+        # Адаптивный запас блоков для каждой цели: устройство → (мин_мс, макс_мс)
+        self.adaptive_jitter = False
+        self.auto_align = DEFAULT_AUTO_ALIGN
+        self.jitter_limits = {}
+        
+        # Плавная смена задержки: длительность кроссфейда в линии задержки
+        self.delay_crossfade_ms = DEFAULT_DELAY_CROSSFADE_MS
+        
+        # Простой при тишине на источнике: 'off', 'zeros' или 'suspend'
+        self.idle_policy = DEFAULT_IDLE_POLICY
+        self.stall_deadline_ms = DEFAULT_STALL_DEADLINE_MS
+        
+        # Фоновая запись источника и выходов целей в WAV (не сохраняется между запусками)
+        self.recording_enabled = False
+        self.recording_dir = DEFAULT_RECORDING_DIR
+        self.recording_rotate_mb = DEFAULT_ROTATE_MB
+        self.recording_rotate_minutes = DEFAULT_ROTATE_MINUTES
+        
+        # Индикаторы уровней: строки массива уровней движка (источники, {цель: номер})
+        self.meter_rows = ((), {})
+        self._last_meter_update = 0.0
+        self.device_health = {}  # устройство → DeviceHealth (надзор за потоками)
+        self._last_latency_update = 0.0
+        
+        # Спектр: SPECTRUM_SOURCE, имя цели или None; БПФ - в потоке SpectrumAnalyzer
+        self.spectrum_selection = None
+        self.spectrum_analyzer = None
+        self._shown_spectrum_frame = None
+        
+        # WAV-файл как источник ("file:<путь>"): по кругу и в темпе реального времени
+        self.file_loop = True
+        self.file_realtime = True
+        
         # Аудио параметры для качественного воспроизведения
         self.sample_rate = 48000  # Высокое качество
         self.blocksize = 256      # Низкая задержка
@@ -280,12 +428,6 @@ class AudioForwarderApp:
         self.memory_cleanup_counter = 0
         self.memory_cleanup_interval = 1000  # Очистка каждые 1000 callback вызовов
         
-        # Автоматическое восстановление
-        self.recovery_attempts = 0
-        self.max_recovery_attempts = 3
-        self.last_error_time = 0
-        self.error_recovery_delay = 5.0  # секунд
-        
         # Защита от аудио-петель (критично для Bluetooth устройств)
         self.loop_protection_enabled = True
         self.loop_detection_buffer = collections.deque([0.0], maxlen=100)  # Буфер для анализа петель (float значения)
@@ -301,7 +443,6 @@ class AudioForwarderApp:
         
         # Отладка задержки - дополнительное деление на 1000 если нужно
         self.delay_debug_mode = False  # Установить True если задержки все еще неправильные
-        self._delay_debug_printed = set()  # Для отслеживания диагностических сообщений
 
     def setup_ui(self):
         """Set up the user interface."""
@@ -313,12 +454,68 @@ class AudioForwarderApp:
             border_radius=10,
             on_change=self.on_source_device_change
         )
+        self.source_file_picker = ft.FilePicker(on_result=self.on_source_file_picked)
+        self.page.overlay.append(self.source_file_picker)
+        self.source_file_button = ft.IconButton(
+            icon="audio_file",
+            tooltip="Источник из WAV-файла (повтор записи через всю цепочку)",
+            on_click=lambda e: self.source_file_picker.pick_files(allowed_extensions=["wav"])
+        )
+        self.network_source_field = ft.TextField(
+            label="Порт приема",
+            width=130,
+            border_radius=10,
+            on_submit=lambda e: self.on_network_source_entered(e),
+            tooltip="Источник из сети: звук другого узла с сетевой целью udp:<этот хост>:<порт>"
+        )
+        self.network_source_button = ft.IconButton(
+            icon="settings_input_antenna",
+            tooltip="Источник из сети (PCM по UDP)",
+            on_click=self.on_network_source_entered
+        )
+        self.source_row = ft.Row([self.source_combo, self.source_file_button,
+                                  self.network_source_field, self.network_source_button])
+        self.source_meter_bar = ft.ProgressBar(value=0, expand=True, color="green", bgcolor="black12")
+        self.source_meter_text = ft.Text("", size=12)
+        self.source_meter_row = ft.Row([ft.Text("🎤", size=12), self.source_meter_bar, self.source_meter_text])
+        self.spectrum_dropdown = ft.Dropdown(
+            label="Спектр",
+            options=self._spectrum_options(),
+            value="off",
+            width=220,
+            on_change=self.on_spectrum_change,
+            tooltip="Спектр источника или того, что уходит на устройство:\n"
+                    "настройка кроссоверов и поиск частоты обратной связи"
+        )
+        self.spectrum_bars = [ft.Container(width=6, height=1, bgcolor="blue", border_radius=1)
+                              for _ in range(SPECTRUM_BANDS)]
+        self.spectrum_peak_text = ft.Text("", size=12)
+        self.spectrum_view = ft.Column([
+            ft.Row(self.spectrum_bars, spacing=1, height=SPECTRUM_VIEW_HEIGHT,
+                   vertical_alignment=ft.CrossAxisAlignment.END),
+            self.spectrum_peak_text,
+        ], spacing=4, visible=False)
+        self.spectrum_row = ft.Row([self.spectrum_dropdown, self.spectrum_view],
+                                   vertical_alignment=ft.CrossAxisAlignment.START)
         self.target_combo = ft.Dropdown(
             label="Целевые устройства", 
             options=[],
             expand=True,
             border_radius=10
         )
+        self.network_target_field = ft.TextField(
+            label="Сеть (хост:порт)",
+            width=200,
+            border_radius=10,
+            on_submit=lambda e: self.on_add_network_target(e),
+            tooltip="Колонки на другой машине: там запускается network_receiver.py"
+        )
+        self.network_target_button = ft.IconButton(
+            icon="cast",
+            tooltip="Добавить сетевую цель (PCM по UDP)",
+            on_click=self.on_add_network_target
+        )
+        self.target_row = ft.Row([self.target_combo, self.network_target_field, self.network_target_button])
 
         # Buttons with consistent styling that adapts to theme
         self.language_toggle_button = ft.ElevatedButton(
@@ -380,8 +577,81 @@ class AudioForwarderApp:
             tooltip="Размер буфера: меньше = меньше задержка, больше = стабильнее"
         )
 
+        self.engine_process_checkbox = ft.Checkbox(
+            label="Отдельный процесс",
+            value=self.engine_mode == 'process',
+            on_change=self.on_engine_mode_change,
+            tooltip="Захват и обработка звука в отдельном процессе:\nзадержки интерфейса не вызывают срывов звука"
+        )
+
+        self.fanout_checkbox = ft.Checkbox(
+            label="Поток на устройство",
+            value=self.fanout_enabled,
+            on_change=self.on_fanout_change,
+            tooltip="Отдельный поток записи для каждого устройства:\nмедленное устройство не задерживает остальные"
+        )
+
+        self.adaptive_jitter_checkbox = ft.Checkbox(
+            label="Адаптивный буфер",
+            value=self.adaptive_jitter,
+            on_change=self.on_adaptive_jitter_change,
+            tooltip="Запас блоков для каждого устройства растет при срывах и медленно\n"
+                    "уменьшается при стабильной работе; задержки остальных устройств\n"
+                    "подстраиваются автоматически"
+        )
+
+        self.auto_align_checkbox = ft.Checkbox(
+            label="Автовыравнивание",
+            value=self.auto_align,
+            on_change=self.on_auto_align_change,
+            tooltip="Быстрые устройства задерживаются до задержки самого медленного\n"
+                    "(по задержке выхода, которую сообщает драйвер); после замены\n"
+                    "устройства выравнивание пересчитывается само"
+        )
+
+        self.delay_crossfade_dropdown = ft.Dropdown(
+            label="Смена задержки",
+            options=[ft.dropdown.Option(str(ms), label) for ms, label in DELAY_CROSSFADE_OPTIONS.items()],
+            value=str(self.delay_crossfade_ms),
+            width=150,
+            on_change=self.on_delay_crossfade_change,
+            tooltip="Время плавного перехода при изменении задержки на лету:\nбез пауз и щелчков"
+        )
+
+        self.idle_policy_dropdown = ft.Dropdown(
+            label="При тишине",
+            options=[ft.dropdown.Option(policy, label) for policy, label in IDLE_POLICY_OPTIONS.items()],
+            value=self.idle_policy,
+            width=200,
+            on_change=self.on_idle_policy_change,
+            tooltip="Пока источник молчит, обработка не выполняется:\n"
+                    "устройства получают готовую тишину или останавливаются.\n"
+                    "Звук возвращается в том же блоке, где появился сигнал"
+        )
+
+        self.stall_deadline_dropdown = ft.Dropdown(
+            label="Сторож потоков",
+            options=[ft.dropdown.Option(str(ms), label) for ms, label in STALL_DEADLINE_OPTIONS.items()],
+            value=str(self.stall_deadline_ms),
+            width=150,
+            on_change=self.on_stall_deadline_change,
+            tooltip="Если источник или устройство молчит дольше этого срока\n"
+                    "(драйвер завис, устройство уснуло), поток открывается заново"
+        )
+
+        self.recording_checkbox = ft.Checkbox(
+            label="Запись WAV",
+            value=self.recording_enabled,
+            on_change=self.on_recording_change,
+            tooltip="Фоновая запись источника и того, что уходит на каждое устройство,\n"
+                    "в папку recordings (можно включать во время трансляции)"
+        )
+
         self.audio_settings_row = ft.Row(
-            [self.sample_rate_dropdown, self.blocksize_dropdown],
+            [self.sample_rate_dropdown, self.blocksize_dropdown, self.delay_crossfade_dropdown, self.idle_policy_dropdown,
+             self.stall_deadline_dropdown,
+             self.engine_process_checkbox, self.fanout_checkbox, self.adaptive_jitter_checkbox, self.auto_align_checkbox,
+             self.recording_checkbox],
             spacing=10
         )
 
@@ -490,8 +760,18 @@ class AudioForwarderApp:
             tooltip="Анализ проблемных устройств и аудио-петель"
         )
 
+        self.routing_matrix_button = ft.ElevatedButton(
+            text="🎚️ Матрица источников",
+            on_click=lambda _: self.show_routing_matrix_dialog(),
+            style=ft.ButtonStyle(
+                shape=ft.RoundedRectangleBorder(radius=10)
+            ),
+            tooltip="Какие источники (Line 1..N) и с каким усилением идут на каждое устройство"
+        )
+
         self.device_control_buttons = ft.Row(
-            [self.add_button, self.refresh_devices_button, self.diagnose_devices_button],
+            [self.add_button, self.refresh_devices_button, self.diagnose_devices_button,
+             self.routing_matrix_button],
             spacing=10
         )
 
@@ -534,8 +814,10 @@ class AudioForwarderApp:
                         text_align=ft.TextAlign.CENTER
                     ),
                     ft.Divider(height=20, thickness=2),
-                    self.source_combo,
-                    self.target_combo,
+                    self.source_row,
+                    self.source_meter_row,
+                    self.spectrum_row,
+                    self.target_row,
                     ft.Text("Настройки качества звука:", weight=ft.FontWeight.BOLD),
                     self.audio_settings_row,
                     self.add_theme_buttons,
@@ -578,11 +860,10 @@ class AudioForwarderApp:
         self.sample_rate = int(e.control.value)
         self.settings["sample_rate"] = self.sample_rate
         self.settings_manager.save(self.settings)
-        print(f"🎵 Sample rate изменен на: {self.sample_rate} Hz")
+        log.info(f"🎵 Sample rate изменен на: {self.sample_rate} Hz")
         
         # Сбрасываем статистику и диагностику
         self._reset_statistics()
-        self._delay_debug_printed.clear()
         self.delay_debug_mode = False
 
     def on_blocksize_change(self, e):
@@ -596,50 +877,310 @@ class AudioForwarderApp:
         self.blocksize = int(e.control.value)
         self.settings["blocksize"] = self.blocksize
         self.settings_manager.save(self.settings)
-        print(f"🔧 Buffer size изменен на: {self.blocksize} frames")
+        log.info(f"🔧 Buffer size изменен на: {self.blocksize} frames")
         
         # Сбрасываем статистику и диагностику
         self._reset_statistics()
-        self._delay_debug_printed.clear()
         self.delay_debug_mode = False
 
+    def on_engine_mode_change(self, e):
+        """Переключение режима движка: в процессе GUI или в отдельном процессе."""
+        if self.transmission_thread and self.transmission_thread.is_alive():
+            self.show_message("Остановите трансляцию перед изменением настроек аудио")
+            e.control.value = self.engine_mode == 'process'  # Откатываем изменение
+            self.page.update()
+            return
+        
+        self.engine_mode = 'process' if e.control.value else 'thread'
+        self.settings["engine_mode"] = self.engine_mode
+        self.settings_manager.save(self.settings)
+        log.info(f"🧩 Режим движка: {self.engine_mode}")
+
+    def on_fanout_change(self, e):
+        """Включение/выключение отдельных потоков записи для устройств."""
+        if self.transmission_thread and self.transmission_thread.is_alive():
+            self.show_message("Остановите трансляцию перед изменением настроек аудио")
+            e.control.value = self.fanout_enabled  # Откатываем изменение
+            self.page.update()
+            return
+        
+        self.fanout_enabled = bool(e.control.value)
+        self.settings["fanout"] = self.fanout_enabled
+        self.settings_manager.save(self.settings)
+        log.info(f"🧵 Поток на устройство: {'включен' if self.fanout_enabled else 'выключен'}")
+
+    def on_adaptive_jitter_change(self, e):
+        """Включение/выключение адаптивного буфера устройств."""
+        if self.transmission_thread and self.transmission_thread.is_alive():
+            self.show_message("Остановите трансляцию перед изменением настроек аудио")
+            e.control.value = self.adaptive_jitter  # Откатываем изменение
+            self.page.update()
+            return
+        
+        self.adaptive_jitter = bool(e.control.value)
+        self.settings["adaptive_jitter"] = self.adaptive_jitter
+        self.settings_manager.save(self.settings)
+        log.info(f"📶 Адаптивный буфер: {'включен' if self.adaptive_jitter else 'выключен'}")
+
+    def on_auto_align_change(self, e):
+        """Выравнивание задержек устройств по самому медленному (применяется на лету)."""
+        self.auto_align = bool(e.control.value)
+        for engine in self.engines:
+            engine.set_auto_align(self.auto_align)
+        self.send_to_engine('auto_align', self.auto_align)
+        self.settings["auto_align"] = self.auto_align
+        self.settings_manager.save(self.settings)
+        log.info(f"⏱️ Автовыравнивание: {'включено' if self.auto_align else 'выключено'}")
+
+    def on_delay_crossfade_change(self, e):
+        """Длительность кроссфейда при изменении задержки (применяется на лету)."""
+        try:
+            self.delay_crossfade_ms = int(e.control.value)
+        except (TypeError, ValueError):
+            return
+        for engine in self.engines:
+            engine.set_delay_crossfade(self.delay_crossfade_ms)
+        self.send_to_engine('delay_crossfade', self.delay_crossfade_ms)
+        self.settings["delay_crossfade_ms"] = self.delay_crossfade_ms
+        self.settings_manager.save(self.settings)
+        log.info(f"🎚️ Смена задержки: {DELAY_CROSSFADE_OPTIONS.get(self.delay_crossfade_ms, self.delay_crossfade_ms)}")
+
+    def on_idle_policy_change(self, e):
+        """Поведение при тишине на источнике (применяется на лету)."""
+        policy = e.control.value
+        if policy not in IDLE_POLICY_OPTIONS:
+            return
+        self.idle_policy = policy
+        for engine in self.engines:
+            engine.set_idle_policy(policy)
+        self.send_to_engine('idle_policy', policy)
+        self.settings["idle_policy"] = policy
+        self.settings_manager.save(self.settings)
+        log.info(f"💤 При тишине: {IDLE_POLICY_OPTIONS[policy]}")
+
+    def on_stall_deadline_change(self, e):
+        """Срок, после которого поток считается зависшим (применяется на лету)."""
+        try:
+            self.stall_deadline_ms = int(e.control.value)
+        except (TypeError, ValueError):
+            return
+        for engine in self.engines:
+            engine.set_stall_deadline(self.stall_deadline_ms)
+        self.send_to_engine('stall_deadline', self.stall_deadline_ms)
+        self.settings["stall_deadline_ms"] = self.stall_deadline_ms
+        self.settings_manager.save(self.settings)
+        log.info(f"⏳ Сторож потоков: {STALL_DEADLINE_OPTIONS.get(self.stall_deadline_ms, self.stall_deadline_ms)}")
+
+    def on_recording_change(self, e):
+        """Включение/выключение записи в WAV (применяется на лету)."""
+        self.recording_enabled = bool(e.control.value)
+        if self.recording_enabled:
+            self.start_recording()
+        else:
+            self.stop_recording()
+
+    def start_recording(self):
+        """Начинает запись во всех движках (если трансляция идет)."""
+        for engine in self.engines:
+            engine.start_recording(self.recording_dir, self.recording_rotate_mb, self.recording_rotate_minutes)
+        self.send_to_engine('record', self.recording_dir, self.recording_rotate_mb, self.recording_rotate_minutes)
+
+    def stop_recording(self):
+        """Останавливает запись и сообщает, куда сохранены файлы."""
+        files = []
+        for engine in self.engines:
+            files.extend(engine.stop_recording())
+        self.send_to_engine('record', None, 0, 0)
+        if files:
+            self.show_message(f"💾 Записано файлов: {len(files)} ({os.path.abspath(self.recording_dir)})")
+
+    def recording_overflows(self):
+        """Блоки, потерянные записью из-за медленного диска."""
+        if self.engine_process is not None:
+            return self.stream_stats.get('recording_overflows', 0)
+        return sum(engine.recorder.overflows for engine in self.engines if engine.recorder is not None)
+
     def on_source_device_change(self, e):
         """Handle source device change"""
         if e.control.value:
-            print(f"🎤 Источник звука изменен: {e.control.value}")
-            
-            # ИСПРАВЛЕНИЕ: Обновляем источник в ApplicationAudioRouter
-            # if hasattr(self, 'audio_router') and self.audio_router:
-            #     self.audio_router.update_source_device(e.control.value)  # Отключено
-            
-            self.save_settings()
-            
-            # Если трансляция активна, перезапускаем с новым источником
-            if self.transmission_thread and self.transmission_thread.is_alive():
-                self.show_message("⚠️ Источник звука изменен. Перезапуск трансляции...")
-                self.restart_capture()
+            self.select_source(e.control.value)
+
+    def on_source_file_picked(self, e):
+        """WAV-файл выбран как источник."""
+        if not e.files:
+            return
+        source = file_source_name(e.files[0].path)
+        options = self.source_combo.options or []
+        if all((opt.key or opt.text) != source for opt in options):
+            self.source_combo.options = options + [ft.dropdown.Option(source)]
+        self.source_combo.value = source
+        self.page.update()
+        self.select_source(source)
+
+    def on_network_source_entered(self, e):
+        """Сетевой источник по порту из поля ("порт" или "адрес:порт")."""
+        address = (self.network_source_field.value or "").strip()
+        if not address:
+            return
+        try:
+            bind, port = parse_network_source(address)
+        except ValueError as error:
+            self.show_message(f"❌ {error}")
+            return
+        source = network_source_name(port, None if bind == "0.0.0.0" else bind)
+        options = self.source_combo.options or []
+        if all((opt.key or opt.text) != source for opt in options):
+            self.source_combo.options = options + [ft.dropdown.Option(source)]
+        self.source_combo.value = source
+        self.network_source_field.value = ""
+        self.page.update()
+        self.select_source(source)
+
+    def select_source(self, source):
+        """Применяет выбранный источник (устройство или файл)."""
+        log.info(f"🎤 Источник звука изменен: {source}")
+        
+        # ИСПРАВЛЕНИЕ: Обновляем источник в ApplicationAudioRouter
+        if hasattr(self, 'audio_router') and self.audio_router:
+            self.audio_router.update_source_device(source)
+
+        # Ячейки, сохраненные под именем прежнего источника, переходят к новому
+        self.adopt_matrix_primary(self._matrix_primary)
+        self._matrix_primary = source
+        
+        self.save_settings()
+        
+        # Если трансляция активна, переключаем источник на лету (кроссфейд без перезапуска потоков)
+        if self.transmission_thread and self.transmission_thread.is_alive():
+            if self.engine_process is not None:
+                self.engine_process.send('swap_source', source)
             else:
-                pass
+                threading.Thread(target=self.swap_live_source, args=(source,), daemon=True).start()
+
+    def swap_live_source(self, source):
+        """Горячая замена источника; если она невозможна - перезапуск трансляции."""
+        if all(engine.swap_source(source) for engine in list(self.engines)):
+            return
+        self.show_message("⚠️ Источник звука изменен. Перезапуск трансляции...")
+        self.restart_capture()
 
     def on_routing_settings_changed(self, app_name, selected_devices):
         """Обработка изменений настроек маршрутизации."""
-        print(f"🔄 Настройки маршрутизации изменены для {app_name}: {selected_devices}")
+        log.info(f"🔄 Настройки маршрутизации изменены для {app_name}: {selected_devices}")
         
         # Если трансляция активна, обновляем маршрутизацию в реальном времени
         if self.transmission_thread and self.transmission_thread.is_alive():
-            print("📡 Обновление маршрутизации в реальном времени...")
+            log.info("📡 Обновление маршрутизации в реальном времени...")
             # Маршрутизация будет обновлена при следующем callback'е
             
     def should_route_to_device(self, device_name):
         """Проверяет должен ли звук маршрутизироваться на указанное устройство."""
-        # if not hasattr(self, 'audio_router') or not self.audio_router:
-        return True  # Если нет маршрутизатора, разрешаем все устройства (отключено)
+        if not hasattr(self, 'audio_router') or not self.audio_router:
+            return True  # Если нет маршрутизатора, разрешаем все устройства
+        
+        return self.audio_router.should_route_to_device(device_name)
+
+    def get_routing_snapshot(self):
+        """Возвращает текущий снимок маршрутизации или None, если маршрутизатора нет."""
+        if not hasattr(self, 'audio_router') or not self.audio_router:
+            return None
+        return self.audio_router.routing_snapshot
+
+    def show_routing_matrix_dialog(self):
+        """Диалог матрицы источников: строки - цели, столбцы - источники, ячейки - усиление в дБ."""
+        sources = [opt.key if hasattr(opt, 'key') and opt.key else opt.text for opt in (self.source_combo.options or [])]
+        if not sources or not self.target_devices_list:
+            self.show_message("⚠️ Нужны хотя бы один источник и одно целевое устройство")
+            return
         
-        # return self.audio_router.should_route_to_device(device_name)  # Отключено
+        primary = self.source_combo.value
+        header = ft.Row(
+            [ft.Container(ft.Text("Цель \\ Источник", weight=ft.FontWeight.BOLD), width=220)] +
+            [ft.Container(ft.Text(source, size=11, max_lines=2), width=110) for source in sources],
+            spacing=5
+        )
+        rows = [header]
+        for target in self.target_devices_list:
+            cells = self.routing_matrix.get(target)
+            fields = []
+            for source in sources:
+                if cells is None:
+                    value = "0" if source == primary else ""
+                else:
+                    gain_db = cells.get(PRIMARY_SOURCE if source == primary else source)
+                    value = "" if gain_db is None else str(gain_db)
+                fields.append(ft.TextField(
+                    value=value,
+                    width=110,
+                    hint_text="выкл",
+                    text_align=ft.TextAlign.CENTER,
+                    on_blur=lambda e, t=target, src=source: self.update_matrix_cell(t, src, e.control),
+                    on_submit=lambda e, t=target, src=source: self.update_matrix_cell(t, src, e.control),
+                    border_radius=10
+                ))
+            rows.append(ft.Row(
+                [ft.Container(ft.Text(target, size=12, max_lines=2), width=220)] + fields,
+                spacing=5
+            ))
+        
+        dialog = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("🎚️ Матрица источников (усиление, дБ; пусто = выкл)"),
+            content=ft.Container(
+                content=ft.Column(rows, scroll=ft.ScrollMode.AUTO, spacing=8),
+                width=900,
+                height=400
+            ),
+            actions=[ft.TextButton("OK", on_click=lambda e: self.close_dialog(dialog))]
+        )
+        self.page.overlay.append(dialog)
+        dialog.open = True
+        self.page.update()
+
+    def update_matrix_cell(self, target, source, control):
+        """Обновляет ячейку матрицы источников; усиление применяется на лету."""
+        text = (control.value or "").strip().replace(',', '.')
+        try:
+            gain_db = None if text == "" else max(-60.0, min(20.0, float(text)))
+        except ValueError:
+            self.show_message("❌ Усиление должно быть числом в дБ (пусто = выключено)")
+            return
+        
+        primary = self.source_combo.value
+        self.adopt_matrix_primary(primary)
+        if target not in self.routing_matrix:
+            # Первая правка: фиксируем неявный маршрут основного источника (каким бы он ни был потом)
+            self.routing_matrix[target] = {PRIMARY_SOURCE: 0.0}
+        cells = self.routing_matrix[target]
+        if source == primary:
+            source = PRIMARY_SOURCE
+        if gain_db is None:
+            cells.pop(source, None)
+        else:
+            cells[source] = gain_db
+        
+        opened_sources = set()
+        for engine in list(self.engines):
+            engine.set_gain(source, target, gain_db)
+            opened_sources.update(engine.sources)
+        self.send_to_engine('gain', source, target, gain_db)
+        
+        self.save_settings()
+        log.info(f"🎚️ Матрица: {primary if source == PRIMARY_SOURCE else source} → {target}: "
+                 f"{'выкл' if gain_db is None else f'{gain_db:+.1f} дБ'}")
+        
+        if gain_db is not None and self.engines and source != PRIMARY_SOURCE and source not in opened_sources:
+            self.show_message(f"ℹ️ Источник '{source}' будет подключен после перезапуска трансляции")
+
+    def adopt_matrix_primary(self, source):
+        """Переводит ячейки основного источника из старых настроек (по имени) на PRIMARY_SOURCE."""
+        if adopt_primary(self.routing_matrix, source):
+            log.info(f"🎚️ Матрица: маршруты '{source}' закреплены за основным источником")
+            self.save_settings()
 
     def force_refresh_devices(self):
         """Принудительное обновление списка устройств через AudioDeviceMonitor."""
-        print("🔄 Принудительное обновление устройств...")
+        log.info("🔄 Принудительное обновление устройств...")
         
         # Проверяем активные потоки
         is_streaming = (self.transmission_thread and 
@@ -650,7 +1191,7 @@ class AudioForwarderApp:
             self.show_message("⚠️ Обновление устройств недоступно!\n\n"
                             "Сначала остановите активные потоки аудио, "
                             "затем попробуйте обновить список устройств.")
-            print("⚠️ Обновление заблокировано - активны потоки")
+            log.warning("⚠️ Обновление заблокировано - активны потоки")
             return
         
         try:
@@ -661,9 +1202,9 @@ class AudioForwarderApp:
             current_devices = device_monitor.get_current_audio_devices()
             device_details = device_monitor.get_device_details()
             
-            print(f"📊 Обнаружено {len(current_devices)} аудио-устройств:")
+            log.info(f"📊 Обнаружено {len(current_devices)} аудио-устройств:")
             for device in current_devices:
-                print(f"  • {device}")
+                log.info(f"  • {device}")
             
             # Принудительно обновляем кеш устройств
             self._force_device_update = True
@@ -678,8 +1219,8 @@ class AudioForwarderApp:
             message += f"Найдено {len(current_devices)} аудио-устройств.\n"
             message += f"Список устройств успешно обновлен."
             
-            print("✅ Принудительное обновление завершено успешно")
-            print(f"📝 {message}")
+            log.info("✅ Принудительное обновление завершено успешно")
+            log.info(f"📝 {message}")
             
             # Отложенное показ сообщения чтобы избежать конфликтов UI
             import threading
@@ -692,7 +1233,7 @@ class AudioForwarderApp:
             
         except Exception as e:
             error_msg = f"❌ Ошибка обновления устройств: {e}"
-            print(error_msg)
+            log.error(error_msg)
             
             # Отложенное показ ошибки
             import threading
@@ -708,9 +1249,9 @@ class AudioForwarderApp:
         Диагностика аудио-устройств для выявления проблемных устройств и аудио-петель.
         Особенно полезна для Bluetooth устройств как Tronsmart Element T6.
         """
-        print("\n" + "="*70)
-        print("🔍 ДИАГНОСТИКА АУДИО-УСТРОЙСТВ")
-        print("="*70)
+        log.info("\n" + "="*70)
+        log.info("🔍 ДИАГНОСТИКА АУДИО-УСТРОЙСТВ")
+        log.info("="*70)
         
         try:
             devices = sd.query_devices()
@@ -724,8 +1265,8 @@ class AudioForwarderApp:
                 except:
                     host_api_names[i] = 'Unknown'
             
-            print(f"\n📊 Обнаружено {len(devices)} аудио-устройств")
-            print(f"🌐 Доступно {len(host_apis)} аудио-интерфейсов")
+            log.info(f"\n📊 Обнаружено {len(devices)} аудио-устройств")
+            log.info(f"🌐 Доступно {len(host_apis)} аудио-интерфейсов")
             
             # Анализируем каждое устройство
             problematic_devices = []
@@ -748,77 +1289,77 @@ class AudioForwarderApp:
                     is_bluetooth = any(keyword in name.lower() for keyword in ['bluetooth', 'bt', 'wireless', 'headphones', 'speakers'])
                     
                     # Детальная диагностика
-                    print(f"\n🔍 Устройство #{device_id}: {name}")
-                    print(f"  📡 API: {host_api_name}")
-                    print(f"  🎤 Вход: {max_input} каналов")
-                    print(f"  🔊 Выход: {max_output} каналов")
-                    print(f"  ⚡ Частота: {default_samplerate} Hz")
+                    log.info(f"\n🔍 Устройство #{device_id}: {name}")
+                    log.info(f"  📡 API: {host_api_name}")
+                    log.info(f"  🎤 Вход: {max_input} каналов")
+                    log.info(f"  🔊 Выход: {max_output} каналов")
+                    log.info(f"  ⚡ Частота: {default_samplerate} Hz")
                     
                     # КРИТИЧЕСКАЯ ПРОВЕРКА: устройство с входом И выходом
                     if max_input > 0 and max_output > 0:
-                        print(f"  ⚠️  РИСК АУДИО-ПЕТЛИ: устройство может принимать И воспроизводить звук!")
+                        log.warning(f"  ⚠️  РИСК АУДИО-ПЕТЛИ: устройство может принимать И воспроизводить звук!")
                         loop_risk_devices.append(name)
                         
                         # Особенно опасно для Bluetooth устройств
                         if is_bluetooth:
-                            print(f"  🚨 BLUETOOTH + ДВУНАПРАВЛЕННОСТЬ = ВЫСОКИЙ РИСК ПЕТЛИ!")
+                            log.error(f"  🚨 BLUETOOTH + ДВУНАПРАВЛЕННОСТЬ = ВЫСОКИЙ РИСК ПЕТЛИ!")
                             problematic_devices.append(name)
                     
                     # Проверка на Tronsmart Element T6
                     if is_tronsmart:
-                        print(f"  🎯 НАЙДЕН TRONSMART ELEMENT T6!")
+                        log.info(f"  🎯 НАЙДЕН TRONSMART ELEMENT T6!")
                         bluetooth_devices.append(name)
                         
                         # Проверяем доступность устройства
                         try:
                             sd.check_output_settings(device=device_id, samplerate=44100, channels=2)
-                            print(f"  ✅ Устройство доступно для вывода")
+                            log.info(f"  ✅ Устройство доступно для вывода")
                         except Exception as e:
-                            print(f"  ❌ Устройство НЕ доступно: {e}")
+                            log.error(f"  ❌ Устройство НЕ доступно: {e}")
                             problematic_devices.append(name)
                     
                     # Проверка на проблемные паттерны
                     if is_bluetooth and max_input > 0:
-                        print(f"  🔴 BLUETOOTH С МИКРОФОНОМ: может вызывать петли!")
+                        log.warning(f"  🔴 BLUETOOTH С МИКРОФОНОМ: может вызывать петли!")
                         problematic_devices.append(name)
                         
                 except Exception as e:
-                    print(f"  ❌ Ошибка анализа устройства: {e}")
+                    log.error(f"  ❌ Ошибка анализа устройства: {e}")
                     continue
             
             # Итоговый отчет
-            print(f"\n" + "="*70)
-            print("📋 ИТОГОВЫЙ ОТЧЕТ ДИАГНОСТИКИ")
-            print("="*70)
+            log.info(f"\n" + "="*70)
+            log.info("📋 ИТОГОВЫЙ ОТЧЕТ ДИАГНОСТИКИ")
+            log.info("="*70)
             
             if problematic_devices:
-                print(f"\n🚨 ПРОБЛЕМНЫЕ УСТРОЙСТВА ({len(problematic_devices)}):")
+                log.error(f"\n🚨 ПРОБЛЕМНЫЕ УСТРОЙСТВА ({len(problematic_devices)}):")
                 for device in problematic_devices:
-                    print(f"  • {device}")
-                print(f"\n💡 РЕКОМЕНДАЦИИ:")
-                print(f"  1. Отключите микрофон на этих устройствах")
-                print(f"  2. Используйте только как устройства ВЫВОДА")
-                print(f"  3. Проверьте настройки Bluetooth профилей")
-                print(f"  4. Рассмотрите использование только A2DP профиля")
+                    log.info(f"  • {device}")
+                log.info(f"\n💡 РЕКОМЕНДАЦИИ:")
+                log.info(f"  1. Отключите микрофон на этих устройствах")
+                log.info(f"  2. Используйте только как устройства ВЫВОДА")
+                log.info(f"  3. Проверьте настройки Bluetooth профилей")
+                log.info(f"  4. Рассмотрите использование только A2DP профиля")
             
             if loop_risk_devices:
-                print(f"\n⚠️  РИСК АУДИО-ПЕТЕЛЬ ({len(loop_risk_devices)}):")
+                log.warning(f"\n⚠️  РИСК АУДИО-ПЕТЕЛЬ ({len(loop_risk_devices)}):")
                 for device in loop_risk_devices:
-                    print(f"  • {device}")
+                    log.info(f"  • {device}")
             
             if bluetooth_devices:
-                print(f"\n📱 BLUETOOTH УСТРОЙСТВА ({len(bluetooth_devices)}):")
+                log.info(f"\n📱 BLUETOOTH УСТРОЙСТВА ({len(bluetooth_devices)}):")
                 for device in bluetooth_devices:
-                    print(f"  • {device}")
+                    log.info(f"  • {device}")
             
-            print(f"\n🔧 РЕКОМЕНДАЦИИ ПО TRONSMART ELEMENT T6:")
-            print(f"  1. Убедитесь, что используется только A2DP профиль")
-            print(f"  2. Отключите HFP/HSP профили в настройках Bluetooth")
-            print(f"  3. Проверьте что колонка не используется как микрофон")
-            print(f"  4. Перезагрузите Bluetooth драйвер")
+            log.info(f"\n🔧 РЕКОМЕНДАЦИИ ПО TRONSMART ELEMENT T6:")
+            log.info(f"  1. Убедитесь, что используется только A2DP профиль")
+            log.info(f"  2. Отключите HFP/HSP профили в настройках Bluetooth")
+            log.info(f"  3. Проверьте что колонка не используется как микрофон")
+            log.info(f"  4. Перезагрузите Bluetooth драйвер")
             
-            print(f"\n✅ Диагностика завершена!")
-            print("="*70)
+            log.info(f"\n✅ Диагностика завершена!")
+            log.info("="*70)
             
             # Показываем результат в UI
             result_message = f"Диагностика завершена!\n\n"
@@ -836,7 +1377,7 @@ class AudioForwarderApp:
             
         except Exception as e:
             error_msg = f"❌ Ошибка диагностики: {e}"
-            print(error_msg)
+            log.error(error_msg)
             self.show_message(error_msg)
 
     def _detect_audio_loop(self, indata, device_name: str) -> bool:
@@ -870,12 +1411,12 @@ class AudioForwarderApp:
                     
                     # Если уровень сигнала резко возрос
                     if recent_avg > early_avg * 2.0 and recent_avg > 0.1:
-                        print(f"⚠️  ОБНАРУЖЕНА ПОТЕНЦИАЛЬНАЯ ПЕТЛЯ: {device_name}")
-                        print(f"   Уровень сигнала: {early_avg:.4f} → {recent_avg:.4f} (x{recent_avg/early_avg:.2f})")
+                        log.warning("⚠️  ОБНАРУЖЕНА ПОТЕНЦИАЛЬНАЯ ПЕТЛЯ: %s", device_name)
+                        log.info("   Уровень сигнала: %.4f → %.4f (x%.2f)", early_avg, recent_avg, recent_avg / early_avg)
                         
                         # Проверяем на повторяющийся паттерн
                         if self._check_repeating_pattern(signal_levels):
-                            print(f"🚨 ПОДТВЕРЖДЕНА АУДИО-ПЕТЛЯ: {device_name}")
+                            log.error("🚨 ПОДТВЕРЖДЕНА АУДИО-ПЕТЛЯ: %s", device_name)
                             self.loop_protection_stats['loops_detected'] += 1
                             self.loop_protection_stats['last_loop_time'] = int(time.time())
                             
@@ -887,7 +1428,7 @@ class AudioForwarderApp:
             return False
             
         except Exception as e:
-            print(f"❌ Ошибка обнаружения петли: {e}")
+            log.error("❌ Ошибка обнаружения петли: %s", e)
             return False
 
     def _check_repeating_pattern(self, signal_levels) -> bool:
@@ -904,13 +1445,13 @@ class AudioForwarderApp:
             if len(first_half) == len(second_half):
                 correlation = np.corrcoef(first_half, second_half)[0, 1]
                 if not np.isnan(correlation) and correlation > self.loop_detection_threshold:
-                    print(f"🔍 Обнаружен повторяющийся паттерн (корреляция: {correlation:.3f})")
+                    log.info("🔍 Обнаружен повторяющийся паттерн (корреляция: %.3f)", correlation)
                     return True
             
             return False
             
         except Exception as e:
-            print(f"❌ Ошибка анализа паттерна: {e}")
+            log.error("❌ Ошибка анализа паттерна: %s", e)
             return False
 
     def _prevent_audio_loop(self, device_name: str) -> bool:
@@ -921,7 +1462,7 @@ class AudioForwarderApp:
             if not self.loop_prevention_enabled:
                 return False
             
-            print(f"🛡️  ПРЕДОТВРАЩЕНИЕ ПЕТЛИ: отключаю {device_name}")
+            log.info(f"🛡️  ПРЕДОТВРАЩЕНИЕ ПЕТЛИ: отключаю {device_name}")
             
             # Останавливаем поток для проблемного устройства
             if device_name in self.device_streams:
@@ -931,14 +1472,14 @@ class AudioForwarderApp:
                     try:
                         output_stream.stop()
                         output_stream.close()
-                        print(f"✅ Поток {device_name} остановлен")
+                        log.info(f"✅ Поток {device_name} остановлен")
                     except Exception as e:
-                        print(f"⚠️ Ошибка остановки потока: {e}")
+                        log.warning(f"⚠️ Ошибка остановки потока: {e}")
                 
                 # Очищаем буфер устройства
                 if device_name in self.buffers:
                     self.buffers[device_name].clear()
-                    print(f"🧹 Буфер {device_name} очищен")
+                    log.info(f"🧹 Буфер {device_name} очищен")
                 
                 # Удаляем из активных потоков
                 del self.device_streams[device_name]
@@ -958,7 +1499,7 @@ class AudioForwarderApp:
             return False
             
         except Exception as e:
-            print(f"❌ Ошибка предотвращения петли: {e}")
+            log.error(f"❌ Ошибка предотвращения петли: {e}")
             return False
 
     def _check_device_availability(self, device_id: int, device_name: str) -> bool:
@@ -977,7 +1518,7 @@ class AudioForwarderApp:
             test_stream.close()
             return True
         except Exception as e:
-            print(f"⚠️ Устройство '{device_name}' недоступно: {e}")
+            log.warning(f"⚠️ Устройство '{device_name}' недоступно: {e}")
             return False
 
     def update_devices(self):
@@ -992,73 +1533,15 @@ class AudioForwarderApp:
                 # Используем кешированные данные
                 filtered_sources = self.devices_cache.get('sources', [])
                 filtered_targets = self.devices_cache.get('targets', [])
-                print(f"📋 Используем кешированные устройства: {len(filtered_sources)} источников, {len(filtered_targets)} целей")
+                log.info(f"📋 Используем кешированные устройства: {len(filtered_sources)} источников, {len(filtered_targets)} целей")
             else:
-                # Обновляем кеш
-                devices = sd.query_devices()
-                filtered_sources = []
-                filtered_targets = []
-                seen_devices = set()
-
-                # Кешируем host APIs для оптимизации
-                host_apis_cache = {}
-                try:
-                    host_apis = sd.query_hostapis()
-                    for i, api in enumerate(host_apis):
-                        try:
-                            # Безопасное извлечение имени API
-                            if hasattr(api, 'get'):
-                                host_apis_cache[i] = api.get('name', 'Unknown') # type: ignore
-                            elif isinstance(api, dict):
-                                host_apis_cache[i] = api['name'] if 'name' in api else 'Unknown'
-                            else:
-                                host_apis_cache[i] = str(api)
-                        except Exception:
-                            host_apis_cache[i] = 'Unknown'
-                except Exception:
-                    pass
-
-                for device in devices:
-                    try:
-                        # Безопасное извлечение данных устройства
-                        name = device.get('name', 'Unknown Device') # type: ignore
-                        device_id = device.get('index', -1) # type: ignore
-                        hostapi_id = device.get('hostapi', -1) # type: ignore
-                        max_output = device.get('max_output_channels', 0) # type: ignore
-                        max_input = device.get('max_input_channels', 0) # type: ignore
-
-                        # Быстрое получение host API из кеша
-                        host_api = host_apis_cache.get(hostapi_id, 'Unknown')
-
-                        # Фильтруем только устройства с API MME
-                        if host_api == "MME":
-                            if max_output > 0 and max_input == 0:
-                                # Исключаем системные виртуальные устройства
-                                excluded_devices = [
-                                    "Mapper", 
-                                    "Переназначение звуковых устр",
-                                    "Sound Mapper",
-                                    "Primary Sound Driver",
-                                    "Основной звуковой драйвер"
-                                ]
-                                
-                                # Проверяем что устройство не является системным виртуальным
-                                is_excluded = any(excluded in str(name) for excluded in excluded_devices)
-                                
-                                if is_excluded:
-                                    print(f"🚫 Исключено системное устройство: {name}")
-                                elif device_id not in seen_devices:
-                                    if "Line 1 (Virtual Audio Cable)" in str(name):
-                                        filtered_sources.append(str(name))
-                                        print(f"📥 Добавлен источник: {name}")
-                                    else:
-                                        filtered_targets.append(str(name))
-                                        print(f"📤 Добавлена цель: {name}")
-                                    seen_devices.add(device_id)
-
-                    except Exception as e:
-                        print(f"⚠️ Ошибка обработки устройства: {e}")
-                        continue
+                # Обновляем кеш: по одному варианту каждого устройства по политике (правила компилируются один раз)
+                scan = discover_devices(self.sample_rate)
+                filtered_sources = [choice.name for choice in scan.sources]
+                filtered_targets = [choice.name for choice in scan.targets]
+                for role, choices in (("📥 Источник", scan.sources), ("📤 Цель", scan.targets)):
+                    for choice in choices:
+                        log.info(f"{role}: {choice.name} [{choice.host_api}, {choice.latency_ms:.1f} мс]")
 
                 # Обновляем кеш
                 self.devices_cache = {
@@ -1068,15 +1551,15 @@ class AudioForwarderApp:
                 self.devices_cache_time = current_time
                 # Сбрасываем флаг принудительного обновления
                 self._force_device_update = False
-                print(f"🔄 Кеш устройств обновлен: {len(filtered_sources)} источников, {len(filtered_targets)} целей")
-                print(f"📋 Источники: {filtered_sources}")
-                print(f"🎯 Цели: {filtered_targets}")
+                log.info(f"🔄 Кеш устройств обновлен: {len(filtered_sources)} источников, {len(filtered_targets)} целей")
+                log.info(f"📋 Источники: {filtered_sources}")
+                log.info(f"🎯 Цели: {filtered_targets}")
 
             # Отложенное обновление UI для оптимизации
             self._schedule_ui_update(filtered_sources, filtered_targets)
             
         except Exception as e:
-            print(f"❌ Ошибка обновления устройств: {e}")
+            log.error(f"❌ Ошибка обновления устройств: {e}")
             # Fallback к старому списку устройств
             if hasattr(self, 'devices_cache') and self.devices_cache:
                 self._schedule_ui_update(
@@ -1086,6 +1569,11 @@ class AudioForwarderApp:
 
     def _schedule_ui_update(self, sources, targets):
         """Отложенное обновление UI для оптимизации производительности."""
+        # Выбранный файл или сетевой источник остается в списке при обновлении устройств
+        if (is_file_source(self.source_combo.value) or is_network_source(self.source_combo.value)) and \
+                self.source_combo.value not in sources:
+            sources = list(sources) + [self.source_combo.value]
+
         def update_ui():
             try:
                 # Обновляем только если есть изменения
@@ -1112,10 +1600,10 @@ class AudioForwarderApp:
                         self.target_combo.value = old_target_value
                     
                     self.page.update()
-                    print(f"✅ UI безопасно обновлен: {len(sources)} источников, {len(targets)} целей")
+                    log.info(f"✅ UI безопасно обновлен: {len(sources)} источников, {len(targets)} целей")
                 
             except Exception as e:
-                print(f"⚠️ Ошибка обновления UI: {e}")
+                log.warning(f"⚠️ Ошибка обновления UI: {e}")
         
         # Запускаем обновление в отдельном потоке для неблокирующего выполнения
         import threading
@@ -1123,44 +1611,17 @@ class AudioForwarderApp:
         ui_thread.daemon = True
         ui_thread.start()
 
-    def start_stream(self, device_name, source_device_id, sample_rate, blocksize):
-        """Starts an output stream for a specific device."""
-        target_device_id = self.get_device_id(device_name)
-        if target_device_id is None:
-            self.show_message(f"Устройство '{device_name}' не найдено")
-            return None
-
-        try:
-            target_stream = sd.OutputStream(
-                device=target_device_id, 
-                samplerate=sample_rate, 
-                channels=2,
-                blocksize=blocksize,
-                dtype=self.bit_depth,
-                latency='low'  # Минимальная задержка
-            )
-            target_stream.start()
-            self.buffers[device_name] = collections.deque(maxlen=sample_rate // blocksize * 3)  # 3 секунды буфера
-            return target_stream
-        except Exception as e:
-            self.show_message(f"Ошибка запуска потока для {device_name}: {e}")
-            return None
-
-    @staticmethod
-    def get_device_id(device_name):
+    def get_device_id(self, device_name, role=ROLE_TARGET):
         """Returns the device ID for a given device name."""
-        try:
-            devices = sd.query_devices()
-            for sd_device in devices:
-                name = sd_device.get('name', '')  # type: ignore
-                if str(name) == device_name:
-                    return sd_device.get('index', None)  # type: ignore
-        except Exception as e:
-            print(f"Ошибка получения ID устройства: {e}")
-        return None
+        return find_device_id(device_name, role, self.sample_rate)
 
     def stop_streams(self):
         """Stops all active streams."""
+        # Движки закрывают свои потоки, включая дополнительные источники
+        for engine in self.engines:
+            engine.close()
+        self.engines.clear()
+        
         for device, streams in self.device_streams.items():
             input_stream, target_stream = streams
             try:
@@ -1169,9 +1630,21 @@ class AudioForwarderApp:
                 if target_stream:
                     target_stream.stop()
             except Exception as e:
-                print(f"Ошибка остановки потока: {e}")
+                log.warning(f"Ошибка остановки потока: {e}")
         self.device_streams.clear()
 
+    def get_engine_state(self):
+        """Настройки целей для движка (ссылки на словари интерфейса)."""
+        return EngineState(delays=self.delays, volumes=self.volumes, routing_matrix=self.routing_matrix,
+                           channel_maps=self.channel_maps, sample_formats=self.sample_formats,
+                           dither_enabled=self.dither_enabled, drop_policies=self.drop_policies,
+                           jitter_limits=self.jitter_limits)
+
+    def send_to_engine(self, *command):
+        """Передает изменение настройки процессу движка (в режиме 'process')."""
+        if self.engine_process is not None:
+            self.engine_process.send(*command)
+
     def manage_capture(self, action="start"):
         if action == "start":
             if self.transmission_thread and self.transmission_thread.is_alive():
@@ -1182,6 +1655,8 @@ class AudioForwarderApp:
                 self.show_message("Необходимо выбрать и источник, и хотя бы одно целевое устройство.")
                 return
             self.restart_button.disabled = False
+            if hasattr(self, 'audio_router') and self.audio_router:
+                self.audio_router.start_foreground_tracking()
             self.transmission_thread = threading.Thread(target=self.manage_audio_stream,
                                                         args=(source_device, self.target_devices_list))
             self.transmission_thread.start()
@@ -1190,6 +1665,8 @@ class AudioForwarderApp:
             if self.transmission_thread:
                 self.transmission_thread.join()
             self.stop_streams()
+            if hasattr(self, 'audio_router') and self.audio_router:
+                self.audio_router.stop_foreground_tracking()
             
             # Сбрасываем статистику при остановке
             self._reset_statistics()
@@ -1213,22 +1690,27 @@ class AudioForwarderApp:
             return
         
         # Проверяем доступность источника
-        source_device_id = self.get_device_id(self.source_combo.value)
-        if source_device_id is None:
+        if is_file_source(self.source_combo.value):
+            if not os.path.isfile(file_source_path(self.source_combo.value)):
+                self.show_message("❌ Файл-источник не найден")
+                return
+        elif is_network_source(self.source_combo.value):
+            pass  # Порт открывается при запуске; до первого пакета источник молчит
+        elif self.get_device_id(self.source_combo.value, ROLE_SOURCE) is None:
             self.show_message("❌ Источник звука недоступен. Проверьте подключение устройства")
             return
         
         # Проверяем доступность целевых устройств
         unavailable_devices = []
         for device in self.target_devices_list:
-            if self.get_device_id(device) is None:
+            if not is_network_target(device) and self.get_device_id(device) is None:
                 unavailable_devices.append(device)
         
         if unavailable_devices:
             self.show_message(f"❌ Недоступные устройства: {', '.join(unavailable_devices)}")
             return
         
-        print(f"✅ Начинаю трансляцию: {self.source_combo.value} → {len(self.target_devices_list)} устройств")
+        log.info(f"✅ Начинаю трансляцию: {self.source_combo.value} → {len(self.target_devices_list)} устройств")
         self.manage_capture(action="start")
 
     def restart_capture(self):
@@ -1306,9 +1788,10 @@ class AudioForwarderApp:
                     new_value = 10000
                 
                 self.delays[device] = new_value
+                self.send_to_engine('delay', device, new_value)
                 if not isinstance(input_control, int):
                     input_control.value = str(new_value)
-                print(f"✅ Задержка для {device}: {new_value} мс")
+                log.info(f"✅ Задержка для {device}: {new_value} мс")
             
             # Валидация громкости
             elif value_type == "volume":
@@ -1320,9 +1803,10 @@ class AudioForwarderApp:
                     new_value = 20
                 
                 self.volumes[device] = new_value
+                self.send_to_engine('volume', device, new_value)
                 if not isinstance(input_control, int):
                     input_control.value = str(new_value)
-                print(f"✅ Громкость для {device}: {new_value:+.1f} дБ")
+                log.info(f"✅ Громкость для {device}: {new_value:+.1f} дБ")
             
             # Обновляем ползунок
             if slider_control:
@@ -1345,7 +1829,7 @@ class AudioForwarderApp:
             self.page.update()
             
         except Exception as e:
-            print(f"⚠️ Ошибка валидации: {e}")
+            log.warning(f"⚠️ Ошибка валидации: {e}")
             self.show_message(f"❌ Ошибка валидации значения: {e}")
 
     def update_delay(self, device, delay_input, delay_slider=None):
@@ -1355,6 +1839,7 @@ class AudioForwarderApp:
         """Обновляет задержку при перемещении ползунка."""
         new_delay_ms = int(delay_slider.value)
         self.delays[device] = new_delay_ms
+        self.send_to_engine('delay', device, new_delay_ms)
         if delay_input:
             delay_input.value = str(new_delay_ms)
         self.page.update()
@@ -1362,196 +1847,399 @@ class AudioForwarderApp:
     def update_volume(self, device, volume_input, volume_slider=None):
         self.update_value(device, volume_input, volume_slider, value_type="volume")
 
+    def update_channel_map(self, device, control):
+        """Меняет раскладку каналов; если число выходных каналов не меняется - применяется на лету."""
+        spec = control.value or DEFAULT_CHANNEL_MAP
+        try:
+            output_channels(spec)
+        except ValueError as e:
+            self.show_message(f"❌ {e}")
+            return
+        
+        self.channel_maps[device] = spec
+        self.save_settings()
+        log.info(f"🔀 Раскладка каналов для {device}: {spec}")
+        
+        # Процесс движка ответит событием, если раскладку нельзя сменить на лету
+        self.send_to_engine('channel_map', device, spec)
+        
+        applied = [engine.set_channel_map(device, spec) for engine in self.engines
+                   if device in engine.compiled_channel_maps]
+        if applied and not all(applied):
+            self.show_message("ℹ️ Раскладка каналов изменится после перезапуска трансляции")
+
+    def update_sample_format(self, device, sample_format):
+        """Меняет выходной формат сэмплов устройства (применяется при открытии потока)."""
+        self.sample_formats[device] = sample_format or DEFAULT_SAMPLE_FORMAT
+        self.save_settings()
+        log.info(f"🎛️ Формат для {device}: {self.sample_formats[device]}")
+        
+        if self.transmission_thread and self.transmission_thread.is_alive():
+            self.show_message("ℹ️ Формат сэмплов изменится после перезапуска трансляции")
+
+    def update_dither(self, device, enabled):
+        """Включает/выключает дизеринг; активный поток подхватывает изменение со следующего блока."""
+        self.dither_enabled[device] = bool(enabled)
+        for engine in self.engines:
+            engine.set_dither(device, enabled)
+        self.send_to_engine('dither', device, bool(enabled))
+        self.save_settings()
+
+    def update_drop_policy(self, device, policy):
+        """Меняет политику перегрузки потока записи устройства (применяется на лету)."""
+        self.drop_policies[device] = policy or DEFAULT_DROP_POLICY
+        for engine in self.engines:
+            engine.set_drop_policy(device, self.drop_policies[device])
+        self.send_to_engine('drop_policy', device, self.drop_policies[device])
+        self.save_settings()
+
+    def update_jitter_limit(self, device, control):
+        """Меняет верхний предел адаптивного запаса устройства (применяется на лету)."""
+        min_ms, max_ms = self.jitter_limits.get(device, default_jitter_limits(device))
+        try:
+            max_ms = max(min_ms, min(MAX_JITTER_LIMIT_MS, int(float((control.value or "0").strip()))))
+        except ValueError:
+            self.show_message(f"❌ Предел запаса должен быть числом в мс (0-{MAX_JITTER_LIMIT_MS})")
+            control.value = str(max_ms)
+            self.page.update()
+            return
+        
+        control.value = str(max_ms)
+        self.jitter_limits[device] = (min_ms, max_ms)
+        for engine in self.engines:
+            engine.set_jitter_limits(device, min_ms, max_ms)
+        self.send_to_engine('jitter_limits', device, (min_ms, max_ms))
+        self.save_settings()
+        self.page.update()
+        log.info(f"📶 Предел запаса для {device}: {min_ms}-{max_ms} мс")
+
     def update_volume_from_slider(self, device, volume_slider, volume_input=None):
         """Обновляет громкость при перемещении ползунка."""
         new_volume_db = int(volume_slider.value)
         self.volumes[device] = new_volume_db
+        self.send_to_engine('volume', device, new_volume_db)
         if volume_input:
             volume_input.value = str(new_volume_db)
         self.page.update()
 
-    def manage_audio_stream(self, source_device_name, target_devices=None, new_device=None, sample_rate=None,
-                            blocksize=None):
+    def manage_audio_stream(self, source_device_name, target_devices=None, sample_rate=None, blocksize=None):
         """Manages the audio stream."""
+        engine = None
         try:
             # Используем настройки из класса если не переданы параметры
             if sample_rate is None:
                 sample_rate = self.sample_rate
             if blocksize is None:
                 blocksize = self.blocksize
-                
-            source_device_id = self.get_device_id(source_device_name)
-            if source_device_id is None:
-                self.show_message(f"Источник '{source_device_name}' не найден")
-                return
 
             if target_devices is None:
                 target_devices = []
+            self.adopt_matrix_primary(source_device_name)
+            self._matrix_primary = source_device_name
 
-            if new_device:
-                target_devices = [new_device]
-                
-            # Обновляем статистику при запуске
-            self.stream_stats['start_time'] = time.time()
-            self.stream_stats['total_frames'] = 0
-            self.stream_stats['errors_count'] = 0
-            self.stream_stats['total_callbacks'] = 0
-            self.stream_stats['data_processed_mb'] = 0.0
-            self.stream_stats['last_callback_time'] = 0
-            self.stream_stats['callback_intervals'].clear()
-            print(f"📊 Статистика сброшена, запуск для {len(target_devices)} устройств")
-
-            target_streams = []
-            for target_device_name in target_devices:
-                target_stream = self.start_stream(target_device_name, source_device_id, sample_rate, blocksize)
-                if target_stream:
-                    if new_device:
-                        self.device_streams[target_device_name] = (None, target_stream)
-                    target_streams.append((target_stream, target_device_name))
-
-            def callback(indata, frames, time, status):
-                """Улучшенная callback функция со статистикой и защитой от петель."""
-                import time as time_module
-                current_callback_time = time_module.time()
-                
-                if status:
-                    print(f"🔊 Статус ошибки: {status}")
-                    self.stream_stats['errors_count'] += 1
-                
-                # КРИТИЧЕСКИ ВАЖНО: Обнаружение аудио-петель для Bluetooth устройств
-                try:
-                    # Проверяем на аудио-петли (особенно для Tronsmart Element T6)
-                    if self._detect_audio_loop(indata, source_device_name):
-                        print(f"🚨 ОБНАРУЖЕНА АУДИО-ПЕТЛЯ: {source_device_name}")
-                        # Немедленно прекращаем обработку для предотвращения петли
-                        return
-                except Exception as e:
-                    print(f"⚠️ Ошибка обнаружения петли: {e}")
-                    # Продолжаем работу даже если обнаружение петли не сработало
-                
-                # ИСПРАВЛЕНО: правильная статистика
-                self.stream_stats['total_frames'] += frames
-                self.stream_stats['total_callbacks'] += 1
-                
-                # Измеряем объем обработанных данных (frames × каналы × байты на sample)
-                data_size_bytes = frames * 2 * 4  # 2 канала × 4 байта (float32)
-                self.stream_stats['data_processed_mb'] += data_size_bytes / (1024 * 1024)
-                
-                # Измеряем стабильность интервалов между callback'ами
-                if self.stream_stats['last_callback_time'] > 0:
-                    interval = current_callback_time - self.stream_stats['last_callback_time']
-                    self.stream_stats['callback_intervals'].append(interval)
-                self.stream_stats['last_callback_time'] = current_callback_time
+            if self.engine_mode == 'process':
+                self.run_engine_process(source_device_name, target_devices, sample_rate, blocksize)
+                return
+
+            engine = AudioEngine(source_device_name, list(target_devices), self.get_engine_state(),
+                                 sample_rate, blocksize,
+                                 stats=self.stream_stats,
+                                 notify=self.show_message,
+                                 loop_detector=self._detect_audio_loop,
+                                 routing_provider=self.get_routing_snapshot,
+                                 device_streams=self.device_streams,
+                                 buffers=self.buffers,
+                                 delay_debug_mode=self.delay_debug_mode,
+                                 fanout=self.fanout_enabled,
+                                 adaptive_jitter=self.adaptive_jitter,
+                                 delay_crossfade_ms=self.delay_crossfade_ms,
+                                 file_loop=self.file_loop,
+                                 file_realtime=self.file_realtime,
+                                 idle_policy=self.idle_policy,
+                                 stall_deadline_ms=self.stall_deadline_ms,
+                                 auto_align=self.auto_align)
+            if not engine.open():
+                return
+            self.engines.append(engine)
+            if self.recording_enabled:
+                engine.start_recording(self.recording_dir, self.recording_rotate_mb, self.recording_rotate_minutes)
+            engine.set_spectrum(self.spectrum_selection)
+            self.start_spectrum(engine.spectrum.buffer, engine.spectrum.written, engine.spectrum.sample_rate)
+
+            # Входной поток закрывает движок (после горячей замены источника это уже другой поток)
+            engine.create_input_stream().start()
+            self.stop_event.clear()
+            self.start_button.disabled = True
+            self.stop_button.disabled = False
+            self.page.update()
+            meter_reader = LevelMeterReader.for_meters(engine.meters)
+            while not self.stop_event.is_set():
+                sd.sleep(int(METER_UI_INTERVAL * 1000))
+                self.update_meters(meter_reader, (engine.meters.source_names, engine.meters.target_rows))
+                self.update_spectrum()
+                self.apply_device_health(engine.device_health())
+                if time.monotonic() - self._last_latency_update >= LATENCY_UI_INTERVAL:
+                    self.apply_latency_report(engine.latency_report())
+                    self.stream_stats.update(engine.network_stats())
+
+        except Exception as e:
+            self.show_message(f"Ошибка в аудиопотоке: {e}")
+        finally:
+            if engine is not None and engine.delay_debug_mode:
+                self.delay_debug_mode = True
+            self.stop_streams()
+            self.stop_spectrum()
+            self.reset_meters()
+            self.apply_device_health({})
+            self.apply_latency_report({})
+            self.page.update()
+
+    def run_engine_process(self, source_device_name, target_devices, sample_rate, blocksize):
+        """
+        Трансляция через процесс движка.
+
+        GUI только передает команды, проверяет петли по копии блоков источника
+        и читает телеметрию; звук обрабатывается в отдельном процессе.
+        """
+        client = EngineProcessClient()
+        snapshot = self.get_routing_snapshot()
+        client.start(source_device_name, target_devices, self.get_engine_state(), sample_rate, blocksize,
+                     enabled_targets=snapshot.enabled_targets() if snapshot is not None else None,
+                     delay_debug_mode=self.delay_debug_mode, fanout=self.fanout_enabled,
+                     adaptive_jitter=self.adaptive_jitter, delay_crossfade_ms=self.delay_crossfade_ms,
+                     file_loop=self.file_loop, file_realtime=self.file_realtime,
+                     spectrum=self.spectrum_selection, idle_policy=self.idle_policy,
+                     stall_deadline_ms=self.stall_deadline_ms, auto_align=self.auto_align)
+        self.engine_process = client
+        self.start_spectrum(client.spectrum_ring.buffer, client.spectrum_ring.written,
+                            sample_rate // spectrum_decimation(sample_rate))
+        self.stream_stats['start_time'] = None  # Статистика придет из телеметрии
+        if self.recording_enabled:
+            client.send('record', self.recording_dir, self.recording_rotate_mb, self.recording_rotate_minutes)
+        
+        source_block = np.zeros((client.source_ring.blocksize, client.source_ring.channels), dtype=np.float32)
+        loop_guard = False
+        try:
+            self.stop_event.clear()
+            self.start_button.disabled = True
+            self.stop_button.disabled = False
+            self.page.update()
+            
+            while not self.stop_event.is_set() and client.is_alive():
+                for event in client.poll_events():
+                    self.handle_engine_event(event)
                 
-                # Управление памятью - периодическая очистка
-                self.memory_cleanup_counter += 1
-                if self.memory_cleanup_counter >= self.memory_cleanup_interval:
-                    try:
-                        # Очищаем переполненные буферы
-                        for device_name in list(self.buffers.keys()):
-                            buffer = self.buffers.get(device_name)
-                            if buffer and len(buffer) > 1000:  # Если буфер слишком большой
-                                buffer.clear()
-                        self.memory_cleanup_counter = 0
-                    except Exception as e:
-                        print(f"⚠️ Ошибка очистки памяти в callback: {e}")
+                # Снимок маршрутизации передается процессу только при изменении
+                current_snapshot = self.get_routing_snapshot()
+                if current_snapshot is not snapshot:
+                    snapshot = current_snapshot
+                    client.send('routing', snapshot.enabled_targets() if snapshot is not None else None)
                 
-                # Антиалиасинг фильтр для высоких частот дискретизации
-                if sample_rate > 48000:
-                    # Применяем сглаживание для высоких частот
-                    filtered_data = indata.copy()
-                    if len(filtered_data) > 1:
-                        filtered_data[1:] = filtered_data[1:] * 0.9 + filtered_data[:-1] * 0.1
-                else:
-                    filtered_data = indata.copy()
+                # Защита от аудио-петель по копии блоков источника из разделяемой памяти
+                # Решение меняется только по новым блокам: пустое кольцо сохраняет прежнее состояние
+                detected = False
+                received = False
+                frames = client.source_ring.pop_into(source_block)
+                while frames:
+                    received = True
+                    detected = self._detect_audio_loop(source_block[:frames], source_device_name) or detected
+                    frames = client.source_ring.pop_into(source_block)
+                if received and detected != loop_guard:
+                    loop_guard = detected
+                    client.send('loop_guard', detected)
                 
-                streams = target_streams if not new_device else [(self.device_streams[new_device][1], new_device)]
-                for target_stream, target_device_name in streams:
-                    try:
-                        # ИСПРАВЛЕНИЕ: Проверка маршрутизации перед обработкой звука
-                        if not self.should_route_to_device(target_device_name):
-                            # Если маршрутизация запрещена, пропускаем этот поток
-                            continue
-                        
-                        # Получаем задержку в миллисекундах
-                        delay_ms = self.delays.get(target_device_name, 0)
-                        
-                        # Преобразуем в секунды (обычно мс → сек)
-                        delay_s = delay_ms / 1000.0
-                        
-                        # ДОПОЛНИТЕЛЬНАЯ ЗАЩИТА: если задержки все еще слишком большие
-                        if self.delay_debug_mode:
-                            delay_s = delay_s / 1000.0  # Еще раз делим на 1000
-                            print(f"🐛 DEBUG: дополнительное деление для {target_device_name}: {delay_ms}мс → {delay_s}с")
-                        
-                        volume_db = self.volumes.get(target_device_name, 0)
-                        volume_factor = 10 ** (volume_db / 20.0)
+                self.apply_engine_telemetry(client.read_telemetry())
+                self.update_meters(client.meter_reader, self.meter_rows)
+                self.update_spectrum()
+                self.stop_event.wait(0.05)
+            
+            if not self.stop_event.is_set():
+                self.show_message("⚠️ Процесс аудио-движка завершился")
+        finally:
+            for event in client.poll_events():
+                self.handle_engine_event(event)
+            self.stop_spectrum()  # Анализатор читает кольцо клиента - до освобождения памяти
+            client.stop()
+            self.engine_process = None
+            self.reset_meters()
+            self.apply_device_health({})
+            self.apply_latency_report({})
+
+    def handle_engine_event(self, event):
+        """Обрабатывает событие процесса движка."""
+        kind = event[0]
+        if kind == 'message':
+            self.show_message(event[1])
+        elif kind == 'channel_map' and not event[2]:
+            self.show_message("ℹ️ Раскладка каналов изменится после перезапуска трансляции")
+        elif kind == 'source_swapped' and not event[2]:
+            self.show_message("⚠️ Источник звука изменен. Перезапуск трансляции...")
+            # Перезапуск ждет завершения потока трансляции - выполняем его отдельно
+            threading.Thread(target=self.restart_capture, daemon=True).start()
+        elif kind == 'attached':
+            log.warning(f"{'➕' if event[2] else '⚠️'} Процесс движка: {event[1]} {'подключено' if event[2] else 'не подключено'}")
+        elif kind == 'started':
+            log.info(f"🧩 Процесс движка: {len(event[1]['targets'])} целей, {event[1]['channels']} кан.")
+        elif kind == 'meter_rows':
+            self.meter_rows = (tuple(event[1]), dict(event[2]))
+        elif kind == 'latency':
+            self.apply_latency_report({name: TargetLatency(*values) for name, values in event[1].items()})
+        elif kind == 'health':
+            self.apply_device_health({name: DeviceHealth(*state) for name, state in event[1].items()})
+        elif kind == 'recording' and event[2]:
+            self.show_message(f"💾 Записано файлов: {len(event[2])} ({os.path.abspath(self.recording_dir)})")
+
+    def apply_engine_telemetry(self, telemetry):
+        """Переносит телеметрию процесса движка в статистику статус-бара."""
+        if not telemetry or not telemetry['start_time']:
+            return
+        for key in ('start_time', 'data_processed_mb', 'last_callback_time', 'last_stall_time', 'net_fill_ms'):
+            self.stream_stats[key] = telemetry[key]
+        for key in ('total_frames', 'total_callbacks', 'errors_count', 'active_streams', 'recording_overflows',
+                    'stalls', 'net_packets', 'net_concealed_frames', 'net_late', 'net_underruns'):
+            self.stream_stats[key] = int(telemetry[key])
+        self.stream_stats['idle'] = bool(telemetry['idle'])
+        intervals = self.stream_stats['callback_intervals']
+        intervals.clear()
+        intervals.extend(telemetry['callback_intervals'])
+
+    def apply_device_health(self, health):
+        """Показывает состояние устройств на карточках (только при изменении)."""
+        if health == self.device_health:
+            return
+        self.device_health = health
+        try:
+            for device, controls in self.device_containers.items():
+                if "health_text" not in controls:
+                    continue
+                state = health.get(device)
+                if state is None or (state.state == HEALTH_OK and not state.restarts):
+                    controls["health_text"].value = ""
+                    continue
+                text = HEALTH_LABELS.get(state.state, state.state)
+                if state.state == HEALTH_RESTARTING and state.retry_in:
+                    text += f" через {state.retry_in:.1f} с"
+                if state.restarts:
+                    text += f" | перезапусков: {state.restarts}"
+                if state.state != HEALTH_OK and state.last_error:
+                    text += f" | {state.last_error}"
+                controls["health_text"].value = text
+            self.page.update()
+        except Exception as e:
+            log.warning(f"⚠️ Ошибка обновления состояния устройств: {e}")
 
-                        buffer = self.buffers[target_device_name]
-                        
-                        # ИСПРАВЛЕНИЕ: правильно считаем количество порций для задержки
-                        required_frames = int(sample_rate * delay_s)
-                        required_chunks = max(1, required_frames // blocksize)  # Порции, не фреймы!
-                        
-                        # Диагностика (только при первом callback для каждого устройства)
-                        if target_device_name not in self._delay_debug_printed:
-                            real_delay_ms = (required_chunks * blocksize / sample_rate) * 1000
-                            print(f"📊 {target_device_name}: установлено {delay_ms}мс → {required_chunks} порций → реально {real_delay_ms:.1f}мс")
-                            
-                            # Автоматическое включение debug режима если задержка слишком большая
-                            if delay_ms > 0 and real_delay_ms > delay_ms * 10:  # Если реальная в 10 раз больше
-                                print(f"⚠️ ОБНАРУЖЕНА ПРОБЛЕМА: задержка в 10 раз больше ожидаемой!")
-                                print(f"💡 Включаю debug режим с дополнительным делением на 1000...")
-                                self.delay_debug_mode = True
-                                
-                            self._delay_debug_printed.add(target_device_name)
-                        
-                        # Защита от переполнения буфера
-                        if len(buffer) > required_chunks * 3:  # Если буфер в 3 раза больше нужного
-                            buffer.clear()
-                            print(f"🧹 Буфер {target_device_name} очищен (переполнение)")
+    def apply_latency_report(self, report):
+        """Показывает сквозную задержку каждого устройства на его карточке."""
+        self._last_latency_update = time.monotonic()
+        try:
+            for device, controls in self.device_containers.items():
+                if "latency_text" in controls:
+                    latency = report.get(device)
+                    controls["latency_text"].value = format_latency(latency) if latency is not None else ""
+            self.page.update()
+        except Exception as e:
+            log.warning(f"⚠️ Ошибка обновления задержек: {e}")
 
-                        # Применяем громкость с мягким ограничением
-                        modified_audio = filtered_data * volume_factor
-                        
-                        # Мягкое ограничение для предотвращения клиппинга
-                        if volume_factor > 1.0:
-                            modified_audio = np.tanh(modified_audio * 0.9) * 1.1
-                        
-                        buffer.append(modified_audio)
+    def update_meters(self, reader, rows):
+        """Обновляет индикаторы уровней (не чаще METER_UI_INTERVAL)."""
+        now = time.monotonic()
+        if reader is None or now - self._last_meter_update < METER_UI_INTERVAL or not reader.refresh():
+            return
+        self._last_meter_update = now
+        source_names, target_rows = rows
+        try:
+            if source_names:
+                self._show_meter(self.source_meter_bar, self.source_meter_text, reader.read(0, now))
+            for device in self.target_devices_list:
+                controls = self.device_containers.get(device, {})
+                index = target_rows.get(device)
+                if index is not None and "meter_bar" in controls:
+                    self._show_meter(controls["meter_bar"], controls["meter_text"],
+                                     reader.read(target_row(index), now))
+            self.page.update()
+        except Exception as e:
+            log.warning(f"⚠️ Ошибка обновления индикаторов: {e}")
 
-                        # ИСПРАВЛЕНИЕ: правильное воспроизведение с задержкой
-                        while len(buffer) > required_chunks:
-                            out_data = buffer.popleft()
-                            target_stream.write(out_data)
-                            
-                    except Exception as e:
-                        print(f"⚠️  Ошибка обработки {target_device_name}: {e}")
-                        self.stream_stats['errors_count'] += 1
-                        continue
-
-            if not new_device:
-                with sd.InputStream(device=source_device_id, channels=2, callback=callback,
-                                    samplerate=sample_rate, blocksize=blocksize):
-                    self.stop_event.clear()
-                    self.start_button.disabled = True
-                    self.stop_button.disabled = False
-                    self.page.update()
-                    while not self.stop_event.is_set():
-                        sd.sleep(100)
-            else:
-                new_stream = sd.InputStream(device=source_device_id, channels=2, callback=callback,
-                                            samplerate=sample_rate, blocksize=blocksize)
-                new_stream.start()
-                self.device_streams[new_device] = (new_stream, self.device_streams[new_device][1])
-                self.page.update()
+    @staticmethod
+    def _show_meter(bar, text, reading):
+        bar.value = meter_fraction(reading.hold_db)
+        bar.color = "red" if reading.clipped else ("orange" if reading.hold_db > -6 else "green")
+        text.value = format_reading(reading)
+
+    def reset_meters(self):
+        """Гасит индикаторы после остановки трансляции."""
+        self.meter_rows = ((), {})
+        bars = [(self.source_meter_bar, self.source_meter_text)] + [
+            (controls["meter_bar"], controls["meter_text"])
+            for controls in self.device_containers.values() if "meter_bar" in controls]
+        for bar, text in bars:
+            bar.value = 0
+            text.value = ""
+
+    def _spectrum_options(self):
+        options = [ft.dropdown.Option("off", "Выкл"), ft.dropdown.Option(SPECTRUM_SOURCE, "🎤 Источник")]
+        return options + [ft.dropdown.Option(device, f"🔊 {device}") for device in self.target_devices_list]
+
+    def refresh_spectrum_options(self):
+        """Список вариантов спектра повторяет список целевых устройств."""
+        if not hasattr(self, 'spectrum_dropdown'):
+            return
+        self.spectrum_dropdown.options = self._spectrum_options()
+        if self.spectrum_selection not in (None, SPECTRUM_SOURCE) and \
+                self.spectrum_selection not in self.target_devices_list:
+            self.select_spectrum(None)
+
+    def on_spectrum_change(self, e):
+        value = e.control.value
+        self.select_spectrum(None if value in (None, "off") else value)
+        self.page.update()
 
+    def select_spectrum(self, selection):
+        """Переключает сигнал спектра на лету (None - выключен)."""
+        self.spectrum_selection = selection
+        self.spectrum_dropdown.value = selection or "off"
+        for engine in self.engines:
+            engine.set_spectrum(selection)
+        self.send_to_engine('spectrum', selection)
+        if self.spectrum_analyzer is not None:
+            self.spectrum_analyzer.reset()
+        self._shown_spectrum_frame = None
+        self.spectrum_view.visible = selection is not None
+        for bar in self.spectrum_bars:
+            bar.height = 1
+        self.spectrum_peak_text.value = ""
+
+    def start_spectrum(self, buffer, written, sample_rate):
+        """Запускает поток БПФ над кольцом спектра движка."""
+        self.stop_spectrum()
+        self.spectrum_analyzer = SpectrumAnalyzer(buffer, written, sample_rate)
+        self.spectrum_analyzer.start()
+
+    def stop_spectrum(self):
+        analyzer = self.spectrum_analyzer
+        self.spectrum_analyzer = None
+        if analyzer is not None:
+            analyzer.stop()
+        self._shown_spectrum_frame = None
+
+    def update_spectrum(self):
+        """Перерисовывает спектр, если анализатор опубликовал новый кадр."""
+        analyzer = self.spectrum_analyzer
+        frame = analyzer.latest if analyzer is not None and self.spectrum_selection is not None else None
+        if frame is None or frame is self._shown_spectrum_frame:
+            return
+        self._shown_spectrum_frame = frame
+        try:
+            for bar, level_db in zip(self.spectrum_bars, frame.magnitudes_db):
+                fraction = max(0.0, 1 - float(level_db) / SPECTRUM_FLOOR_DB)
+                bar.height = max(1, int(fraction * SPECTRUM_VIEW_HEIGHT))
+                bar.bgcolor = "red" if level_db > -6 else ("orange" if level_db > -20 else "blue")
+            self.spectrum_peak_text.value = (f"{format_frequency(frame.frequencies[0])} … "
+                                             f"{format_frequency(frame.frequencies[-1])} | "
+                                             f"пик {format_frequency(frame.peak_hz)}, {frame.peak_db:.1f} дБ")
+            self.spectrum_view.update()
         except Exception as e:
-            self.show_message(f"Ошибка в аудиопотоке: {e}")
-        finally:
-            if not new_device:
-                self.stop_streams()
-                self.page.update()
+            log.warning(f"⚠️ Ошибка обновления спектра: {e}")
 
     def add_device(self, device):
         """Добавляет новое устройство в список."""
@@ -1566,16 +2254,60 @@ class AudioForwarderApp:
             self.add_device_to_ui(device)
 
             if self.transmission_thread and self.transmission_thread.is_alive():
-                self.manage_audio_stream(source_device, new_device=device)
+                self.attach_live_target(device)
+
+    def on_add_network_target(self, e):
+        """Добавляет сетевую цель по адресу из поля ("хост:порт" или только хост - порт по умолчанию)."""
+        address = (self.network_target_field.value or "").strip()
+        if not address:
+            return
+        try:
+            host, port = parse_network_address(address)
+        except ValueError as error:
+            try:
+                host, port = parse_network_address(f"{address}:{DEFAULT_NETWORK_PORT}")
+            except ValueError:
+                self.show_message(f"❌ {error}")
+                return
+        self.network_target_field.value = ""
+        self.add_device(network_target_name(host, port))
+        self.page.update()
+
+    def attach_live_target(self, device):
+        """Подключает устройство к идущей трансляции (общий захват, без перезапуска)."""
+        if self.engine_process is not None:
+            self.engine_process.send('attach', device, self.get_device_settings_entry(device))
+            return
+        # Открытие устройства занимает время - не задерживаем интерфейс
+        for engine in list(self.engines):
+            threading.Thread(target=engine.attach_target, args=(device,), daemon=True).start()
+
+    def detach_live_target(self, device):
+        """Отключает устройство от идущей трансляции на границе блоков."""
+        if self.engine_process is not None:
+            self.engine_process.send('detach', device)
+            return
+        for engine in list(self.engines):
+            engine.detach_target(device)
 
     def add_device_to_ui(self, device):
         """Add the device UI elements for the newly added device."""
         device_settings = self.device_settings.get(device, {})
         delay_ms = device_settings.get('delay', 0)
         volume_db = device_settings.get('volume', 0)
+        channel_map = device_settings.get('channel_map', DEFAULT_CHANNEL_MAP)
+        sample_format = device_settings.get('sample_format', DEFAULT_SAMPLE_FORMAT)
+        dither = device_settings.get('dither', True)
+        drop_policy = device_settings.get('drop_policy', DEFAULT_DROP_POLICY)
+        jitter_limits = tuple(device_settings.get('jitter_limits', default_jitter_limits(device)))
 
         self.delays[device] = delay_ms
         self.volumes[device] = volume_db
+        self.channel_maps[device] = channel_map
+        self.sample_formats[device] = sample_format
+        self.dither_enabled[device] = dither
+        self.drop_policies[device] = drop_policy
+        self.jitter_limits[device] = jitter_limits
         self.buffers[device] = collections.deque()
 
         # UI элементы
@@ -1652,6 +2384,64 @@ class AudioForwarderApp:
             tooltip="Удалить устройство"
         )
 
+        channel_map_options = dict(CHANNEL_MAP_PRESETS)
+        if channel_map not in channel_map_options:
+            channel_map_options[channel_map] = f"Каналы {channel_map.split(':', 1)[-1]}"
+        channel_map_dropdown = ft.Dropdown(
+            label="Каналы",
+            options=[ft.dropdown.Option(key, text) for key, text in channel_map_options.items()],
+            value=channel_map,
+            on_change=lambda e, d=device: self.update_channel_map(d, e.control),
+            border_radius=10,
+            tooltip="Раскладка каналов для устройства (моно-сабвуфер, перестановка L/R, 5.1)"
+        )
+
+        sample_format_dropdown = ft.Dropdown(
+            label="Формат",
+            options=[ft.dropdown.Option(key, text) for key, text in SAMPLE_FORMAT_OPTIONS.items()],
+            value=sample_format if sample_format in SAMPLE_FORMAT_OPTIONS else DEFAULT_SAMPLE_FORMAT,
+            on_change=lambda e, d=device: self.update_sample_format(d, e.control.value),
+            border_radius=10,
+            expand=True,
+            tooltip="Формат сэмплов на устройство: int16/int24 уменьшают трафик по USB и Bluetooth"
+        )
+
+        dither_checkbox = ft.Checkbox(
+            label="Дизеринг",
+            value=dither,
+            on_change=lambda e, d=device: self.update_dither(d, e.control.value),
+            tooltip="TPDF-дизеринг при преобразовании в int16/int24"
+        )
+
+        drop_policy_dropdown = ft.Dropdown(
+            label="При перегрузке",
+            options=[ft.dropdown.Option(key, text) for key, text in DROP_POLICY_OPTIONS.items()],
+            value=drop_policy if drop_policy in DROP_POLICY_OPTIONS else DEFAULT_DROP_POLICY,
+            on_change=lambda e, d=device: self.update_drop_policy(d, e.control.value),
+            border_radius=10,
+            expand=True,
+            tooltip="Что делать, если устройство не успевает (режим \"Поток на устройство\")"
+        )
+
+        jitter_limit_input = ft.TextField(
+            label="Макс. запас, мс",
+            value=str(jitter_limits[1]),
+            width=130,
+            text_align=ft.TextAlign.CENTER,
+            on_blur=lambda e, d=device: self.update_jitter_limit(d, e.control),
+            on_submit=lambda e, d=device: self.update_jitter_limit(d, e.control),
+            border_radius=10,
+            tooltip="Верхний предел адаптивного буфера (Bluetooth-колонкам нужно больше)"
+        )
+
+        # Индикатор уровня того, что уходит на устройство
+        meter_bar = ft.ProgressBar(value=0, expand=True, color="green", bgcolor="black12")
+        meter_text = ft.Text("", size=11)
+        # Состояние устройства по данным надзора за потоками
+        health_text = ft.Text("", size=11)
+        # Сквозная задержка устройства с разбивкой по составляющим
+        latency_text = ft.Text("", size=11)
+
         # Создаем контейнер устройства
         device_container = ft.Container(
             content=ft.Column(
@@ -1660,6 +2450,10 @@ class AudioForwarderApp:
                         ft.Text(f"🔊 {device}", size=16, weight=ft.FontWeight.BOLD),
                         remove_button
                     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                    health_text,
+                    latency_text,
+                    meter_bar,
+                    meter_text,
                     ft.Row([
                         decrement_button,
                         delay_input,
@@ -1673,6 +2467,9 @@ class AudioForwarderApp:
                         increment_volume_button
                     ], alignment=ft.MainAxisAlignment.CENTER),
                     volume_slider,
+                    channel_map_dropdown,
+                    ft.Row([sample_format_dropdown, dither_checkbox]),
+                    ft.Row([drop_policy_dropdown, jitter_limit_input]),
                 ],
                 alignment=ft.MainAxisAlignment.CENTER,
                 spacing=10
@@ -1696,6 +2493,10 @@ class AudioForwarderApp:
         self.device_containers[device] = {
             "delay_slider": delay_slider,
             "volume_slider": volume_slider,
+            "meter_bar": meter_bar,
+            "meter_text": meter_text,
+            "health_text": health_text,
+            "latency_text": latency_text,
             "container": device_container
         }
         
@@ -1704,21 +2505,20 @@ class AudioForwarderApp:
             if hasattr(self, 'page') and self.page:
                 self.page.update()
         except Exception as e:
-            print(f"⚠️ Ошибка обновления UI в add_device_to_ui: {e}")
+            log.warning(f"⚠️ Ошибка обновления UI в add_device_to_ui: {e}")
         
         self.update_panel_visibility()
         
         # Обновляем audio_router с проверкой
-        # if hasattr(self, 'audio_router') and self.audio_router:
-        #     self.audio_router.update_devices(self.target_devices_list)  # Отключено
+        if hasattr(self, 'audio_router') and self.audio_router:
+            self.audio_router.update_devices(self.target_devices_list)
 
     def remove_device(self, device):
         """Removes a device from the list and stops its stream."""
         if self.transmission_thread and self.transmission_thread.is_alive():
-            self.show_message_with_stop_button("Невозможно выполнить пока включен поток.")
-            return
-
-        if device in self.device_streams:
+            # Общая шина захвата: устройство отключается без перезапуска трансляции
+            self.detach_live_target(device)
+        elif device in self.device_streams:
             _, target_stream = self.device_streams[device]
             try:
                 target_stream.stop()
@@ -1731,30 +2531,32 @@ class AudioForwarderApp:
             self.target_devices_list.pop(index)
             self.selected_devices_list.controls.pop(index)
 
-            self.device_settings[device] = {
-                'delay': self.delays.get(device, 0),
-                'volume': self.volumes.get(device, 0)
-            }
+            self.device_settings[device] = self.get_device_settings_entry(device)
 
             # Очистка данных устройства
-            for key in ['delays', 'volumes', 'buffers', 'device_containers']:
+            for key in ['delays', 'volumes', 'buffers', 'device_containers', 'channel_maps',
+                        'sample_formats', 'dither_enabled', 'drop_policies', 'jitter_limits']:
                 device_dict = getattr(self, key, {})
                 if device in device_dict:
                     del device_dict[device]
 
             self.update_panel_visibility()
             
+            if hasattr(self, 'audio_router') and self.audio_router:
+                self.audio_router.update_devices(self.target_devices_list)
+            
             # Безопасное обновление UI
             try:
                 if hasattr(self, 'page') and self.page:
                     self.page.update()
             except Exception as e:
-                print(f"⚠️ Ошибка обновления UI в remove_device: {e}")
+                log.warning(f"⚠️ Ошибка обновления UI в remove_device: {e}")
 
     def update_panel_visibility(self):
         """Updates the visibility of the devices panel and the clear button."""
         try:
             has_devices = len(self.target_devices_list) > 0
+            self.refresh_spectrum_options()
             
             if hasattr(self, 'devices_panel'):
                 self.devices_panel.visible = has_devices
@@ -1766,10 +2568,10 @@ class AudioForwarderApp:
                 try:
                     self.page.update()
                 except Exception as update_error:
-                    print(f"⚠️ Ошибка обновления UI в update_panel_visibility: {update_error}")
+                    log.warning(f"⚠️ Ошибка обновления UI в update_panel_visibility: {update_error}")
                     
         except Exception as e:
-            print(f"❌ Ошибка в update_panel_visibility: {e}")
+            log.error(f"❌ Ошибка в update_panel_visibility: {e}")
 
     def toggle_device_controls(self, active: bool):
         """Toggles the activity of the remove buttons and the clear button."""
@@ -1782,9 +2584,9 @@ class AudioForwarderApp:
                 try:
                     self.page.update()
                 except Exception as update_error:
-                    print(f"⚠️ Ошибка обновления UI в toggle_device_controls: {update_error}")
+                    log.warning(f"⚠️ Ошибка обновления UI в toggle_device_controls: {update_error}")
         except Exception as e:
-            print(f"❌ Ошибка переключения контролов: {e}")
+            log.error(f"❌ Ошибка переключения контролов: {e}")
 
     def clear_default_value(self, event):
         """Clears the default value of a text field if it is zero."""
@@ -1794,7 +2596,7 @@ class AudioForwarderApp:
                 if hasattr(self, 'page') and self.page:
                     self.page.update()
         except Exception as e:
-            print(f"⚠️ Ошибка в clear_default_value: {e}")
+            log.warning(f"⚠️ Ошибка в clear_default_value: {e}")
 
     def restore_default_value(self, event):
         """Restores the default value of a text field if it is empty."""
@@ -1804,7 +2606,7 @@ class AudioForwarderApp:
                 if hasattr(self, 'page') and self.page:
                     self.page.update()
         except Exception as e:
-            print(f"⚠️ Ошибка в restore_default_value: {e}")
+            log.warning(f"⚠️ Ошибка в restore_default_value: {e}")
 
     def window_event_handler(self, e):
         """Handles window events, like closing the app."""
@@ -1820,10 +2622,13 @@ class AudioForwarderApp:
         if hasattr(self, 'status_timer'):
             try:
                 self.status_timer.cancel()
-                print("🔕 Таймер статуса остановлен")
+                log.info("🔕 Таймер статуса остановлен")
             except Exception as e:
-                print(f"⚠️ Ошибка остановки таймера: {e}")
+                log.warning(f"⚠️ Ошибка остановки таймера: {e}")
         
+        if hasattr(self, 'audio_router') and self.audio_router:
+            self.audio_router.stop_foreground_tracking()
+            self.audio_router.stop_monitoring()
 
         
         # Выполняем очистку памяти
@@ -1838,7 +2643,7 @@ class AudioForwarderApp:
             time.sleep(0.5)
 
         self.page.window.destroy()
-        print("✅ Программа завершена корректно")
+        log.info("✅ Программа завершена корректно")
 
     def _cleanup_memory(self):
         """Очистка памяти для предотвращения утечек."""
@@ -1858,48 +2663,9 @@ class AudioForwarderApp:
             self.memory_cleanup_counter = 0
             self.stream_stats['total_frames'] = 0
             
-            print("🧹 Очистка памяти выполнена")
+            log.info("🧹 Очистка памяти выполнена")
         except Exception as e:
-            print(f"⚠️ Ошибка очистки памяти: {e}")
-
-    def _attempt_recovery(self, error_msg: str):
-        """Автоматическое восстановление после ошибок."""
-        current_time = time.time()
-        
-        # Проверяем не слишком ли часто происходят ошибки
-        if current_time - self.last_error_time < self.error_recovery_delay:
-            self.recovery_attempts += 1
-        else:
-            self.recovery_attempts = 1
-        
-        self.last_error_time = current_time
-        
-        if self.recovery_attempts <= self.max_recovery_attempts:
-            print(f"🔄 Попытка восстановления #{self.recovery_attempts}: {error_msg}")
-            
-            try:
-                # Очищаем буферы
-                for device in list(self.buffers.keys()):
-                    if device in self.buffers:
-                        self.buffers[device].clear()
-                
-                # Обновляем список устройств
-                self.update_devices()
-                
-                # Сбрасываем статистику ошибок если восстановление успешно
-                if self.recovery_attempts == 1:
-                    self.stream_stats['errors_count'] = 0
-                
-                print(f"✅ Восстановление #{self.recovery_attempts} успешно")
-                return True
-                
-            except Exception as e:
-                print(f"❌ Восстановление #{self.recovery_attempts} неудачно: {e}")
-                return False
-        else:
-            print(f"❌ Превышено максимальное количество попыток восстановления ({self.max_recovery_attempts})")
-            self.show_message(f"❌ Критическая ошибка: {error_msg}. Перезапустите приложение.")
-            return False
+            log.warning(f"⚠️ Ошибка очистки памяти: {e}")
 
     def clear_devices(self):
         """Clears the list of devices."""
@@ -1913,22 +2679,30 @@ class AudioForwarderApp:
         self.buffers.clear()
         self.delays.clear()
         self.volumes.clear()
+        self.channel_maps.clear()
+        self.sample_formats.clear()
+        self.dither_enabled.clear()
+        self.drop_policies.clear()
+        self.jitter_limits.clear()
         self.device_containers.clear()
         self.update_panel_visibility()
         
+        if hasattr(self, 'audio_router') and self.audio_router:
+            self.audio_router.update_devices(self.target_devices_list)
+        
         # Безопасное обновление UI
         try:
             if hasattr(self, 'page') and self.page:
                 self.page.update()
         except Exception as e:
-            print(f"⚠️ Ошибка обновления UI в clear_devices: {e}")
+            log.warning(f"⚠️ Ошибка обновления UI в clear_devices: {e}")
 
     def show_message(self, message: str):
         """Показывает сообщение в центре окна с безопасным обновлением."""
         try:
             # Проверяем что page доступна
             if not hasattr(self, 'page') or not self.page:
-                print(f"⚠️ Сообщение (page недоступна): {message}")
+                log.warning(f"⚠️ Сообщение (page недоступна): {message}")
                 return
                 
             dialog = ft.AlertDialog(
@@ -1947,15 +2721,15 @@ class AudioForwarderApp:
                 try:
                     self.page.update()
                 except Exception as update_error:
-                    print(f"⚠️ Ошибка обновления UI в show_message: {update_error}")
+                    log.warning(f"⚠️ Ошибка обновления UI в show_message: {update_error}")
                     # Альтернативный способ - просто логируем
-                    print(f"📝 Сообщение: {message}")
+                    log.info(f"📝 Сообщение: {message}")
             else:
-                print(f"📝 Сообщение (overlay недоступен): {message}")
+                log.info(f"📝 Сообщение (overlay недоступен): {message}")
                 
         except Exception as e:
-            print(f"❌ Критическая ошибка show_message: {e}")
-            print(f"📝 Исходное сообщение: {message}")
+            log.error(f"❌ Критическая ошибка show_message: {e}")
+            log.info(f"📝 Исходное сообщение: {message}")
 
     def close_dialog(self, dialog):
         """Закрывает диалог."""
@@ -1988,42 +2762,48 @@ class AudioForwarderApp:
         self.page.update()
 
     def on_advanced_settings_click(self):
-        """Заглушка для расширенных настроек."""
-        print("🔧 Запрос на открытие расширенных настроек...")
+        """Открываем интерфейс для настройки маршрутизации аудиопотоков."""
+        log.info("🔧 Запрос на открытие расширенных настроек...")
         
-        #"""Открываем интерфейс для настройки маршрутизации аудиопотоков."""
         # ИСПРАВЛЕНИЕ: Проверки состояния перед открытием
-        #try:
-            # 1. Проверка активных потоков
-            #if self.transmission_thread and self.transmission_thread.is_alive():
-               # active_streams = len([s for s in self.device_streams.values() if s])
-                #if active_streams > 0:
-                    #self.show_message(
-                        #"⚠️ Расширенные настройки недоступны!\n\n"
-                        #f"Активно {active_streams} аудиопотоков.\n"
-                        #"Сначала остановите трансляцию, затем откройте расширенные настройки."
-                    #)
-                    #print("⚠️ Расширенные настройки заблокированы - активна трансляция")
-                    #return
-            
-            # 2. Проверка источника звука
-            #if not self.source_combo.value:
-                #self.show_message(
-                    #"⚠️ Не выбран источник звука!\n\n"
-                    #"Выберите источник звука перед настройкой маршрутизации."
-                #)
-                #print("⚠️ Расширенные настройки заблокированы - нет источника звука")
-                #return
-            
-            # 3. Проверка целевых устройств
-            #if not self.target_devices_
-        # Показываем сообщение что функция пока не работает
-        self.show_message(
-            "⚠️ Расширенные настройки\n\n"
-            "Функция пока не работает.\n"
-            "Находится в разработке."
-        )
-        print("⚠️ Расширенные настройки - функция отключена (заглушка)")
+        try:
+            if not hasattr(self, 'audio_router') or not self.audio_router:
+                self.show_message("⚠️ Маршрутизатор приложений недоступен")
+                return
+            
+            # 1. Проверка источника звука
+            if not self.source_combo.value:
+                self.show_message(
+                    "⚠️ Не выбран источник звука!\n\n"
+                    "Выберите источник звука перед настройкой маршрутизации."
+                )
+                log.warning("⚠️ Расширенные настройки заблокированы - нет источника звука")
+                return
+            
+            # 2. Проверка целевых устройств
+            if not self.target_devices_list:
+                self.show_message(
+                    "⚠️ Нет целевых устройств!\n\n"
+                    "Добавьте хотя бы одно устройство перед настройкой маршрутизации."
+                )
+                log.warning("⚠️ Расширенные настройки заблокированы - нет целевых устройств")
+                return
+            
+            # 3. Диалог уже открыт
+            if self.audio_router._dialog_open:
+                log.warning("⚠️ Расширенные настройки уже открыты")
+                return
+            
+            self.audio_router.update_source_device(self.source_combo.value)
+            self.audio_router.update_devices(self.target_devices_list)
+            
+            # Сканирование окон идет в executor, поэтому цикл событий Flet не блокируется;
+            # маршрутизация применяется на лету через снимок, остановка трансляции не нужна
+            self.page.run_task(self.audio_router.start, self.page)
+            
+        except Exception as e:
+            log.error(f"❌ Ошибка открытия расширенных настроек: {e}")
+            self.show_message(f"❌ Ошибка открытия расширенных настроек: {e}")
 
     def toggle_language(self, _):
         """Переключение языка."""
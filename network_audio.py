@@ -0,0 +1,636 @@
+"""
+Network Audio для AudioForwarderApp
+PCM по UDP: сетевая цель (отправка блоков), сетевой источник и прием с буфером джиттера.
+
+Сетевая цель выглядит для движка как обычный выходной поток
+(start/stop/close/active/latency и write), поэтому проходит ту же цепочку:
+матрица, раскладка каналов, задержка, громкость, формат сэмплов и надзор.
+Имя цели: "udp:<хост>:<порт>".
+
+Сетевой источник (NetworkSourceStream) повторяет интерфейс sd.InputStream:
+собственный поток по локальным часам забирает блоки из буфера джиттера и
+вызывает callback движка, поэтому одна машина захвата может питать
+несколько узлов маршрутизации. Имя источника: "udp:<порт>" или
+"udp:<адрес приема>:<порт>".
+
+Каждый пакет несет заголовок _HEADER и не больше MAX_PACKET_BYTES данных
+(помещается в MTU Ethernet без фрагментации): номер пакета, номер первого
+фрейма от начала передачи (метка времени в сэмплах), частоту, формат,
+каналы и время отправки. Идентификатор передачи меняется при каждом
+открытии цели - приемник по нему понимает, что отправитель перезапущен.
+
+Приемник (PacketJitterBuffer) кладет сэмплы по номеру фрейма, поэтому
+пакеты, пришедшие не по порядку, встают на свое место без сортировки, а
+дубликаты просто перезаписывают те же фреймы. Потерянные фреймы
+маскируются повтором предыдущего блока с затуханием. Запас буфера
+подстраивается AdaptiveJitterBuffer: растет при опустошении и медленно
+уменьшается при стабильном приеме.
+"""
+import random
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import numpy as np
+from jitter_buffer import AdaptiveJitterBuffer
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+NETWORK_PREFIX = "udp:"
+DEFAULT_NETWORK_PORT = 5004
+DEFAULT_NETWORK_FORMAT = 'int16'
+DEFAULT_RECEIVE_BUFFER_MS = 60    # Начальный запас приемника
+MAX_RECEIVE_BUFFER_MS = 500
+MAX_PACKET_BYTES = 1400           # Данных в пакете: без фрагментации в MTU 1500
+RECEIVE_TIMEOUT = 0.2             # Поток приема проверяет остановку с этим периодом
+CONCEALMENT_DECAY = 0.5           # Усиление повтора при каждом следующем потерянном блоке
+CONCEALMENT_BLOCKS = 4            # После стольких потерянных блоков подряд - тишина
+
+PACKET_MAGIC = b'SSPL'
+PACKET_VERSION = 1
+# magic, версия, формат, каналы, фреймов, идентификатор передачи, номер пакета,
+# номер первого фрейма, частота, время отправки (time.time())
+_HEADER = struct.Struct('<4sBBBxHxxIIQId')
+
+# Формат сэмплов в пакете: имя → код, код → dtype, dtype → множитель в float32
+_FORMAT_CODES = {'int16': 1, 'float32': 2}
+_CODE_FORMATS = {1: np.dtype('<i2'), 2: np.dtype('<f4')}
+_SCALES = {np.dtype('<i2'): 1.0 / 32768.0, np.dtype('<f4'): 1.0}
+
+
+class AudioPacket(NamedTuple):
+    stream_id: int     # Идентификатор передачи (новый при каждом открытии цели)
+    seq: int           # Номер пакета
+    sample_time: int   # Номер первого фрейма от начала передачи
+    sample_rate: int
+    send_time: float   # time.time() отправителя
+    samples: np.ndarray  # (фреймы, каналы) в формате пакета, представление буфера приема
+
+
+def is_network_target(name: Optional[str]) -> bool:
+    return bool(name) and name.startswith(NETWORK_PREFIX)
+
+
+def network_target_name(host: str, port: int = DEFAULT_NETWORK_PORT) -> str:
+    return f"{NETWORK_PREFIX}{host}:{port}"
+
+
+def parse_network_address(name: str) -> Tuple[str, int]:
+    """
+    Хост и порт из имени "udp:<хост>:<порт>" (или просто "<хост>:<порт>").
+
+    Raises:
+        ValueError: Имя не содержит хост и корректный порт
+    """
+    address = name[len(NETWORK_PREFIX):] if is_network_target(name) else name
+    host, _, port = address.rpartition(':')
+    host = host.strip('[]')  # IPv6 в квадратных скобках
+    if not host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Ожидается хост:порт, получено '{address}'")
+    return host, int(port)
+
+
+def is_network_source(name: Optional[str]) -> bool:
+    return is_network_target(name)
+
+
+def network_source_name(port: int = DEFAULT_NETWORK_PORT, bind: Optional[str] = None) -> str:
+    return f"{NETWORK_PREFIX}{bind}:{port}" if bind else f"{NETWORK_PREFIX}{port}"
+
+
+def parse_network_source(name: str) -> Tuple[str, int]:
+    """
+    Адрес приема и порт из имени "udp:<порт>" или "udp:<адрес>:<порт>".
+
+    Raises:
+        ValueError: Некорректный порт или адрес
+    """
+    address = name[len(NETWORK_PREFIX):] if is_network_source(name) else name
+    if address.isdigit():
+        address = f"0.0.0.0:{address}"
+    return parse_network_address(address)
+
+
+def packet_format(sample_format: str) -> str:
+    """Формат сэмплов сетевой цели: float32 или int16 (все остальное передается как int16)."""
+    return sample_format if sample_format in _FORMAT_CODES else DEFAULT_NETWORK_FORMAT
+
+
+def decode_packet(data) -> AudioPacket:
+    """
+    Разбирает пакет (сэмплы - представление data без копирования).
+
+    Raises:
+        ValueError: Чужой или поврежденный пакет
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("короткий пакет")
+    magic, version, code, channels, frames, stream_id, seq, sample_time, sample_rate, send_time = \
+        _HEADER.unpack_from(data)
+    if magic != PACKET_MAGIC or version != PACKET_VERSION or code not in _CODE_FORMATS or not channels:
+        raise ValueError("неизвестный формат пакета")
+    dtype = _CODE_FORMATS[code]
+    size = frames * channels * dtype.itemsize
+    if len(data) < _HEADER.size + size:
+        raise ValueError("пакет обрезан")
+    samples = np.frombuffer(data, dtype=dtype, count=frames * channels, offset=_HEADER.size)
+    return AudioPacket(stream_id, seq, sample_time, sample_rate, send_time,
+                       samples.reshape(frames, channels))
+
+
+class NetworkSinkStream:
+    """
+    Выход цели в сеть с интерфейсом sd.OutputStream.
+
+    write() не ждет: блок режется на пакеты в заранее выделенном буфере и
+    отправляется неблокирующим сокетом. Если буфер сокета переполнен, пакет
+    отбрасывается (приемник замаскирует потерю). Ошибки сети пробрасываются -
+    их считает надзор, который при серии ошибок открывает цель заново.
+    Задержка сети и буфера приемника неизвестна отправителю (latency = 0) -
+    ее компенсирует задержка пользователя.
+    """
+
+    def __init__(self, address: str, samplerate: int, channels: int, blocksize: int,
+                 dtype: str = DEFAULT_NETWORK_FORMAT):
+        """
+        Args:
+            address: Имя цели "udp:<хост>:<порт>"
+            samplerate: Частота дискретизации
+            channels: Количество каналов
+            blocksize: Размер блока в фреймах (больше не режется на лишние пакеты)
+            dtype: 'int16' или 'float32'
+
+        Raises:
+            ValueError: Некорректный адрес
+        """
+        self.host, self.port = parse_network_address(address)
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.dtype = packet_format(dtype)
+        self.latency = 0.0
+        self.active = False
+        self.closed = False
+        sample_bytes = np.dtype(self.dtype).itemsize * channels
+        self.frames_per_packet = max(1, min(blocksize, (MAX_PACKET_BYTES - _HEADER.size) // sample_bytes))
+        self._packet = bytearray(_HEADER.size + self.frames_per_packet * sample_bytes)
+        self._payload = np.frombuffer(self._packet, dtype=self.dtype, offset=_HEADER.size).reshape(
+            self.frames_per_packet, channels)
+        self._code = _FORMAT_CODES[self.dtype]
+        self._socket: Optional[socket.socket] = None
+        self._destination = None
+        self.stream_id = 0
+        self.seq = 0
+        self.sample_time = 0
+
+        # Счетчики (только поток, вызывающий write)
+        self.packets_sent = 0
+        self.packets_dropped = 0
+
+    def start(self):
+        info = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)[0]
+        self._socket = socket.socket(info[0], socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._destination = info[4]
+        # Новая передача: приемник сбрасывает буфер вместо ожидания старых номеров
+        self.stream_id = random.getrandbits(32)
+        self.seq = 0
+        self.sample_time = 0
+        self.active = True
+        log.info("🌐 Сетевая цель %s:%d (%s, %d кан., %d фреймов в пакете)",
+                 self.host, self.port, self.dtype, self.channels, self.frames_per_packet)
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+        self.closed = True
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def write(self, data: np.ndarray) -> bool:
+        """
+        Отправляет блок (frames, channels).
+
+        Returns:
+            bool: Всегда False (опустошения буфера у сетевой цели не бывает)
+        """
+        sock = self._socket
+        if sock is None:
+            raise RuntimeError("сетевая цель закрыта")
+        frames = len(data)
+        for start in range(0, frames, self.frames_per_packet):
+            count = min(self.frames_per_packet, frames - start)
+            _HEADER.pack_into(self._packet, 0, PACKET_MAGIC, PACKET_VERSION, self._code, self.channels,
+                              count, self.stream_id, self.seq & 0xFFFFFFFF, self.sample_time,
+                              self.samplerate, time.time())
+            self._payload[:count] = data[start:start + count]
+            try:
+                sock.sendto(memoryview(self._packet)[:_HEADER.size + count * self._payload.strides[0]],
+                            self._destination)
+                self.packets_sent += 1
+            except (BlockingIOError, InterruptedError):
+                self.packets_dropped += 1
+            self.seq += 1
+            self.sample_time += count
+        return False
+
+
+class PacketJitterBuffer:
+    """
+    Буфер джиттера приемника: кольцо фреймов float32, адресуемое номером фрейма.
+
+    Один писатель (поток приема, push) и один читатель (callback устройства,
+    pull). Рядом с каждым фреймом хранится его номер: читатель сравнивает
+    номера с ожидаемыми и маскирует отсутствующие фреймы. Позиции - обычные
+    целые, которые меняет только их владелец, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, channels: int, sample_rate: int, blocksize: int,
+                 buffer_ms: float = DEFAULT_RECEIVE_BUFFER_MS,
+                 max_buffer_ms: float = MAX_RECEIVE_BUFFER_MS):
+        """
+        Args:
+            channels: Количество каналов на выходе
+            sample_rate: Частота дискретизации
+            blocksize: Максимальный размер блока, который запрашивает pull
+            buffer_ms: Минимальный запас (он же начальный)
+            max_buffer_ms: Максимальный запас
+        """
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.jitter = AdaptiveJitterBuffer(blocksize / sample_rate * 1000, buffer_ms, max_buffer_ms)
+        # Кольцо вмещает максимальный запас, допуск сверх него и один блок на чтение
+        self.capacity = 2 * (self.jitter.max_blocks + 2) * blocksize
+        self._frames = np.zeros((self.capacity, channels), dtype=np.float32)
+        self._stamps = np.full(self.capacity, -1, dtype=np.int64)
+        self._offsets = np.arange(blocksize, dtype=np.int64)
+        self._expected = np.zeros(blocksize, dtype=np.int64)
+        self._present = np.zeros(blocksize, dtype=bool)
+        self._block = np.zeros((blocksize, channels), dtype=np.float32)
+        self._previous = np.zeros((blocksize, channels), dtype=np.float32)
+        self._concealed_run = 0
+
+        # Писатель
+        self.stream_id: Optional[int] = None
+        self.newest_frame = 0       # Номер фрейма после самого нового принятого
+        self.highest_seq = -1
+        self.packets = 0
+        self.late = 0               # Пришли после того, как их фреймы уже проиграны
+        self.reordered = 0
+        self.duplicates = 0
+        self.restarts = 0           # Отправитель открыл передачу заново
+        self.format_errors = 0      # Чужие или поврежденные пакеты
+        self.channel_mismatches = 0
+        self.last_send_time = 0.0
+
+        # Читатель
+        self.read_frame = 0
+        self.prebuffering = True
+        self.concealed_frames = 0
+        self.underruns = 0
+        self.skipped_frames = 0     # Отброшены при переполнении (часы отправителя спешат)
+
+    @property
+    def fill_frames(self) -> int:
+        """Фреймов принято, но еще не проиграно."""
+        return 0 if self.prebuffering else max(0, self.newest_frame - self.read_frame)
+
+    @property
+    def target_frames(self) -> int:
+        return self.jitter.target * self.blocksize
+
+    # ------------------------------------------------------------ поток приема
+
+    def push(self, packet: AudioPacket) -> bool:
+        """
+        Кладет пакет по номеру первого фрейма (только писатель).
+
+        Returns:
+            bool: False если пакет опоздал или не подходит по формату
+        """
+        if packet.stream_id != self.stream_id:
+            if self.stream_id is not None:
+                self.restarts += 1
+                log.info("🌐 Отправитель начал передачу заново - буфер сброшен")
+            self._reset(packet)
+        self.packets += 1
+        self.last_send_time = packet.send_time
+        if packet.seq < self.highest_seq:
+            self.reordered += 1
+        else:
+            self.highest_seq = packet.seq
+
+        frames = len(packet.samples)
+        first = packet.sample_time
+        if first + frames <= self.read_frame and not self.prebuffering:
+            self.late += 1
+            return False
+        slot = first % self.capacity
+        if self._stamps[slot] == first:
+            self.duplicates += 1
+            return True
+        if packet.samples.shape[1] != self.channels:
+            if not self.channel_mismatches:
+                log.warning("⚠️ В пакете %d каналов, приемник ожидает %d - лишние отбрасываются, "
+                            "недостающие молчат", packet.samples.shape[1], self.channels)
+            self.channel_mismatches += 1
+
+        scale = _SCALES[packet.samples.dtype]
+        channels = min(self.channels, packet.samples.shape[1])
+        done = 0
+        while done < frames:
+            start = (first + done) % self.capacity
+            count = min(frames - done, self.capacity - start)
+            target = self._frames[start:start + count]
+            np.multiply(packet.samples[done:done + count, :channels], scale, out=target[:, :channels])
+            if channels < self.channels:
+                target[:, channels:] = 0.0
+            # Номера - после данных: читатель не увидит фрейм раньше сэмплов
+            self._stamps[start:start + count] = np.arange(first + done, first + done + count)
+            done += count
+        self.newest_frame = max(self.newest_frame, first + frames)
+        return True
+
+    def _reset(self, packet: AudioPacket):
+        self.stream_id = packet.stream_id
+        self.highest_seq = -1
+        self._stamps[:] = -1
+        self.newest_frame = packet.sample_time
+        self.read_frame = packet.sample_time
+        self.prebuffering = True
+
+    # --------------------------------------------------------- callback выхода
+
+    def pull(self, frames: int) -> np.ndarray:
+        """
+        Следующие frames фреймов (только читатель; результат действителен до следующего вызова).
+
+        Пока запас не набран - тишина. Отсутствующие фреймы маскируются,
+        при переполнении сверх запаса старые фреймы пропускаются.
+        """
+        frames = min(frames, self.blocksize)
+        block = self._block[:frames]
+        target = self.target_frames
+        if self.prebuffering:
+            if self.newest_frame - self.read_frame < max(target, frames):
+                block[:] = 0.0
+                return block
+            self.prebuffering = False
+            self.read_frame = self.newest_frame - max(target, frames)
+
+        ahead = self.newest_frame - self.read_frame
+        if ahead > 2 * (target + frames):
+            # Часы отправителя спешат или пакеты пришли пачкой после обрыва - возвращаемся к запасу
+            skip = ahead - target - frames
+            self.read_frame += skip
+            self.skipped_frames += skip
+        elif ahead <= 0:
+            self.underruns += 1
+            if self.jitter.on_underrun():
+                log.info("📶 Сеть: запас приемника увеличен до %.0f мс", self.jitter.target_ms)
+            self.prebuffering = True
+            self._conceal(block, frames)
+            return block
+        elif self.jitter.on_stable() and ahead > target + frames:
+            # Прием стабилен - отдаем один блок запаса (уменьшаем задержку)
+            skip = min(self.blocksize, ahead - target - frames)
+            self.read_frame += skip
+            self.skipped_frames += skip
+
+        expected = np.add(self._offsets[:frames], self.read_frame, out=self._expected[:frames])
+        start = self.read_frame % self.capacity
+        count = min(frames, self.capacity - start)
+        present = self._present[:frames]
+        np.equal(self._stamps[start:start + count], expected[:count], out=present[:count])
+        block[:count] = self._frames[start:start + count]
+        if count < frames:
+            np.equal(self._stamps[:frames - count], expected[count:], out=present[count:])
+            block[count:] = self._frames[:frames - count]
+        self.read_frame += frames
+
+        missing = frames - int(np.count_nonzero(present))
+        if missing:
+            self.concealed_frames += missing
+            concealment = self._previous[:frames] * (CONCEALMENT_DECAY ** (self._concealed_run + 1)
+                                                      if self._concealed_run < CONCEALMENT_BLOCKS else 0.0)
+            np.copyto(block, concealment, where=~present[:, None])
+            self._concealed_run += 1
+        else:
+            self._concealed_run = 0
+        self._previous[:frames] = block
+        return block
+
+    def _conceal(self, block: np.ndarray, frames: int):
+        """Блок целиком потерян: повтор предыдущего с затуханием, затем тишина."""
+        self.concealed_frames += frames
+        if self._concealed_run < CONCEALMENT_BLOCKS:
+            np.multiply(self._previous[:frames], CONCEALMENT_DECAY ** (self._concealed_run + 1), out=block)
+        else:
+            block[:] = 0.0
+        self._concealed_run += 1
+        self._previous[:frames] = block
+
+    def stats(self) -> Dict[str, float]:
+        return dict({
+            'packets': self.packets,
+            'late': self.late,
+            'reordered': self.reordered,
+            'duplicates': self.duplicates,
+            'restarts': self.restarts,
+            'format_errors': self.format_errors,
+            'concealed_frames': self.concealed_frames,
+            'skipped_frames': self.skipped_frames,
+            'fill_ms': self.fill_frames * 1000 / self.sample_rate,
+        }, **self.jitter.stats())
+
+
+class UdpReceiver:
+    """
+    Поток приема: пакеты из сокета в PacketJitterBuffer.
+
+    Буфер создается по первому пакету (частота и каналы берутся из него,
+    если не заданы), поэтому приемник можно запустить раньше отправителя.
+    """
+
+    def __init__(self, port: int = DEFAULT_NETWORK_PORT, bind: str = "0.0.0.0",
+                 blocksize: int = 256, buffer_ms: float = DEFAULT_RECEIVE_BUFFER_MS,
+                 channels: Optional[int] = None, sample_rate: Optional[int] = None):
+        """
+        Args:
+            port: UDP-порт
+            bind: Адрес, на котором принимаются пакеты
+            blocksize: Максимальный размер блока, который запрашивает pull
+            buffer_ms: Минимальный запас буфера джиттера
+            channels: Каналы на выходе (None - как в первом пакете)
+            sample_rate: Ожидаемая частота (None - как в первом пакете)
+        """
+        self.port = port
+        self.bind = bind
+        self.blocksize = blocksize
+        self.buffer_ms = buffer_ms
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.buffer: Optional[PacketJitterBuffer] = None
+        self.ready = threading.Event()  # Первый пакет принят, буфер создан
+        self.rate_mismatches = 0
+        self._socket: Optional[socket.socket] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        family = socket.AF_INET6 if ':' in self.bind else socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        self._socket.bind((self.bind, self.port))
+        self._socket.settimeout(RECEIVE_TIMEOUT)
+        self.port = self._socket.getsockname()[1]  # Порт 0 - выбранный системой
+        self._thread = threading.Thread(target=self._run, name=f"UdpReceiver-{self.port}", daemon=True)
+        self._thread.start()
+        log.info("🌐 Прием PCM по UDP на %s:%d", self.bind, self.port)
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self.ready.wait(timeout)
+
+    def _run(self):
+        data = bytearray(65536)
+        view = memoryview(data)
+        while not self._stop.is_set():
+            try:
+                size = self._socket.recv_into(data)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._stop.is_set():
+                    log.warning("⚠️ Ошибка приема UDP: %s", e)
+                continue
+            try:
+                packet = decode_packet(view[:size])
+            except ValueError:
+                if self.buffer is not None:
+                    self.buffer.format_errors += 1
+                continue
+            if self.buffer is None:
+                self._create_buffer(packet)
+            if packet.sample_rate != self.sample_rate:
+                if not self.rate_mismatches:
+                    log.warning("⚠️ Частота отправителя %d Гц, приемник работает на %d Гц (без передискретизации)",
+                                packet.sample_rate, self.sample_rate)
+                self.rate_mismatches += 1
+            self.buffer.push(packet)
+
+    def _create_buffer(self, packet: AudioPacket):
+        self.sample_rate = self.sample_rate or packet.sample_rate
+        self.channels = self.channels or packet.samples.shape[1]
+        self.buffer = PacketJitterBuffer(self.channels, self.sample_rate, self.blocksize, self.buffer_ms)
+        log.info("🌐 Первый пакет: %d Гц, %d кан., запас %.0f мс",
+                 packet.sample_rate, packet.samples.shape[1], self.buffer.jitter.target_ms)
+        self.ready.set()
+
+
+class NetworkSourceStream:
+    """
+    Входной поток из сети с интерфейсом sd.InputStream.
+
+    Поток по локальным часам каждые blocksize / samplerate секунд забирает
+    блок из буфера джиттера и вызывает callback(indata, frames, time_info,
+    status). Пока не пришел первый пакет, в callback идет тишина - движок
+    работает так же, как с молчащим устройством. Расхождение часов
+    отправителя и приемника выравнивает буфер (пропуск или маскирование).
+    """
+
+    def __init__(self, source_name: str, blocksize: int, callback: Callable, samplerate: int,
+                 channels: int, buffer_ms: float = DEFAULT_RECEIVE_BUFFER_MS):
+        """
+        Args:
+            source_name: "udp:<порт>" или "udp:<адрес>:<порт>"
+            blocksize: Размер блока в фреймах
+            callback: Callback в формате sd.InputStream
+            samplerate: Частота движка (пакеты с другой частотой - предупреждение)
+            channels: Каналы движка (лишние каналы пакета отбрасываются, недостающие молчат)
+            buffer_ms: Минимальный запас буфера джиттера
+
+        Raises:
+            ValueError: Некорректное имя источника
+        """
+        bind, port = parse_network_source(source_name)
+        self.receiver = UdpReceiver(port, bind, blocksize, buffer_ms, channels=channels, sample_rate=samplerate)
+        self.blocksize = blocksize
+        self.callback = callback
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocks_delivered = 0
+        self._silence = np.zeros((blocksize, channels), dtype=np.float32)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.closed = False
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def latency(self) -> float:
+        """Задержка входа: текущий запас буфера джиттера в секундах."""
+        buffer = self.receiver.buffer
+        return buffer.target_frames / self.samplerate if buffer is not None else 0.0
+
+    def start(self):
+        if self.active:
+            return
+        if self.closed:
+            raise RuntimeError("сетевой источник закрыт")
+        self._stop.clear()
+        self.receiver.start()
+        self._thread = threading.Thread(target=self._run, name="NetworkSource", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(2.0)
+        self._thread = None
+        self.receiver.stop()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def stats(self) -> Dict[str, float]:
+        buffer = self.receiver.buffer
+        return buffer.stats() if buffer is not None else {}
+
+    def _run(self):
+        block_time = self.blocksize / self.samplerate
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            buffer = self.receiver.buffer
+            block = buffer.pull(self.blocksize) if buffer is not None else self._silence
+            try:
+                self.callback(block, len(block), None, None)
+            except Exception as e:
+                log.warning("⚠️ Ошибка обработки сетевого блока: %s", e)
+            self.blocks_delivered += 1
+            next_time += block_time
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif delay < -0.5:
+                next_time = time.perf_counter()  # Сильно отстали - не догоняем рывком
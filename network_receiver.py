@@ -0,0 +1,135 @@
+"""
+Network Receiver для AudioForwarderApp
+Приемник сетевой цели: PCM по UDP → буфер джиттера → локальное устройство.
+
+Запускается на второй машине (колонки в другой комнате). Формат берется из
+первого пакета, поэтому приемник можно запустить раньше отправителя, а
+перезапуск трансляции на отправляющей машине не требует перезапуска
+приемника. Вместо устройства можно писать в WAV - так связку проверяют
+через localhost без звуковой карты.
+
+Использование:
+    python network_receiver.py --port 5004 --device "Динамики" --buffer-ms 60
+    python network_receiver.py --port 5004 --wav received.wav --seconds 10
+    python network_receiver.py --list-devices
+"""
+import argparse
+import sys
+import time
+from typing import Optional, Sequence
+import sounddevice as sd
+
+from device_policy import ROLE_TARGET, discover_devices, resolve_device
+from network_audio import DEFAULT_NETWORK_PORT, DEFAULT_RECEIVE_BUFFER_MS, UdpReceiver
+from wav_recorder import WavFileWriter
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+DEFAULT_RECEIVER_BLOCKSIZE = 256
+STATS_INTERVAL = 5.0  # Период вывода статистики приема
+
+
+def play_to_device(receiver: UdpReceiver, device: Optional[str], seconds: Optional[float]):
+    """Играет буфер приемника на устройство (callback устройства забирает блоки из буфера)."""
+    buffer = receiver.buffer
+    device_id = resolve_device(device, ROLE_TARGET, buffer.sample_rate) if device else None
+    if device and device_id is None:
+        raise ValueError(f"Устройство '{device}' не найдено")
+
+    def callback(outdata, frames, time_info, status):
+        outdata[:] = buffer.pull(frames)
+
+    with sd.OutputStream(device=device_id, samplerate=buffer.sample_rate, channels=buffer.channels,
+                         blocksize=receiver.blocksize, dtype='float32', latency='low', callback=callback):
+        log.info("🔊 Воспроизведение на %s", device or "устройство по умолчанию")
+        _wait(receiver, seconds)
+
+
+def write_to_wav(receiver: UdpReceiver, path: str, seconds: Optional[float]):
+    """Пишет буфер приемника в WAV в темпе реального времени (проверка без звуковой карты)."""
+    buffer = receiver.buffer
+    writer = WavFileWriter(path, buffer.sample_rate, buffer.channels)
+    period = receiver.blocksize / buffer.sample_rate
+    started = time.monotonic()
+    next_report = started + STATS_INTERVAL
+    blocks = 0
+    try:
+        while seconds is None or blocks * period < seconds:
+            writer.write(buffer.pull(receiver.blocksize))
+            blocks += 1
+            now = time.monotonic()
+            if now >= next_report:
+                _report(receiver)
+                next_report = now + STATS_INTERVAL
+            delay = started + blocks * period - now
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        writer.close()
+    log.info("💾 Записано %d фреймов в %s", writer.frames, path)
+
+
+def _wait(receiver: UdpReceiver, seconds: Optional[float]):
+    deadline = time.monotonic() + seconds if seconds else None
+    while True:
+        remaining = deadline - time.monotonic() if deadline is not None else STATS_INTERVAL
+        if remaining <= 0:
+            return
+        time.sleep(min(STATS_INTERVAL, remaining))
+        _report(receiver)
+
+
+def _report(receiver: UdpReceiver):
+    stats = receiver.buffer.stats()
+    log.info("📶 Пакетов: %d | запас %.0f мс (цель %.0f мс) | замаскировано фреймов: %d | "
+             "опоздали: %d, не по порядку: %d, дубликаты: %d | опустошений: %d",
+             stats['packets'], stats['fill_ms'], stats['target_ms'], stats['concealed_frames'],
+             stats['late'], stats['reordered'], stats['duplicates'], stats['underruns'])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Приемник сетевой цели: PCM по UDP на локальное устройство")
+    parser.add_argument('--port', type=int, default=DEFAULT_NETWORK_PORT)
+    parser.add_argument('--bind', default="0.0.0.0", help="Адрес приема (\"::\" для IPv6)")
+    parser.add_argument('--device', default=None, help="Устройство вывода (по умолчанию - системное)")
+    parser.add_argument('--wav', default=None, help="Писать в WAV вместо устройства")
+    parser.add_argument('--buffer-ms', type=float, default=DEFAULT_RECEIVE_BUFFER_MS,
+                        help="Минимальный запас буфера джиттера")
+    parser.add_argument('--blocksize', type=int, default=DEFAULT_RECEIVER_BLOCKSIZE)
+    parser.add_argument('--channels', type=int, default=None, help="Каналы вывода (по умолчанию - как в потоке)")
+    parser.add_argument('--seconds', type=float, default=None, help="Длительность (по умолчанию - до Ctrl+C)")
+    parser.add_argument('--list-devices', action='store_true', help="Показать устройства вывода")
+    args = parser.parse_args(argv)
+
+    if args.list_devices:
+        for choice in discover_devices().targets:
+            log.info("📤 %s [%s, %d кан., %.1f мс]", choice.name, choice.host_api, choice.channels, choice.latency_ms)
+        return 0
+
+    receiver = UdpReceiver(args.port, args.bind, args.blocksize, args.buffer_ms, channels=args.channels)
+    receiver.start()
+    try:
+        log.info("⏳ Ожидание пакетов на порту %d...", receiver.port)
+        while not receiver.wait_ready(1.0):
+            pass
+        if args.wav:
+            write_to_wav(receiver, args.wav, args.seconds)
+        else:
+            play_to_device(receiver, args.device, args.seconds)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        log.error("❌ %s", e)
+        return 1
+    finally:
+        receiver.stop()
+        if receiver.buffer is not None:
+            _report(receiver)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
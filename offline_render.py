@@ -0,0 +1,262 @@
+"""
+Offline Render для AudioForwarderApp
+Рендер полной цепочки целей без устройств быстрее реального времени.
+
+Источник - WAV-файл или генератор ("file:<путь>", "gen:..."), цели - имена
+из настроек (device_settings.json). Каждый блок проходит тот же callback
+AudioEngine, что и при трансляции: матрица, сглаживание, раскладка каналов,
+линия задержки, громкость и ограничитель. Выход каждой цели пишется в
+отдельный WAV float32 (до преобразования в формат устройства).
+
+Сравнение с эталонными файлами ловит изменения звука при правках DSP, а
+скорость рендера (сэмплов в секунду) служит бенчмарком.
+
+Использование:
+    python offline_render.py render gen:sweep:20:20000 "Динамики" "Наушники" --out renders --seconds 10
+    python offline_render.py compare renders golden --tolerance 1e-4
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import numpy as np
+
+from audio_engine import AudioEngine, EngineState
+from audio_mixer import PRIMARY_SOURCE
+from file_source import (WavFile, file_source_name, is_generator_source, is_virtual_source,
+                         open_block_reader)
+from wav_recorder import WavFileWriter
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+DEFAULT_TOLERANCE = 1e-4  # Допустимое отклонение сэмпла от эталона
+
+
+class RenderResult(NamedTuple):
+    files: Dict[str, str]   # цель → путь к WAV
+    frames: int             # Фреймов источника
+    seconds: float          # Время рендера
+    sample_rate: int
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def realtime_factor(self) -> float:
+        """Во сколько раз быстрее реального времени."""
+        return self.frames_per_second / self.sample_rate
+
+
+class CompareResult(NamedTuple):
+    name: str
+    passed: bool
+    max_error: float
+    rms_error_db: float
+    message: str
+
+
+class OfflineOutput:
+    """Выход цели в WAV-файл с интерфейсом выходного потока."""
+
+    def __init__(self, path: str, sample_rate: int, channels: int):
+        self.writer = WavFileWriter(path, sample_rate, channels)
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def write(self, data: np.ndarray) -> bool:
+        self.writer.write(data)
+        return False  # Опустошений не бывает
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.writer.close()
+
+
+def _file_label(name: str) -> str:
+    return re.sub(r'[^\w\-]+', '_', name).strip('_') or 'target'
+
+
+def state_from_settings(settings: dict, targets: Sequence[str]) -> EngineState:
+    """EngineState из сохраненных настроек (device_settings.json)."""
+    device_settings = settings.get("device_settings", {})
+    state = EngineState(routing_matrix=dict(settings.get("routing_matrix", {})))
+    for target in targets:
+        entry = device_settings.get(target, {})
+        if 'delay' in entry:
+            state.delays[target] = entry['delay']
+        if 'volume' in entry:
+            state.volumes[target] = entry['volume']
+        if 'channel_map' in entry:
+            state.channel_maps[target] = entry['channel_map']
+    return state
+
+
+def render(source: str, targets: Sequence[str], state: EngineState, out_dir: str,
+           sample_rate: int = 48000, blocksize: int = 256,
+           seconds: Optional[float] = None, tail: bool = True) -> RenderResult:
+    """
+    Прогоняет источник через цепочки целей так быстро, как позволяет процессор.
+
+    Args:
+        source: "file:<путь>" или "gen:..."
+        targets: Имена целей (настройки берутся из state)
+        state: Задержки, громкость, раскладки и матрица
+        out_dir: Папка для WAV целей
+        sample_rate: Частота дискретизации
+        blocksize: Размер блока в фреймах
+        seconds: Длительность (обязательна для генератора; для файла - обрезка)
+        tail: Дописать хвост длиной в наибольшую задержку (тишина на входе)
+
+    Returns:
+        RenderResult: Файлы целей и скорость рендера
+    """
+    if is_generator_source(source) and not seconds:
+        raise ValueError("Для генератора нужна длительность")
+    os.makedirs(out_dir, exist_ok=True)
+    files = {target: os.path.join(out_dir, f"{_file_label(target)}.wav") for target in targets}
+    # Дополнительные источники матрицы живут в своих потоках - в офлайне только основной
+    state = EngineState.from_dict(state.to_dict())
+    state.routing_matrix = {target: {src: gain for src, gain in cells.items() if src in (source, PRIMARY_SOURCE)}
+                            for target, cells in state.routing_matrix.items()}
+
+    engine = AudioEngine(source, targets, state, sample_rate, blocksize,
+                         notify=lambda message: log.warning("⚠️ %s", message),
+                         file_loop=False,
+                         output_factory=lambda name, channels: OfflineOutput(files[name], sample_rate, channels))
+    if not engine.open():
+        raise ValueError(f"Источник '{source}' недоступен")
+    reader = open_block_reader(source, blocksize, sample_rate, loop=False, duration=seconds)
+    limit = int(seconds * sample_rate) if seconds else None
+    frames = 0
+    try:
+        started = time.perf_counter()
+        block = reader.next_block()
+        while block is not None and (limit is None or frames < limit):
+            engine.callback(block, len(block), None, None)
+            frames += len(block)
+            block = reader.next_block()
+
+        if tail:
+            # Хвост: содержимое линий задержки выходит на тишине
+            longest = max((engine.state.delays.get(target, 0) for target in targets), default=0)
+            silence = np.zeros((blocksize, reader.channels), dtype=np.float32)
+            for _ in range(-(-int(sample_rate * longest / 1000) // blocksize)):
+                engine.callback(silence, blocksize, None, None)
+        elapsed = time.perf_counter() - started
+    finally:
+        engine.close()
+        reader.close()
+    return RenderResult({name: path for name, path in files.items()
+                         if name in engine.target_names}, frames, elapsed, sample_rate)
+
+
+def compare_files(path: str, golden_path: str, tolerance: float = DEFAULT_TOLERANCE) -> CompareResult:
+    """Сравнивает WAV с эталоном по максимальному отклонению сэмпла."""
+    name = os.path.basename(golden_path)
+    if not os.path.exists(path):
+        return CompareResult(name, False, float('inf'), 0.0, "нет файла рендера")
+    output, golden = WavFile(path), WavFile(golden_path)
+    try:
+        if (output.sample_rate, output.channels) != (golden.sample_rate, golden.channels):
+            return CompareResult(name, False, float('inf'), 0.0,
+                                 f"формат {output.sample_rate} Гц/{output.channels} кан. вместо "
+                                 f"{golden.sample_rate} Гц/{golden.channels} кан.")
+        if output.frames != golden.frames:
+            return CompareResult(name, False, float('inf'), 0.0,
+                                 f"длина {output.frames} фреймов вместо {golden.frames}")
+        a = np.zeros((output.frames, output.channels), dtype=np.float32)
+        b = np.zeros_like(a)
+        output.convert_into(0, output.frames, a)
+        golden.convert_into(0, golden.frames, b)
+        diff = a - b
+        max_error = float(np.max(np.abs(diff))) if diff.size else 0.0
+        rms = float(np.sqrt(np.mean(np.square(diff, dtype=np.float64)))) if diff.size else 0.0
+        rms_db = 20 * np.log10(rms) if rms > 0 else -np.inf
+        passed = max_error <= tolerance
+        return CompareResult(name, passed, max_error, rms_db,
+                             "совпадает" if passed else f"отклонение {max_error:.2e} > {tolerance:.0e}")
+    finally:
+        output.close()
+        golden.close()
+
+
+def compare_dirs(out_dir: str, golden_dir: str, tolerance: float = DEFAULT_TOLERANCE) -> List[CompareResult]:
+    """Сравнивает все эталонные WAV из golden_dir с одноименными файлами рендера."""
+    return [compare_files(os.path.join(out_dir, name), os.path.join(golden_dir, name), tolerance)
+            for name in sorted(os.listdir(golden_dir)) if name.lower().endswith('.wav')]
+
+
+def _channels(path: str) -> int:
+    wav = WavFile(path)
+    wav.close()
+    return wav.channels
+
+
+def _print_compare(results: List[CompareResult]) -> bool:
+    for result in results:
+        log.info(f"{'✅' if result.passed else '❌'} {result.name}: {result.message} "
+                 f"(макс. {result.max_error:.2e}, RMS {result.rms_error_db:.1f} дБ)")
+    failed = sum(1 for result in results if not result.passed)
+    log.info(f"{'✅' if not failed else '❌'} Сравнение: {len(results) - failed}/{len(results)} совпадают")
+    return not failed and bool(results)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Офлайн-рендер цепочки целей и сравнение с эталонами")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    render_parser = commands.add_parser('render', help="Рендер источника на цели")
+    render_parser.add_argument('source', help='"file:<путь>", путь к WAV или "gen:sine:1000" / "gen:sweep:20:20000" / "gen:noise"')
+    render_parser.add_argument('targets', nargs='+', help="Имена целей из настроек")
+    render_parser.add_argument('--out', default='renders', help="Папка для WAV целей")
+    render_parser.add_argument('--settings', default='device_settings.json', help="Файл настроек")
+    render_parser.add_argument('--sample-rate', type=int, default=None)
+    render_parser.add_argument('--blocksize', type=int, default=None)
+    render_parser.add_argument('--seconds', type=float, default=None)
+    render_parser.add_argument('--golden', default=None, help="Сразу сравнить с эталонами из папки")
+    render_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    compare_parser = commands.add_parser('compare', help="Сравнить рендер с эталонами")
+    compare_parser.add_argument('out')
+    compare_parser.add_argument('golden')
+    compare_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return 0 if _print_compare(compare_dirs(args.out, args.golden, args.tolerance)) else 1
+
+    settings = {}
+    if os.path.exists(args.settings):
+        with open(args.settings, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    source = args.source if is_virtual_source(args.source) else file_source_name(args.source)
+    if not source.startswith('file:') and not args.seconds:
+        parser.error("для генератора нужна длительность --seconds")
+    result = render(source, args.targets, state_from_settings(settings, args.targets), args.out,
+                    sample_rate=args.sample_rate or settings.get("sample_rate", 48000),
+                    blocksize=args.blocksize or settings.get("blocksize", 256),
+                    seconds=args.seconds)
+    channels_total = sum(_channels(path) for path in result.files.values())
+    log.info(f"🏁 Рендер: {result.frames} фреймов за {result.seconds:.3f}с - "
+             f"{result.frames_per_second:,.0f} фреймов/с, {result.frames_per_second * channels_total:,.0f} сэмплов/с "
+             f"({result.realtime_factor:.1f}× реального времени)")
+    for target, path in result.files.items():
+        log.info(f"   {target} → {path}")
+    if args.golden:
+        return 0 if _print_compare(compare_dirs(args.out, args.golden, args.tolerance)) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""
+Process Discovery для ApplicationAudioRouter
+Модуль инкрементального обнаружения аудио-приложений с кешированием имён процессов.
+
+Перечисление окон зависит от платформы и вынесено за интерфейс backend'а:
+на Windows используется Win32WindowBackend, на остальных системах (и в тестах)
+PsutilProcessBackend, которому нужен только psutil.
+"""
+import sys
+import time
+import ctypes
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+import psutil
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+# Процессы, которые почти всегда воспроизводят звук
+AUDIO_RELEVANT_PROCESSES = frozenset({
+    'chrome.exe', 'firefox.exe', 'msedge.exe', 'opera.exe',
+    'spotify.exe', 'vlc.exe', 'wmplayer.exe', 'winamp.exe',
+    'foobar2000.exe', 'aimp.exe', 'potplayer.exe', 'mpc-hc.exe',
+    'steam.exe', 'discord.exe', 'telegram.exe', 'zoom.exe',
+    'teams.exe', 'skype.exe', 'obs64.exe', 'streamlabs.exe'
+})
+
+# Ключевые слова в заголовке окна, указывающие на аудио/видео
+AUDIO_TITLE_KEYWORDS = ('музыка', 'music', 'audio', 'звук', 'video', 'видео', 'player')
+
+
+class WindowRecord(NamedTuple):
+    """Снимок одного окна (или процесса) на момент перечисления."""
+    handle: Hashable
+    pid: int
+    title: str
+
+
+class DiscoveryChanges(NamedTuple):
+    """Изменения списка приложений между двумя обновлениями."""
+    added: Dict[Hashable, dict]
+    removed: Dict[Hashable, dict]
+    changed: Dict[Hashable, dict]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+class _CacheEntry:
+    __slots__ = ('name', 'create_time', 'checked_at')
+
+    def __init__(self, name: str, create_time: float, checked_at: float):
+        self.name = name
+        self.create_time = create_time
+        self.checked_at = checked_at
+
+
+class ProcessNameCache:
+    """
+    Кеш PID → имя процесса с TTL и защитой от повторного использования PID.
+
+    Пока запись моложе TTL, имя возвращается без системных вызовов. После
+    истечения TTL сравнивается create_time процесса: если PID был занят новым
+    процессом, имя разрешается заново.
+    """
+
+    UNKNOWN = "Unknown"
+
+    def __init__(self, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            ttl: Время жизни записи в секундах
+            clock: Источник монотонного времени (подменяется в тестах)
+        """
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[int, _CacheEntry] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'reused_pids': 0}
+
+    def get(self, pid: int) -> str:
+        """
+        Возвращает имя процесса по PID.
+
+        Args:
+            pid: Идентификатор процесса
+
+        Returns:
+            str: Имя процесса или "Unknown", если процесс недоступен
+        """
+        now = self._clock()
+        entry = self._entries.get(pid)
+
+        if entry is not None:
+            if now - entry.checked_at < self.ttl:
+                self.stats['hits'] += 1
+                return entry.name
+
+            # TTL истек: проверяем, что PID принадлежит тому же процессу
+            try:
+                create_time = psutil.Process(pid).create_time()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self._entries.pop(pid, None)
+                return self.UNKNOWN
+
+            if create_time == entry.create_time:
+                entry.checked_at = now
+                self.stats['revalidated'] += 1
+                return entry.name
+
+            self.stats['reused_pids'] += 1
+
+        self.stats['misses'] += 1
+        return self._resolve(pid, now)
+
+    def _resolve(self, pid: int, now: float) -> str:
+        """Разрешает имя процесса через psutil и сохраняет его в кеш."""
+        try:
+            process = psutil.Process(pid)
+            with process.oneshot():
+                name = process.name()
+                create_time = process.create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            self._entries.pop(pid, None)
+            return self.UNKNOWN
+
+        self._entries[pid] = _CacheEntry(name, create_time, now)
+        return name
+
+    def put(self, pid: int, name: str, create_time: float):
+        """Добавляет уже известное имя процесса (без системных вызовов)."""
+        self._entries[pid] = _CacheEntry(name, create_time, self._clock())
+
+    def invalidate(self, pid: int):
+        """Удаляет запись для указанного PID."""
+        self._entries.pop(pid, None)
+
+    def prune(self, alive_pids):
+        """Удаляет записи процессов, которых больше нет в перечислении."""
+        for pid in list(self._entries.keys()):
+            if pid not in alive_pids:
+                del self._entries[pid]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class WindowEnumerationBackend:
+    """Интерфейс платформенного перечисления окон/процессов."""
+
+    name = "base"
+
+    def enumerate(self) -> Dict[Hashable, WindowRecord]:
+        """
+        Перечисляет видимые окна.
+
+        Returns:
+            Dict[Hashable, WindowRecord]: Словарь handle → запись окна
+        """
+        raise NotImplementedError
+
+    def get_foreground_handle(self) -> Optional[Hashable]:
+        """Возвращает handle активного окна или None, если это не поддерживается."""
+        return None
+
+    def lookup_name(self, record: WindowRecord, name_cache: ProcessNameCache) -> str:
+        """Возвращает имя процесса для записи окна."""
+        return name_cache.get(record.pid)
+
+
+class Win32WindowBackend(WindowEnumerationBackend):
+    """
+    Перечисление окон через EnumWindows.
+
+    В отличие от pygetwindow не создает объект на каждое окно и сразу
+    отбрасывает невидимые окна и окна без заголовка.
+    """
+
+    name = "win32"
+
+    def __init__(self):
+        import win32gui  # Доступен только на Windows
+        self._win32gui = win32gui
+        self._user32 = ctypes.windll.user32  # type: ignore[attr-defined]
+        self._pid_buffer = ctypes.c_ulong()
+        self._hwnd_pids: Dict[Hashable, int] = {}  # PID окна не меняется за время его жизни
+
+    def _window_pid(self, hwnd) -> int:
+        pid = self._hwnd_pids.get(hwnd)
+        if pid is None:
+            self._user32.GetWindowThreadProcessId(hwnd, ctypes.byref(self._pid_buffer))
+            pid = self._pid_buffer.value
+        return pid
+
+    def enumerate(self) -> Dict[Hashable, WindowRecord]:
+        win32gui = self._win32gui
+        windows: Dict[Hashable, WindowRecord] = {}
+
+        def collect(hwnd, _):
+            if not win32gui.IsWindowVisible(hwnd):
+                return True
+            title = win32gui.GetWindowText(hwnd)
+            if len(title) > 3 and title.strip() and title != 'Program Manager':
+                windows[hwnd] = WindowRecord(hwnd, self._window_pid(hwnd), title)
+            return True
+
+        win32gui.EnumWindows(collect, None)
+        self._hwnd_pids = {hwnd: record.pid for hwnd, record in windows.items()}
+        return windows
+
+    def get_foreground_handle(self) -> Optional[Hashable]:
+        try:
+            return self._win32gui.GetForegroundWindow()
+        except Exception:
+            return None
+
+
+class PsutilProcessBackend(WindowEnumerationBackend):
+    """
+    Переносимый backend на одном psutil.
+
+    Окон как таковых нет: каждый процесс представлен записью с handle = PID
+    и заголовком, равным имени процесса. Подходит для Linux и для тестов.
+    """
+
+    name = "psutil"
+
+    def __init__(self, process_names=None):
+        """
+        Args:
+            process_names: Если задано, перечисляются только процессы с этими именами
+        """
+        self.process_names = (frozenset(n.lower() for n in process_names)
+                              if process_names is not None else None)
+        self._known: Dict[int, Tuple[str, float]] = {}
+
+    def enumerate(self) -> Dict[Hashable, WindowRecord]:
+        records: Dict[Hashable, WindowRecord] = {}
+        known: Dict[int, Tuple[str, float]] = {}
+
+        for process in psutil.process_iter(['name', 'create_time']):
+            try:
+                name = process.info.get('name') or ''
+                if self.process_names is not None and name.lower() not in self.process_names:
+                    continue
+                pid = process.pid
+                known[pid] = (name, process.info.get('create_time') or 0.0)
+                records[pid] = WindowRecord(pid, pid, name)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+        self._known = known
+        return records
+
+    def lookup_name(self, record: WindowRecord, name_cache: ProcessNameCache) -> str:
+        # process_iter уже вернул имя и create_time - кладем их в кеш без лишних вызовов
+        info = self._known.get(record.pid)
+        if info is not None:
+            name_cache.put(record.pid, info[0], info[1])
+            return info[0]
+        return name_cache.get(record.pid)
+
+
+def create_default_backend() -> WindowEnumerationBackend:
+    """Выбирает backend перечисления для текущей платформы."""
+    if sys.platform == 'win32':
+        try:
+            return Win32WindowBackend()
+        except Exception as e:
+            log.warning(f"⚠️ Win32 backend недоступен, используется psutil: {e}")
+    return PsutilProcessBackend()
+
+
+def is_audio_relevant(app_name: str, title: str, extra_titles=()) -> bool:
+    """Проверяет, относится ли окно к аудио-приложению."""
+    if app_name.lower() in AUDIO_RELEVANT_PROCESSES or title in extra_titles:
+        return True
+    title_lower = title.lower()
+    return any(keyword in title_lower for keyword in AUDIO_TITLE_KEYWORDS)
+
+
+class ProcessDiscovery:
+    """
+    Инкрементальное обнаружение аудио-приложений.
+
+    Для каждого handle запоминается последний заголовок и результат фильтрации,
+    поэтому имя процесса разрешается и фильтр применяется только к новым окнам
+    или окнам со сменившимся заголовком. Смена пользовательских заголовков
+    увеличивает поколение - тогда решение пересматривается для всех окон.
+    Наружу отдаются только изменения.
+    """
+
+    def __init__(self, backend: Optional[WindowEnumerationBackend] = None,
+                 name_cache: Optional[ProcessNameCache] = None,
+                 extra_titles: Optional[Callable[[], object]] = None):
+        """
+        Args:
+            backend: Backend перечисления окон (по умолчанию - для текущей платформы)
+            name_cache: Кеш имен процессов
+            extra_titles: Функция, возвращающая заголовки, добавленные пользователем
+        """
+        self.backend = backend or create_default_backend()
+        self.name_cache = name_cache if name_cache is not None else ProcessNameCache()
+        self._extra_titles = extra_titles or (lambda: ())
+
+        # handle → (title, pid, info | None, поколение); None означает "окно не аудио"
+        self._seen: Dict[Hashable, Tuple[str, int, Optional[dict], int]] = {}
+        self._extra_key: frozenset = frozenset()
+        self._generation = 0
+        self._applications: Dict[Hashable, dict] = {}
+        self.stats = {'refreshes': 0, 'resolved': 0, 'last_refresh_ms': 0.0}
+
+    @property
+    def applications(self) -> Dict[Hashable, dict]:
+        """Текущие аудио-приложения в формате handle → {"title", "app_name"}."""
+        return dict(self._applications)
+
+    def refresh(self) -> DiscoveryChanges:
+        """
+        Перечисляет окна и возвращает только изменения с прошлого вызова.
+
+        Returns:
+            DiscoveryChanges: Добавленные, удаленные и измененные приложения
+        """
+        started = time.perf_counter()
+        records = self.backend.enumerate()
+        extra_titles = frozenset(self._extra_titles())
+        if extra_titles != self._extra_key:
+            # Пользователь добавил или убрал заголовки - прошлые решения устарели
+            self._extra_key = extra_titles
+            self._generation += 1
+        generation = self._generation
+
+        added: Dict[Hashable, dict] = {}
+        changed: Dict[Hashable, dict] = {}
+        removed: Dict[Hashable, dict] = {}
+        seen = self._seen
+
+        for handle, record in records.items():
+            previous = seen.get(handle)
+            if (previous is not None and previous[0] == record.title and previous[1] == record.pid
+                    and previous[3] == generation):
+                # Окно не изменилось - используем прошлое решение
+                continue
+
+            app_name = self.backend.lookup_name(record, self.name_cache)
+            self.stats['resolved'] += 1
+            info = None
+            if is_audio_relevant(app_name, record.title, extra_titles):
+                info = {"title": record.title, "app_name": app_name}
+            seen[handle] = (record.title, record.pid, info, generation)
+
+            old_info = self._applications.get(handle)
+            if info is None:
+                # Окно перестало быть аудио-приложением
+                if old_info is not None:
+                    removed[handle] = self._applications.pop(handle)
+                continue
+            if old_info is None:
+                added[handle] = info
+            elif old_info != info:
+                changed[handle] = info
+            self._applications[handle] = info
+
+        for handle in [h for h in seen if h not in records]:
+            del seen[handle]
+            info = self._applications.pop(handle, None)
+            if info is not None:
+                removed[handle] = info
+
+        if removed or added:
+            self.name_cache.prune({record.pid for record in records.values()})
+
+        self.stats['refreshes'] += 1
+        self.stats['last_refresh_ms'] = (time.perf_counter() - started) * 1000
+        return DiscoveryChanges(added, removed, changed)
+
+    def get_foreground_handle(self) -> Optional[Hashable]:
+        """Возвращает handle активного окна через backend."""
+        return self.backend.get_foreground_handle()
+
+    def reset(self):
+        """Сбрасывает запомненное состояние (следующий refresh вернет все окна)."""
+        self._seen.clear()
+        self._applications.clear()
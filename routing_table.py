@@ -0,0 +1,113 @@
+"""
+Routing Table для ApplicationAudioRouter
+Неизменяемый снимок маршрутизации "активное приложение → битовая маска целей".
+
+Снимок перестраивается вне аудио-потока (при смене активного окна или
+настроек) и публикуется одним присваиванием ссылки. Аудио-callback только
+читает готовый снимок и не делает системных вызовов.
+"""
+from types import MappingProxyType
+from typing import Hashable, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+
+class RoutingSnapshot(NamedTuple):
+    """Неизменяемое состояние маршрутизации на момент построения."""
+    targets: Tuple[str, ...]
+    target_bits: Mapping[str, int]
+    app_masks: Mapping[str, int]
+    handle_titles: Mapping[Hashable, str]
+    all_mask: int
+    active_handle: Optional[Hashable]
+    active_title: Optional[str]
+    active_mask: int
+    version: int
+
+    def allows(self, device_name: str) -> bool:
+        """Разрешен ли вывод на устройство для текущего активного приложения."""
+        bit = self.target_bits.get(device_name)
+        if bit is None:
+            # Неизвестное снимку устройство не блокируем
+            return True
+        return bool(self.active_mask & bit)
+
+    def allows_for_app(self, app_title: str, device_name: str) -> bool:
+        """Разрешен ли вывод на устройство для указанного приложения."""
+        bit = self.target_bits.get(device_name)
+        if bit is None:
+            return True
+        return bool(self.app_masks.get(app_title, self.all_mask) & bit)
+
+    def mask_for_handle(self, handle: Optional[Hashable]) -> int:
+        """Маска целей для окна (для неизвестных окон - все цели)."""
+        title = self.handle_titles.get(handle) if handle is not None else None
+        if title is None:
+            return self.all_mask
+        return self.app_masks.get(title, self.all_mask)
+
+    def with_active(self, handle: Optional[Hashable]) -> "RoutingSnapshot":
+        """Новый снимок с другим активным окном (маски не пересчитываются)."""
+        return self._replace(
+            active_handle=handle,
+            active_title=self.handle_titles.get(handle) if handle is not None else None,
+            active_mask=self.mask_for_handle(handle),
+            version=self.version + 1
+        )
+
+    def enabled_targets(self) -> Tuple[str, ...]:
+        """Цели, разрешенные для активного приложения."""
+        return tuple(t for t in self.targets if self.active_mask & self.target_bits[t])
+
+
+def build_routing_snapshot(targets: Iterable[str], device_settings: Mapping,
+                           applications: Mapping[Hashable, dict],
+                           active_handle: Optional[Hashable] = None,
+                           version: int = 0) -> RoutingSnapshot:
+    """
+    Строит снимок маршрутизации.
+
+    Args:
+        targets: Список целевых устройств (порядок задает номера битов)
+        device_settings: Настройки приложений: заголовок → список устройств
+        applications: Известные приложения: handle → {"title", "app_name"}
+        active_handle: Handle активного окна
+        version: Номер версии снимка
+
+    Returns:
+        RoutingSnapshot: Готовый к публикации снимок
+    """
+    targets = tuple(dict.fromkeys(targets))
+    target_bits = {name: 1 << index for index, name in enumerate(targets)}
+    all_mask = (1 << len(targets)) - 1
+
+    app_masks = {}
+    for app_title, devices in device_settings.items():
+        if not isinstance(devices, list):
+            # Старый формат или поврежденная запись - разрешаем все цели
+            app_masks[app_title] = all_mask
+            continue
+        mask = 0
+        for device in devices:
+            mask |= target_bits.get(device, 0)
+        app_masks[app_title] = mask
+
+    handle_titles = {handle: info.get('title') for handle, info in applications.items()
+                     if info.get('title')}
+
+    snapshot = RoutingSnapshot(
+        targets=targets,
+        target_bits=MappingProxyType(target_bits),
+        app_masks=MappingProxyType(app_masks),
+        handle_titles=MappingProxyType(handle_titles),
+        all_mask=all_mask,
+        active_handle=None,
+        active_title=None,
+        active_mask=all_mask,
+        version=version
+    )
+    if active_handle is not None:
+        snapshot = snapshot._replace(
+            active_handle=active_handle,
+            active_title=handle_titles.get(active_handle),
+            active_mask=snapshot.mask_for_handle(active_handle)
+        )
+    return snapshot
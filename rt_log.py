@@ -0,0 +1,176 @@
+"""
+RT Log для AudioForwarderApp
+Журнал, который нельзя заблокировать из аудио-callback.
+
+Вывод в консоль Windows может блокироваться на миллисекунды, поэтому
+модули не вызывают print() и обработчики logging напрямую. Логгер
+get_logger(имя) только кладет запись (уровень, шаблон, аргументы, время)
+в заранее выделенное кольцо: номер слота выдает itertools.count (атомарно
+под GIL), поэтому писателей может быть несколько и блокировки не нужны.
+Форматирование и вывод выполняет фоновый поток через стандартный logging
+с обычными уровнями DEBUG/INFO/WARNING/ERROR.
+
+Одинаковые сообщения (по шаблону) ограничиваются: не больше
+RATE_LIMIT_BURST за RATE_LIMIT_WINDOW секунд, число пропущенных
+дописывается к следующему выведенному. Поэтому на аудио-пути шаблон
+передается отдельно от аргументов: log.warning("Ошибка %s: %s", имя, e).
+"""
+import atexit
+import itertools
+import logging
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+LOG_QUEUE_SIZE = 4096      # Записей в кольце; при переполнении старые теряются (со счетчиком)
+LOG_DRAIN_INTERVAL = 0.05  # Период вывода накопленных записей
+RATE_LIMIT_BURST = 5       # Одинаковых сообщений за окно без ограничения
+RATE_LIMIT_WINDOW = 1.0
+DEFAULT_LOG_FORMAT = '%(message)s'
+_MAX_RATE_KEYS = 512       # Сообщения с подставленными значениями (f-строки) не копятся бесконечно
+
+
+class _RecordQueue:
+    """Кольцо записей: много писателей без блокировок, один читатель (поток вывода)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._slots: List[Optional[Tuple[int, tuple]]] = [None] * capacity
+        self._sequence = itertools.count()
+        self._read = 0
+        self.dropped = 0
+
+    def put(self, record: tuple):
+        sequence = next(self._sequence)
+        self._slots[sequence % self.capacity] = (sequence, record)
+
+    def drain(self) -> List[tuple]:
+        records = []
+        while True:
+            slot = self._slots[self._read % self.capacity]
+            if slot is None or slot[0] < self._read:
+                break  # Запись еще не положена
+            if slot[0] > self._read:
+                # Писатели обогнали читателя на круг - самые старые записи потеряны
+                oldest = slot[0] - self.capacity + 1
+                self.dropped += oldest - self._read
+                self._read = oldest
+                continue
+            records.append(slot[1])
+            self._read += 1
+        return records
+
+
+_queue = _RecordQueue(LOG_QUEUE_SIZE)
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+_reported_drops = 0
+
+
+class RtLogger:
+    """Логгер модуля с интерфейсом logging.Logger (debug/info/warning/error)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._logger = logging.getLogger(name)
+        self._limits: Dict[str, list] = {}  # шаблон → [начало окна, сообщений в окне, пропущено]
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def log(self, level: int, msg, *args):
+        """Кладет запись в кольцо (не блокирует, не форматирует)."""
+        if not self._logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        limits = self._limits
+        state = limits.get(msg)
+        if state is None:
+            if len(limits) >= _MAX_RATE_KEYS:
+                limits.clear()
+            state = limits[msg] = [now, 0, 0]
+        suppressed = 0
+        if now - state[0] >= RATE_LIMIT_WINDOW:
+            suppressed = state[2]
+            state[0], state[1], state[2] = now, 0, 0
+        state[1] += 1
+        if state[1] > RATE_LIMIT_BURST:
+            state[2] += 1
+            return
+        _queue.put((self.name, level, msg, args, time.time(), suppressed))
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(logging.ERROR, msg, *args)
+
+
+def setup_logging(level: int = logging.INFO, fmt: str = DEFAULT_LOG_FORMAT):
+    """Настраивает вывод стандартного logging в консоль (если он еще не настроен)."""
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(fmt))
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def get_logger(name: str) -> RtLogger:
+    """Логгер модуля; при первом вызове запускается поток вывода."""
+    _ensure_started()
+    return RtLogger(name)
+
+
+def _ensure_started():
+    global _thread
+    with _start_lock:
+        if _thread is not None:
+            return
+        if not logging.getLogger().handlers:
+            setup_logging()
+        _thread = threading.Thread(target=_run, name="RtLog", daemon=True)
+        _thread.start()
+        atexit.register(shutdown)
+
+
+def _run():
+    while not _stop.wait(LOG_DRAIN_INTERVAL):
+        flush()
+
+
+def flush():
+    """Выводит накопленные записи (поток вывода; при завершении - вызывающий поток)."""
+    global _reported_drops
+    for name, level, msg, args, created, suppressed in _queue.drain():
+        logger = logging.getLogger(name)
+        if suppressed:
+            msg = f"{msg} (еще {suppressed} похожих сообщений пропущено)"
+        try:
+            record = logger.makeRecord(name, level, name, 0, msg, args, None)
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+            logger.handle(record)
+        except Exception:
+            pass  # Ошибка вывода не должна останавливать поток журнала
+    if _queue.dropped != _reported_drops:
+        logging.getLogger(__name__).warning(
+            "⚠️ Журнал: потеряно записей при переполнении - %d", _queue.dropped - _reported_drops)
+        _reported_drops = _queue.dropped
+
+
+def shutdown(timeout: float = 1.0):
+    """Останавливает поток вывода и выводит остаток записей."""
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+    flush()
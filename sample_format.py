@@ -0,0 +1,168 @@
+"""
+Sample Format для AudioForwarderApp
+Выбор выходного формата сэмплов для каждой цели и векторное преобразование
+из float32-буфера движка в int16/int24/int32 с опциональным TPDF-дизерингом.
+
+Все буферы выделяются один раз при открытии потока; в callback только
+арифметика numpy с параметром out.
+"""
+from typing import Optional, Sequence
+import numpy as np
+import sounddevice as sd
+
+
+# Форматы для интерфейса: ключ → описание
+SAMPLE_FORMAT_OPTIONS = {
+    'auto': "Авто (по устройству)",
+    'float32': "float32 (4 байта)",
+    'int24': "int24 (3 байта)",
+    'int16': "int16 (2 байта)",
+}
+
+DEFAULT_SAMPLE_FORMAT = 'auto'
+
+# Порядок перебора для 'auto': самый компактный формат без потери качества первым
+AUTO_FORMAT_PREFERENCE = ('int24', 'float32', 'int16')
+
+BYTES_PER_SAMPLE = {'float32': 4, 'int32': 4, 'int24': 3, 'int16': 2}
+
+# Полная шкала для целочисленных форматов
+_FULL_SCALE = {'int16': 32767.0, 'int24': 8388607.0, 'int32': 2147483520.0}
+
+
+def is_raw_format(sample_format: str) -> bool:
+    """int24 поддерживается sounddevice только через Raw-потоки."""
+    return sample_format == 'int24'
+
+
+def negotiate_sample_format(device_id: int, sample_rate: int, channels: int,
+                            preferred: str = DEFAULT_SAMPLE_FORMAT,
+                            candidates: Sequence[str] = AUTO_FORMAT_PREFERENCE) -> str:
+    """
+    Выбирает формат, который устройство реально принимает.
+
+    Args:
+        device_id: Индекс устройства вывода
+        sample_rate: Частота дискретизации
+        channels: Количество выходных каналов
+        preferred: Формат из настроек ('auto' - перебор candidates)
+        candidates: Порядок перебора
+
+    Returns:
+        str: Поддерживаемый формат (в худшем случае 'float32')
+    """
+    order = list(candidates) if preferred == 'auto' else [preferred] + [c for c in candidates if c != preferred]
+    for sample_format in order:
+        try:
+            sd.check_output_settings(device=device_id, channels=channels,
+                                     dtype=sample_format, samplerate=sample_rate)
+            return sample_format
+        except Exception:
+            continue
+    return 'float32'
+
+
+class SampleFormatConverter:
+    """
+    Преобразует блоки float32 в формат устройства.
+
+    Для float32 блок отдается как есть. Для целочисленных форматов используется
+    заранее выделенный рабочий буфер; TPDF-дизеринг (разность двух равномерных
+    шумов амплитудой 1 LSB) генерируется в заранее выделенные массивы.
+    """
+
+    def __init__(self, sample_format: str, blocksize: int, channels: int,
+                 dither: bool = True, seed: Optional[int] = None):
+        """
+        Args:
+            sample_format: 'float32', 'int32', 'int24' или 'int16'
+            blocksize: Максимальный размер блока в фреймах
+            channels: Количество выходных каналов
+            dither: Включить TPDF-дизеринг для int16/int24
+            seed: Зерно генератора шума (для воспроизводимых прогонов)
+        """
+        if sample_format not in BYTES_PER_SAMPLE:
+            raise ValueError(f"Неподдерживаемый формат: {sample_format}")
+        self.sample_format = sample_format
+        self.channels = channels
+        self.blocksize = blocksize
+        self.dither = dither
+        self.bytes_per_sample = BYTES_PER_SAMPLE[sample_format]
+
+        shape = (blocksize, channels)
+        self._rng = np.random.default_rng(seed)
+        if sample_format == 'float32':
+            self._scratch = None
+            self._out = None
+            return
+
+        self._scale = np.float32(_FULL_SCALE[sample_format])
+        self._low = np.float32(-_FULL_SCALE[sample_format] - 1.0)
+        self._scratch = np.zeros(shape, dtype=np.float32)
+        self._noise_a = np.zeros(shape, dtype=np.float32)
+        self._noise_b = np.zeros(shape, dtype=np.float32)
+
+        if sample_format == 'int16':
+            self._out = np.zeros(shape, dtype=np.int16)
+        else:
+            # int24 и int32 сначала собираются в int32
+            self._int32 = np.zeros(shape, dtype=np.int32)
+            if sample_format == 'int24':
+                self._out = np.zeros((blocksize, channels, 3), dtype=np.uint8)
+                # Младшие 3 байта каждого int32 (little-endian)
+                self._int32_bytes = self._int32.view(np.uint8).reshape(blocksize, channels, 4)
+            else:
+                self._out = self._int32
+
+    @property
+    def dtype(self) -> str:
+        """dtype для sd.OutputStream (для int24 - Raw-поток)."""
+        return self.sample_format
+
+    def bytes_per_frame(self) -> int:
+        return self.bytes_per_sample * self.channels
+
+    def silence(self) -> np.ndarray:
+        """Новый блок тишины (blocksize кадров) в формате устройства - для режима простоя."""
+        if self._out is None:
+            return np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        return np.zeros_like(self._out)
+
+    def convert(self, block: np.ndarray):
+        """
+        Преобразует блок float32 (frames, channels).
+
+        Returns:
+            Представление заранее выделенного буфера в формате устройства
+        """
+        if self._out is None:
+            return block
+
+        frames = len(block)
+        scratch = self._scratch[:frames]
+        np.multiply(block, self._scale, out=scratch)
+
+        if self.dither and self.sample_format != 'int32':
+            noise_a = self._noise_a[:frames]
+            noise_b = self._noise_b[:frames]
+            self._rng.random(dtype=np.float32, out=noise_a)
+            self._rng.random(dtype=np.float32, out=noise_b)
+            np.subtract(noise_a, noise_b, out=noise_a)
+            np.add(scratch, noise_a, out=scratch)
+
+        np.rint(scratch, out=scratch)
+        np.clip(scratch, self._low, self._scale, out=scratch)
+
+        if self.sample_format == 'int16':
+            out = self._out[:frames]
+            np.copyto(out, scratch, casting='unsafe')
+            return out
+
+        int32 = self._int32[:frames]
+        np.copyto(int32, scratch, casting='unsafe')
+        if self.sample_format == 'int32':
+            return int32
+
+        out = self._out[:frames]
+        out[...] = self._int32_bytes[:frames, :, :3]
+        return out
@@ -0,0 +1,309 @@
+"""
+Shared Memory Ring для AudioForwarderApp
+Кольца блоков, блок телеметрии, уровни и кольцо спектра в разделяемой памяти между процессом движка и GUI.
+
+Кольцо рассчитано на одного писателя и одного читателя (SPSC): писатель
+двигает только позицию записи, читатель - только позицию чтения, поэтому
+блокировки не нужны. Писатель никогда не ждет: при заполненном кольце
+блок отбрасывается и увеличивается счетчик переполнений.
+"""
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Sequence
+import numpy as np
+
+
+# Заголовок кольца (int64): позиция записи, позиция чтения, переполнения
+_WRITE, _READ, _OVERRUNS = 0, 1, 2
+_HEADER_SLOTS = 4
+_HEADER_BYTES = _HEADER_SLOTS * 8
+
+
+class SharedFrameRing:
+    """Кольцо блоков float32 (frames, channels) в разделяемой памяти."""
+
+    def __init__(self, capacity: int, blocksize: int, channels: int,
+                 name: Optional[str] = None, create: bool = False):
+        """
+        Args:
+            capacity: Количество блоков в кольце
+            blocksize: Максимальный размер блока в фреймах
+            channels: Количество каналов
+            name: Имя сегмента (для подключения к существующему)
+            create: Создать новый сегмент
+        """
+        self.capacity = capacity
+        self.blocksize = blocksize
+        self.channels = channels
+        block_bytes = blocksize * channels * 4
+        size = _HEADER_BYTES + capacity * 8 + capacity * block_bytes
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._owner = create
+
+        buf = self._shm.buf
+        self._header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=buf, offset=0)
+        self._frames = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=_HEADER_BYTES)
+        self._blocks = np.ndarray((capacity, blocksize, channels), dtype=np.float32, buffer=buf,
+                                  offset=_HEADER_BYTES + capacity * 8)
+        if create:
+            self._header[:] = 0
+
+    @classmethod
+    def create(cls, capacity: int, blocksize: int, channels: int) -> "SharedFrameRing":
+        return cls(capacity, blocksize, channels, create=True)
+
+    @classmethod
+    def attach(cls, descriptor: Dict) -> "SharedFrameRing":
+        """Подключается к кольцу по описанию из descriptor()."""
+        return cls(descriptor['capacity'], descriptor['blocksize'], descriptor['channels'],
+                   name=descriptor['name'])
+
+    def descriptor(self) -> Dict:
+        """Описание для передачи в другой процесс (сериализуемое)."""
+        return {'name': self._shm.name, 'capacity': self.capacity,
+                'blocksize': self.blocksize, 'channels': self.channels}
+
+    def __len__(self):
+        return int(self._header[_WRITE] - self._header[_READ])
+
+    @property
+    def overruns(self) -> int:
+        return int(self._header[_OVERRUNS])
+
+    def push(self, block: np.ndarray) -> bool:
+        """
+        Кладет блок (только писатель). Не блокирует.
+
+        Returns:
+            bool: False если кольцо заполнено и блок отброшен
+        """
+        write = int(self._header[_WRITE])
+        if write - int(self._header[_READ]) >= self.capacity:
+            self._header[_OVERRUNS] += 1
+            return False
+        slot = write % self.capacity
+        frames = min(len(block), self.blocksize)
+        channels = min(block.shape[1], self.channels)
+        self._blocks[slot, :frames, :channels] = block[:frames, :channels]
+        if channels < self.channels:
+            self._blocks[slot, :frames, channels:] = 0.0
+        self._frames[slot] = frames
+        # Позиция записи публикуется после данных блока
+        self._header[_WRITE] = write + 1
+        return True
+
+    def pop_into(self, dst: np.ndarray) -> int:
+        """
+        Забирает следующий блок в dst (только читатель).
+
+        Returns:
+            int: Количество фреймов (0 если кольцо пустое)
+        """
+        read = int(self._header[_READ])
+        if read == int(self._header[_WRITE]):
+            return 0
+        slot = read % self.capacity
+        frames = min(int(self._frames[slot]), len(dst))
+        dst[:frames] = self._blocks[slot, :frames]
+        self._header[_READ] = read + 1
+        return frames
+
+    def skip_to_latest(self):
+        """Отбрасывает накопившиеся блоки, кроме последнего (только читатель)."""
+        write = int(self._header[_WRITE])
+        if write - int(self._header[_READ]) > 1:
+            self._header[_READ] = write - 1
+
+    def close(self):
+        """Отключается от сегмента; владелец также удаляет его."""
+        self._header = self._frames = self._blocks = None
+        try:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+
+# Поля телеметрии движка (float64)
+TELEMETRY_FIELDS = (
+    'heartbeat',            # Время последней публикации (time.time())
+    'start_time',
+    'total_frames',
+    'total_callbacks',
+    'errors_count',
+    'data_processed_mb',
+    'last_callback_time',
+    'active_streams',
+    'source_overruns',
+    'writer_drops',         # Отброшенные блоки потоков записи (режим fan-out)
+    'recording_overflows',  # Блоки, не попавшие в запись WAV (медленный диск)
+    'idle',                 # 1 - источник молчит, обработка целей приостановлена
+    'stalls',               # Зависания потоков, найденные сторожем
+    'last_stall_time',      # Время последнего зависания (time.time())
+    'net_packets',          # Принято пакетов сетевыми источниками
+    'net_concealed_frames', # Фреймы, замаскированные при потерях
+    'net_late',             # Пакеты, пришедшие после проигрывания своих фреймов
+    'net_underruns',        # Опустошения буфера джиттера
+    'net_fill_ms',          # Наименьший текущий запас буфера джиттера
+)
+TELEMETRY_INTERVALS = 100  # Последние интервалы между callback'ами
+
+
+class SharedTelemetry:
+    """
+    Блок телеметрии движка в разделяемой памяти.
+
+    Процесс движка пишет, GUI читает. Счетчик версии (seqlock) нечетный во
+    время записи, поэтому читатель повторяет чтение, если попал на запись.
+    """
+
+    def __init__(self, name: Optional[str] = None, create: bool = False):
+        self._field_index = {field: i for i, field in enumerate(TELEMETRY_FIELDS)}
+        count = 2 + len(TELEMETRY_FIELDS) + TELEMETRY_INTERVALS
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=count * 8 if create else 0)
+        self._owner = create
+        buf = self._shm.buf
+        self._seq = np.ndarray((2,), dtype=np.int64, buffer=buf, offset=0)  # версия, число интервалов
+        self._values = np.ndarray((len(TELEMETRY_FIELDS),), dtype=np.float64, buffer=buf, offset=16)
+        self._intervals = np.ndarray((TELEMETRY_INTERVALS,), dtype=np.float64, buffer=buf,
+                                     offset=16 + len(TELEMETRY_FIELDS) * 8)
+        if create:
+            self._seq[:] = 0
+            self._values[:] = 0.0
+
+    @classmethod
+    def create(cls) -> "SharedTelemetry":
+        return cls(create=True)
+
+    @classmethod
+    def attach(cls, descriptor: Dict) -> "SharedTelemetry":
+        return cls(name=descriptor['name'])
+
+    def descriptor(self) -> Dict:
+        return {'name': self._shm.name}
+
+    def publish(self, values: Dict[str, float], intervals: Sequence[float] = ()):
+        """Записывает телеметрию (только процесс движка)."""
+        self._seq[0] += 1
+        for field, value in values.items():
+            index = self._field_index.get(field)
+            if index is not None:
+                self._values[index] = float(value or 0.0)
+        tail = list(intervals)[-TELEMETRY_INTERVALS:]
+        self._intervals[:len(tail)] = tail
+        self._seq[1] = len(tail)
+        self._seq[0] += 1
+
+    def read(self, retries: int = 5) -> Optional[Dict]:
+        """
+        Читает согласованную копию телеметрии.
+
+        Returns:
+            dict: Поля TELEMETRY_FIELDS и список 'callback_intervals' (None если не удалось)
+        """
+        for _ in range(retries):
+            version = int(self._seq[0])
+            if version % 2:
+                continue
+            values = self._values.copy()
+            count = int(self._seq[1])
+            intervals = self._intervals[:count].tolist()
+            if int(self._seq[0]) == version:
+                result = dict(zip(TELEMETRY_FIELDS, values.tolist()))
+                result['callback_intervals'] = intervals
+                return result
+        return None
+
+    def close(self):
+        self._seq = self._values = self._intervals = None
+        try:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+
+class SharedLevels:
+    """
+    Массив уровней (level_meters) в разделяемой памяти.
+
+    Процесс движка пишет через LevelMeters, GUI читает через LevelMeterReader;
+    согласованность - тем же счетчиком версии (seqlock), что и у телеметрии.
+    """
+
+    def __init__(self, rows: int, channels: int, name: Optional[str] = None, create: bool = False):
+        self.rows = rows
+        self.channel_slots = channels
+        size = 8 + rows * 4 + rows * 2 * channels * 4
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._owner = create
+        buf = self._shm.buf
+        self.sequence = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        self.channels = np.ndarray((rows,), dtype=np.int32, buffer=buf, offset=8)
+        self.levels = np.ndarray((rows, 2, channels), dtype=np.float32, buffer=buf, offset=8 + rows * 4)
+        if create:
+            self.sequence[:] = 0
+            self.channels[:] = 0
+            self.levels[:] = 0.0
+
+    @classmethod
+    def create(cls, rows: int, channels: int) -> "SharedLevels":
+        return cls(rows, channels, create=True)
+
+    @classmethod
+    def attach(cls, descriptor: Dict) -> "SharedLevels":
+        return cls(descriptor['rows'], descriptor['channels'], name=descriptor['name'])
+
+    def descriptor(self) -> Dict:
+        return {'name': self._shm.name, 'rows': self.rows, 'channels': self.channel_slots}
+
+    def close(self):
+        self.sequence = self.channels = self.levels = None
+        try:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+
+class SharedSpectrumRing:
+    """
+    Кольцо моно-сэмплов для спектра (spectrum_analyzer) в разделяемой памяти.
+
+    Процесс движка пишет через SpectrumTap, GUI считает БПФ через
+    SpectrumAnalyzer; счетчик записанных сэмплов - первое поле сегмента.
+    """
+
+    def __init__(self, capacity: int, name: Optional[str] = None, create: bool = False):
+        self.capacity = capacity
+        size = 8 + capacity * 4
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._owner = create
+        buf = self._shm.buf
+        self.written = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        self.buffer = np.ndarray((capacity,), dtype=np.float32, buffer=buf, offset=8)
+        if create:
+            self.written[:] = 0
+            self.buffer[:] = 0.0
+
+    @classmethod
+    def create(cls, capacity: int) -> "SharedSpectrumRing":
+        return cls(capacity, create=True)
+
+    @classmethod
+    def attach(cls, descriptor: Dict) -> "SharedSpectrumRing":
+        return cls(descriptor['capacity'], name=descriptor['name'])
+
+    def descriptor(self) -> Dict:
+        return {'name': self._shm.name, 'capacity': self.capacity}
+
+    def close(self):
+        self.written = self.buffer = None
+        try:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
@@ -0,0 +1,199 @@
+"""
+Spectrum Analyzer для AudioForwarderApp
+Спектр источника или выбранной цели вне потока звука.
+
+Callback только сводит блок в моно (с прореживанием на высоких частотах
+дискретизации) и копирует его в кольцо сэмплов - без БПФ, выделения памяти
+и блокировок. Рабочий поток с фиксированной частотой берет последние
+SPECTRUM_FFT_SIZE сэмплов, умножает на окно Ханна, считает rfft,
+усредняет мощность между кадрами и публикует полосы в дБ для интерфейса
+одним присваиванием ссылки. В режиме отдельного процесса кольцо лежит в
+разделяемой памяти, и БПФ считается в процессе GUI.
+"""
+import threading
+from typing import NamedTuple, Optional
+import numpy as np
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+SPECTRUM_SOURCE = ":source:"   # Выбор "источник" (имена целей - как есть)
+SPECTRUM_FFT_SIZE = 4096
+SPECTRUM_RING_SAMPLES = 16384  # Кольцо с запасом: кадр не перезаписывается во время копирования
+SPECTRUM_ANALYSIS_RATE = 48000  # Выше этой частоты сигнал прореживается
+SPECTRUM_RATE_HZ = 15           # Кадров спектра в секунду
+SPECTRUM_AVERAGING = 0.6        # Доля предыдущего кадра в усреднении мощности
+SPECTRUM_BANDS = 64
+SPECTRUM_MIN_HZ = 20.0
+SPECTRUM_FLOOR_DB = -100.0
+
+
+def spectrum_decimation(sample_rate: int) -> int:
+    """Шаг прореживания: 96 и 192 кГц анализируются как 48 кГц."""
+    return max(1, int(sample_rate) // SPECTRUM_ANALYSIS_RATE)
+
+
+class SpectrumTap:
+    """Сторона callback: моно-сэмплы в кольцо (один писатель)."""
+
+    def __init__(self, sample_rate: int, blocksize: int, shared=None):
+        """
+        Args:
+            sample_rate: Частота дискретизации движка
+            blocksize: Размер блока в фреймах
+            shared: SharedSpectrumRing (кольцо в разделяемой памяти) или None
+        """
+        if shared is not None:
+            self.buffer, self.written = shared.buffer, shared.written
+        else:
+            self.buffer = np.zeros(SPECTRUM_RING_SAMPLES, dtype=np.float32)
+            self.written = np.zeros(1, dtype=np.int64)  # Всего записано сэмплов
+        self.capacity = len(self.buffer)
+        self.decimation = spectrum_decimation(sample_rate)
+        self.sample_rate = sample_rate // self.decimation
+        self._mono = np.zeros(blocksize // self.decimation + 1, dtype=np.float32)
+
+    def push(self, block: np.ndarray):
+        """Сводит блок (frames, channels) в моно и дописывает в кольцо."""
+        decimation = self.decimation
+        count = min(len(block) // decimation, len(self._mono))
+        if count == 0:
+            return
+        channels = block.shape[1]
+        mono = self._mono[:count]
+        # Среднее по каналам и соседним сэмплам (простой ФНЧ перед прореживанием) одной редукцией
+        np.sum(block[:count * decimation].reshape(count, decimation * channels), axis=1, out=mono)
+        np.multiply(mono, 1.0 / (decimation * channels), out=mono)
+
+        index = int(self.written[0]) % self.capacity
+        first = min(count, self.capacity - index)
+        self.buffer[index:index + first] = mono[:first]
+        if first < count:
+            self.buffer[:count - first] = mono[first:]
+        self.written[0] += count
+
+
+class SpectrumFrame(NamedTuple):
+    frequencies: np.ndarray    # Центры полос (Гц)
+    magnitudes_db: np.ndarray  # Уровни полос (дБ относительно полной шкалы синуса)
+    peak_hz: float             # Частота самого громкого бина
+    peak_db: float
+
+
+class SpectrumAnalyzer:
+    """
+    Рабочий поток БПФ над кольцом SpectrumTap.
+
+    Интерфейс читает SpectrumAnalyzer.latest - последний готовый кадр
+    (None пока данных нет).
+    """
+
+    def __init__(self, buffer: np.ndarray, written: np.ndarray, sample_rate: int,
+                 fft_size: int = SPECTRUM_FFT_SIZE, rate: float = SPECTRUM_RATE_HZ,
+                 averaging: float = SPECTRUM_AVERAGING, bands: int = SPECTRUM_BANDS):
+        """
+        Args:
+            buffer: Кольцо сэмплов (SpectrumTap.buffer)
+            written: Счетчик записанных сэмплов (SpectrumTap.written)
+            sample_rate: Частота сэмплов в кольце (после прореживания)
+            fft_size: Размер окна БПФ
+            rate: Кадров в секунду
+            averaging: Доля предыдущего кадра в усреднении (0 - без усреднения)
+            bands: Число логарифмических полос
+        """
+        self.buffer = buffer
+        self.written = written
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.rate = rate
+        self.averaging = averaging
+        self._window = np.hanning(fft_size).astype(np.float32)
+        # Синус полной шкалы дает 0 дБ
+        self._power_scale = (2.0 / float(self._window.sum())) ** 2
+        self._frame = np.zeros(fft_size, dtype=np.float32)
+        self._power: Optional[np.ndarray] = None
+        self._last_written = 0
+
+        # Логарифмические полосы: индексы первых бинов (полоса - максимум своих бинов)
+        nyquist = sample_rate / 2
+        edges = np.geomspace(SPECTRUM_MIN_HZ, nyquist, bands + 1)
+        bins = np.clip(np.floor(edges * fft_size / sample_rate).astype(int), 1, fft_size // 2)
+        self._band_starts = bins[:-1]
+        self._band_stop = int(bins[-1])
+        self.frequencies = np.sqrt(edges[:-1] * edges[1:])
+
+        self.latest: Optional[SpectrumFrame] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="SpectrumAnalyzer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def reset(self):
+        """Сбрасывает усреднение (смена источника спектра)."""
+        self._power = None
+        self.latest = None
+        self._last_written = int(self.written[0])
+
+    def _run(self):
+        while not self._stop.wait(1.0 / self.rate):
+            try:
+                self.analyze()
+            except Exception as e:
+                log.warning("⚠️ Ошибка анализа спектра: %s", e)
+
+    def _copy_frame(self, end: int) -> bool:
+        """Копирует fft_size сэмплов, заканчивающихся на end; False если их успели перезаписать."""
+        capacity = len(self.buffer)
+        start = end - self.fft_size
+        index = start % capacity
+        first = min(self.fft_size, capacity - index)
+        self._frame[:first] = self.buffer[index:index + first]
+        if first < self.fft_size:
+            self._frame[first:] = self.buffer[:self.fft_size - first]
+        return int(self.written[0]) - start <= capacity
+
+    def analyze(self) -> Optional[SpectrumFrame]:
+        """
+        Один кадр спектра по последним сэмплам кольца.
+
+        Returns:
+            SpectrumFrame: Новый кадр (None если новых сэмплов нет)
+        """
+        written = int(self.written[0])
+        if written == self._last_written or written < self.fft_size:
+            return None
+        if not self._copy_frame(written):
+            return None
+        self._last_written = written
+
+        np.multiply(self._frame, self._window, out=self._frame)
+        spectrum = np.fft.rfft(self._frame)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2) * self._power_scale
+        if self._power is None or self.averaging <= 0:
+            self._power = power
+        else:
+            self._power = self.averaging * self._power + (1.0 - self.averaging) * power
+
+        bands = np.maximum.reduceat(self._power[:self._band_stop + 1], self._band_starts)
+        magnitudes_db = np.maximum(10 * np.log10(np.maximum(bands, 1e-20)), SPECTRUM_FLOOR_DB)
+        low = int(self._band_starts[0])
+        peak_bin = low + int(np.argmax(self._power[low:]))
+        peak_db = max(float(10 * np.log10(max(float(self._power[peak_bin]), 1e-20))), SPECTRUM_FLOOR_DB)
+        frame = SpectrumFrame(self.frequencies, magnitudes_db.astype(np.float32),
+                              peak_bin * self.sample_rate / self.fft_size, peak_db)
+        self.latest = frame
+        return frame
+
+
+def format_frequency(hz: float) -> str:
+    return f"{hz / 1000:.1f} кГц" if hz >= 1000 else f"{hz:.0f} Гц"
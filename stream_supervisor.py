@@ -0,0 +1,210 @@
+"""
+Stream Supervisor для AudioForwarderApp
+Надзор за выходными потоками целей: перезапуск только сбойного устройства.
+
+Callback лишь считает ошибки цели (без блокировок). Поток надзора несколько
+раз в секунду проверяет каждую цель: закрытый или остановленный поток,
+серия ошибок обработки или записи. Сбойная цель убирается из обработки
+(остальные цели продолжают играть), ее устройство закрывается и
+открывается заново с экспоненциальной задержкой между попытками.
+Состояние каждого устройства доступно через health().
+"""
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+HEALTH_OK = 'ok'
+HEALTH_DEGRADED = 'degraded'      # Ошибки есть, устройство еще играет
+HEALTH_RESTARTING = 'restarting'  # Устройство закрыто, ждет повторного открытия
+
+# Состояние → подпись для интерфейса
+HEALTH_LABELS = {
+    HEALTH_OK: "🟢 Работает",
+    HEALTH_DEGRADED: "🟡 Ошибки",
+    HEALTH_RESTARTING: "🔴 Перезапуск",
+}
+
+SUPERVISOR_INTERVAL = 0.25  # Период проверки целей
+ERROR_THRESHOLD = 3         # Ошибок за период проверки, после которых устройство перезапускается
+BACKOFF_INITIAL = 0.5       # Первая пауза перед повторным открытием (с)
+BACKOFF_MAX = 30.0
+STABLE_RESET_SECONDS = 30.0  # Столько стабильной работы - и пауза снова начинается с BACKOFF_INITIAL
+
+
+def backoff_delay(attempts: int) -> float:
+    """Пауза перед следующей попыткой: удваивается с каждой неудачей, не больше BACKOFF_MAX."""
+    return min(BACKOFF_MAX, BACKOFF_INITIAL * (2 ** attempts))
+
+
+class DeviceHealth(NamedTuple):
+    state: str          # HEALTH_OK / HEALTH_DEGRADED / HEALTH_RESTARTING
+    errors: int         # Всего ошибок обработки и записи
+    restarts: int       # Успешных перезапусков
+    attempts: int       # Сбоев и неудачных открытий подряд (сбрасывается после стабильной работы)
+    last_error: str
+    retry_in: float     # Секунд до следующей попытки (0 если не ждет)
+
+
+class _DeviceState:
+    """Счетчики одной цели: errors/last_error меняет callback, остальное - поток надзора."""
+
+    __slots__ = ('errors', 'last_error', 'seen_errors', 'seen_writer_errors', 'state',
+                 'attempts', 'restarts', 'next_retry', 'healthy_since')
+
+    def __init__(self, now: float):
+        self.errors = 0
+        self.last_error: object = ""
+        self.seen_errors = 0
+        self.seen_writer_errors = 0
+        self.state = HEALTH_OK
+        self.attempts = 0
+        self.restarts = 0
+        self.next_retry = 0.0
+        self.healthy_since = now
+
+
+class StreamSupervisor:
+    """
+    Поток надзора за целями одного AudioEngine.
+
+    Движок предоставляет target_stream(имя), writers, isolate_target(имя),
+    reopen_target(имя) и close_retired_streams(); набор целей берется из
+    engine.target_names.
+    """
+
+    def __init__(self, engine, interval: float = SUPERVISOR_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self._devices: Dict[str, _DeviceState] = {}
+        self._forced: Dict[str, str] = {}  # цель → причина перезапуска, найденная другим потоком
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StreamSupervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ---------------------------------------------------------------- callback
+
+    def report_error(self, name: str, error: object):
+        """Ошибка обработки или вывода цели (вызывается из callback, не блокирует)."""
+        device = self._devices.get(name)
+        if device is not None:
+            device.errors += 1
+            device.last_error = error
+
+    def fail(self, name: str, reason: str):
+        """Требует перезапустить цель при следующей проверке (например, зависла запись)."""
+        self._forced[name] = reason
+
+    # ------------------------------------------------------------ поток надзора
+
+    def forget(self, name: str):
+        """Цель отключена пользователем - надзор за ней прекращается."""
+        self._devices = {key: value for key, value in self._devices.items() if key != name}
+        self._forced.pop(name, None)
+
+    def health(self) -> Dict[str, DeviceHealth]:
+        """Состояние всех целей под надзором."""
+        now = time.monotonic()
+        result = {}
+        for name, device in list(self._devices.items()):
+            writer = self.engine.writers.get(name)
+            errors = device.errors + (writer.write_errors if writer is not None else 0)
+            retry_in = max(0.0, device.next_retry - now) if device.state == HEALTH_RESTARTING else 0.0
+            result[name] = DeviceHealth(device.state, errors, device.restarts, device.attempts,
+                                        str(device.last_error), round(retry_in, 1))
+        return result
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            try:
+                self.engine.close_retired_streams()
+            except Exception as e:
+                log.warning("⚠️ Надзор: закрытие прерванных устройств: %s", e)
+            names = list(self.engine.target_names)
+            for name in names:
+                if name not in self._devices:
+                    # Копия словаря: callback читает его без блокировок
+                    self._devices = dict(self._devices, **{name: _DeviceState(now)})
+            for name in names:
+                device = self._devices.get(name)
+                if device is None:
+                    continue  # Цель отключена, пока шла проверка
+                try:
+                    self._check(name, device, now)
+                except Exception as e:
+                    log.warning("⚠️ Надзор за %s: %s", name, e)
+
+    def _check(self, name: str, device: _DeviceState, now: float):
+        engine = self.engine
+        if device.state == HEALTH_RESTARTING:
+            if now >= device.next_retry:
+                self._reopen(name, device, now)
+            return
+
+        stream = engine.target_stream(name)
+        if stream is None:
+            return
+        writer = engine.writers.get(name)
+        new_errors = device.errors - device.seen_errors
+        writer_errors = writer.write_errors if writer is not None else 0
+        new_errors += writer_errors - device.seen_writer_errors
+        device.seen_errors = device.errors
+        device.seen_writer_errors = writer_errors
+
+        reason = self._forced.pop(name, None)
+        if reason is not None:
+            pass  # Причину уже установил сторож
+        elif getattr(stream, 'closed', False):
+            reason = "поток закрыт"
+        elif not getattr(stream, 'active', True):
+            reason = "поток остановлен"
+        elif new_errors >= ERROR_THRESHOLD:
+            reason = f"{new_errors} ошибок: {device.last_error}"
+
+        if reason is not None:
+            device.last_error = reason
+            device.state = HEALTH_RESTARTING
+            # Устройство, которое открывается, но сразу снова сбоит, тоже ждет все дольше
+            device.next_retry = now + backoff_delay(device.attempts)
+            device.attempts += 1
+            log.warning("⚠️ %s: %s - устройство перезапускается, остальные цели продолжают играть", name, reason)
+            engine.notify(f"⚠️ {name}: сбой устройства, перезапуск")
+            engine.isolate_target(name)
+        elif new_errors:
+            device.state = HEALTH_DEGRADED
+            device.healthy_since = now
+        else:
+            device.state = HEALTH_OK
+            if device.attempts and now - device.healthy_since >= STABLE_RESET_SECONDS:
+                device.attempts = 0
+
+    def _reopen(self, name: str, device: _DeviceState, now: float):
+        if self.engine.reopen_target(name):
+            device.state = HEALTH_OK
+            device.restarts += 1
+            device.healthy_since = now
+            device.seen_errors = device.errors
+            writer = self.engine.writers.get(name)
+            device.seen_writer_errors = writer.write_errors if writer is not None else 0
+            log.info("✅ %s: устройство снова играет (перезапуск #%d)", name, device.restarts)
+            self.engine.notify(f"✅ {name}: устройство восстановлено")
+        else:
+            delay = backoff_delay(device.attempts)
+            device.attempts += 1
+            device.next_retry = now + delay
+            log.warning("⚠️ %s: не удалось открыть (попытка %d), следующая через %.1f с",
+                        name, device.attempts, delay)
@@ -0,0 +1,236 @@
+"""
+Target Writer для AudioForwarderApp
+Режим разветвления (fan-out): отдельный поток записи для каждой цели.
+
+Callback захвата только кладет готовый блок в кольцо цели; блокирующий
+stream.write выполняется потоком цели. Медленное устройство задерживает
+только свой поток, а время callback не растет с количеством целей.
+
+Кольцо рассчитано на одного писателя (callback) и одного читателя (поток
+цели): писатель двигает только позицию записи, читатель - только позицию
+чтения, поэтому блокировки не нужны.
+"""
+import math
+import threading
+import time
+from typing import Dict, Optional
+import numpy as np
+from jitter_buffer import MAX_JITTER_LIMIT_MS
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+# Политики при перегрузке: ключ → описание
+DROP_POLICY_OPTIONS = {
+    'drop_oldest': "Отбрасывать старые блоки",
+    'drop_newest': "Отбрасывать новые блоки",
+}
+
+DEFAULT_DROP_POLICY = 'drop_oldest'
+
+
+class BlockRing:
+    """Кольцо блоков float32 с заранее выделенной памятью (один писатель, один читатель)."""
+
+    def __init__(self, capacity: int, blocksize: int, channels: int):
+        self._blocks = np.zeros((capacity, blocksize, channels), dtype=np.float32)
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self.capacity = capacity
+        self._write = 0
+        self._read = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    def push(self, block: np.ndarray) -> bool:
+        """
+        Кладет блок (только писатель). Не блокирует.
+
+        Returns:
+            bool: False если кольцо заполнено
+        """
+        if self._write - self._read >= self.capacity:
+            return False
+        slot = self._write % self.capacity
+        frames = min(len(block), self._blocks.shape[1])
+        self._blocks[slot, :frames] = block[:frames]
+        self._frames[slot] = frames
+        self._write += 1  # Публикуется после данных блока
+        return True
+
+    def peek(self) -> Optional[np.ndarray]:
+        """Следующий блок без копирования (только читатель; действителен до release)."""
+        if self._write == self._read:
+            return None
+        slot = self._read % self.capacity
+        return self._blocks[slot, :int(self._frames[slot])]
+
+    def release(self):
+        """Освобождает блок, полученный через peek (только читатель)."""
+        self._read += 1
+
+    def discard(self, count: int) -> int:
+        """Отбрасывает до count старых блоков (только читатель)."""
+        count = max(0, min(count, self._write - self._read))
+        self._read += count
+        return count
+
+
+class TargetWriter:
+    """
+    Поток записи одной цели.
+
+    Обратное давление: stream.write блокирует только этот поток. Если
+    устройство не успевает, блоки отбрасываются по политике цели:
+    'drop_oldest' - поток пропускает устаревшие блоки сверх max_fill
+    (задержка не накапливается), 'drop_newest' - новые блоки не кладутся
+    в заполненное кольцо (звук идет без пропусков, но задержка растет до
+    емкости кольца).
+
+    С адаптивным буфером (jitter) поток держит в кольце запас jitter.target
+    блоков: после опустошения устройства запись приостанавливается, пока
+    кольцо не наберет новый, увеличенный запас.
+    """
+
+    def __init__(self, device_name: str, stream, converter, blocksize: int, channels: int,
+                 capacity: int = 8, policy: str = DEFAULT_DROP_POLICY, max_fill: Optional[int] = None,
+                 jitter=None):
+        """
+        Args:
+            device_name: Имя цели
+            stream: Выходной поток устройства
+            converter: SampleFormatConverter цели (или None)
+            blocksize: Размер блока в фреймах
+            channels: Количество выходных каналов
+            capacity: Емкость кольца в блоках
+            policy: Политика при перегрузке ('drop_oldest' или 'drop_newest')
+            max_fill: Допустимое заполнение сверх запаса для 'drop_oldest' (по умолчанию - половина кольца)
+            jitter: AdaptiveJitterBuffer цели (или None)
+        """
+        self.device_name = device_name
+        self.stream = stream
+        self.converter = converter
+        self.ring = BlockRing(capacity, blocksize, channels)
+        self.policy = policy if policy in DROP_POLICY_OPTIONS else DEFAULT_DROP_POLICY
+        self.max_fill = max_fill if max_fill is not None else max(1, capacity // 2)
+        self.jitter = jitter
+        if jitter is not None:
+            # Кольцо вмещает наибольший запас, который можно задать на лету, и допуск сверх него:
+            # пределы меняются без перевыделения кольца
+            limit_blocks = math.ceil(MAX_JITTER_LIMIT_MS / jitter.block_ms)
+            capacity = max(capacity, max(jitter.max_blocks, limit_blocks) + self.max_fill + 1)
+            self.ring = BlockRing(capacity, blocksize, channels)
+        self._prebuffering = jitter is not None and jitter.target > 0
+
+        # Счетчики: писатель и читатель меняют только свои
+        self.written = 0
+        self.dropped_full = 0    # Кольцо заполнено (callback)
+        self.dropped_stale = 0   # Устаревшие блоки (поток цели)
+        self.max_seen_fill = 0
+        self.write_errors = 0
+        self.write_started = 0.0  # time.monotonic() начала текущей записи (0 - не пишет), для сторожа
+
+        self._rearm = False  # Запись возобновляется после паузы (простой источника)
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"Writer-{self.device_name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, block: np.ndarray) -> bool:
+        """Передает блок потоку цели (вызывается из callback, не блокирует)."""
+        if not self.ring.push(block):
+            self.dropped_full += 1
+            return False
+        self._wakeup.set()
+        return True
+
+    def rearm(self):
+        """Запись возобновляется после паузы: запас набирается заново, опустошение не учитывается (из callback)."""
+        self._rearm = True
+
+    def _run(self):
+        ring = self.ring
+        jitter = self.jitter
+        paused = False
+        while not self._stop.is_set():
+            self._wakeup.wait(0.1)
+            self._wakeup.clear()
+            while not self._stop.is_set():
+                if self._rearm:
+                    self._rearm = False
+                    self._prebuffering = jitter is not None and jitter.target > 0
+                    paused = True
+                fill = len(ring)
+                reserve = jitter.target if jitter is not None else 0
+                if self._prebuffering:
+                    # Набираем запас перед (повторным) началом воспроизведения
+                    if fill < max(1, reserve):
+                        break
+                    self._prebuffering = False
+                if fill == 0:
+                    break
+                if fill > self.max_seen_fill:
+                    self.max_seen_fill = fill
+                if self.policy == 'drop_oldest' and fill > reserve + self.max_fill:
+                    self.dropped_stale += ring.discard(fill - reserve - self.max_fill)
+                block = ring.peek()
+                underflowed = False
+                try:
+                    out_data = self.converter.convert(block) if self.converter is not None else block
+                    self.write_started = time.monotonic()
+                    underflowed = self.stream.write(out_data)
+                    self.written += 1
+                except Exception as e:
+                    self.write_errors += 1
+                    if self.write_errors <= 3:
+                        log.warning("⚠️ Ошибка записи %s: %s", self.device_name, e)
+                finally:
+                    self.write_started = 0.0
+                    ring.release()
+                if jitter is not None and not paused:
+                    self._adapt(bool(underflowed))
+                paused = False
+
+    def _adapt(self, underflowed: bool):
+        """Подстраивает запас по результату записи."""
+        jitter = self.jitter
+        if underflowed:
+            if jitter.on_underrun():
+                log.info("📶 %s: запас увеличен до %d блоков (%.0f мс)", self.device_name, jitter.target, jitter.target_ms)
+            self._prebuffering = True
+        elif jitter.on_stable():
+            # Устройство стабильно - отдаем один блок запаса (уменьшаем задержку)
+            self.dropped_stale += self.ring.discard(1)
+
+    @property
+    def reserve_blocks(self) -> int:
+        """Текущий целевой запас в блоках (0 без адаптивного буфера)."""
+        return self.jitter.target if self.jitter is not None else 0
+
+    def stats(self) -> Dict[str, int]:
+        if self.jitter is not None:
+            return dict(self._base_stats(), **self.jitter.stats())
+        return self._base_stats()
+
+    def _base_stats(self) -> Dict[str, int]:
+        return {
+            'fill': len(self.ring),
+            'max_fill': self.max_seen_fill,
+            'written': self.written,
+            'dropped_full': self.dropped_full,
+            'dropped_stale': self.dropped_stale,
+            'write_errors': self.write_errors,
+        }
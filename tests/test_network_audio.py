@@ -0,0 +1,136 @@
+"""Тесты PCM по UDP через localhost: перестановка, дубликаты, потери и перезапуск отправителя."""
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from network_audio import CONCEALMENT_DECAY, NetworkSinkStream, UdpReceiver
+
+
+SAMPLE_RATE = 48000
+BLOCKSIZE = 64
+BUFFER_MS = 5.0        # Запас приемника: 4 блока по 64 фрейма
+PACKETS = 8
+STEP = 1e-4            # Сэмпл фрейма n: n * STEP (левый канал) и -n * STEP (правый)
+
+
+def ramp(first: int, frames: int, offset: float = 0.0) -> np.ndarray:
+    values = (np.arange(first, first + frames, dtype=np.float32) * STEP + offset)[:, None]
+    return np.hstack([values, -values]).astype(np.float32)
+
+
+class Relay:
+    """Посредник между целью и приемником: перехватывает пакеты и пересылает их в заданном порядке."""
+
+    def __init__(self, port: int):
+        self.destination = ("127.0.0.1", port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.settimeout(1.0)
+        self.name = f"udp:127.0.0.1:{self.socket.getsockname()[1]}"
+
+    def capture(self, count: int):
+        return [self.socket.recv(65536) for _ in range(count)]
+
+    def forward(self, packets):
+        for packet in packets:
+            self.socket.sendto(packet, self.destination)
+
+    def close(self):
+        self.socket.close()
+
+
+@pytest.fixture
+def receiver():
+    receiver = UdpReceiver(port=0, bind="127.0.0.1", blocksize=BLOCKSIZE, buffer_ms=BUFFER_MS)
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+@pytest.fixture
+def relay(receiver):
+    relay = Relay(receiver.port)
+    yield relay
+    relay.close()
+
+
+def send_ramp(relay: Relay, offset: float = 0.0):
+    """Открывает новую передачу и возвращает ее пакеты (перехваченные посредником)."""
+    sink = NetworkSinkStream(relay.name, SAMPLE_RATE, 2, BLOCKSIZE, dtype='float32')
+    sink.start()
+    try:
+        for index in range(PACKETS):
+            sink.write(ramp(index * BLOCKSIZE, BLOCKSIZE, offset))
+        assert sink.frames_per_packet == BLOCKSIZE
+        return relay.capture(PACKETS)
+    finally:
+        sink.close()
+
+
+def wait_packets(receiver: UdpReceiver, count: int, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if receiver.buffer is not None and receiver.buffer.packets >= count:
+            return receiver.buffer
+        time.sleep(0.005)
+    pytest.fail(f"приемник не получил {count} пакетов")
+
+
+def test_reordered_and_duplicate_packets_play_in_order(receiver, relay):
+    packets = send_ramp(relay)
+    order = [0, 2, 1, 3, 3, 5, 4, 7, 6, 6]
+    relay.forward(packets[i] for i in order)
+    buffer = wait_packets(receiver, len(order))
+
+    assert buffer.reordered == 4  # 1, 4, 6 и повтор 6 пришли после более новых
+    assert buffer.duplicates == 2
+    # Запас набран: воспроизведение начинается за target_frames до самого нового фрейма
+    first = PACKETS * BLOCKSIZE - buffer.target_frames
+    for block in range(buffer.target_frames // BLOCKSIZE):
+        start = first + block * BLOCKSIZE
+        np.testing.assert_allclose(buffer.pull(BLOCKSIZE), ramp(start, BLOCKSIZE), atol=1e-7)
+    assert buffer.concealed_frames == 0
+
+
+def test_lost_packet_is_concealed(receiver, relay):
+    packets = send_ramp(relay)
+    lost = 5
+    relay.forward(packet for index, packet in enumerate(packets) if index != lost)
+    buffer = wait_packets(receiver, PACKETS - 1)
+
+    first = PACKETS * BLOCKSIZE - buffer.target_frames
+    blocks = [buffer.pull(BLOCKSIZE).copy() for _ in range(buffer.target_frames // BLOCKSIZE)]
+    lost_block = lost - first // BLOCKSIZE
+    # Потерянный блок - повтор предыдущего с затуханием, соседние не тронуты
+    np.testing.assert_allclose(blocks[lost_block], blocks[lost_block - 1] * CONCEALMENT_DECAY, atol=1e-7)
+    np.testing.assert_allclose(blocks[lost_block + 1], ramp((lost + 1) * BLOCKSIZE, BLOCKSIZE), atol=1e-7)
+    assert buffer.concealed_frames == BLOCKSIZE
+
+
+def test_sender_restart_resets_buffer(receiver, relay):
+    relay.forward(send_ramp(relay))
+    buffer = wait_packets(receiver, PACKETS)
+    buffer.pull(BLOCKSIZE)
+
+    # Новая передача (новый stream_id) снова начинается с фрейма 0
+    relay.forward(send_ramp(relay, offset=0.5))
+    wait_packets(receiver, 2 * PACKETS)
+
+    assert buffer.restarts == 1
+    assert buffer.prebuffering
+    first = PACKETS * BLOCKSIZE - buffer.target_frames
+    np.testing.assert_allclose(buffer.pull(BLOCKSIZE), ramp(first, BLOCKSIZE, 0.5), atol=1e-7)
+    assert buffer.late == 0
+
+
+def test_pull_returns_reused_view(receiver, relay):
+    relay.forward(send_ramp(relay))
+    buffer = wait_packets(receiver, PACKETS)
+
+    first = buffer.pull(BLOCKSIZE)
+    second = buffer.pull(BLOCKSIZE)
+    # Блок действителен до следующего вызова: без выделений памяти в callback
+    assert np.shares_memory(first, second)
+    assert buffer.pull(BLOCKSIZE // 2).base is first.base
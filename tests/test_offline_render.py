@@ -0,0 +1,67 @@
+"""Эталонные рендеры цепочки целей (offline_render): задержка, громкость и раскладка каналов."""
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("sounddevice")
+
+from audio_engine import EngineState
+from offline_render import compare_dirs, render
+
+
+SAMPLE_RATE = 16000
+BLOCKSIZE = 256
+SECONDS = 0.25
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+SOURCES = {
+    "sine": "gen:sine:1000",
+    "sweep": "gen:sweep:20:6000",
+}
+TARGETS = ("Speakers", "Headphones", "Sub")
+
+
+def make_state(**volumes) -> EngineState:
+    state = EngineState(
+        delays={"Speakers": 0, "Headphones": 12.5, "Sub": 40},
+        volumes={"Speakers": 0.0, "Headphones": -6.0, "Sub": -12.0},
+        channel_maps={"Speakers": "stereo", "Headphones": "swap", "Sub": "mono"},
+    )
+    state.volumes.update(volumes)
+    return state
+
+
+def render_source(source: str, out_dir: str, state: EngineState):
+    result = render(source, TARGETS, state, str(out_dir), sample_rate=SAMPLE_RATE,
+                    blocksize=BLOCKSIZE, seconds=SECONDS)
+    assert set(result.files) == set(TARGETS)
+    if os.environ.get("UPDATE_GOLDEN"):
+        # UPDATE_GOLDEN=1 python -m pytest tests/test_offline_render.py - перезаписать эталоны
+        golden = os.path.join(GOLDEN_DIR, os.path.basename(str(out_dir)))
+        os.makedirs(golden, exist_ok=True)
+        for path in result.files.values():
+            shutil.copy(path, golden)
+    return result
+
+
+@pytest.mark.parametrize("kind", sorted(SOURCES))
+def test_render_matches_golden(kind, tmp_path):
+    out_dir = tmp_path / kind
+    render_source(SOURCES[kind], out_dir, make_state())
+
+    results = compare_dirs(str(out_dir), os.path.join(GOLDEN_DIR, kind))
+    assert len(results) == len(TARGETS)
+    for result in results:
+        assert result.passed, f"{result.name}: {result.message}"
+
+
+@pytest.mark.parametrize("kind", sorted(SOURCES))
+def test_gain_change_breaks_golden(kind, tmp_path, monkeypatch):
+    monkeypatch.delenv("UPDATE_GOLDEN", raising=False)
+    out_dir = tmp_path / kind
+    render_source(SOURCES[kind], out_dir, make_state(Headphones=-5.0))
+
+    results = {result.name: result for result in compare_dirs(str(out_dir), os.path.join(GOLDEN_DIR, kind))}
+    assert not results["Headphones.wav"].passed
+    # Остальные цели не зависят от громкости наушников
+    assert results["Speakers.wav"].passed and results["Sub.wav"].passed
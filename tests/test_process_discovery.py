@@ -0,0 +1,178 @@
+"""Тесты инкрементального обнаружения аудио-приложений (process_discovery)."""
+import pytest
+
+psutil = pytest.importorskip("psutil")
+
+import process_discovery
+from process_discovery import ProcessDiscovery, ProcessNameCache, WindowEnumerationBackend, WindowRecord
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProcesses:
+    """Подмена psutil.Process: таблица PID → (имя, create_time) и счетчик обращений."""
+
+    def __init__(self):
+        self.table = {}
+        self.calls = 0
+
+    def __call__(self, pid):
+        self.calls += 1
+        if pid not in self.table:
+            raise psutil.NoSuchProcess(pid)
+        return _FakeProcess(*self.table[pid])
+
+
+class _FakeProcess:
+    def __init__(self, name, create_time):
+        self._name = name
+        self._create_time = create_time
+
+    def oneshot(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def name(self):
+        return self._name
+
+    def create_time(self):
+        return self._create_time
+
+
+class FakeBackend(WindowEnumerationBackend):
+    name = "fake"
+
+    def __init__(self):
+        self.windows = {}
+
+    def show(self, handle, pid, title):
+        self.windows[handle] = WindowRecord(handle, pid, title)
+
+    def hide(self, handle):
+        del self.windows[handle]
+
+    def enumerate(self):
+        return dict(self.windows)
+
+
+@pytest.fixture
+def processes(monkeypatch):
+    fake = FakeProcesses()
+    monkeypatch.setattr(process_discovery.psutil, "Process", fake)
+    return fake
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+def make_discovery(backend, clock, titles=()):
+    extra = set(titles)
+    discovery = ProcessDiscovery(backend, ProcessNameCache(ttl=30.0, clock=clock), extra_titles=lambda: extra)
+    return discovery, extra
+
+
+def test_refresh_reports_additions_and_removals(processes, clock, backend):
+    processes.table = {10: ("spotify.exe", 1.0), 20: ("notepad.exe", 2.0)}
+    backend.show(1, 10, "Spotify Premium")
+    backend.show(2, 20, "Заметки")
+    discovery, _ = make_discovery(backend, clock)
+
+    changes = discovery.refresh()
+    assert list(changes.added) == [1]
+    assert changes.added[1] == {"title": "Spotify Premium", "app_name": "spotify.exe"}
+    assert not changes.removed and not changes.changed
+
+    # Без изменений в окнах - пустой результат и никаких обращений к процессам
+    calls = processes.calls
+    assert not discovery.refresh()
+    assert processes.calls == calls
+
+    backend.hide(1)
+    changes = discovery.refresh()
+    assert list(changes.removed) == [1]
+    assert discovery.applications == {}
+
+
+def test_title_change_updates_application(processes, clock, backend):
+    processes.table = {10: ("vlc.exe", 1.0)}
+    backend.show(1, 10, "song.mp3 - VLC")
+    discovery, _ = make_discovery(backend, clock)
+    discovery.refresh()
+
+    backend.show(1, 10, "movie.mkv - VLC")
+    changes = discovery.refresh()
+    assert changes.changed == {1: {"title": "movie.mkv - VLC", "app_name": "vlc.exe"}}
+
+
+def test_name_cache_ttl(processes, clock):
+    processes.table = {10: ("spotify.exe", 1.0)}
+    cache = ProcessNameCache(ttl=30.0, clock=clock)
+
+    assert cache.get(10) == "spotify.exe"
+    assert cache.stats['misses'] == 1
+
+    clock.now += 29.0
+    calls = processes.calls
+    assert cache.get(10) == "spotify.exe"
+    assert cache.stats['hits'] == 1
+    assert processes.calls == calls  # Пока запись моложе TTL, системных вызовов нет
+
+    clock.now += 2.0
+    assert cache.get(10) == "spotify.exe"
+    assert cache.stats['revalidated'] == 1
+    assert processes.calls == calls + 1  # После TTL - только проверка create_time
+
+
+def test_pid_reuse_detected_by_create_time(processes, clock, backend):
+    processes.table = {10: ("spotify.exe", 1.0)}
+    backend.show(1, 10, "Spotify")
+    discovery, _ = make_discovery(backend, clock)
+    assert 1 in discovery.refresh().added
+
+    # Процесс завершился, его PID занял другой процесс с окном под новым handle
+    backend.hide(1)
+    processes.table = {10: ("discord.exe", 5.0)}
+    clock.now += 31.0
+    backend.show(2, 10, "Discord")
+    changes = discovery.refresh()
+    assert list(changes.removed) == [1]
+    assert changes.added == {2: {"title": "Discord", "app_name": "discord.exe"}}
+
+    # PID переиспользован без смены окна: после TTL имя разрешается заново
+    cache = discovery.name_cache
+    processes.table = {10: ("obs64.exe", 9.0)}
+    clock.now += 31.0
+    assert cache.get(10) == "obs64.exe"
+    assert cache.stats['reused_pids'] == 2
+
+
+def test_extra_titles_change_reevaluates_windows(processes, clock, backend):
+    processes.table = {20: ("notepad.exe", 2.0)}
+    backend.show(2, 20, "Подкаст")
+    discovery, extra = make_discovery(backend, clock)
+    assert not discovery.refresh()
+
+    extra.add("Подкаст")
+    assert 2 in discovery.refresh().added
+
+    extra.discard("Подкаст")
+    assert 2 in discovery.refresh().removed
+    assert discovery.applications == {}
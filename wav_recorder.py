@@ -0,0 +1,241 @@
+"""
+WAV Recorder для AudioForwarderApp
+Фоновая запись точек съема (источник, выход каждой цели) в WAV-файлы.
+
+Callback только копирует блок в ограниченное кольцо точки съема (без
+блокировок и системных вызовов); поток записи забирает блоки, собирает их
+в большие последовательные куски и пишет на диск. Медленный диск не
+тормозит callback: при заполненном кольце блок отбрасывается и
+увеличивается счетчик переполнений.
+
+Файлы - WAV float32 (IEEE float), ротация по размеру или времени.
+"""
+import os
+import re
+import struct
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional
+import numpy as np
+
+from target_writer import BlockRing
+from rt_log import get_logger
+
+
+log = get_logger(__name__)
+
+
+DEFAULT_RECORDING_DIR = "recordings"
+DEFAULT_ROTATE_MB = 1024       # WAV ограничен 4 ГБ - ротация заранее
+DEFAULT_ROTATE_MINUTES = 60
+TAP_QUEUE_BLOCKS = 256         # Емкость кольца точки съема (~1.4 с при 48 кГц и блоке 256)
+WRITE_CHUNK_SECONDS = 0.5      # Размер одной записи на диск
+
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_HEADER_BYTES = 58  # RIFF + fmt (18) + fact + заголовок data
+
+
+class WavFileWriter:
+    """Последовательная запись WAV float32; размеры в заголовке дописываются при закрытии."""
+
+    def __init__(self, path: str, sample_rate: int, channels: int):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames = 0
+        self._file: Optional[BinaryIO] = open(path, 'wb')
+        self._file.write(self._header(0))
+
+    def _header(self, frames: int) -> bytes:
+        block_align = self.channels * 4
+        data_bytes = frames * block_align
+        return b''.join((
+            b'RIFF', struct.pack('<I', _HEADER_BYTES - 8 + data_bytes), b'WAVE',
+            b'fmt ', struct.pack('<IHHIIHHH', 18, _WAVE_FORMAT_IEEE_FLOAT, self.channels,
+                                 self.sample_rate, self.sample_rate * block_align, block_align, 32, 0),
+            b'fact', struct.pack('<II', 4, frames),
+            b'data', struct.pack('<I', data_bytes),
+        ))
+
+    @property
+    def bytes_written(self) -> int:
+        return _HEADER_BYTES + self.frames * self.channels * 4
+
+    def write(self, frames: np.ndarray):
+        """Пишет фреймы (frames, channels) float32 одним вызовом."""
+        self._file.write(np.ascontiguousarray(frames, dtype=np.float32).tobytes())
+        self.frames += len(frames)
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            self._file.seek(0)
+            self._file.write(self._header(self.frames))
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class RecordingTap:
+    """Точка съема: кольцо блоков между callback (писатель) и потоком записи (читатель)."""
+
+    def __init__(self, label: str, channels: int, blocksize: int, capacity: int = TAP_QUEUE_BLOCKS):
+        self.label = label
+        self.channels = channels
+        self.ring = BlockRing(capacity, blocksize, channels)
+        self.overflows = 0  # Отброшенные блоки (меняет только callback)
+
+    def push(self, block: np.ndarray):
+        """Копирует блок в кольцо (вызывается из callback, не блокирует)."""
+        if not self.ring.push(block):
+            self.overflows += 1
+
+
+class _TapFile:
+    """Состояние записи одной точки съема (только поток записи)."""
+
+    def __init__(self, tap: RecordingTap, chunk_frames: int):
+        self.tap = tap
+        self.chunk = np.zeros((chunk_frames, tap.channels), dtype=np.float32)
+        self.fill = 0
+        self.writer: Optional[WavFileWriter] = None
+        self.part = 0
+        self.files: List[str] = []
+
+
+class WavRecorder:
+    """
+    Поток записи для набора точек съема.
+
+    Точки добавляются и удаляются из UI; поток записи сам открывает,
+    ротирует и закрывает файлы.
+    """
+
+    def __init__(self, directory: str, sample_rate: int, rotate_mb: float = DEFAULT_ROTATE_MB,
+                 rotate_minutes: float = DEFAULT_ROTATE_MINUTES):
+        """
+        Args:
+            directory: Папка для файлов
+            sample_rate: Частота дискретизации
+            rotate_mb: Новый файл после стольких МБ (0 - без ротации по размеру)
+            rotate_minutes: Новый файл после стольких минут (0 - без ротации по времени)
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.rotate_bytes = int(rotate_mb * 1024 * 1024) if rotate_mb else 0
+        self.rotate_frames = int(rotate_minutes * 60 * sample_rate) if rotate_minutes else 0
+        self.session = time.strftime('%Y%m%d_%H%M%S')
+        self._chunk_frames = max(1, int(sample_rate * WRITE_CHUNK_SECONDS))
+        self._taps: Dict[str, _TapFile] = {}
+        self._closed: List[_TapFile] = []
+        self._lock = threading.Lock()  # Только UI и поток записи, не callback
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.write_errors = 0
+
+    def add_tap(self, label: str, channels: int, blocksize: int) -> RecordingTap:
+        """Создает точку съема; файл откроется при первых данных."""
+        tap = RecordingTap(label, channels, blocksize)
+        with self._lock:
+            self._taps[label] = _TapFile(tap, self._chunk_frames)
+        return tap
+
+    def remove_tap(self, label: str):
+        """Дописывает остаток точки съема и закрывает ее файл."""
+        with self._lock:
+            state = self._taps.pop(label, None)
+            if state is not None:
+                self._drain(state)
+                self._flush(state)
+                self._close_file(state)
+                self._closed.append(state)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="WavRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> List[str]:
+        """
+        Останавливает запись и закрывает все файлы.
+
+        Returns:
+            list: Пути записанных файлов
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        for label in list(self._taps):
+            self.remove_tap(label)
+        return [path for state in self._closed for path in state.files]
+
+    def _run(self):
+        while not self._stop.wait(0.05):
+            with self._lock:
+                for state in self._taps.values():
+                    self._drain(state)
+
+    def _drain(self, state: _TapFile):
+        """Переносит блоки из кольца в кусок записи; полный кусок уходит на диск."""
+        ring = state.tap.ring
+        block = ring.peek()
+        while block is not None:
+            offset = 0
+            while offset < len(block):
+                count = min(len(block) - offset, len(state.chunk) - state.fill)
+                state.chunk[state.fill:state.fill + count] = block[offset:offset + count]
+                state.fill += count
+                offset += count
+                if state.fill == len(state.chunk):
+                    self._flush(state)
+            ring.release()
+            block = ring.peek()
+
+    def _flush(self, state: _TapFile):
+        if state.fill == 0:
+            return
+        try:
+            if state.writer is None:
+                state.writer = self._open_file(state)
+            state.writer.write(state.chunk[:state.fill])
+            if ((self.rotate_bytes and state.writer.bytes_written >= self.rotate_bytes) or
+                    (self.rotate_frames and state.writer.frames >= self.rotate_frames)):
+                self._close_file(state)
+        except OSError as e:
+            self.write_errors += 1
+            if self.write_errors <= 3:
+                log.warning("⚠️ Ошибка записи %s: %s", state.tap.label, e)
+        state.fill = 0
+
+    def _open_file(self, state: _TapFile) -> WavFileWriter:
+        state.part += 1
+        name = re.sub(r'[^\w\-]+', '_', state.tap.label).strip('_')
+        path = os.path.join(self.directory, f"{self.session}_{name}_{state.part:03d}.wav")
+        state.files.append(path)
+        return WavFileWriter(path, self.sample_rate, state.tap.channels)
+
+    @staticmethod
+    def _close_file(state: _TapFile):
+        if state.writer is not None:
+            state.writer.close()
+            state.writer = None
+
+    @property
+    def overflows(self) -> int:
+        return sum(state.tap.overflows for state in list(self._taps.values()) + self._closed)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Статистика по точкам съема: файлы, записанные секунды, переполнения."""
+        result = {}
+        for label, state in list(self._taps.items()):
+            written = state.writer.frames if state.writer is not None else 0
+            result[label] = {
+                'files': len(state.files),
+                'file_seconds': written / self.sample_rate,
+                'queued_blocks': len(state.tap.ring),
+                'overflows': state.tap.overflows,
+            }
+        return result
+